@@ -0,0 +1,3 @@
+"""
+Shared building blocks for the All Ten Nutrition API servers
+"""
@@ -0,0 +1,30 @@
+"""
+Transports for the analysis core
+
+Each adapter serves the same allten.core Router: flask_app mounts it on a
+Flask app, http_server runs it on ThreadingHTTPServer with keep-alive and
+asyncio_server on an asyncio event loop. The stdlib servers pick between
+the last two with HTTP_TRANSPORT (threading or asyncio).
+"""
+
+import os
+
+from allten.adapters.http_server import RouterRequestHandler, make_server
+
+HTTP_TRANSPORT = os.environ.get('HTTP_TRANSPORT', 'threading')
+TRANSPORTS = ('threading', 'asyncio')
+
+
+def serve(router, host, port, on_listening=None, handler_class=RouterRequestHandler, transport=None):
+    """Serve router with the configured stdlib transport; on_listening runs once the socket is bound"""
+    transport = transport or HTTP_TRANSPORT
+    if transport == 'asyncio':
+        from allten.adapters.asyncio_server import serve_forever
+        serve_forever(router, host, port, on_listening)
+        return
+    if transport != 'threading':
+        raise ValueError(f"Unknown HTTP_TRANSPORT {transport!r}, expected one of {', '.join(TRANSPORTS)}")
+    server = make_server(router, host, port, handler_class)
+    if on_listening:
+        on_listening()
+    server.serve_forever()
@@ -0,0 +1,214 @@
+"""
+asyncio adapter: serve a Router from an asyncio event loop
+
+One coroutine per connection parses HTTP/1.1 requests (Content-Length or
+chunked bodies, keep-alive, pipelining) and hands each to the router on a
+thread pool, because handlers block on Vision, SQLite and the local model.
+Streamed responses are sent with chunked encoding, each chunk produced on
+the same pool.
+Fast-lane routes (health checks, metrics, preflights) get a small pool of
+their own, so they are answered even while every analysis worker is busy.
+Bodies are received up to MAX_BODY_BYTES before the handler runs; a larger
+declared body is answered with 413 without being read. Idle connections,
+connection reuse and counters follow allten.keepalive.
+"""
+
+import asyncio
+import functools
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.client import HTTPMessage
+from urllib.parse import urlsplit
+
+from allten.core.routing import FAST_LANE, Request, json_response
+from allten.ingest import MAX_BODY_BYTES, MAX_CHUNK_LINE
+from allten.keepalive import IDLE_TIMEOUT, MAX_REQUESTS_PER_CONNECTION, count_connection_event
+
+ASYNC_WORKERS = int(os.environ.get('ASYNC_WORKERS', 32))
+FAST_LANE_WORKERS = int(os.environ.get('FAST_LANE_WORKERS', 4))
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class _BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def _read_chunk_line(reader):
+    """One chunk-size or trailer line; 400 if it is longer than the stream limit"""
+    try:
+        return await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        # readline reports an overlong line as ValueError (LimitOverrunError from readuntil)
+        raise _BadRequest(400, "Malformed chunked body")
+
+
+async def _read_chunked(reader, limit):
+    """Decode a chunked body of at most limit bytes"""
+    parts = []
+    size = 0
+    while True:
+        line = await _read_chunk_line(reader)
+        if len(line) > MAX_CHUNK_LINE or not line.endswith(b'\n'):
+            raise _BadRequest(400, "Malformed chunked body")
+        try:
+            chunk_size = int(line.split(b';', 1)[0].strip(), 16)
+        except ValueError:
+            raise _BadRequest(400, "Malformed chunk size")
+        if chunk_size < 0:
+            raise _BadRequest(400, "Malformed chunk size")
+        if chunk_size == 0:
+            # Skip trailers up to the blank line that ends the body
+            while True:
+                trailer = await _read_chunk_line(reader)
+                if trailer in (b'\r\n', b'\n', b''):
+                    return b''.join(parts)
+                if len(trailer) > MAX_CHUNK_LINE:
+                    raise _BadRequest(400, "Malformed chunk trailer")
+        size += chunk_size
+        if size > limit:
+            raise _BadRequest(413, f"Request body exceeds the {limit} byte limit")
+        parts.append(await reader.readexactly(chunk_size))
+        await _read_chunk_line(reader)  # CRLF after the chunk data
+
+
+async def _read_request(reader, writer):
+    """(Request, keep_alive) for the next request on the connection, or None once it is closed"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), IDLE_TIMEOUT)
+    except asyncio.TimeoutError:
+        count_connection_event("idle_timeouts")
+        return None
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise _BadRequest(431, "Request headers too large")
+
+    request_line, _, header_block = head.partition(b'\r\n')
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise _BadRequest(400, "Bad request line")
+    headers = BytesParser(_class=HTTPMessage).parsebytes(header_block)
+
+    connection = headers.get('Connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        body = await _read_chunked(reader, MAX_BODY_BYTES)
+        # The handler sees a plain body with a known length
+        del headers['Transfer-Encoding']
+        headers['Content-Length'] = str(len(body))
+    else:
+        try:
+            length = int(headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise _BadRequest(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise _BadRequest(413, f"Request body is {length} bytes, the limit is {MAX_BODY_BYTES}")
+        if length and headers.get('Expect', '').lower() == '100-continue':
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+        body = await reader.readexactly(length) if length else b''
+
+    parsed = urlsplit(target)
+    peer = writer.get_extra_info('peername')
+    request = Request(method, parsed.path, parsed.query, headers, io.BytesIO(body),
+                      client=peer[0] if peer else None)
+    return request, keep_alive
+
+
+def _encode_response(response, keep_alive, remaining):
+    try:
+        reason = HTTPStatus(response.status).phrase
+    except ValueError:
+        reason = ''
+    lines = [f"HTTP/1.1 {response.status} {reason}"]
+    lines.extend(f"{name}: {value}" for name, value in response.headers)
+    if response.stream is not None:
+        lines.append("Transfer-Encoding: chunked")
+    else:
+        lines.append(f"Content-Length: {len(response.body)}")
+    if keep_alive:
+        lines.append("Connection: keep-alive")
+        lines.append(f"Keep-Alive: timeout={int(IDLE_TIMEOUT)}, max={remaining}")
+    else:
+        lines.append("Connection: close")
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + response.body
+
+
+async def _send_stream(loop, executor, writer, stream):
+    """Send each chunk as the executor produces it, with chunked framing"""
+    chunks = iter(stream)
+    while True:
+        chunk = await loop.run_in_executor(executor, next, chunks, None)
+        if chunk is None:
+            break
+        if chunk:
+            writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def _handle_connection(router, executors, reader, writer):
+    count_connection_event("connections")
+    loop = asyncio.get_running_loop()
+    served = 0
+    try:
+        while True:
+            try:
+                received = await _read_request(reader, writer)
+            except _BadRequest as e:
+                writer.write(_encode_response(router.cors(json_response({"error": e.message}, e.status)), False, 0))
+                await writer.drain()
+                return
+            if received is None:
+                return
+            request, keep_alive = received
+            served += 1
+            count_connection_event("requests")
+            if served >= MAX_REQUESTS_PER_CONNECTION and keep_alive:
+                count_connection_event("max_requests_reached")
+                keep_alive = False
+
+            executor = executors[FAST_LANE] if router.lane(request) == FAST_LANE else executors[None]
+            response = await loop.run_in_executor(executor, router.dispatch, request)
+            try:
+                writer.write(_encode_response(response, keep_alive, MAX_REQUESTS_PER_CONNECTION - served))
+                if response.stream is not None:
+                    await _send_stream(loop, executor, writer, response.stream)
+                await writer.drain()
+            finally:
+                response.close()
+            if not keep_alive:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(router, host, port, on_listening=None, workers=ASYNC_WORKERS):
+    """Serve router until cancelled; on_listening runs once the socket is bound"""
+    executors = {
+        None: ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asyncio-router'),
+        FAST_LANE: ThreadPoolExecutor(max_workers=FAST_LANE_WORKERS, thread_name_prefix='asyncio-fast-lane'),
+    }
+    server = await asyncio.start_server(
+        functools.partial(_handle_connection, router, executors), host, port, limit=MAX_HEADER_BYTES)
+    if on_listening:
+        on_listening()
+    async with server:
+        await server.serve_forever()
+
+
+def serve_forever(router, host, port, on_listening=None):
+    asyncio.run(serve(router, host, port, on_listening))
@@ -0,0 +1,44 @@
+"""
+Flask adapter: mount a Router on a Flask app
+"""
+
+import io
+
+from allten.core.routing import Request, json_response
+
+
+def register_router(app, router):
+    """Send every path and method of a Flask app to router"""
+    from flask import Response, request
+    from werkzeug.datastructures import Headers
+    from werkzeug.exceptions import HTTPException
+
+    def view(path=''):
+        try:
+            headers, rfile = request.headers, request.stream
+            if request.content_length is None and 'chunked' in request.headers.get('Transfer-Encoding', '').lower():
+                # The WSGI server has already removed the chunked framing
+                body = request.get_data()
+                headers = Headers(request.headers)
+                headers.remove('Transfer-Encoding')
+                headers['Content-Length'] = str(len(body))
+                rfile = io.BytesIO(body)
+        except HTTPException as e:
+            # MAX_CONTENT_LENGTH exceeded; answer in JSON like the other transports
+            response = router.cors(json_response({"error": e.description}, e.code))
+            return Response(response.body, status=response.status, headers=response.headers)
+        core_request = Request(request.method, request.path, request.query_string.decode('latin-1'),
+                               headers, rfile, client=request.remote_addr)
+        response = router.dispatch(core_request)
+        if response.stream is not None:
+            # Werkzeug sends a generator body chunk by chunk
+            flask_response = Response(response.stream, status=response.status, headers=response.headers)
+        else:
+            flask_response = Response(response.body, status=response.status, headers=response.headers)
+        flask_response.call_on_close(response.close)
+        return flask_response
+
+    methods = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS']
+    app.add_url_rule('/', 'allten_router', view, methods=methods, provide_automatic_options=False)
+    app.add_url_rule('/<path:path>', 'allten_router_path', view, methods=methods, provide_automatic_options=False)
+    return app
@@ -0,0 +1,45 @@
+"""
+http.server adapter: serve a Router from ThreadingHTTPServer
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from allten.core.routing import Request
+from allten.keepalive import KeepAliveHandlerMixin
+
+
+class RouterRequestHandler(KeepAliveHandlerMixin, BaseHTTPRequestHandler):
+    """Keep-alive request handler that hands every request to its router"""
+
+    router = None
+
+    def handle_router_request(self):
+        parsed = urlsplit(self.path)
+        request = Request(self.command, parsed.path, parsed.query, self.headers, self.rfile,
+                          client=self.client_address[0])
+        response = self.router.dispatch(request)
+        try:
+            self.send_response(response.status)
+            for name, value in response.headers:
+                self.send_header(name, value)
+            self.end_headers()
+            if response.stream is not None:
+                self.send_chunked(response.stream)
+            else:
+                self.wfile.write(response.body)
+        finally:
+            response.close()
+
+    def log_request(self, code='-', size='-'):
+        # The router's access log records the request instead of a line on stderr
+        if self.router.access_log is None:
+            super().log_request(code, size)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = handle_router_request
+
+
+def make_server(router, host, port, handler_class=RouterRequestHandler):
+    """A bound ThreadingHTTPServer for router (call serve_forever to run it)"""
+    handler = type(handler_class.__name__, (handler_class,), {'router': router})
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,199 @@
+"""
+Admission control for expensive endpoints
+
+At most max_concurrent analyses run at once. Up to max_queue more wait in
+FIFO order, each for at most queue_timeout seconds; beyond that, or once
+the deadline passes, the request is answered 503 with a Retry-After
+estimated from recent service times instead of being worked on after the
+client has given up. Each client (a configured API key, else IP address)
+also has a token bucket, so one caller cannot fill the queue: over its rate it gets
+429 with Retry-After. Counters for every outcome are kept for /metrics.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from allten.core.routing import json_response
+
+ANALYSIS_MAX_CONCURRENCY = int(os.environ.get('ANALYSIS_MAX_CONCURRENCY', 8))
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('ANALYSIS_QUEUE_SIZE', 16))
+ANALYSIS_QUEUE_TIMEOUT = float(os.environ.get('ANALYSIS_QUEUE_TIMEOUT', 2))
+# Per-client sustained requests per second and burst size (0 disables rate limiting)
+RATE_LIMIT_RPS = float(os.environ.get('RATE_LIMIT_RPS', 2))
+RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 10))
+MAX_TRACKED_CLIENTS = 10000
+# Comma-separated X-API-Key values that get their own bucket; any other key is ignored
+API_KEYS = frozenset(key.strip() for key in os.environ.get('API_KEYS', '').split(',') if key.strip())
+
+
+class Rejected(Exception):
+    """Request turned away before any work was done"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def client_key(request, api_keys=API_KEYS):
+    """Rate limit key: a known API key if one is sent, else the client address
+
+    Unknown keys fall through to the address, so a client cannot get a fresh
+    bucket (or push other clients' buckets out) by making keys up.
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key and api_key in api_keys:
+        return 'key:' + api_key
+    # Render and Railway proxies append the address they saw, so trust only the last entry
+    forwarded = request.headers.get('X-Forwarded-For')
+    if forwarded:
+        return 'ip:' + forwarded.split(',')[-1].strip()
+    return 'ip:' + str(request.client)
+
+
+class RateLimiter:
+    """Token bucket per client, refilled at rate tokens per second up to burst"""
+
+    def __init__(self, rate, burst, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()  # key -> (tokens, updated); least recently seen first
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Spend one token; 0 if allowed, else seconds until the next token"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionController:
+    """Concurrency cap with a bounded, deadline-limited FIFO queue and per-client rate limits"""
+
+    def __init__(self, name, max_concurrent=ANALYSIS_MAX_CONCURRENCY, max_queue=ANALYSIS_QUEUE_SIZE,
+                 queue_timeout=ANALYSIS_QUEUE_TIMEOUT, rate=RATE_LIMIT_RPS, burst=RATE_LIMIT_BURST):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limiter = RateLimiter(rate, burst) if rate > 0 else None
+        self.active = 0
+        self.waiters = deque()
+        self.service_seconds = None  # moving average of time spent per admitted request
+        self._lock = threading.Lock()
+        self._stats = {
+            "admitted": 0, "completed": 0, "queued": 0, "admitted_from_queue": 0,
+            "rejected": {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0},
+            "queue_wait_ms_total": 0.0, "max_queue_wait_ms": 0.0,
+        }
+
+    def _retry_after(self):
+        # Time for the queue ahead to drain through the available slots
+        service_seconds = self.service_seconds or 1.0
+        return max(1, math.ceil(service_seconds * (len(self.waiters) + 1) / self.max_concurrent))
+
+    def acquire(self, key=None):
+        """Take a slot, waiting in the queue if necessary; raises Rejected"""
+        if self.limiter is not None and key is not None:
+            wait = self.limiter.take(key)
+            if wait:
+                self._reject("rate_limited")
+                raise Rejected(429, "Rate limit exceeded", max(1, math.ceil(wait)))
+
+        with self._lock:
+            if self.active < self.max_concurrent and not self.waiters:
+                self.active += 1
+                self._stats["admitted"] += 1
+                return
+            if len(self.waiters) >= self.max_queue:
+                self._stats["rejected"]["queue_full"] += 1
+                raise Rejected(503, "Server busy, queue is full", self._retry_after())
+            turn = threading.Event()
+            self.waiters.append(turn)
+            self._stats["queued"] += 1
+
+        start = time.monotonic()
+        turn.wait(self.queue_timeout)
+        waited_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            if not turn.is_set():
+                # Deadline passed; a slot handed over after this point goes to the next waiter
+                self.waiters.remove(turn)
+                self._stats["rejected"]["queue_timeout"] += 1
+                raise Rejected(503, "Server busy, timed out waiting in queue", self._retry_after())
+            self._stats["admitted"] += 1
+            self._stats["admitted_from_queue"] += 1
+            self._stats["queue_wait_ms_total"] += waited_ms
+            self._stats["max_queue_wait_ms"] = max(self._stats["max_queue_wait_ms"], round(waited_ms, 1))
+
+    def release(self, service_seconds):
+        with self._lock:
+            self._stats["completed"] += 1
+            if self.service_seconds is None:
+                self.service_seconds = service_seconds
+            else:
+                self.service_seconds = 0.9 * self.service_seconds + 0.1 * service_seconds
+            if self.waiters:
+                # Hand the slot straight to the oldest waiter (active stays the same)
+                self.waiters.popleft().set()
+            else:
+                self.active -= 1
+
+    def _reject(self, reason):
+        with self._lock:
+            self._stats["rejected"][reason] += 1
+
+    def guard(self, handler, key=client_key):
+        """Wrap a route handler so it only runs once admitted"""
+        @functools.wraps(handler)
+        def guarded(request):
+            try:
+                self.acquire(key(request) if key else None)
+            except Rejected as e:
+                return json_response({"error": e.reason, "retry_after": e.retry_after}, e.status,
+                                     headers=[('Retry-After', str(e.retry_after))])
+            start = time.monotonic()
+            try:
+                result = handler(request)
+            except BaseException:
+                self.release(time.monotonic() - start)
+                raise
+            if getattr(result, 'stream', None) is not None:
+                # The work happens while the stream is sent; keep the slot until then
+                result.call_on_close(lambda: self.release(time.monotonic() - start))
+            else:
+                self.release(time.monotonic() - start)
+            return result
+        return guarded
+
+    def stats(self):
+        with self._lock:
+            stats = {**self._stats, "rejected": dict(self._stats["rejected"])}
+            wait_total, from_queue = stats.pop("queue_wait_ms_total"), stats["admitted_from_queue"]
+            stats["mean_queue_wait_ms"] = round(wait_total / from_queue, 1) if from_queue else 0.0
+            stats.update({
+                "name": self.name,
+                "active": self.active,
+                "waiting": len(self.waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "mean_service_ms": round(self.service_seconds * 1000, 1) if self.service_seconds else None,
+                "tracked_clients": len(self.limiter.buckets) if self.limiter else 0,
+            })
+        return stats
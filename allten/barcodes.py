@@ -0,0 +1,179 @@
+"""
+Product barcodes: normalization, the on-disk lookup index and local decoding
+
+Every code is stored and looked up as its GTIN-14 number, so a UPC-A
+printed as 12 digits, the same product as EAN-13 and the 14-digit form in
+FoodData Central all find the same row. UPC-E codes are expanded to UPC-A.
+
+The index is an open-addressing hash table (linear probing, at most half
+full) written next to the catalogue and memory-mapped, so a lookup reads
+one or two slots however many products there are, and opening it costs
+nothing up front:
+
+    upc.idx     b'UPCIDX01', uint64 capacity, then capacity uint64 GTINs
+                (0 = empty slot) followed by capacity int32 catalogue rows
+
+Decoding barcodes from photos needs pyzbar (and the zbar library) and
+Pillow; without them decode_barcodes() finds nothing.
+"""
+
+import io
+import os
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from PIL import Image
+    from pyzbar import pyzbar
+    PYZBAR_AVAILABLE = True
+except ImportError:  # also raised when the zbar shared library is missing
+    PYZBAR_AVAILABLE = False
+
+MAGIC = b'UPCIDX01'
+HEADER_BYTES = 16
+# Fibonacci hashing: the top bits of code * 2^64/phi spread consecutive codes evenly
+_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+# Photos are scanned at this size at most; barcodes stay readable and zbar stays fast
+SCAN_MAX_SIDE = 1280
+
+
+def expand_upce(code):
+    """12-digit UPC-A for an 8-digit UPC-E code, or None"""
+    if len(code) != 8 or not code.isdigit() or code[0] not in '01':
+        return None
+    system, digits, check = code[0], code[1:7], code[7]
+    last = digits[5]
+    if last in '012':
+        body = digits[:2] + last + '0000' + digits[2:5]
+    elif last == '3':
+        body = digits[:3] + '00000' + digits[3:5]
+    elif last == '4':
+        body = digits[:4] + '00000' + digits[4]
+    else:
+        body = digits[:5] + '0000' + last
+    return system + body + check
+
+
+def normalize_gtin(code):
+    """GTIN-14 number for an 8, 12, 13 or 14 digit code (spaces and dashes ignored), or None"""
+    digits = ''.join(ch for ch in str(code or '') if ch not in ' -')
+    if not digits.isdigit() or len(digits) not in (8, 12, 13, 14):
+        return None
+    return int(digits) or None
+
+
+def gtin_candidates(code):
+    """GTINs a code may stand for: 8 digits is EAN-8 or, failing that, UPC-E"""
+    candidates = [normalize_gtin(code)]
+    digits = ''.join(ch for ch in str(code or '') if ch not in ' -')
+    if len(digits) == 8:
+        candidates.append(normalize_gtin(expand_upce(digits)))
+    return [gtin for gtin in candidates if gtin is not None]
+
+
+def format_gtin(gtin):
+    return f"{gtin:014d}"
+
+
+def _slots(codes, shift):
+    return (codes * np.uint64(_MULTIPLIER)) >> np.uint64(shift)
+
+
+def write_upc_index(path, codes, rows):
+    """Write the hash table for parallel arrays of GTINs and catalogue rows; later rows win for repeated codes"""
+    codes = np.asarray(codes, dtype=np.uint64)
+    rows = np.asarray(rows, dtype=np.int32)
+    # Keep the last occurrence of each code
+    _, last = np.unique(codes[::-1], return_index=True)
+    keep = len(codes) - 1 - last
+    codes, rows = codes[keep], rows[keep]
+
+    capacity = 16
+    while capacity < 2 * len(codes):
+        capacity *= 2
+    shift = 64 - (capacity.bit_length() - 1)
+    keys = np.zeros(capacity, dtype=np.uint64)
+    values = np.full(capacity, -1, dtype=np.int32)
+
+    # Insert everything at once, one probe step per round: each pending code
+    # tries its current slot, the first claimant of a free slot takes it and
+    # everyone else moves one slot on. Slots are never freed, so every code
+    # ends up behind an unbroken run of occupied slots from its home slot,
+    # which is what lookups rely on.
+    slots = _slots(codes, shift).astype(np.int64)
+    pending = np.arange(len(codes))
+    while pending.size:
+        target = slots[pending]
+        free = np.flatnonzero(keys[target] == 0)
+        _, first = np.unique(target[free], return_index=True)
+        won = np.zeros(pending.size, dtype=bool)
+        won[free[first]] = True
+        winners = pending[won]
+        keys[slots[winners]] = codes[winners]
+        values[slots[winners]] = rows[winners]
+        pending = pending[~won]
+        slots[pending] = (slots[pending] + 1) & (capacity - 1)
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(capacity).tobytes())
+        f.write(keys.astype('<u8').tobytes())
+        f.write(values.astype('<i4').tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    return len(codes)
+
+
+class UpcIndex:
+    """Memory-mapped GTIN -> catalogue row hash table"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+        if len(header) != HEADER_BYTES or header[:8] != MAGIC:
+            raise ValueError(f"{path} is not a barcode index")
+        self.capacity = int(np.frombuffer(header[8:], dtype='<u8')[0])
+        self.mask = self.capacity - 1
+        self.shift = 64 - (self.capacity.bit_length() - 1)
+        self.keys = np.memmap(path, dtype='<u8', mode='r', offset=HEADER_BYTES, shape=(self.capacity,))
+        self.rows = np.memmap(path, dtype='<i4', mode='r', offset=HEADER_BYTES + 8 * self.capacity,
+                              shape=(self.capacity,))
+
+    def row(self, gtin):
+        """Catalogue row for a GTIN, or None"""
+        slot = ((gtin * _MULTIPLIER) & _MASK64) >> self.shift
+        while True:
+            key = int(self.keys[slot])
+            if key == gtin:
+                return int(self.rows[slot])
+            if key == 0:
+                return None
+            slot = (slot + 1) & self.mask
+
+    def __len__(self):
+        return int(np.count_nonzero(self.keys))
+
+
+def decode_barcodes(image_bytes):
+    """Product codes (EAN/UPC, UPC-E expanded) found in a photo, in the order zbar reports them"""
+    if not PYZBAR_AVAILABLE:
+        return []
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.thumbnail((SCAN_MAX_SIDE, SCAN_MAX_SIDE))
+        symbols = pyzbar.decode(image.convert('L'), symbols=[
+            pyzbar.ZBarSymbol.EAN13, pyzbar.ZBarSymbol.EAN8, pyzbar.ZBarSymbol.UPCA, pyzbar.ZBarSymbol.UPCE])
+    except Exception:
+        return []
+    codes = []
+    for symbol in symbols:
+        code = symbol.data.decode('ascii', 'replace')
+        if symbol.type == 'UPCE':
+            code = expand_upce(code) or code
+        codes.append(code)
+    return codes
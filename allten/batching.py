@@ -0,0 +1,140 @@
+"""
+Dynamic micro-batching for local model inference
+
+Concurrent requests each submit one item; a single worker thread collects
+items until either max_batch_size is reached or the oldest item has waited
+max_wait_ms, runs one batched call, and hands every caller its own result.
+If the batched call raises, each item is retried on its own so one bad
+input (a corrupt image, say) only fails its own caller. Callers that
+cancel their future before the batch runs are left out of it.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Groups concurrent single-item calls into batched calls of batch_fn"""
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=3.0, name='batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self._queue = queue.SimpleQueue()
+        self._stats_lock = threading.Lock()
+        self.items = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.split_batches = 0
+        self.queue_wait_seconds_total = 0.0
+        self.batch_size_histogram = [0] * (self.max_batch_size + 1)
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Queue one item; the returned Future resolves to its result"""
+        future = Future()
+        self._queue.put((time.perf_counter(), item, future))
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        enqueued_at, item, future = self._queue.get()
+        batch = [(enqueued_at, item, future)]
+        deadline = enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    # Past the deadline: still take whatever is already waiting
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._process(batch)
+            except Exception as e:
+                # One bad batch must not stop the only worker; whoever is still waiting gets the error
+                for _, _, future in batch:
+                    self._fail(future, e)
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        waited = sum(started - enqueued_at for enqueued_at, _, _ in batch)
+        # Callers that cancelled are dropped; the rest can no longer cancel
+        batch = [entry for entry in batch if entry[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        items = [item for _, item, _ in batch]
+        futures = [future for _, _, future in batch]
+        try:
+            self._resolve(futures, self.batch_fn(items))
+        except Exception as e:
+            pending = [(item, future) for item, future in zip(items, futures) if not future.done()]
+            if len(pending) == 1:
+                self._fail(pending[0][1], e)
+            elif pending:
+                with self._stats_lock:
+                    self.split_batches += 1
+                for item, future in pending:
+                    try:
+                        self._resolve([future], self.batch_fn([item]))
+                    except Exception as item_error:
+                        self._fail(future, item_error)
+
+        with self._stats_lock:
+            self.items += len(batch)
+            self.batches += 1
+            self.queue_wait_seconds_total += waited
+            self.batch_size_histogram[len(batch)] += 1
+
+    @staticmethod
+    def _fail(future, error):
+        if not future.done():
+            future.set_exception(error)
+
+    @classmethod
+    def _resolve(cls, futures, results):
+        results = list(results)
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+        if len(results) < len(futures):
+            error = RuntimeError(f"batch_fn returned {len(results)} results for {len(futures)} items")
+            for future in futures[len(results):]:
+                cls._fail(future, error)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "items": self.items,
+                "batches": self.batches,
+                # Batches that raised and were retried one item at a time
+                "split_batches": self.split_batches,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "avg_queue_wait_ms": round(self.queue_wait_seconds_total / self.items * 1000, 3) if self.items else 0.0,
+                # Index is the batch size, value is how many batches ran at that size
+                "batch_size_histogram": list(self.batch_size_histogram),
+            }
@@ -0,0 +1,200 @@
+"""
+Compiled nutrition catalogue
+
+The importer writes a directory the servers load at startup. Each import
+produces a new generation directory, and the CURRENT file naming the live
+generation is swapped atomically, so readers never see a half-written
+catalogue:
+
+    CURRENT                 name of the live generation, e.g. gen-000003
+    gen-000003/
+        manifest.json       format version, nutrient fields and units, food
+                            count, and a fingerprint of every imported source
+        foods.json          parallel lists: ids, names, sources, serving_grams
+                            and upcs (barcode as imported, or null)
+        nutrients.f32       float32 matrix, one contiguous column per nutrient
+                            (len(fields) x food count), values per 100 g
+        upc.idx             barcode -> row hash table (see allten.barcodes),
+                            when any food has a barcode
+
+Columns are stored contiguously so whole-catalogue math on one nutrient
+reads one block, and the file is memory-mapped rather than parsed.
+"""
+
+import json
+import os
+import shutil
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from allten.barcodes import UpcIndex, gtin_candidates, normalize_gtin, write_upc_index
+from allten.nutrients import NUTRIENT_FIELDS, NUTRIENT_UNITS, unflatten_nutrition
+
+CATALOG_FORMAT = 1
+KEEP_GENERATIONS = 2
+DEFAULT_CATALOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'catalog')
+
+
+class CatalogError(Exception):
+    """Missing, corrupt or incompatible catalogue"""
+
+
+class Catalog:
+    """Foods with per-100 g nutrient columns in NUTRIENT_FIELDS order"""
+
+    def __init__(self, ids, names, sources, serving_grams, columns, manifest=None, upcs=None, upc_index=None):
+        self.ids = list(ids)
+        self.names = list(names)
+        self.sources = list(sources)
+        self.serving_grams = list(serving_grams)
+        self.columns = columns  # float32, shape (len(NUTRIENT_FIELDS), len(ids))
+        self.manifest = manifest or {}
+        self.upcs = list(upcs) if upcs is not None else [None] * len(self.ids)
+        self.upc_index = upc_index
+        self.row_of = {food_id: row for row, food_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def vector(self, food_id):
+        """Per-100 g values of one food in NUTRIENT_FIELDS order, or None"""
+        row = self.row_of.get(food_id)
+        return None if row is None else self.columns[:, row].tolist()
+
+    def nutrition(self, food_id, grams=100.0, digits=2):
+        """Nested nutrition block for an amount of one food"""
+        vector = self.vector(food_id)
+        if vector is None:
+            return None
+        return unflatten_nutrition([value * grams / 100.0 for value in vector], digits=digits)
+
+    def row_for_upc(self, code):
+        """Catalogue row of the product with this barcode, or None"""
+        if self.upc_index is None:
+            return None
+        for gtin in gtin_candidates(code):
+            row = self.upc_index.row(gtin)
+            if row is not None:
+                return row
+        return None
+
+    def search_entries(self):
+        """(food_id, name, aliases, source) tuples for FoodSearchIndex"""
+        return [(food_id, name, [], source) for food_id, name, source in zip(self.ids, self.names, self.sources)]
+
+    def validate(self):
+        """Raise CatalogError unless the catalogue is internally consistent"""
+        count = len(self.ids)
+        if not (len(self.names) == len(self.sources) == len(self.serving_grams) == len(self.upcs) == count):
+            raise CatalogError("Food columns have different lengths")
+        if len(self.row_of) != count:
+            raise CatalogError("Duplicate food ids")
+        if self.columns.shape != (len(NUTRIENT_FIELDS), count):
+            raise CatalogError(f"Nutrient matrix has shape {self.columns.shape}, expected {(len(NUTRIENT_FIELDS), count)}")
+        if count and not np.isfinite(self.columns).all():
+            raise CatalogError("Nutrient matrix contains NaN or infinite values")
+        if count and (self.columns < 0).any():
+            raise CatalogError("Nutrient matrix contains negative values")
+
+
+def default_catalog_dir():
+    return os.environ.get('NUTRITION_CATALOG_DIR', DEFAULT_CATALOG_DIR)
+
+
+def current_generation(directory):
+    """Name of the live generation directory, or None if nothing has been imported"""
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_catalog(directory=None):
+    """Memory-map the live catalogue generation; raises CatalogError if it is missing or incompatible"""
+    if not NUMPY_AVAILABLE:
+        raise CatalogError("numpy is required to load the catalogue")
+    directory = directory or default_catalog_dir()
+    generation = current_generation(directory)
+    if generation is None:
+        raise CatalogError(f"No catalogue has been imported into {directory}")
+    path = os.path.join(directory, generation)
+
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        with open(os.path.join(path, 'foods.json')) as f:
+            foods = json.load(f)
+    except (OSError, ValueError) as e:
+        raise CatalogError(f"Cannot read catalogue in {path}: {e}")
+
+    if manifest.get('format') != CATALOG_FORMAT or manifest.get('fields') != NUTRIENT_FIELDS:
+        raise CatalogError("Catalogue was compiled for a different format or nutrient schema")
+
+    count = manifest['count']
+    if count:
+        columns = np.memmap(os.path.join(path, 'nutrients.f32'), dtype='<f4', mode='r',
+                            shape=(len(NUTRIENT_FIELDS), count))
+    else:
+        columns = np.zeros((len(NUTRIENT_FIELDS), 0), dtype=np.float32)
+    upc_index = None
+    if os.path.exists(os.path.join(path, 'upc.idx')):
+        try:
+            upc_index = UpcIndex(os.path.join(path, 'upc.idx'))
+        except (OSError, ValueError) as e:
+            raise CatalogError(f"Cannot read barcode index in {path}: {e}")
+    manifest['generation'] = generation
+    catalog = Catalog(foods['ids'], foods['names'], foods['sources'], foods['serving_grams'], columns, manifest,
+                      foods.get('upcs'), upc_index)
+    catalog.validate()
+    return catalog
+
+
+def write_catalog(directory, ids, names, sources, serving_grams, columns, source_fingerprints, upcs=None):
+    """Write a new catalogue generation and make it live; returns the generation name"""
+    columns = np.ascontiguousarray(columns, dtype='<f4')
+    upcs = list(upcs) if upcs is not None else [None] * len(ids)
+    barcoded = [(gtin, row) for row, gtin in enumerate(map(normalize_gtin, upcs)) if gtin is not None]
+    manifest = {
+        "format": CATALOG_FORMAT,
+        "basis": "per_100g",
+        "fields": NUTRIENT_FIELDS,
+        "units": [NUTRIENT_UNITS[name] for name in NUTRIENT_FIELDS],
+        "count": len(ids),
+        "sources": source_fingerprints,
+    }
+    foods = {"ids": list(ids), "names": list(names), "sources": list(sources), "serving_grams": list(serving_grams),
+             "upcs": upcs}
+
+    os.makedirs(directory, exist_ok=True)
+    previous = current_generation(directory)
+    number = int(previous.split('-')[1]) + 1 if previous else 1
+    generation = f"gen-{number:06d}"
+    path = os.path.join(directory, generation)
+    os.makedirs(path, exist_ok=True)
+
+    _write_file(os.path.join(path, 'nutrients.f32'), columns.tobytes())
+    _write_file(os.path.join(path, 'foods.json'), json.dumps(foods).encode())
+    if barcoded:
+        manifest["barcodes"] = write_upc_index(os.path.join(path, 'upc.idx'),
+                                               [gtin for gtin, _ in barcoded], [row for _, row in barcoded])
+    _write_file(os.path.join(path, 'manifest.json'), json.dumps(manifest, indent=2).encode())
+    _write_file(os.path.join(directory, 'CURRENT.tmp'), generation.encode())
+    os.replace(os.path.join(directory, 'CURRENT.tmp'), os.path.join(directory, 'CURRENT'))
+
+    # Keep the previous generation around for servers still mapping it
+    generations = sorted(name for name in os.listdir(directory) if name.startswith('gen-'))
+    for name in generations[:-KEEP_GENERATIONS]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return generation
+
+
+def _write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
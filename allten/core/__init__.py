@@ -0,0 +1,18 @@
+"""
+Analysis core shared by every entry point
+
+Routing, request/response handling, CORS and the decode -> recognize ->
+match -> compute pipeline, independent of the server they run in. Only the
+standard library is needed to import it; allten.adapters serves a Router
+from Flask, http.server or asyncio.
+"""
+
+from allten.core.pipeline import AnalysisError, AnalysisPipeline, decode_image
+from allten.core.routing import (
+    DEFAULT_LANE, FAST_LANE, Request, Response, Router, StreamingResponse, json_response
+)
+
+__all__ = [
+    'AnalysisError', 'AnalysisPipeline', 'decode_image',
+    'DEFAULT_LANE', 'FAST_LANE', 'Request', 'Response', 'Router', 'StreamingResponse', 'json_response',
+]
@@ -0,0 +1,161 @@
+"""
+JSON encoding for every response builder
+
+dumps() encodes straight to bytes with orjson when it is installed, then
+ujson, then the standard library (JSON_ENCODER=orjson|ujson|stdlib forces
+one). All three produce interchangeable JSON; only whitespace differs.
+NaN and infinities are written as null by every backend, as orjson does,
+instead of as invalid NaN/Infinity tokens or an error.
+
+Nutrient vectors (the flat NUTRIENT_FIELDS lists used by recipes and the
+meal log) go through nutrition_json(). With the standard library it skips
+the nested dict entirely, formatting the vector into a precompiled
+template and returning a RawJSON fragment that dumps() splices in as is.
+orjson and ujson encode a dict in C faster than Python can format the
+template, so with them it just returns the dict.
+"""
+
+import json
+import math
+import os
+import uuid
+
+from allten.nutrients import MACRONUTRIENTS, MICRONUTRIENTS, unflatten_nutrition
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import ujson
+    UJSON_AVAILABLE = True
+except ImportError:
+    UJSON_AVAILABLE = False
+
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto')
+
+
+class RawJSON(bytes):
+    """Already-encoded JSON that dumps() inserts without re-encoding"""
+
+
+# Stands in for each RawJSON while the backend encodes the rest; the random
+# part keeps it from ever matching a string in a real payload
+_TOKEN = f"rawjson-{uuid.uuid4().hex}"
+_QUOTED_TOKEN = json.dumps(_TOKEN).encode()
+
+
+def _default(fragments):
+    def default(value):
+        if isinstance(value, RawJSON):
+            fragments.append(value)
+            return _TOKEN
+        if hasattr(value, 'tolist'):
+            # numpy scalars and arrays
+            return value.tolist()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return default
+
+
+def _splice(encoded, fragments):
+    if not fragments:
+        return encoded
+    parts = encoded.split(_QUOTED_TOKEN)
+    out = [parts[0]]
+    for fragment, part in zip(fragments, parts[1:]):
+        out.append(fragment)
+        out.append(part)
+    return b''.join(out)
+
+
+def _orjson_dumps(obj, indent, default):
+    if indent not in (None, 2):
+        return _stdlib_dumps(obj, indent, default)
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=default, option=option)
+
+
+def _ujson_dumps(obj, indent, default):
+    return ujson.dumps(obj, indent=indent or 0, ensure_ascii=False, allow_nan=False, default=default).encode()
+
+
+def _stdlib_dumps(obj, indent, default):
+    return json.dumps(obj, indent=indent, default=default, allow_nan=False).encode()
+
+
+def _finite(value):
+    """value with every NaN or infinite float replaced by None"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if hasattr(value, 'tolist'):
+        return _finite(value.tolist())
+    return value
+
+
+_BACKENDS = {
+    'orjson': (ORJSON_AVAILABLE, _orjson_dumps),
+    'ujson': (UJSON_AVAILABLE, _ujson_dumps),
+    'stdlib': (True, _stdlib_dumps),
+}
+
+
+def select_encoder(name='auto'):
+    """(name, encode function) for a backend, the best installed one for 'auto'"""
+    if name != 'auto':
+        available, encode = _BACKENDS.get(name, (False, None))
+        if available:
+            return name, encode
+        print(f"⚠️ JSON encoder {name!r} not available, choosing automatically")
+    for candidate in ('orjson', 'ujson', 'stdlib'):
+        available, encode = _BACKENDS[candidate]
+        if available:
+            return candidate, encode
+
+
+ENCODER, _encode = select_encoder(JSON_ENCODER)
+
+
+def dumps(obj, indent=None):
+    """obj as UTF-8 JSON bytes, with RawJSON fragments spliced in"""
+    fragments = []
+    try:
+        encoded = _encode(obj, indent, _default(fragments))
+    except (ValueError, OverflowError):
+        # A non-finite float somewhere: write it as null, whatever the backend
+        fragments = []
+        encoded = _encode(_finite(obj), indent, _default(fragments))
+    return _splice(encoded, fragments)
+
+
+def _nutrition_template():
+    macros = ','.join(f'"{name}":%r' for name in MACRONUTRIENTS)
+    micros = ','.join(f'"{name}":%r' for name in MICRONUTRIENTS)
+    return '{' + macros + ',"micronutrients":{' + micros + '}}'
+
+
+_NUTRITION_TEMPLATE = _nutrition_template()
+
+
+def _nutrition_fragment(values):
+    values = tuple(map(float, values))
+    if not all(map(math.isfinite, values)):
+        # Written as null by dumps(), like every other non-finite value
+        return RawJSON(dumps(unflatten_nutrition(values)))
+    return RawJSON((_NUTRITION_TEMPLATE % values).encode())
+
+
+def nutrition_json(values, digits=None):
+    """Nested nutrition block for a NUTRIENT_FIELDS vector, for dumps()"""
+    if digits is not None:
+        values = [round(value, digits) for value in values]
+    if ENCODER != 'stdlib':
+        return unflatten_nutrition(values)
+    return _nutrition_fragment(values)
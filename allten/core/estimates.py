@@ -0,0 +1,296 @@
+"""
+Nutrition estimates behind /analyze_food
+
+The label matching and portion estimates used with Google Vision, the
+fallback estimate when no recognizer answers, totals over FOOD_DATABASE
+entries for the local classifier, and the fixed sample response of the
+demo servers. Estimates are seeded from the image, so the same photo always
+gets the same numbers.
+"""
+
+import copy
+import hashlib
+import random
+import time
+
+from allten.nutrients import flatten_nutrition, unflatten_nutrition
+from allten.request_log import log_event
+
+# Per-meal micronutrient ranges: (name, low, high, decimal places)
+MICRONUTRIENT_RANGES = [
+    ("iron", 1, 5, 1),
+    ("calcium", 50, 200, 1),
+    ("vitamin_c", 10, 50, 1),
+    ("potassium", 200, 600, 1),
+    ("vitamin_a", 100, 800, 1),
+    ("vitamin_e", 1, 5, 1),
+    ("vitamin_k", 5, 25, 1),
+    ("folate", 20, 80, 1),
+    ("niacin", 3, 12, 1),
+    ("riboflavin", 0.2, 0.8, 2),
+    ("thiamin", 0.1, 0.5, 2),
+    ("vitamin_b6", 0.3, 1.2, 2),
+    ("phosphorus", 80, 180, 1),
+    ("selenium", 5, 25, 1),
+    ("copper", 0.1, 0.5, 2),
+    ("manganese", 0.2, 0.8, 2),
+    ("chromium", 2, 8, 1),
+    ("molybdenum", 5, 15, 1),
+    ("iodine", 5, 25, 1),
+    ("chloride", 100, 400, 1),
+    ("biotin", 2, 8, 1),
+    ("pantothenic_acid", 1, 4, 1),
+    ("choline", 20, 80, 1),
+    ("betaine", 5, 20, 1),
+    ("taurine", 10, 40, 1),
+    ("creatine", 1, 5, 1),
+    ("carnitine", 5, 25, 1),
+    ("inositol", 10, 40, 1),
+    ("paba", 0.5, 2, 1),
+    ("lipoic_acid", 0.2, 1, 2),
+    ("coq10", 0.5, 2, 1),
+    ("glutathione", 5, 20, 1),
+    ("melatonin", 0.05, 0.2, 2),
+    ("serotonin", 0.02, 0.1, 2),
+    ("dopamine", 0.01, 0.05, 2),
+    ("norepinephrine", 0.005, 0.02, 3),
+    ("epinephrine", 0.002, 0.01, 3),
+    ("histamine", 0.05, 0.2, 2),
+    ("gaba", 0.2, 1, 2),
+    ("glycine", 50, 150, 1),
+    ("proline", 40, 120, 1),
+    ("serine", 30, 90, 1),
+    ("threonine", 25, 75, 1),
+    ("tryptophan", 10, 30, 1),
+    ("tyrosine", 20, 60, 1),
+    ("valine", 35, 105, 1),
+    ("alanine", 45, 135, 1),
+    ("arginine", 40, 120, 1),
+    ("asparagine", 30, 90, 1),
+    ("aspartic_acid", 35, 105, 1),
+    ("cysteine", 15, 45, 1),
+    ("glutamine", 50, 150, 1),
+    ("glutamic_acid", 60, 180, 1),
+    ("isoleucine", 30, 90, 1),
+    ("leucine", 40, 120, 1),
+    ("lysine", 35, 105, 1),
+    ("methionine", 12, 38, 1),
+    ("phenylalanine", 25, 75, 1),
+    ("histidine", 15, 45, 1),
+]
+
+FOOD_KEYWORDS = [
+    'food', 'meal', 'dish', 'cuisine', 'cooking', 'recipe', 'ingredient',
+    'meat', 'beef', 'chicken', 'pork', 'lamb', 'fish', 'seafood',
+    'vegetable', 'fruit', 'grain', 'rice', 'pasta', 'bread', 'cereal',
+    'dairy', 'milk', 'cheese', 'yogurt', 'butter', 'cream',
+    'nut', 'seed', 'bean', 'legume', 'soup', 'salad', 'sandwich',
+    'pizza', 'burger', 'steak', 'chop', 'cutlet', 'fillet',
+    'potato', 'tomato', 'onion', 'carrot', 'broccoli', 'spinach',
+    'apple', 'banana', 'orange', 'grape', 'berry', 'lemon',
+    'pasta', 'noodle', 'spaghetti', 'macaroni', 'lasagna',
+    'sauce', 'gravy', 'marinade', 'seasoning', 'spice', 'herb'
+]
+
+# General categories for labels that match no specific food: name -> (keywords, macro ranges)
+CATEGORY_RANGES = {
+    'mixed meat': (['meat', 'protein', 'animal'],
+                   {"calories": (200, 300), "protein": (25, 35), "carbs": (0, 5), "fat": (10, 20)}),
+    'mixed grain': (['grain', 'starch', 'carb'],
+                    {"calories": (150, 250), "protein": (3, 8), "carbs": (25, 40), "fat": (1, 5)}),
+}
+
+FALLBACK_MEALS = [
+    {"name": "Mixed Meal", "calories": (300, 500), "protein": (20, 35), "carbs": (25, 45), "fat": (10, 25)},
+    {"name": "Light Meal", "calories": (200, 350), "protein": (15, 25), "carbs": (20, 35), "fat": (5, 15)},
+    {"name": "Hearty Meal", "calories": (500, 700), "protein": (30, 45), "carbs": (40, 60), "fat": (20, 35)},
+]
+
+SAMPLE_ANALYSIS = {
+    "nutrition": {
+        "calories": 250.0, "protein": 15.0, "carbs": 30.0, "fat": 8.0,
+        "fiber": 5.0, "sugar": 12.0, "sodium": 300.0,
+        "micronutrients": {
+            "iron": 2.5, "calcium": 150.0, "vitamin_c": 25.0, "potassium": 400.0, "vitamin_a": 500.0,
+            "vitamin_e": 3.0, "vitamin_k": 15.0, "folate": 50.0, "niacin": 8.0, "riboflavin": 0.5,
+            "thiamin": 0.3, "vitamin_b6": 0.8, "phosphorus": 120.0, "selenium": 15.0, "copper": 0.2,
+            "manganese": 0.5, "chromium": 5.0, "molybdenum": 10.0, "iodine": 15.0, "chloride": 200.0,
+            "biotin": 5.0, "pantothenic_acid": 2.0, "choline": 50.0, "betaine": 10.0, "taurine": 20.0,
+            "creatine": 2.0, "carnitine": 15.0, "inositol": 25.0, "paba": 1.0, "lipoic_acid": 0.5,
+            "coq10": 1.0, "glutathione": 10.0, "melatonin": 0.1, "serotonin": 0.05, "dopamine": 0.02,
+            "norepinephrine": 0.01, "epinephrine": 0.005, "histamine": 0.1, "gaba": 0.5, "glycine": 100.0,
+            "proline": 80.0, "serine": 60.0, "threonine": 50.0, "tryptophan": 20.0, "tyrosine": 40.0,
+            "valine": 70.0, "alanine": 90.0, "arginine": 80.0, "asparagine": 60.0, "aspartic_acid": 70.0,
+            "cysteine": 30.0, "glutamine": 100.0, "glutamic_acid": 120.0, "isoleucine": 60.0,
+            "leucine": 80.0, "lysine": 70.0, "methionine": 25.0, "phenylalanine": 50.0, "histidine": 30.0
+        }
+    },
+    "detected_foods": ["Sample Food Item"]
+}
+
+
+def sample_analysis(image_data=None):
+    """The fixed response of the demo servers"""
+    return copy.deepcopy(SAMPLE_ANALYSIS)
+
+
+def is_food_related(label):
+    """Check if a label is food-related"""
+    label_lower = label.lower()
+    return any(keyword in label_lower for keyword in FOOD_KEYWORDS)
+
+
+def _seeded_random(data):
+    """Random generator seeded from image bytes or text, so estimates are repeatable"""
+    image_hash = hashlib.md5(data).hexdigest()
+    return random.Random(int(image_hash[:8], 16) % 1000000)
+
+
+def match_vision_labels(food_labels, food_ranges):
+    """Foods (VISION_FOOD_RANGES keys or general categories) matching Vision labels, in label order"""
+    detected_foods = []
+    for label in food_labels:
+        label_matched = False
+        for food in food_ranges:
+            # Flexible matching - check if food name is in label or label is in food name
+            if (food in label or
+                    label in food or
+                    any(word in label for word in food.split()) or
+                    any(word in food for word in label.split())):
+                if food not in detected_foods:  # Avoid duplicates
+                    detected_foods.append(food)
+                    label_matched = True
+                    break
+
+        # If no specific match, check for general categories
+        if not label_matched:
+            for category, (keywords, _) in CATEGORY_RANGES.items():
+                if any(word in label for word in keywords):
+                    if category not in detected_foods:
+                        detected_foods.append(category)
+                    break
+    return detected_foods
+
+
+def first_food_label(candidates, food_ranges):
+    """The first label naming a specific food, else the first naming a general category, else None"""
+    for label in candidates:
+        if any(food in food_ranges for food in match_vision_labels([label], food_ranges)):
+            return label
+    for label in candidates:
+        if match_vision_labels([label], food_ranges):
+            return label
+    return None
+
+
+def food_portions(label_portions, food_ranges):
+    """{food: servings} from {label: servings}, adding up labels that match the same food"""
+    portions = {}
+    for label, servings in label_portions.items():
+        foods = match_vision_labels([label], food_ranges)
+        if foods:
+            portions[foods[0]] = portions.get(foods[0], 0.0) + servings
+    return portions
+
+
+def estimate_nutrition(detected_foods, image_bytes, food_ranges, analysis_method, portions=None):
+    """Nutrition for matched foods with portion sizes estimated from the image
+
+    portions ({food: servings}, e.g. from object bounding boxes) replaces
+    the guessed portion of the foods it covers.
+    """
+    rng = _seeded_random(image_bytes)
+    portions = portions or {}
+    total_calories = total_protein = total_carbs = total_fat = 0
+
+    for food in detected_foods:
+        if food in food_ranges:
+            # Calculate portion size based on image characteristics
+            portion_multiplier = rng.uniform(0.8, 1.5)
+            portion_multiplier = portions.get(food, portion_multiplier)
+            nutrition = food_ranges[food]
+            total_calories += nutrition['calories'][1] * portion_multiplier
+            total_protein += nutrition['protein'][1] * portion_multiplier
+            total_carbs += nutrition['carbs'][1] * portion_multiplier
+            total_fat += nutrition['fat'][1] * portion_multiplier
+        elif food in CATEGORY_RANGES:
+            ranges = CATEGORY_RANGES[food][1]
+            total_calories += rng.uniform(*ranges["calories"])
+            total_protein += rng.uniform(*ranges["protein"])
+            total_carbs += rng.uniform(*ranges["carbs"])
+            total_fat += rng.uniform(*ranges["fat"])
+
+    # If no specific foods detected, use general estimation
+    if not detected_foods:
+        detected_foods = ['mixed meal']
+        total_calories = rng.randint(300, 600)
+        total_protein = rng.uniform(20, 40)
+        total_carbs = rng.uniform(30, 60)
+        total_fat = rng.uniform(10, 25)
+
+    # Generate micronutrients based on detected foods
+    base_multiplier = total_calories / 400
+
+    return {
+        "nutrition": {
+            "calories": round(total_calories),
+            "protein": round(total_protein, 1),
+            "carbs": round(total_carbs, 1),
+            "fat": round(total_fat, 1),
+            "fiber": round(rng.uniform(3, 8) * base_multiplier, 1),
+            "sugar": round(rng.uniform(5, 15) * base_multiplier, 1),
+            "sodium": round(rng.uniform(200, 800) * base_multiplier),
+            "micronutrients": {
+                name: round(rng.uniform(low, high) * base_multiplier, digits)
+                for name, low, high, digits in MICRONUTRIENT_RANGES
+            }
+        },
+        "detected_foods": detected_foods,
+        "confidence": 0.85 if detected_foods != ['mixed meal'] else 0.6,
+        "analysis_method": analysis_method
+    }
+
+
+FALLBACK_METHOD = "All Ten AI - Fallback Analysis"
+
+
+def fallback_nutrition(image_data):
+    """Estimate for when no recognizer is available"""
+    log_event('fallback_analysis', 'warning')
+    if image_data:
+        rng = _seeded_random(image_data.encode() if isinstance(image_data, str) else str(image_data).encode())
+    else:
+        rng = random.Random(int(time.time() * 1000) % 1000000)
+
+    meal = rng.choice(FALLBACK_MEALS)
+    return {
+        "nutrition": {
+            "calories": rng.randint(meal["calories"][0], meal["calories"][1]),
+            "protein": round(rng.uniform(meal["protein"][0], meal["protein"][1]), 1),
+            "carbs": round(rng.uniform(meal["carbs"][0], meal["carbs"][1]), 1),
+            "fat": round(rng.uniform(meal["fat"][0], meal["fat"][1]), 1),
+            "fiber": round(rng.uniform(3, 8), 1),
+            "sugar": round(rng.uniform(5, 15), 1),
+            "sodium": rng.randint(200, 800),
+            "micronutrients": {
+                name: round(rng.uniform(low, high), digits)
+                for name, low, high, digits in MICRONUTRIENT_RANGES
+            }
+        },
+        "detected_foods": [meal["name"]],
+        "confidence": 0.6,
+        "analysis_method": FALLBACK_METHOD
+    }
+
+
+def database_totals(foods, food_database):
+    """Summed FOOD_DATABASE nutrition for recognized foods (unknown names are skipped)"""
+    totals = [0.0] * len(flatten_nutrition({}))
+    for food in foods:
+        if food in food_database:
+            totals = [total + value for total, value in zip(totals, flatten_nutrition(food_database[food]))]
+    return {
+        "success": True,
+        "detected_foods": list(foods),
+        "nutrition": unflatten_nutrition(totals)
+    }
@@ -0,0 +1,182 @@
+"""
+The food photo analysis pipeline: decode -> recognize -> match -> compute
+
+Each app plugs in its own stages: shortcuts that can answer outright (a
+barcode in the photo), recognizers (local model, Vision, a colour
+heuristic) tried in order until one returns labels, a matcher from labels
+to foods and a calculator from foods to the nutrition response. Encoding
+is left to the router, so the same pipeline runs behind Flask, http.server
+and asyncio. Time spent in each stage is kept for /metrics and benchmarks.
+"""
+
+import base64
+import binascii
+import threading
+import time
+
+from allten.request_log import log_event
+
+STAGES = ('decode', 'recognize', 'match', 'compute')
+
+
+class AnalysisError(Exception):
+    """Request that cannot be analysed; status is the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def decode_image(image_data):
+    """Image bytes from base64 or a data: URL; raises AnalysisError if missing or malformed"""
+    if not image_data or not isinstance(image_data, str):
+        raise AnalysisError(400, "No image data provided")
+    # Remove data URL prefix if present
+    if image_data.startswith('data:image'):
+        image_data = image_data.split(',', 1)[-1]
+    try:
+        return base64.b64decode(image_data)
+    except (binascii.Error, ValueError):
+        raise AnalysisError(400, "Image data is not valid base64")
+
+
+def split_portions(labels):
+    """(label strings, {label: summed servings}) for labels that may include (label, servings) pairs"""
+    names, portions = [], {}
+    for label in labels:
+        if isinstance(label, (list, tuple)):
+            label, servings = label
+            portions[label] = portions.get(label, 0.0) + servings
+        names.append(label)
+    return names, portions
+
+
+class AnalysisPipeline:
+    """Turn an /analyze_food payload into a nutrition result"""
+
+    def __init__(self, recognizers, match, compute, fallback=None, on_result=None, shortcuts=None):
+        # recognizers: [(recognize(image_bytes) -> labels or None, analysis_method)]
+        # match(labels) -> foods; compute(foods, image_bytes, analysis_method) -> result
+        # A recognizer may give (label, servings) pairs for items it measured;
+        # compute is then called with portions={label: summed servings} as well
+        # fallback(image_data) -> result when nothing is recognized or a stage fails;
+        # without one, missing images raise AnalysisError and stage errors propagate
+        # on_result(image_bytes, result) is told about every recognized (not fallback) result
+        # shortcuts: [lookup(image_bytes) -> result or None] tried before the recognizers;
+        # their results are final and skip matching, compute and on_result
+        self.recognizers = list(recognizers)
+        self.shortcuts = list(shortcuts or [])
+        self.match = match
+        self.compute = compute
+        self.fallback = fallback
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._stats = {"analyses": 0, "fallbacks": 0, "shortcuts": 0, "stage_ms": dict.fromkeys(STAGES, 0.0)}
+
+    def analyze(self, payload):
+        for stage, result in self.stages(payload):
+            pass
+        return result
+
+    def stages(self, payload):
+        """Run the pipeline, yielding (stage, data) as each step finishes
+
+        ('labels', {"labels", "analysis_method"}) and ('detected_foods',
+        {"detected_foods"}) come first when a recognizer answers; the last
+        item is always ('result', result). A fallback skips straight to it.
+        """
+        image_data = payload.get('image') if isinstance(payload, dict) else None
+        timings = {}
+        try:
+            start = time.perf_counter()
+            image_bytes = decode_image(image_data)
+            timings['decode'] = time.perf_counter() - start
+        except AnalysisError:
+            if self.fallback is None:
+                raise
+            yield 'result', self._fall_back(image_data, timings)
+            return
+
+        try:
+            start = time.perf_counter()
+            result = self.shortcut(image_bytes)
+            if result is not None:
+                timings['recognize'] = time.perf_counter() - start
+                self._record(timings, shortcut=True)
+                yield 'result', result
+                return
+            labels, method = self.recognize(image_bytes)
+            timings['recognize'] = time.perf_counter() - start
+            if labels is None:
+                yield 'result', self._fall_back(image_data, timings)
+                return
+            labels, portions = split_portions(labels)
+            yield 'labels', {"labels": labels, "analysis_method": method, **({"portions": portions} if portions else {})}
+
+            start = time.perf_counter()
+            foods = self.match(labels)
+            timings['match'] = time.perf_counter() - start
+            yield 'detected_foods', {"detected_foods": foods}
+
+            start = time.perf_counter()
+            if portions:
+                result = self.compute(foods, image_bytes, method, portions=portions)
+            else:
+                result = self.compute(foods, image_bytes, method)
+            timings['compute'] = time.perf_counter() - start
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            log_event('analysis_error', 'error', error=str(e))
+            yield 'result', self._fall_back(image_data, timings)
+            return
+
+        self._record(timings)
+        if self.on_result is not None:
+            self.on_result(image_bytes, result)
+        yield 'result', result
+
+    def shortcut(self, image_bytes):
+        """Result of the first shortcut with an answer, or None"""
+        for lookup in self.shortcuts:
+            result = lookup(image_bytes)
+            if result is not None:
+                return result
+        return None
+
+    def recognize(self, image_bytes):
+        """(labels, analysis method) from the first recognizer with an answer, or (None, None)"""
+        for recognizer, method in self.recognizers:
+            labels = recognizer(image_bytes)
+            if labels:
+                return labels, method
+        return None, None
+
+    def _fall_back(self, image_data, timings):
+        start = time.perf_counter()
+        result = self.fallback(image_data)
+        timings['compute'] = timings.get('compute', 0.0) + time.perf_counter() - start
+        self._record(timings, fallback=True)
+        return result
+
+    def _record(self, timings, fallback=False, shortcut=False):
+        with self._lock:
+            self._stats["analyses"] += 1
+            self._stats["fallbacks"] += fallback
+            self._stats["shortcuts"] += shortcut
+            for stage, seconds in timings.items():
+                self._stats["stage_ms"][stage] += seconds * 1000
+
+    def stats(self):
+        with self._lock:
+            count = self._stats["analyses"]
+            return {
+                "analyses": count,
+                "fallbacks": self._stats["fallbacks"],
+                "shortcuts": self._stats["shortcuts"],
+                "mean_stage_ms": {
+                    stage: round(total / count, 3) if count else 0.0
+                    for stage, total in self._stats["stage_ms"].items()
+                },
+            }
@@ -0,0 +1,254 @@
+"""
+Transport-independent requests, responses and routing
+
+Handlers take a Request and return a Response, a JSON payload or a
+(payload, status) pair, the same way Flask views do. Router.dispatch turns
+that into a Response with the JSON body encoded and the CORS headers every
+app sends, and maps rejected bodies (IngestError), unusable images
+(AnalysisError) and unexpected exceptions to JSON errors. The adapters in
+allten.adapters only translate between a server's request objects and these.
+"""
+
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+
+from allten.core.encoding import dumps
+from allten.core.pipeline import AnalysisError
+from allten.ingest import IngestError, read_body
+
+_PARAM = re.compile(r'\{(\w+)(?::(int))?\}')
+
+# Lanes: FAST for health checks, metrics, preflights and static GETs, which
+# transports serve on reserved workers so they never queue behind analyses
+FAST_LANE = 'fast'
+DEFAULT_LANE = 'default'
+
+
+class Request:
+    """One HTTP request: method, path, query, headers and a readable body stream"""
+
+    def __init__(self, method, path, query_string='', headers=None, rfile=None, client=None):
+        self.method = method.upper()
+        self.path = path
+        self.query_string = query_string
+        self.query = parse_qs(query_string)
+        self.headers = headers if headers is not None else {}
+        self.rfile = rfile
+        self.client = client
+        self.params = {}
+
+    def arg(self, name, default=None):
+        """First value of a query parameter"""
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    def body(self, **limits):
+        """The request body as bytes; raises IngestError (413 or 400) if it is rejected"""
+        return read_body(self.headers, self.rfile, **limits)
+
+    def json(self, **limits):
+        """Parsed JSON object body, or None if it is empty or invalid; raises IngestError if it is rejected"""
+        raw = self.body(**limits)
+        if not raw:
+            return None
+        try:
+            data = json.loads(raw.decode('utf-8'))
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+class Response:
+    """Status, headers and an encoded body"""
+
+    stream = None
+
+    def __init__(self, status=200, body=b'', headers=None, content_type='application/json'):
+        self.status = status
+        self.body = body
+        self.headers = [('Content-Type', content_type)] if content_type else []
+        if headers:
+            self.headers.extend(headers)
+        self._on_close = []
+
+    def call_on_close(self, callback):
+        """Run callback once the response has been sent (or abandoned)"""
+        self._on_close.append(callback)
+        return callback
+
+    def close(self):
+        """Called by the transport after the last byte, even if the client went away"""
+        callbacks, self._on_close = self._on_close, []
+        close_stream = getattr(self.stream, 'close', None)
+        if close_stream:
+            close_stream()
+        for callback in callbacks:
+            callback()
+
+
+class StreamingResponse(Response):
+    """Response whose body is an iterable of byte chunks, sent as each one is produced
+
+    Transports send it with chunked transfer encoding (HTTP/1.1) and flush
+    every chunk; the chunks are produced on the request's worker thread.
+    """
+
+    def __init__(self, stream, status=200, headers=None, content_type='application/octet-stream'):
+        super().__init__(status, b'', headers, content_type)
+        self.stream = stream
+
+
+def json_response(payload, status=200, indent=None, headers=None):
+    """Encode a payload as a JSON response (see allten.core.encoding for the encoder)"""
+    return Response(status, dumps(payload, indent=indent), headers)
+
+
+class Router:
+    """Route table shared by every transport"""
+
+    def __init__(self, cors_headers='Content-Type', not_found=None, access_log=None):
+        # access_log: a RequestLogger (allten.request_log) told about every dispatched request
+        self.cors_headers = cors_headers
+        self.not_found = not_found or (lambda request: {"error": "Not found"})
+        self.access_log = access_log
+        self.exact = {}
+        self.patterns = []
+        self._lane_lock = threading.Lock()
+        self._lanes = {}
+
+    def route(self, path, methods=('GET',), lane=DEFAULT_LANE):
+        """Decorator registering a handler for a path such as /meals or /meals/{meal_id:int}"""
+        def register(handler):
+            methods_by_path = self._methods_for(path)
+            for method in methods:
+                methods_by_path[method.upper()] = (handler, lane, path)
+            return handler
+        return register
+
+    def _methods_for(self, path):
+        if '{' not in path:
+            return self.exact.setdefault(path, {})
+        pattern, converters = self._compile(path)
+        for existing, _, handlers in self.patterns:
+            if existing.pattern == pattern.pattern:
+                return handlers
+        handlers = {}
+        self.patterns.append((pattern, converters, handlers))
+        return handlers
+
+    @staticmethod
+    def _compile(path):
+        converters = {}
+        regex = ''
+        position = 0
+        for match in _PARAM.finditer(path):
+            regex += re.escape(path[position:match.start()])
+            name, kind = match.groups()
+            regex += r'(?P<%s>\d+)' % name if kind == 'int' else r'(?P<%s>[^/]+)' % name
+            if kind == 'int':
+                converters[name] = int
+            position = match.end()
+        regex += re.escape(path[position:])
+        return re.compile('^' + regex + '$'), converters
+
+    def match(self, path):
+        """(handlers by method, path params) for a path, or (None, {})"""
+        handlers = self.exact.get(path)
+        if handlers is not None:
+            return handlers, {}
+        for pattern, converters, handlers in self.patterns:
+            found = pattern.match(path)
+            if found:
+                params = {name: converters.get(name, str)(value) for name, value in found.groupdict().items()}
+                return handlers, params
+        return None, {}
+
+    def allowed_methods(self):
+        methods = {method for handlers in self.exact.values() for method in handlers}
+        methods.update(method for _, _, handlers in self.patterns for method in handlers)
+        order = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE']
+        return ', '.join([method for method in order if method in methods] + ['OPTIONS'])
+
+    def lane(self, request):
+        """Lane a request is served on; preflights and unknown paths are answered on the fast lane"""
+        if request.method == 'OPTIONS':
+            return FAST_LANE
+        handlers, _ = self.match(request.path)
+        route = handlers.get(request.method) if handlers else None
+        return route[1] if route else FAST_LANE
+
+    def cors(self, response, preflight=False):
+        response.headers.append(('Access-Control-Allow-Origin', '*'))
+        if preflight:
+            response.headers.append(('Access-Control-Allow-Methods', self.allowed_methods()))
+            response.headers.append(('Access-Control-Allow-Headers', self.cors_headers))
+        return response
+
+    def dispatch(self, request):
+        """Run the matching handler and always return a Response"""
+        start = time.perf_counter()
+        response, route, lane, error = self._dispatch(request)
+        if self.access_log is not None:
+            self.access_log.request(request, response.status, time.perf_counter() - start, route, lane, error)
+        return response
+
+    def _dispatch(self, request):
+        """(response, route template, lane, error message)"""
+        if request.method == 'OPTIONS':
+            return self.cors(Response(200, content_type=None), preflight=True), None, FAST_LANE, None
+
+        handlers, params = self.match(request.path)
+        route = handlers.get(request.method) if handlers else None
+        if route is None:
+            if handlers:
+                allow = ', '.join(sorted(handlers)) + ', OPTIONS'
+                response = json_response({"error": "Method not allowed"}, 405, headers=[('Allow', allow)])
+            else:
+                response = json_response(self.not_found(request), 404)
+            return self.cors(response), None, FAST_LANE, None
+
+        handler, lane, path = route
+        request.params = params
+        start = time.perf_counter()
+        try:
+            result = handler(request)
+        except (IngestError, AnalysisError) as e:
+            return self.cors(json_response({"error": e.message}, e.status)), path, lane, None
+        except Exception as e:
+            if self.access_log is None:
+                print(f"❌ Error in {request.method} {request.path}: {e}")
+            return self.cors(json_response({"error": str(e)}, 500)), path, lane, str(e)
+        finally:
+            self._record_lane(lane, time.perf_counter() - start)
+        return self.cors(self._to_response(result)), path, lane, None
+
+    def _record_lane(self, lane, seconds):
+        with self._lane_lock:
+            stats = self._lanes.setdefault(lane, {"requests": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["requests"] += 1
+            stats["total_ms"] += seconds * 1000
+            stats["max_ms"] = max(stats["max_ms"], round(seconds * 1000, 2))
+
+    def lane_stats(self):
+        """Requests and handler time per lane"""
+        with self._lane_lock:
+            return {
+                lane: {
+                    "requests": stats["requests"],
+                    "mean_ms": round(stats["total_ms"] / stats["requests"], 3),
+                    "max_ms": stats["max_ms"],
+                }
+                for lane, stats in self._lanes.items()
+            }
+
+    @staticmethod
+    def _to_response(result):
+        if isinstance(result, Response):
+            return result
+        if isinstance(result, tuple):
+            payload, status = result
+            return json_response(payload, status)
+        return json_response(result)
@@ -0,0 +1,87 @@
+"""
+Progressive analysis results as Server-Sent Events or NDJSON
+
+The pipeline's stages become client events in the order they finish:
+labels (straight from the recognizer), detected_foods, macros, then the
+micronutrient block, then done. A UI can show what was recognized while
+the nutrition is still being worked out. Every event carries elapsed_ms
+since the request started. Errors after the stream has begun arrive as an
+error event, since the status line has already been sent.
+"""
+
+import time
+
+from allten.core.encoding import dumps
+from allten.core.pipeline import AnalysisError
+from allten.core.routing import StreamingResponse
+from allten.request_log import log_event
+
+FORMATS = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def analysis_events(stages):
+    """(event, data) pairs for the (stage, data) pairs of AnalysisPipeline.stages"""
+    start = time.perf_counter()
+
+    def elapsed():
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    sent_foods = False
+    try:
+        for stage, data in stages:
+            if stage != 'result':
+                sent_foods |= stage == 'detected_foods'
+                yield stage, {**data, "elapsed_ms": elapsed()}
+                continue
+            nutrition = dict(data.get('nutrition') or {})
+            micronutrients = nutrition.pop('micronutrients', {})
+            if not sent_foods:
+                # Fallbacks and shortcuts (barcodes) report their foods with the result
+                yield 'detected_foods', {"detected_foods": data.get('detected_foods', []), "elapsed_ms": elapsed()}
+            yield 'macros', {
+                "nutrition": nutrition,
+                "confidence": data.get('confidence'),
+                "analysis_method": data.get('analysis_method'),
+                "elapsed_ms": elapsed()
+            }
+            yield 'micronutrients', {"micronutrients": micronutrients, "elapsed_ms": elapsed()}
+    except AnalysisError as e:
+        yield 'error', {"error": e.message, "status": e.status, "elapsed_ms": elapsed()}
+        return
+    except Exception as e:
+        log_event('stream_error', 'error', error=str(e))
+        yield 'error', {"error": str(e), "status": 500, "elapsed_ms": elapsed()}
+        return
+    yield 'done', {"elapsed_ms": elapsed()}
+
+
+def encode_event(event, data, fmt):
+    if fmt == 'sse':
+        return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+    return dumps({"event": event, **data}) + b"\n"
+
+
+def stream_format(request, default='sse'):
+    """'sse' or 'ndjson' from ?format= or the Accept header"""
+    fmt = request.arg('format')
+    if fmt in FORMATS:
+        return fmt
+    accept = request.headers.get('Accept', '') or ''
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if 'text/event-stream' in accept:
+        return 'sse'
+    return default
+
+
+def event_stream(events, fmt='sse'):
+    """StreamingResponse sending each (event, data) pair as soon as it is produced"""
+    return StreamingResponse(
+        (encode_event(event, data, fmt) for event, data in events),
+        content_type=FORMATS[fmt],
+        # Keep reverse proxies (nginx, Render's edge) from buffering the stream
+        headers=[('Cache-Control', 'no-cache'), ('X-Accel-Buffering', 'no')]
+    )
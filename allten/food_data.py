@@ -0,0 +1,466 @@
+"""
+Built-in food tables
+
+FOOD_DATABASE holds full per-serving nutrition for the foods the local
+recognizer knows. VISION_FOOD_RANGES holds per-serving macro ranges keyed by
+the words Google Vision uses in its labels. FOOD_ALIASES lists other names
+people (and Vision) use for entries of either table. SERVING_GRAMS gives
+the weight of one serving so per-serving values can be scaled by grams.
+"""
+
+# Per-serving nutrition, keys are the local recognizer's classes
+FOOD_DATABASE = {
+    "apple": {
+        "calories": 95,
+        "protein": 0.5,
+        "carbs": 25,
+        "fat": 0.3,
+        "fiber": 4.4,
+        "sugar": 19,
+        "sodium": 2,
+        "micronutrients": {
+            "vitamin_c": 8.4,
+            "iron": 0.2,
+            "calcium": 11,
+            "potassium": 195,
+            "vitamin_a": 98,
+            "vitamin_e": 0.3,
+            "vitamin_k": 2.2,
+            "folate": 3,
+            "niacin": 0.1,
+            "riboflavin": 0.1,
+            "thiamin": 0.1,
+            "vitamin_b6": 0.1,
+            "phosphorus": 20,
+            "selenium": 0,
+            "copper": 0.1,
+            "manganese": 0.1,
+            "chromium": 0,
+            "molybdenum": 0,
+            "iodine": 0,
+            "chloride": 0,
+            "biotin": 0,
+            "pantothenic_acid": 0.1,
+            "choline": 6,
+            "betaine": 0,
+            "taurine": 0,
+            "creatine": 0,
+            "carnitine": 0,
+            "inositol": 0,
+            "paba": 0,
+            "lipoic_acid": 0,
+            "coq10": 0,
+            "glutathione": 0,
+            "melatonin": 0,
+            "serotonin": 0,
+            "dopamine": 0,
+            "norepinephrine": 0,
+            "epinephrine": 0,
+            "histamine": 0,
+            "gaba": 0,
+            "glycine": 0,
+            "proline": 0,
+            "serine": 0,
+            "threonine": 0,
+            "tryptophan": 0,
+            "tyrosine": 0,
+            "valine": 0,
+            "alanine": 0,
+            "arginine": 0,
+            "asparagine": 0,
+            "aspartic_acid": 0,
+            "cysteine": 0,
+            "glutamine": 0,
+            "glutamic_acid": 0,
+            "isoleucine": 0,
+            "leucine": 0,
+            "lysine": 0,
+            "methionine": 0,
+            "phenylalanine": 0,
+            "histidine": 0,
+        }
+    },
+    "banana": {
+        "calories": 105,
+        "protein": 1.3,
+        "carbs": 27,
+        "fat": 0.4,
+        "fiber": 3.1,
+        "sugar": 14,
+        "sodium": 1,
+        "micronutrients": {
+            "vitamin_c": 10.3,
+            "iron": 0.3,
+            "calcium": 6,
+            "potassium": 422,
+            "vitamin_a": 76,
+            "vitamin_e": 0.1,
+            "vitamin_k": 0.6,
+            "folate": 24,
+            "niacin": 0.8,
+            "riboflavin": 0.1,
+            "thiamin": 0.1,
+            "vitamin_b6": 0.4,
+            "phosphorus": 26,
+            "selenium": 1,
+            "copper": 0.1,
+            "manganese": 0.3,
+            "chromium": 0,
+            "molybdenum": 0,
+            "iodine": 0,
+            "chloride": 0,
+            "biotin": 0,
+            "pantothenic_acid": 0.4,
+            "choline": 12,
+            "betaine": 0,
+            "taurine": 0,
+            "creatine": 0,
+            "carnitine": 0,
+            "inositol": 0,
+            "paba": 0,
+            "lipoic_acid": 0,
+            "coq10": 0,
+            "glutathione": 0,
+            "melatonin": 0,
+            "serotonin": 0,
+            "dopamine": 0,
+            "norepinephrine": 0,
+            "epinephrine": 0,
+            "histamine": 0,
+            "gaba": 0,
+            "glycine": 0,
+            "proline": 0,
+            "serine": 0,
+            "threonine": 0,
+            "tryptophan": 0,
+            "tyrosine": 0,
+            "valine": 0,
+            "alanine": 0,
+            "arginine": 0,
+            "asparagine": 0,
+            "aspartic_acid": 0,
+            "cysteine": 0,
+            "glutamine": 0,
+            "glutamic_acid": 0,
+            "isoleucine": 0,
+            "leucine": 0,
+            "lysine": 0,
+            "methionine": 0,
+            "phenylalanine": 0,
+            "histidine": 0,
+        }
+    },
+    "chicken_breast": {
+        "calories": 165,
+        "protein": 31,
+        "carbs": 0,
+        "fat": 3.6,
+        "fiber": 0,
+        "sugar": 0,
+        "sodium": 74,
+        "micronutrients": {
+            "vitamin_c": 0,
+            "iron": 1.0,
+            "calcium": 15,
+            "potassium": 256,
+            "vitamin_a": 6,
+            "vitamin_e": 0.2,
+            "vitamin_k": 0,
+            "folate": 4,
+            "niacin": 13.7,
+            "riboflavin": 0.1,
+            "thiamin": 0.1,
+            "vitamin_b6": 0.6,
+            "phosphorus": 228,
+            "selenium": 22,
+            "copper": 0.1,
+            "manganese": 0,
+            "chromium": 0,
+            "molybdenum": 0,
+            "iodine": 7,
+            "chloride": 0,
+            "biotin": 0,
+            "pantothenic_acid": 0.9,
+            "choline": 73,
+            "betaine": 0,
+            "taurine": 0,
+            "creatine": 0,
+            "carnitine": 0,
+            "inositol": 0,
+            "paba": 0,
+            "lipoic_acid": 0,
+            "coq10": 0,
+            "glutathione": 0,
+            "melatonin": 0,
+            "serotonin": 0,
+            "dopamine": 0,
+            "norepinephrine": 0,
+            "epinephrine": 0,
+            "histamine": 0,
+            "gaba": 0,
+            "glycine": 0,
+            "proline": 0,
+            "serine": 0,
+            "threonine": 0,
+            "tryptophan": 0,
+            "tyrosine": 0,
+            "valine": 0,
+            "alanine": 0,
+            "arginine": 0,
+            "asparagine": 0,
+            "aspartic_acid": 0,
+            "cysteine": 0,
+            "glutamine": 0,
+            "glutamic_acid": 0,
+            "isoleucine": 0,
+            "leucine": 0,
+            "lysine": 0,
+            "methionine": 0,
+            "phenylalanine": 0,
+            "histidine": 0,
+        }
+    },
+    "rice": {
+        "calories": 130,
+        "protein": 2.7,
+        "carbs": 28,
+        "fat": 0.3,
+        "fiber": 0.4,
+        "sugar": 0.1,
+        "sodium": 0,
+        "micronutrients": {
+            "vitamin_c": 0,
+            "iron": 0.2,
+            "calcium": 10,
+            "potassium": 35,
+            "vitamin_a": 0,
+            "vitamin_e": 0.1,
+            "vitamin_k": 0,
+            "folate": 8,
+            "niacin": 1.6,
+            "riboflavin": 0.1,
+            "thiamin": 0.1,
+            "vitamin_b6": 0.1,
+            "phosphorus": 43,
+            "selenium": 15,
+            "copper": 0.1,
+            "manganese": 0.5,
+            "chromium": 0,
+            "molybdenum": 0,
+            "iodine": 0,
+            "chloride": 0,
+            "biotin": 0,
+            "pantothenic_acid": 0.4,
+            "choline": 9,
+            "betaine": 0,
+            "taurine": 0,
+            "creatine": 0,
+            "carnitine": 0,
+            "inositol": 0,
+            "paba": 0,
+            "lipoic_acid": 0,
+            "coq10": 0,
+            "glutathione": 0,
+            "melatonin": 0,
+            "serotonin": 0,
+            "dopamine": 0,
+            "norepinephrine": 0,
+            "epinephrine": 0,
+            "histamine": 0,
+            "gaba": 0,
+            "glycine": 0,
+            "proline": 0,
+            "serine": 0,
+            "threonine": 0,
+            "tryptophan": 0,
+            "tyrosine": 0,
+            "valine": 0,
+            "alanine": 0,
+            "arginine": 0,
+            "asparagine": 0,
+            "aspartic_acid": 0,
+            "cysteine": 0,
+            "glutamine": 0,
+            "glutamic_acid": 0,
+            "isoleucine": 0,
+            "leucine": 0,
+            "lysine": 0,
+            "methionine": 0,
+            "phenylalanine": 0,
+            "histidine": 0,
+        }
+    },
+    "broccoli": {
+        "calories": 55,
+        "protein": 3.7,
+        "carbs": 11,
+        "fat": 0.6,
+        "fiber": 5.2,
+        "sugar": 1.5,
+        "sodium": 33,
+        "micronutrients": {
+            "vitamin_c": 89.2,
+            "iron": 0.7,
+            "calcium": 47,
+            "potassium": 316,
+            "vitamin_a": 623,
+            "vitamin_e": 0.8,
+            "vitamin_k": 101.6,
+            "folate": 63,
+            "niacin": 0.6,
+            "riboflavin": 0.1,
+            "thiamin": 0.1,
+            "vitamin_b6": 0.2,
+            "phosphorus": 66,
+            "selenium": 2.5,
+            "copper": 0.1,
+            "manganese": 0.2,
+            "chromium": 0,
+            "molybdenum": 0,
+            "iodine": 0,
+            "chloride": 0,
+            "biotin": 0,
+            "pantothenic_acid": 0.6,
+            "choline": 18,
+            "betaine": 0,
+            "taurine": 0,
+            "creatine": 0,
+            "carnitine": 0,
+            "inositol": 0,
+            "paba": 0,
+            "lipoic_acid": 0,
+            "coq10": 0,
+            "glutathione": 0,
+            "melatonin": 0,
+            "serotonin": 0,
+            "dopamine": 0,
+            "norepinephrine": 0,
+            "epinephrine": 0,
+            "histamine": 0,
+            "gaba": 0,
+            "glycine": 0,
+            "proline": 0,
+            "serine": 0,
+            "threonine": 0,
+            "tryptophan": 0,
+            "tyrosine": 0,
+            "valine": 0,
+            "alanine": 0,
+            "arginine": 0,
+            "asparagine": 0,
+            "aspartic_acid": 0,
+            "cysteine": 0,
+            "glutamine": 0,
+            "glutamic_acid": 0,
+            "isoleucine": 0,
+            "leucine": 0,
+            "lysine": 0,
+            "methionine": 0,
+            "phenylalanine": 0,
+            "histidine": 0,
+        }
+    }
+}
+
+# Per-serving (min, max) macro ranges matched against Vision labels
+VISION_FOOD_RANGES = {
+    # Meats
+    'chicken': {'calories': (150, 250), 'protein': (25, 35), 'carbs': (0, 5), 'fat': (3, 8)},
+    'beef': {'calories': (200, 300), 'protein': (25, 35), 'carbs': (0, 2), 'fat': (10, 20)},
+    'steak': {'calories': (250, 350), 'protein': (30, 40), 'carbs': (0, 2), 'fat': (15, 25)},
+    'lamb': {'calories': (200, 300), 'protein': (25, 35), 'carbs': (0, 2), 'fat': (12, 22)},
+    'lambchop': {'calories': (220, 320), 'protein': (28, 38), 'carbs': (0, 2), 'fat': (14, 24)},
+    'pork': {'calories': (180, 280), 'protein': (22, 32), 'carbs': (0, 2), 'fat': (8, 18)},
+    'fish': {'calories': (120, 200), 'protein': (20, 30), 'carbs': (0, 2), 'fat': (3, 10)},
+    'salmon': {'calories': (150, 250), 'protein': (22, 32), 'carbs': (0, 2), 'fat': (8, 15)},
+    'tuna': {'calories': (120, 180), 'protein': (25, 35), 'carbs': (0, 2), 'fat': (1, 5)},
+    
+    # Grains and Starches
+    'rice': {'calories': (100, 150), 'protein': (2, 4), 'carbs': (20, 30), 'fat': (0, 1)},
+    'pasta': {'calories': (150, 200), 'protein': (5, 8), 'carbs': (30, 40), 'fat': (1, 2)},
+    'bread': {'calories': (80, 120), 'protein': (3, 5), 'carbs': (15, 25), 'fat': (1, 3)},
+    'potato': {'calories': (80, 120), 'protein': (2, 4), 'carbs': (18, 25), 'fat': (0, 1)},
+    'mashed': {'calories': (120, 180), 'protein': (3, 6), 'carbs': (25, 35), 'fat': (2, 8)},
+    'fries': {'calories': (200, 300), 'protein': (3, 6), 'carbs': (30, 45), 'fat': (8, 15)},
+    
+    # Vegetables
+    'vegetable': {'calories': (30, 80), 'protein': (2, 5), 'carbs': (5, 15), 'fat': (0, 2)},
+    'broccoli': {'calories': (25, 50), 'protein': (3, 6), 'carbs': (5, 10), 'fat': (0, 1)},
+    'carrot': {'calories': (25, 50), 'protein': (1, 2), 'carbs': (6, 12), 'fat': (0, 1)},
+    'spinach': {'calories': (15, 30), 'protein': (2, 4), 'carbs': (2, 6), 'fat': (0, 1)},
+    'lettuce': {'calories': (10, 25), 'protein': (1, 2), 'carbs': (2, 5), 'fat': (0, 1)},
+    'tomato': {'calories': (15, 30), 'protein': (1, 2), 'carbs': (3, 7), 'fat': (0, 1)},
+    'onion': {'calories': (20, 40), 'protein': (1, 2), 'carbs': (5, 10), 'fat': (0, 1)},
+    'pepper': {'calories': (20, 40), 'protein': (1, 2), 'carbs': (4, 8), 'fat': (0, 1)},
+    
+    # Fruits
+    'fruit': {'calories': (50, 100), 'protein': (0, 2), 'carbs': (10, 25), 'fat': (0, 1)},
+    'apple': {'calories': (60, 80), 'protein': (0, 1), 'carbs': (15, 20), 'fat': (0, 1)},
+    'banana': {'calories': (80, 120), 'protein': (1, 2), 'carbs': (20, 30), 'fat': (0, 1)},
+    'orange': {'calories': (50, 70), 'protein': (1, 2), 'carbs': (12, 18), 'fat': (0, 1)},
+    
+    # Dairy
+    'cheese': {'calories': (100, 150), 'protein': (6, 10), 'carbs': (1, 3), 'fat': (8, 15)},
+    'milk': {'calories': (80, 120), 'protein': (8, 10), 'carbs': (10, 15), 'fat': (3, 8)},
+    'yogurt': {'calories': (60, 120), 'protein': (6, 12), 'carbs': (8, 20), 'fat': (0, 8)},
+    'butter': {'calories': (200, 300), 'protein': (0, 1), 'carbs': (0, 1), 'fat': (20, 30)},
+    
+    # Other
+    'salad': {'calories': (50, 150), 'protein': (3, 8), 'carbs': (8, 15), 'fat': (0, 5)},
+    'soup': {'calories': (80, 200), 'protein': (5, 15), 'carbs': (10, 25), 'fat': (2, 8)},
+    'sandwich': {'calories': (200, 400), 'protein': (10, 20), 'carbs': (25, 45), 'fat': (5, 15)},
+    'pizza': {'calories': (250, 400), 'protein': (12, 20), 'carbs': (30, 50), 'fat': (8, 18)},
+    'burger': {'calories': (300, 500), 'protein': (15, 25), 'carbs': (30, 50), 'fat': (10, 25)},
+    'eggs': {'calories': (70, 90), 'protein': (6, 8), 'carbs': (0, 1), 'fat': (5, 7)},
+}
+
+# Alternative names for entries of the tables above
+FOOD_ALIASES = {
+    'apple': ['apples'],
+    'banana': ['bananas'],
+    'chicken_breast': ['grilled chicken', 'chicken fillet'],
+    'rice': ['white rice', 'steamed rice', 'boiled rice'],
+    'broccoli': ['broccoli florets'],
+    'chicken': ['poultry', 'roast chicken'],
+    'beef': ['ground beef', 'minced beef'],
+    'steak': ['beefsteak', 'sirloin', 'ribeye'],
+    'lambchop': ['lamb chop', 'lamb chops'],
+    'pork': ['pork chop', 'ham'],
+    'fish': ['white fish', 'cod'],
+    'salmon': ['salmon fillet'],
+    'tuna': ['tuna steak'],
+    'pasta': ['spaghetti', 'macaroni', 'noodles', 'lasagna'],
+    'bread': ['toast', 'baguette'],
+    'potato': ['potatoes', 'baked potato'],
+    'mashed': ['mashed potatoes', 'mash'],
+    'fries': ['french fries', 'chips'],
+    'vegetable': ['vegetables', 'veggies'],
+    'carrot': ['carrots'],
+    'lettuce': ['romaine'],
+    'tomato': ['tomatoes'],
+    'onion': ['onions'],
+    'pepper': ['bell pepper', 'capsicum'],
+    'fruit': ['fruits'],
+    'orange': ['oranges'],
+    'cheese': ['cheddar'],
+    'milk': ['whole milk'],
+    'yogurt': ['yoghurt'],
+    'salad': ['green salad'],
+    'soup': ['broth'],
+    'sandwich': ['sub', 'wrap'],
+    'pizza': ['pizza slice'],
+    'burger': ['hamburger', 'cheeseburger'],
+    'eggs': ['egg', 'boiled egg', 'scrambled eggs'],
+}
+
+# Grams in one serving of each entry above, used to turn per-serving values into per-gram densities
+SERVING_GRAMS = {
+    'apple': 182, 'banana': 118, 'chicken_breast': 100, 'rice': 100, 'broccoli': 156,
+    'chicken': 140, 'beef': 100, 'steak': 150, 'lamb': 100, 'lambchop': 120, 'pork': 100,
+    'fish': 120, 'salmon': 120, 'tuna': 100,
+    'pasta': 140, 'bread': 40, 'potato': 130, 'mashed': 150, 'fries': 100,
+    'vegetable': 100, 'carrot': 90, 'spinach': 100, 'lettuce': 100, 'tomato': 120, 'onion': 100, 'pepper': 120,
+    'fruit': 100, 'orange': 130,
+    'cheese': 30, 'milk': 244, 'yogurt': 170, 'butter': 35,
+    'salad': 150, 'soup': 245, 'sandwich': 150, 'pizza': 110, 'burger': 200, 'eggs': 50,
+}
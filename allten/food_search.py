@@ -0,0 +1,258 @@
+"""
+Food name search with prefix and typo-tolerant lookup
+
+Prefix matching uses a trie laid out as a sorted array of search terms:
+every trie node (a prefix) is a contiguous range of that array found by
+bisection, and nodes with many terms below them carry a precomputed top-k
+list so popular prefixes like "chi" never scan their subtree. Each word
+start of a name is indexed, so "breast" finds "chicken breast".
+
+When prefixes do not fill the result list, fuzzy candidates come from the
+names below the deepest trie node the query reaches and from the postings
+of the query's rarest trigrams, restricted to the name lengths that could
+still reach the similarity threshold. Candidates are then scored by
+trigram similarity.
+"""
+
+import bisect
+import heapq
+import re
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+# Prefix nodes with more terms than this get a materialized top-k list
+HEAVY_NODE_TERMS = 32
+MAX_CACHED_PREFIX = 12
+# Rarest query trigrams scanned for fuzzy candidates, and the candidate cap
+FUZZY_SEED_TRIGRAMS = 3
+MAX_FUZZY_CANDIDATES = 200
+
+
+def normalize(text):
+    return _NON_ALNUM.sub(' ', text.lower().replace('_', ' ')).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FoodSearchIndex:
+    """Ranked prefix and fuzzy search over food names and aliases"""
+
+    def __init__(self, foods, top_k=10):
+        """foods: iterable of (food_id, name, aliases, source)"""
+        self.top_k = top_k
+        self.foods = []  # food_id, display name, source
+        self.names = []  # normalized name per name id
+        self.name_food = []  # name id -> food index
+        self.exact = {}  # normalized name or alias -> food index, the first food listing it wins
+
+        for food_id, name, aliases, source in foods:
+            food_index = len(self.foods)
+            self.foods.append((food_id, name, source))
+            for text in [name, *aliases]:
+                normalized = normalize(text)
+                if normalized:
+                    self.names.append(normalized)
+                    self.name_food.append(food_index)
+                    self.exact.setdefault(normalized, food_index)
+
+        # Name rank: shorter (more generic) names first, ties alphabetical
+        order = sorted(range(len(self.names)), key=lambda i: (len(self.names[i]), self.names[i]))
+        self.name_rank = [0] * len(self.names)
+        for rank, name_id in enumerate(order):
+            self.name_rank[name_id] = rank
+
+        self._build_prefix_index()
+        self._build_trigram_index()
+
+    def _build_prefix_index(self):
+        terms = []
+        for name_id, name in enumerate(self.names):
+            terms.append((name, name_id))
+            for match in re.finditer(r' (?=\S)', name):
+                terms.append((name[match.end():], name_id))
+        terms.sort()
+        self.term_text = [term for term, _ in terms]
+        self.term_name = [name_id for _, name_id in terms]
+
+        # Top-k lists for heavy prefixes, filled in rank order so each list is already sorted
+        counts = {}
+        for term in self.term_text:
+            for length in range(1, min(len(term), MAX_CACHED_PREFIX) + 1):
+                prefix = term[:length]
+                counts[prefix] = counts.get(prefix, 0) + 1
+        heavy = {prefix for prefix, count in counts.items() if count > HEAVY_NODE_TERMS}
+
+        self.heavy_top = {}
+        by_rank = sorted(range(len(self.term_text)), key=lambda i: self.name_rank[self.term_name[i]])
+        for term_id in by_rank:
+            term = self.term_text[term_id]
+            name_id = self.term_name[term_id]
+            for length in range(1, min(len(term), MAX_CACHED_PREFIX) + 1):
+                prefix = term[:length]
+                if prefix not in heavy:
+                    break
+                top = self.heavy_top.setdefault(prefix, [])
+                if len(top) < self.top_k * 2 and name_id not in top:
+                    top.append(name_id)
+
+    def _build_trigram_index(self):
+        # Posting lists are ordered by name length so a query only scans the length window
+        # that could reach min_similarity (a Jaccard bound), then by rank
+        self.name_grams = [len(name) + 1 for name in self.names]  # trigram count of the padded name
+        postings = {}
+        for name_id in sorted(range(len(self.names)), key=lambda i: (self.name_grams[i], self.name_rank[i])):
+            for gram in trigrams(self.names[name_id]):
+                postings.setdefault(gram, []).append(name_id)
+        self.postings = postings
+
+        # Whole-word postings (ascending name ids) for multi-word queries
+        words = {}
+        for name_id, name in enumerate(self.names):
+            for word in set(name.split()):
+                words.setdefault(word, []).append(name_id)
+        self.word_postings = words
+
+    def _prefix_matches(self, query, limit):
+        """Name ids whose name (or a word in it) starts with query, best ranked first"""
+        if len(query) <= MAX_CACHED_PREFIX and query in self.heavy_top:
+            return self.heavy_top[query][:limit]
+
+        lo = bisect.bisect_left(self.term_text, query)
+        hi = bisect.bisect_left(self.term_text, query + '\uffff', lo)
+        if hi - lo > HEAVY_NODE_TERMS * 4:
+            # Long, very common prefix beyond the cached depth
+            candidates = set(self.term_name[lo:hi])
+            return heapq.nsmallest(limit, candidates, key=self.name_rank.__getitem__)
+        candidates = {self.term_name[i] for i in range(lo, hi)}
+        return sorted(candidates, key=self.name_rank.__getitem__)[:limit]
+
+    def _longest_prefix_names(self, query):
+        """(depth, names) of the deepest trie node on the query's path; names only if that node is small"""
+        lo, hi = 0, len(query)
+        while lo < hi:
+            length = (lo + hi + 1) // 2
+            start = bisect.bisect_left(self.term_text, query[:length])
+            if start < len(self.term_text) and self.term_text[start].startswith(query[:length]):
+                lo = length
+            else:
+                hi = length - 1
+        if lo < 3:
+            return lo, []
+        start = bisect.bisect_left(self.term_text, query[:lo])
+        end = bisect.bisect_left(self.term_text, query[:lo] + '\uffff', start)
+        if end - start > MAX_FUZZY_CANDIDATES:
+            return lo, []
+        return lo, self.term_name[start:end]
+
+    def _shared_word_names(self, query):
+        """Names containing every correctly spelled word of a multi-word query, if few enough"""
+        words = query.split()
+        lists = sorted((self.word_postings[word] for word in set(words) if word in self.word_postings), key=len)
+        if len(words) < 2 or not lists or len(lists[0]) > MAX_FUZZY_CANDIDATES * 4:
+            return []
+        common = lists[0]
+        for posting in lists[1:]:
+            if len(common) <= MAX_FUZZY_CANDIDATES // 4:
+                break
+            common = [name_id for name_id in common if _contains(posting, name_id)]
+        return common if len(common) <= MAX_FUZZY_CANDIDATES else []
+
+    def _fuzzy_matches(self, query, limit, min_similarity):
+        query_grams = trigrams(query)
+        query_size = len(query_grams)
+        min_size = query_size * min_similarity
+        max_size = query_size / min_similarity
+        size_of = self.name_grams.__getitem__
+
+        # Candidates, most precise source first: names sharing every correctly spelled
+        # word, names below the deepest trie node the query reaches (typos usually sit
+        # after a correct head), then the rarest trigram postings
+        candidates = set(self._shared_word_names(query))
+        if not candidates:
+            head, names = self._longest_prefix_names(query)
+            candidates.update(names[:MAX_FUZZY_CANDIDATES - len(candidates)])
+            if not names or head * 2 < len(query):
+                seeds = sorted((self.postings[gram] for gram in query_grams if gram in self.postings), key=len)
+                for posting in seeds[:FUZZY_SEED_TRIGRAMS]:
+                    if len(candidates) >= MAX_FUZZY_CANDIDATES:
+                        break
+                    lo = bisect.bisect_left(posting, min_size, key=size_of)
+                    hi = bisect.bisect_right(posting, max_size, lo, key=size_of)
+                    candidates.update(posting[lo:min(hi, lo + MAX_FUZZY_CANDIDATES - len(candidates))])
+
+        scored = []
+        for name_id in candidates:
+            # Every trigram of the padded name is a substring of it, so counting query
+            # trigrams found in the string gives the intersection without building a set
+            padded = f"  {self.names[name_id]} "
+            shared = sum(gram in padded for gram in query_grams)
+            similarity = shared / (query_size + self.name_grams[name_id] - shared)
+            if similarity >= min_similarity:
+                scored.append((-similarity, self.name_rank[name_id], name_id))
+        return [(name_id, -negative) for negative, _, name_id in heapq.nsmallest(limit * 2, scored)]
+
+    def lookup(self, name):
+        """(food_id, name, source) for an exact name or alias (already normalized), or None"""
+        food_index = self.exact.get(name)
+        return None if food_index is None else self.foods[food_index]
+
+    def search(self, query, limit=None, min_similarity=0.3):
+        """Top results as dicts with id, name, source, match ('exact', 'prefix' or 'fuzzy') and score"""
+        limit = min(limit or self.top_k, self.top_k)
+        query = normalize(query)
+        if not query:
+            return []
+
+        results = []
+        seen = set()
+
+        def add(name_id, match, score):
+            food_index = self.name_food[name_id]
+            if food_index in seen:
+                return
+            seen.add(food_index)
+            food_id, name, source = self.foods[food_index]
+            results.append({
+                "id": food_id,
+                "name": name,
+                "source": source,
+                "matched": self.names[name_id],
+                "match": match,
+                "score": round(score, 3),
+            })
+
+        for name_id in self._prefix_matches(query, limit * 2):
+            name = self.names[name_id]
+            if name == query:
+                add(name_id, 'exact', 1.0)
+            else:
+                add(name_id, 'prefix', 0.5 + 0.5 * len(query) / len(name))
+        # Exact hits first, then prefix hits by how much of the name the query covers
+        results.sort(key=lambda result: -result['score'])
+        del results[limit:]
+
+        if len(results) < limit:
+            for name_id, similarity in self._fuzzy_matches(query, limit, min_similarity):
+                add(name_id, 'fuzzy', 0.5 * similarity)
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def _contains(sorted_ids, name_id):
+    i = bisect.bisect_left(sorted_ids, name_id)
+    return i < len(sorted_ids) and sorted_ids[i] == name_id
+
+
+def builtin_food_entries(food_database, vision_food_ranges, aliases):
+    """Search entries for the in-code tables; a name present in both is listed once"""
+    entries = []
+    for food_id in food_database:
+        entries.append((food_id, food_id.replace('_', ' '), aliases.get(food_id, []), 'food_database'))
+    for food_id in vision_food_ranges:
+        if food_id not in food_database:
+            entries.append((food_id, food_id.replace('_', ' '), aliases.get(food_id, []), 'vision_food_ranges'))
+    return entries
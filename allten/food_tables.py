@@ -0,0 +1,336 @@
+"""
+Food tables that can be changed without a restart
+
+The tables in food_data.py are the defaults. JSON files in FOOD_TABLES_DIR
+add to or override their entries, each table keyed like the Python one:
+
+    {"food_database": {"apple": {"calories": 52, "micronutrients": {"iron": 0.1}}},
+     "vision_food_ranges": {"rice": {"calories": [110, 160]}},
+     "aliases": {"rice": ["jasmine rice"]},
+     "serving_grams": {"apple": 182}}
+
+An entry is merged onto the built-in one (micronutrients key by key), so
+changing one calorie value is a one-line file; null removes an entry.
+Files are applied in name order.
+
+LiveFoodTables holds the current FoodTables: the merged tables, the
+compiled catalogue and the name search index, recipe calculator and meal
+text parser built from them. A background thread polls the directory and
+the catalogue's CURRENT file (or is woken by reload()); when they change it
+builds and validates a complete new FoodTables, then swaps it in with a
+single reference assignment. Requests keep the snapshot they started with, so
+nobody waits for a reload, and a reload that fails validation leaves the
+live tables untouched.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+from allten.catalog import CatalogError, current_generation, default_catalog_dir, load_catalog
+from allten.food_data import FOOD_ALIASES, FOOD_DATABASE, SERVING_GRAMS, VISION_FOOD_RANGES
+from allten.food_search import FoodSearchIndex, builtin_food_entries
+from allten.nutrients import MACRONUTRIENTS, MICRONUTRIENTS
+from allten.recipes import RecipeCalculator
+from allten.similarity import food_vector_index
+from allten.text_meals import TextMealAnalyzer
+
+DEFAULT_TABLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'food_tables')
+TABLES = ('food_database', 'vision_food_ranges', 'aliases', 'serving_grams')
+RANGE_FIELDS = ('calories', 'protein', 'carbs', 'fat')
+# Changed ids listed per table in stats(); the counts are always complete
+MAX_LISTED_CHANGES = 50
+
+
+class TablesError(Exception):
+    """Override files that cannot be read or produce inconsistent tables"""
+
+
+class FoodTables:
+    """One consistent, read-only set of food tables and the indexes built from them"""
+
+    def __init__(self, food_database, vision_food_ranges, aliases, serving_grams, catalog=None, generation=1):
+        self.food_database = food_database
+        self.vision_food_ranges = vision_food_ranges
+        self.aliases = aliases
+        self.serving_grams = serving_grams
+        self.catalog = catalog
+        self.generation = generation
+        self.search = FoodSearchIndex(
+            builtin_food_entries(food_database, vision_food_ranges, aliases)
+            + (catalog.search_entries() if catalog else [])
+        )
+        self.recipes = RecipeCalculator(food_database, vision_food_ranges, serving_grams, catalog)
+        self.text = TextMealAnalyzer(self.search, self.recipes)
+        self._similar = None
+        self._similar_lock = threading.Lock()
+
+    def similar_foods(self):
+        """Nutrient similarity index over every food, built on first use (seconds for a large catalogue)"""
+        if self._similar is None:
+            with self._similar_lock:
+                if self._similar is None:
+                    self._similar = food_vector_index(self.recipes, self.catalog)
+        return self._similar
+
+    def table(self, name):
+        return getattr(self, name)
+
+
+def default_tables_dir():
+    return os.environ.get('FOOD_TABLES_DIR', DEFAULT_TABLES_DIR)
+
+
+def override_files(directory):
+    """Sorted paths of the *.json override files in directory (none if it does not exist)"""
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+
+def merge_tables(overrides):
+    """Built-in tables with a list of override dicts applied in order"""
+    tables = {
+        'food_database': dict(FOOD_DATABASE),
+        'vision_food_ranges': dict(VISION_FOOD_RANGES),
+        'aliases': dict(FOOD_ALIASES),
+        'serving_grams': dict(SERVING_GRAMS),
+    }
+    for source, override in overrides:
+        if not isinstance(override, dict) or set(override) - set(TABLES):
+            raise TablesError(f"{source}: expected an object with keys from {', '.join(TABLES)}")
+        for name, entries in override.items():
+            if not isinstance(entries, dict):
+                raise TablesError(f"{source}: {name} must be an object")
+            table = tables[name]
+            for food_id, entry in entries.items():
+                if entry is None:
+                    table.pop(food_id, None)
+                elif name in ('food_database', 'vision_food_ranges') and isinstance(entry, dict):
+                    merged = dict(table.get(food_id, {}))
+                    merged.update(entry)
+                    if 'micronutrients' in entry and isinstance(entry['micronutrients'], dict):
+                        merged['micronutrients'] = {**table.get(food_id, {}).get('micronutrients', {}),
+                                                    **entry['micronutrients']}
+                    table[food_id] = merged
+                else:
+                    table[food_id] = entry
+    return tables
+
+
+def validate_tables(tables):
+    """Raise TablesError unless the merged tables are usable by matching, search and recipes"""
+    for food_id, nutrition in tables['food_database'].items():
+        if not isinstance(nutrition, dict):
+            raise TablesError(f"food_database.{food_id} must be an object")
+        micronutrients = nutrition.get('micronutrients', {})
+        if not isinstance(micronutrients, dict):
+            raise TablesError(f"food_database.{food_id}.micronutrients must be an object")
+        unknown = (set(nutrition) - set(MACRONUTRIENTS) - {'micronutrients'}) | (set(micronutrients) - set(MICRONUTRIENTS))
+        if unknown:
+            raise TablesError(f"food_database.{food_id}: unknown nutrients {', '.join(sorted(unknown))}")
+        for name, value in [*nutrition.items(), *micronutrients.items()]:
+            if name != 'micronutrients' and not _amount(value):
+                raise TablesError(f"food_database.{food_id}.{name} must be a non-negative number")
+
+    for food_id, ranges in tables['vision_food_ranges'].items():
+        if not isinstance(ranges, dict) or set(ranges) != set(RANGE_FIELDS):
+            raise TablesError(f"vision_food_ranges.{food_id} needs exactly {', '.join(RANGE_FIELDS)}")
+        for name, bounds in ranges.items():
+            if (not isinstance(bounds, (list, tuple)) or len(bounds) != 2
+                    or not all(map(_amount, bounds)) or bounds[0] > bounds[1]):
+                raise TablesError(f"vision_food_ranges.{food_id}.{name} must be [low, high]")
+
+    for food_id in [*tables['food_database'], *tables['vision_food_ranges']]:
+        grams = tables['serving_grams'].get(food_id)
+        if not _amount(grams) or grams <= 0:
+            raise TablesError(f"serving_grams.{food_id} must be a positive number")
+
+    for food_id, names in tables['aliases'].items():
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise TablesError(f"aliases.{food_id} must be a list of names")
+
+
+def _amount(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) and value >= 0
+
+
+def changed_foods(old, new):
+    """{table: set of ids added, removed or changed} between two FoodTables"""
+    changes = {}
+    for name in TABLES:
+        before, after = old.table(name), new.table(name)
+        changes[name] = {food_id for food_id in before.keys() | after.keys()
+                         if _normalized(before.get(food_id)) != _normalized(after.get(food_id))}
+    changes['catalog'] = _catalog_changes(old.catalog, new.catalog)
+    return changes
+
+
+def _normalized(entry):
+    # Tuples in the Python tables compare equal to lists from JSON
+    return json.dumps(entry, sort_keys=True)
+
+
+def _catalog_changes(before, after):
+    if before is after:
+        return set()
+    before_ids = set(before.ids) if before else set()
+    after_ids = set(after.ids) if after else set()
+    changed = before_ids ^ after_ids
+    common = sorted(before_ids & after_ids)
+    if common:
+        # One column gather per side instead of a vector per food
+        differs = (before.columns[:, [before.row_of[food_id] for food_id in common]]
+                   != after.columns[:, [after.row_of[food_id] for food_id in common]]).any(axis=0)
+        changed.update(food_id for food_id, flag in zip(common, differs) if flag)
+    return changed
+
+
+class LiveFoodTables:
+    """The current FoodTables, rebuilt in the background when their sources change"""
+
+    def __init__(self, directory=None, catalog_dir=None, poll_seconds=2.0, on_swap=None):
+        # on_swap(old, new, changes) runs after each swap and may return
+        # stats about what it invalidated
+        self.directory = directory or default_tables_dir()
+        self.catalog_dir = catalog_dir or default_catalog_dir()
+        self.poll_seconds = poll_seconds
+        self.on_swap = on_swap
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._finished = threading.Condition()
+        self._attempts = 0
+        self._thread = None
+        self._stats = {"reloads": 0, "failures": 0, "last_reload_ms": None, "last_error": None,
+                       "last_changes": None, "last_invalidated": None}
+
+        self._signature = self._sources()
+        start = time.perf_counter()
+        try:
+            self.current = self._build(strict=False)
+        except TablesError as e:
+            # A broken override file must not keep the server from starting
+            print(f"⚠️ Food table overrides not applied: {e}")
+            self._stats["last_error"] = str(e)
+            self.current = FoodTables(FOOD_DATABASE, VISION_FOOD_RANGES, FOOD_ALIASES, SERVING_GRAMS,
+                                      self._load_catalog(strict=False))
+        self.loaded_at = time.time()
+        self._stats["last_reload_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def _sources(self):
+        """What a reload reads: override file names, sizes and mtimes, and the live catalogue generation"""
+        files = []
+        for path in override_files(self.directory):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((os.path.basename(path), stat.st_mtime_ns, stat.st_size))
+        return tuple(files), current_generation(self.catalog_dir)
+
+    def _load_catalog(self, strict=True, reuse=None):
+        generation = current_generation(self.catalog_dir)
+        if reuse is not None and reuse.manifest.get('generation') == generation:
+            return reuse
+        try:
+            return load_catalog(self.catalog_dir)
+        except CatalogError as e:
+            if strict and generation is not None:
+                raise TablesError(f"catalogue: {e}")
+            if not strict:
+                print(f"⚠️ Nutrient catalogue not loaded: {e}")
+            return None
+
+    def _build(self, strict=True, previous=None):
+        overrides = []
+        for path in override_files(self.directory):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    overrides.append((os.path.basename(path), json.load(f)))
+            except (OSError, ValueError) as e:
+                raise TablesError(f"{os.path.basename(path)}: {e}")
+        tables = merge_tables(overrides)
+        validate_tables(tables)
+        catalog = self._load_catalog(strict, reuse=previous.catalog if previous else None)
+        generation = previous.generation + 1 if previous else 1
+        return FoodTables(tables['food_database'], tables['vision_food_ranges'], tables['aliases'],
+                          tables['serving_grams'], catalog, generation)
+
+    def start(self):
+        """Start the watcher thread (also needed for reload() to do anything)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='food-tables-reloader', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            requested = self._wakeup.wait(self.poll_seconds or None)
+            self._wakeup.clear()
+            if requested or self._sources() != self._signature:
+                self.reload_now()
+
+    def reload(self, timeout=30.0):
+        """Ask the watcher thread for a reload and wait for it; False if it did not finish in time"""
+        with self._finished:
+            target = self._attempts + 1
+            self._wakeup.set()
+            return self._finished.wait_for(lambda: self._attempts >= target, timeout)
+
+    def reload_now(self):
+        """Rebuild, validate and swap in new tables on this thread; True if they were swapped"""
+        with self._lock:
+            signature = self._sources()
+            start = time.perf_counter()
+            old = self.current
+            try:
+                new = self._build(previous=old)
+            except TablesError as e:
+                print(f"❌ Food table reload failed, keeping generation {old.generation}: {e}")
+                self._record(signature, start, error=str(e))
+                return False
+            if old._similar is not None:
+                # Similarity search is in use; build its index before requests can see the new tables
+                new.similar_foods()
+
+            self.current = new
+            self.loaded_at = time.time()
+            changes = changed_foods(old, new)
+            invalidated = self.on_swap(old, new, changes) if self.on_swap else None
+            self._record(signature, start, changes=changes, invalidated=invalidated)
+            print(f"♻️ Food tables generation {new.generation} live "
+                  f"({sum(map(len, changes.values()))} foods changed, {self._stats['last_reload_ms']:.0f} ms)")
+            return True
+
+    def _record(self, signature, start, error=None, changes=None, invalidated=None):
+        # A bad file is not retried on every poll, only once it changes again
+        self._signature = signature
+        self._stats["last_reload_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._stats["last_error"] = error
+        if error is None:
+            self._stats["reloads"] += 1
+            self._stats["last_changes"] = {
+                name: {"count": len(ids), "ids": sorted(ids)[:MAX_LISTED_CHANGES]}
+                for name, ids in changes.items() if ids
+            }
+            self._stats["last_invalidated"] = invalidated
+        else:
+            self._stats["failures"] += 1
+        with self._finished:
+            self._attempts += 1
+            self._finished.notify_all()
+
+    def stats(self):
+        current = self.current
+        return {
+            "generation": current.generation,
+            "loaded_at": round(self.loaded_at, 3),
+            "directory": self.directory,
+            "override_files": [name for name, _, _ in self._signature[0]],
+            "catalog_generation": current.catalog.manifest.get('generation') if current.catalog else None,
+            "poll_seconds": self.poll_seconds,
+            **self._stats,
+        }
@@ -0,0 +1,240 @@
+"""
+Perceptual hashing and near-duplicate lookup for food photos
+
+The same plate photographed twice, or re-encoded by a phone, produces
+different bytes but an almost identical difference hash (dHash). Hashes are
+kept in a BK-tree so we can find the closest earlier photo within a Hamming
+distance and reuse its Vision labels instead of paying for another call.
+An optional SQLite store keeps the entries and their hit counts across
+restarts so a new instance can start with the recently hottest photos.
+"""
+
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from allten.sqlite_db import ThreadConnections
+
+HASH_SIZE = 8  # 8x8 comparisons -> 64-bit hash
+
+
+def dhash(image_bytes, hash_size=HASH_SIZE):
+    """Difference hash of an encoded image, computed on a tiny greyscale thumbnail"""
+    image = Image.open(io.BytesIO(image_bytes))
+    # Let the JPEG decoder downscale while decoding; full-size decode is the expensive part
+    image.draft('L', ((hash_size + 1) * 4, hash_size * 4))
+    image = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = image.tobytes()
+
+    value = 0
+    width = hash_size + 1
+    for row in range(hash_size):
+        offset = row * width
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def compute_phash(image_bytes):
+    """Perceptual hash of the image, or None if it cannot be decoded"""
+    if not PIL_AVAILABLE or not image_bytes:
+        return None
+    try:
+        return dhash(image_bytes)
+    except Exception:
+        return None
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes using Hamming distance"""
+
+    def __init__(self):
+        # Nodes are [hash, value, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def add(self, key, value):
+        if self.root is None:
+            self.root = [key, value, {}]
+            self.size = 1
+            return
+
+        node = self.root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                node[1] = value
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, value, {}]
+                self.size += 1
+                return
+            node = child
+
+    def find_nearest(self, key, max_distance, accept=None):
+        """Return (distance, hash, value) of the closest entry within max_distance, or None
+
+        accept(value), if given, skips entries it returns False for (expired
+        ones, say) so the search goes on to the next closest.
+        """
+        if self.root is None:
+            return None
+
+        best = None
+        radius = max_distance
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if (distance <= radius and (best is None or distance < best[0])
+                    and (accept is None or accept(node[1]))):
+                best = (distance, node[0], node[1])
+                if distance == 0:
+                    break
+                radius = distance
+            # Triangle inequality: only subtrees at edge distance d +/- radius can hold a match
+            low, high = distance - radius, distance + radius
+            for edge, child in node[2].items():
+                if low <= edge <= high:
+                    stack.append(child)
+        return best
+
+
+class PerceptualLabelCache:
+    """Thread-safe near-duplicate cache mapping perceptual hashes to Vision labels"""
+
+    def __init__(self, max_distance=6, max_entries=10000, persistent=None):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.persistent = persistent  # optional PersistentLabelStore
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._tree = BKTree()
+        self._entries = OrderedDict()  # insertion order, used for eviction
+
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds_total = 0.0
+        self.lookup_seconds_max = 0.0
+        self.hit_distances = [0] * (max_distance + 1)
+
+    def lookup(self, phash):
+        """Labels of the closest cached image within max_distance, or None"""
+        start = time.perf_counter()
+        with self._lock:
+            match = self._tree.find_nearest(phash, self.max_distance)
+            elapsed = time.perf_counter() - start
+            self.lookup_seconds_total += elapsed
+            self.lookup_seconds_max = max(self.lookup_seconds_max, elapsed)
+            if match is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.hit_distances[match[0]] += 1
+        if self.persistent is not None:
+            self.persistent.touch(match[1])
+        return list(match[2])
+
+    def store(self, phash, labels):
+        self._add(phash, labels)
+        if self.persistent is not None:
+            self.persistent.save(phash, labels)
+
+    def _add(self, phash, labels):
+        with self._lock:
+            self._entries[phash] = list(labels)
+            self._entries.move_to_end(phash)
+            self._tree.add(phash, self._entries[phash])
+            if len(self._entries) > self.max_entries:
+                self._evict()
+
+    def replay(self, since_seconds=3600):
+        """Load the most hit entries used in the last since_seconds from the store; returns the count"""
+        if self.persistent is None:
+            return 0
+        rows = self.persistent.hottest(time.time() - since_seconds, self.max_entries)
+        # Coldest first, so the hottest entries are the last to be evicted
+        for phash, labels in reversed(rows):
+            self._add(phash, labels)
+        self.replayed = len(rows)
+        return self.replayed
+
+    def _evict(self):
+        # BK-trees do not support deletion, so drop the oldest quarter and rebuild
+        for _ in range(max(1, self.max_entries // 4)):
+            self._entries.popitem(last=False)
+        self._tree = BKTree()
+        for phash, labels in self._entries.items():
+            self._tree.add(phash, labels)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_distance": self.max_distance,
+                "lookups": lookups,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "avg_lookup_ms": round(self.lookup_seconds_total / lookups * 1000, 4) if lookups else 0.0,
+                "max_lookup_ms": round(self.lookup_seconds_max * 1000, 4),
+                "hit_distance_histogram": list(self.hit_distances),
+                "replayed_from_store": self.replayed,
+            }
+
+
+def _to_signed(phash):
+    # SQLite integers are signed 64-bit
+    return phash - (1 << 64) if phash >= 1 << 63 else phash
+
+
+class PersistentLabelStore:
+    """SQLite copy of the near-duplicate cache with per-entry hit counts"""
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = ThreadConnections(path)
+        self._connection().execute("""
+            CREATE TABLE IF NOT EXISTS phash_labels (
+                phash INTEGER PRIMARY KEY,
+                labels TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._connection().execute("CREATE INDEX IF NOT EXISTS phash_labels_last_used ON phash_labels (last_used)")
+
+    def _connection(self):
+        return self._connections.get()
+
+    def save(self, phash, labels):
+        self._connection().execute(
+            "INSERT INTO phash_labels (phash, labels, hits, last_used) VALUES (?, ?, 0, ?) "
+            "ON CONFLICT (phash) DO UPDATE SET labels = excluded.labels, last_used = excluded.last_used",
+            (_to_signed(phash), json.dumps(list(labels)), time.time()))
+
+    def touch(self, phash):
+        self._connection().execute(
+            "UPDATE phash_labels SET hits = hits + 1, last_used = ? WHERE phash = ?",
+            (time.time(), _to_signed(phash)))
+
+    def hottest(self, since, limit):
+        """(phash, labels) used since the given time, most hit first"""
+        rows = self._connection().execute(
+            "SELECT phash, labels FROM phash_labels WHERE last_used >= ? ORDER BY hits DESC, last_used DESC LIMIT ?",
+            (since, limit)).fetchall()
+        return [(phash & ((1 << 64) - 1), json.loads(labels)) for phash, labels in rows]
@@ -0,0 +1,489 @@
+"""
+Streaming importer for USDA-style nutrient datasets
+
+Supported sources:
+  * a FoodData Central CSV directory (food.csv, nutrient.csv,
+    food_nutrient.csv and optionally food_portion.csv and branded_food.csv)
+  * FoodData Central JSON downloads ({"FoundationFoods": [...]} and friends)
+  * JSON Lines with one FoodData Central food object per line
+
+Files are read in fixed-size chunks, never whole. food_nutrient.csv and JSON
+Lines files are split into byte ranges that a process pool parses and
+normalizes in parallel; the main process only scatters the compact results
+into the nutrient matrix. Source nutrient ids are mapped onto NUTRIENT_FIELDS
+and converted to the catalogue's units, per 100 g. Branded foods keep their
+barcode (gtinUpc) and label serving size.
+
+Re-imports are incremental: each source is fingerprinted, unchanged sources
+keep their rows from the live catalogue, and only changed ones are parsed.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from allten.catalog import CatalogError, load_catalog, write_catalog
+from allten.nutrients import FIELD_INDEX, NUTRIENT_FIELDS, NUTRIENT_UNITS, unit_factor
+
+CHUNK_BYTES = 8 * 1024 * 1024
+
+# FoodData Central nutrient id -> (field, priority); lower priority wins when a food has several
+FDC_NUTRIENTS = {
+    1008: ('calories', 0), 2047: ('calories', 1), 2048: ('calories', 2),
+    1003: ('protein', 0),
+    1005: ('carbs', 0), 1050: ('carbs', 1),
+    1004: ('fat', 0), 1085: ('fat', 1),
+    1079: ('fiber', 0),
+    2000: ('sugar', 0), 1063: ('sugar', 1),
+    1093: ('sodium', 0),
+    1089: ('iron', 0),
+    1087: ('calcium', 0),
+    1162: ('vitamin_c', 0),
+    1092: ('potassium', 0),
+    1106: ('vitamin_a', 0),
+    1109: ('vitamin_e', 0),
+    1185: ('vitamin_k', 0),
+    1177: ('folate', 0), 1190: ('folate', 1),
+    1167: ('niacin', 0),
+    1166: ('riboflavin', 0),
+    1165: ('thiamin', 0),
+    1175: ('vitamin_b6', 0),
+    1091: ('phosphorus', 0),
+    1103: ('selenium', 0),
+    1098: ('copper', 0),
+    1101: ('manganese', 0),
+    1096: ('chromium', 0),
+    1102: ('molybdenum', 0),
+    1100: ('iodine', 0),
+    1088: ('chloride', 0),
+    1176: ('biotin', 0),
+    1170: ('pantothenic_acid', 0),
+    1180: ('choline', 0),
+    1198: ('betaine', 0),
+    1210: ('tryptophan', 0),
+    1211: ('threonine', 0),
+    1212: ('isoleucine', 0),
+    1213: ('leucine', 0),
+    1214: ('lysine', 0),
+    1215: ('methionine', 0),
+    1216: ('cysteine', 1), 1232: ('cysteine', 0),
+    1217: ('phenylalanine', 0),
+    1218: ('tyrosine', 0),
+    1219: ('valine', 0),
+    1220: ('arginine', 0),
+    1221: ('histidine', 0),
+    1222: ('alanine', 0),
+    1223: ('aspartic_acid', 0),
+    1224: ('glutamic_acid', 0),
+    1225: ('glycine', 0),
+    1226: ('proline', 0),
+    1227: ('serine', 0),
+    1233: ('glutamine', 0),
+}
+
+
+class InvalidSourceError(ValueError):
+    """A source file that cannot be imported"""
+
+
+def fingerprint(path, previous=None):
+    """Size, mtime and sha256 of a file; the hash is reused when size and mtime are unchanged"""
+    stat = os.stat(path)
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+        return dict(previous)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_BYTES), b''):
+            digest.update(block)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+
+
+def byte_ranges(path, start=0, chunk_bytes=CHUNK_BYTES):
+    """Split a file into (start, end) ranges that begin and end on line boundaries"""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(end - start).decode('utf-8')
+
+
+def _field_factor(nutrient_id, unit):
+    """(field index, unit factor, priority) for a source nutrient, or None if unmapped"""
+    mapped = FDC_NUTRIENTS.get(nutrient_id)
+    if mapped is None:
+        return None
+    field, priority = mapped
+    factor = unit_factor(unit, NUTRIENT_UNITS[field]) if unit else 1.0
+    if factor is None:
+        return None
+    return FIELD_INDEX[field], factor, priority
+
+
+# -- FoodData Central CSV ---------------------------------------------------
+
+def _parse_food_nutrient_range(task):
+    """Worker: parse one byte range of food_nutrient.csv into compact arrays"""
+    path, start, end, columns, nutrient_map = task
+    fdc_col, nutrient_col, amount_col = columns
+    fdc_ids, fields, values, priorities = array('q'), array('h'), array('f'), array('b')
+    for row in csv.reader(io.StringIO(_read_range(path, start, end))):
+        try:
+            mapped = nutrient_map.get(int(row[nutrient_col]))
+            if mapped is None or not row[amount_col]:
+                continue
+            field, factor, priority = mapped
+            value = float(row[amount_col]) * factor
+            fdc_id = int(row[fdc_col])
+        except (ValueError, IndexError):
+            continue
+        fdc_ids.append(fdc_id)
+        fields.append(field)
+        values.append(value)
+        priorities.append(priority)
+    return fdc_ids.tobytes(), fields.tobytes(), values.tobytes(), priorities.tobytes()
+
+
+def _csv_header(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        header_line = f.readline()
+        return next(csv.reader([header_line])), len(header_line.encode('utf-8'))
+
+
+def _column(header, name, path):
+    try:
+        return header.index(name)
+    except ValueError:
+        raise InvalidSourceError(f"{path} has no {name} column")
+
+
+def import_fdc_csv(directory, source, pool):
+    """Rows for every food in a FoodData Central CSV directory"""
+    nutrient_map = {}
+    with open(os.path.join(directory, 'nutrient.csv'), newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            mapped = _field_factor(int(row['id']), row.get('unit_name', ''))
+            if mapped:
+                nutrient_map[int(row['id'])] = mapped
+
+    fdc_ids, names = [], []
+    with open(os.path.join(directory, 'food.csv'), newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            fdc_ids.append(int(row['fdc_id']))
+            names.append(row['description'])
+
+    order = np.argsort(np.array(fdc_ids, dtype=np.int64), kind='stable')
+    sorted_ids = np.array(fdc_ids, dtype=np.int64)[order]
+    columns = np.zeros((len(NUTRIENT_FIELDS), len(fdc_ids)), dtype=np.float32)
+    best_priority = np.full((len(NUTRIENT_FIELDS), len(fdc_ids)), 127, dtype=np.int8)
+
+    path = os.path.join(directory, 'food_nutrient.csv')
+    header, header_bytes = _csv_header(path)
+    wanted = (_column(header, 'fdc_id', path), _column(header, 'nutrient_id', path), _column(header, 'amount', path))
+    tasks = [(path, start, end, wanted, nutrient_map) for start, end in byte_ranges(path, header_bytes)]
+
+    for chunk in _bounded_map(pool, _parse_food_nutrient_range, tasks):
+        chunk_ids = np.frombuffer(chunk[0], dtype=np.int64)
+        fields = np.frombuffer(chunk[1], dtype=np.int16)
+        values = np.frombuffer(chunk[2], dtype=np.float32)
+        priorities = np.frombuffer(chunk[3], dtype=np.int8)
+        positions = np.minimum(np.searchsorted(sorted_ids, chunk_ids), len(sorted_ids) - 1)
+        known = sorted_ids[positions] == chunk_ids
+        rows = order[positions[known]]
+        fields, values, priorities = fields[known], values[known], priorities[known]
+        # Keep the value from the most preferred source nutrient for each cell,
+        # including when one chunk holds several of them for the same food
+        better = priorities < best_priority[fields, rows]
+        fields, rows, values, priorities = fields[better], rows[better], values[better], priorities[better]
+        cells = fields.astype(np.int64) * len(fdc_ids) + rows
+        by_cell = np.lexsort((priorities, cells))
+        first = by_cell[np.r_[True, cells[by_cell][1:] != cells[by_cell][:-1]]] if len(cells) else by_cell
+        columns[fields[first], rows[first]] = values[first]
+        best_priority[fields[first], rows[first]] = priorities[first]
+
+    serving_grams = np.full(len(fdc_ids), 100.0)
+    upcs = [None] * len(fdc_ids)
+    branded_path = os.path.join(directory, 'branded_food.csv')
+    if os.path.exists(branded_path):
+        with open(branded_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                position = np.searchsorted(sorted_ids, int(row['fdc_id']))
+                if position == len(sorted_ids) or sorted_ids[position] != int(row['fdc_id']):
+                    continue
+                upcs[order[position]] = row.get('gtin_upc') or None
+                grams = _label_serving_grams(row.get('serving_size'), row.get('serving_size_unit'))
+                if grams:
+                    serving_grams[order[position]] = grams
+
+    portion_path = os.path.join(directory, 'food_portion.csv')
+    if os.path.exists(portion_path):
+        with open(portion_path, newline='', encoding='utf-8') as f:
+            seen = set()
+            for row in csv.DictReader(f):
+                fdc_id = int(row['fdc_id'])
+                if fdc_id in seen or not row.get('gram_weight'):
+                    continue
+                seen.add(fdc_id)
+                position = np.searchsorted(sorted_ids, fdc_id)
+                if position < len(sorted_ids) and sorted_ids[position] == fdc_id:
+                    serving_grams[order[position]] = float(row['gram_weight'])
+
+    ids = [f"fdc:{fdc_id}" for fdc_id in fdc_ids]
+    return ids, names, [source] * len(ids), serving_grams.tolist(), columns, upcs
+
+
+def _label_serving_grams(size, unit):
+    """Grams in a branded food's label serving, or None if it is not given in grams"""
+    try:
+        size = float(size)
+    except (TypeError, ValueError):
+        return None
+    return size if size > 0 and str(unit or '').strip().lower() in ('g', 'grm') else None
+
+
+# -- FoodData Central JSON --------------------------------------------------
+
+def normalize_fdc_food(food):
+    """(id, name, serving_grams, vector, upc) for one FoodData Central food object"""
+    vector = [0.0] * len(NUTRIENT_FIELDS)
+    priorities = [127] * len(NUTRIENT_FIELDS)
+    for entry in food.get('foodNutrients', []):
+        nutrient = entry.get('nutrient') or {}
+        amount = entry.get('amount')
+        if amount is None or 'id' not in nutrient:
+            continue
+        mapped = _field_factor(int(nutrient['id']), nutrient.get('unitName', ''))
+        if mapped is None:
+            continue
+        field, factor, priority = mapped
+        if priority < priorities[field]:
+            vector[field] = float(amount) * factor
+            priorities[field] = priority
+
+    portions = food.get('foodPortions') or []
+    serving_grams = float(portions[0].get('gramWeight') or 100.0) if portions else (
+        _label_serving_grams(food.get('servingSize'), food.get('servingSizeUnit')) or 100.0)
+    return f"fdc:{food['fdcId']}", food.get('description', ''), serving_grams, vector, food.get('gtinUpc') or None
+
+
+def _normalize_jsonl_range(task):
+    """Worker: parse and normalize one byte range of a JSON Lines file"""
+    path, start, end = task
+    foods = []
+    for line in _read_range(path, start, end).splitlines():
+        if line.strip():
+            foods.append(normalize_fdc_food(json.loads(line)))
+    return foods
+
+
+def _normalize_batch(foods):
+    return [normalize_fdc_food(food) for food in foods]
+
+
+def iter_json_array_items(f, block_bytes=1024 * 1024):
+    """Yield the elements of the first JSON array in a stream, holding only one element at a time"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        block = f.read(block_bytes)
+        if not block:
+            eof = True
+        buffer = buffer[position:] + block
+        position = 0
+
+    while '[' not in buffer[position:]:
+        if eof:
+            return
+        fill()
+    position = buffer.index('[', position) + 1
+
+    while True:
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            fill()
+        if position >= len(buffer) or buffer[position] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                raise InvalidSourceError("Truncated JSON array")
+            fill()
+            continue
+        position = end
+        yield item
+
+
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bounded_map(pool, fn, items, window=8):
+    """pool.map that keeps at most window tasks in flight, so a huge input is never fully buffered"""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def import_json(path, source, pool):
+    """Rows for every food in a FoodData Central JSON or JSON Lines file"""
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        tasks = [(path, start, end) for start, end in byte_ranges(path)]
+        return _collect_foods(_bounded_map(pool, _normalize_jsonl_range, tasks), source)
+    # Decoding the single JSON document is sequential; normalization still runs in the pool
+    with open(path, encoding='utf-8') as f:
+        return _collect_foods(_bounded_map(pool, _normalize_batch, _batched(iter_json_array_items(f), 500)), source)
+
+
+def _collect_foods(results, source):
+    ids, names, serving_grams, blocks, upcs = [], [], [], [], []
+    for foods in results:
+        if not foods:
+            continue
+        ids.extend(food[0] for food in foods)
+        names.extend(food[1] for food in foods)
+        serving_grams.extend(food[2] for food in foods)
+        blocks.append(np.array([food[3] for food in foods], dtype=np.float32).T)
+        upcs.extend(food[4] for food in foods)
+    columns = np.concatenate(blocks, axis=1) if blocks else np.zeros((len(NUTRIENT_FIELDS), 0), dtype=np.float32)
+    return ids, names, [source] * len(ids), serving_grams, columns, upcs
+
+
+# -- Catalogue build --------------------------------------------------------
+
+def source_files(source):
+    """Files that make up a source, for fingerprinting"""
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in
+                      ('food.csv', 'nutrient.csv', 'food_nutrient.csv', 'food_portion.csv', 'branded_food.csv')
+                      if os.path.exists(os.path.join(source, name)))
+    return [source]
+
+
+def source_key(source):
+    """Name a source is recorded under in the catalogue, e.g. 'FoodData_Central_csv' or 'branded.jsonl'"""
+    return os.path.basename(os.path.normpath(source))
+
+
+def _digests(fingerprints):
+    return {path: fp.get('sha256') for path, fp in fingerprints.items()}
+
+
+def _import_source(source, pool):
+    """Rows for one source; malformed content (bad JSON, missing columns or fields) is an InvalidSourceError"""
+    key = source_key(source)
+    if not (os.path.isdir(source) or source.endswith(('.json', '.jsonl', '.ndjson'))):
+        raise InvalidSourceError(f"Unsupported source: {source}")
+    try:
+        if os.path.isdir(source):
+            return import_fdc_csv(source, key, pool)
+        return import_json(source, key, pool)
+    except InvalidSourceError:
+        raise
+    except json.JSONDecodeError as e:
+        raise InvalidSourceError(f"{source}: invalid JSON ({e})")
+    except KeyError as e:
+        raise InvalidSourceError(f"{source}: missing column or field {e}")
+    except (AttributeError, TypeError, ValueError) as e:
+        raise InvalidSourceError(f"{source}: {e}")
+
+
+def import_sources(sources, catalog_dir, workers=None, force=False, log=print):
+    """Import sources into the catalogue; returns the new generation, or None if nothing changed"""
+    try:
+        existing = load_catalog(catalog_dir)
+        previous = existing.manifest.get('sources', {})
+    except CatalogError:
+        existing, previous = None, {}
+
+    fingerprints, changed = {}, []
+    for source in sources:
+        key = source_key(source)
+        old = previous.get(key, {})
+        fingerprints[key] = {path: fingerprint(path, old.get(path)) for path in source_files(source)}
+        if force or existing is None or _digests(fingerprints[key]) != _digests(old):
+            changed.append(source)
+    removed = set(previous) - set(fingerprints)
+
+    if not changed and not removed:
+        log("Catalogue is up to date")
+        return None
+
+    parts = []
+    if existing is not None:
+        # Carry over rows of unchanged sources straight from the memory-mapped catalogue
+        stale = {source_key(source) for source in changed} | removed
+        keep = [row for row, source in enumerate(existing.sources) if source not in stale]
+        if keep:
+            parts.append(([existing.ids[row] for row in keep], [existing.names[row] for row in keep],
+                          [existing.sources[row] for row in keep], [existing.serving_grams[row] for row in keep],
+                          np.asarray(existing.columns[:, keep]), [existing.upcs[row] for row in keep]))
+        log(f"Keeping {len(keep)} foods from unchanged sources")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for source in changed:
+            part = _import_source(source, pool)
+            log(f"Imported {len(part[0])} foods from {source}")
+            parts.append(part)
+
+    ids = [food_id for part in parts for food_id in part[0]]
+    if len(set(ids)) != len(ids):
+        # The same food in two sources: the later source wins
+        last = {food_id: i for i, food_id in enumerate(ids)}
+        keep = sorted(last.values())
+    else:
+        keep = None
+
+    names = [name for part in parts for name in part[1]]
+    sources_column = [source for part in parts for source in part[2]]
+    serving_grams = [grams for part in parts for grams in part[3]]
+    columns = np.concatenate([part[4] for part in parts], axis=1) if parts else np.zeros((len(NUTRIENT_FIELDS), 0), np.float32)
+    upcs = [upc for part in parts for upc in part[5]]
+    if keep is not None:
+        ids = [ids[i] for i in keep]
+        names = [names[i] for i in keep]
+        sources_column = [sources_column[i] for i in keep]
+        serving_grams = [serving_grams[i] for i in keep]
+        columns = columns[:, keep]
+        upcs = [upcs[i] for i in keep]
+
+    np.nan_to_num(columns, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    np.maximum(columns, 0, out=columns)
+    generation = write_catalog(catalog_dir, ids, names, sources_column, serving_grams, columns, fingerprints, upcs)
+    log(f"Wrote {len(ids)} foods to {catalog_dir} ({generation})")
+    return generation
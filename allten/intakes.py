@@ -0,0 +1,263 @@
+"""
+Reference daily intakes and micronutrient gap analysis
+
+Reference values follow the US/Canadian Dietary Reference Intakes by life
+stage: the RDA where one exists, else the Adequate Intake, and the
+Tolerable Upper Intake Level (UL) where one is set. Essential amino acids
+use the WHO/FAO/UNU 2007 requirements in mg per kg of body weight (the
+sulphur amino acid total split 70/30 between methionine and cysteine for
+children), scaled by the person's weight or the DRI reference weight of
+their group. Phenylalanine and tyrosine only have a combined requirement,
+and the remaining micronutrients have no established intake at all; those
+are listed under no_reference instead of getting a %DV.
+
+ULs for vitamin A, vitamin E, folate and niacin apply to preformed or
+supplemental forms, so an excess against total intake is a flag to look
+at, not a diagnosis. Pregnancy, lactation and infants under one year are
+not covered.
+
+gap_arrays() works on whole cohorts at once: intakes are a users x
+micronutrients matrix, reference and UL rows are gathered per user by
+group index, and %DV, deficits and excesses are broadcast array
+operations.
+"""
+
+import math
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from allten.nutrients import (
+    MACRONUTRIENTS, MICRONUTRIENTS, NUTRIENT_FIELDS, NUTRIENT_UNITS, NutritionError, flatten_nutrition
+)
+
+MAX_PEOPLE = 10000
+SEXES = ('male', 'female')
+SEX_ALIASES = {'male': 'male', 'm': 'male', 'man': 'male', 'female': 'female', 'f': 'female', 'woman': 'female'}
+# DRI life-stage groups: (first age, last age), the last one open-ended
+AGE_BANDS = [(1, 3), (4, 8), (9, 13), (14, 18), (19, 30), (31, 50), (51, 70), (71, None)]
+
+# Per age band; a pair is (male, female)
+RECOMMENDED = {
+    "iron": ([7, 10, 8, 11, 8, 8, 8, 8], [7, 10, 8, 15, 18, 18, 8, 8]),
+    "calcium": ([700, 1000, 1300, 1300, 1000, 1000, 1000, 1200], [700, 1000, 1300, 1300, 1000, 1000, 1200, 1200]),
+    "vitamin_c": ([15, 25, 45, 75, 90, 90, 90, 90], [15, 25, 45, 65, 75, 75, 75, 75]),
+    "potassium": ([2000, 2300, 2500, 3000, 3400, 3400, 3400, 3400], [2000, 2300, 2300, 2300, 2600, 2600, 2600, 2600]),
+    "vitamin_a": ([300, 400, 600, 900, 900, 900, 900, 900], [300, 400, 600, 700, 700, 700, 700, 700]),
+    "vitamin_e": [6, 7, 11, 15, 15, 15, 15, 15],
+    "vitamin_k": ([30, 55, 60, 75, 120, 120, 120, 120], [30, 55, 60, 75, 90, 90, 90, 90]),
+    "folate": [150, 200, 300, 400, 400, 400, 400, 400],
+    "niacin": ([6, 8, 12, 16, 16, 16, 16, 16], [6, 8, 12, 14, 14, 14, 14, 14]),
+    "riboflavin": ([0.5, 0.6, 0.9, 1.3, 1.3, 1.3, 1.3, 1.3], [0.5, 0.6, 0.9, 1.0, 1.1, 1.1, 1.1, 1.1]),
+    "thiamin": ([0.5, 0.6, 0.9, 1.2, 1.2, 1.2, 1.2, 1.2], [0.5, 0.6, 0.9, 1.0, 1.1, 1.1, 1.1, 1.1]),
+    "vitamin_b6": ([0.5, 0.6, 1.0, 1.3, 1.3, 1.3, 1.7, 1.7], [0.5, 0.6, 1.0, 1.2, 1.3, 1.3, 1.5, 1.5]),
+    "phosphorus": [460, 500, 1250, 1250, 700, 700, 700, 700],
+    "selenium": [20, 30, 40, 55, 55, 55, 55, 55],
+    "copper": [0.34, 0.44, 0.7, 0.89, 0.9, 0.9, 0.9, 0.9],
+    "manganese": ([1.2, 1.5, 1.9, 2.2, 2.3, 2.3, 2.3, 2.3], [1.2, 1.5, 1.6, 1.6, 1.8, 1.8, 1.8, 1.8]),
+    "chromium": ([11, 15, 25, 35, 35, 35, 30, 30], [11, 15, 21, 24, 25, 25, 20, 20]),
+    "molybdenum": [17, 22, 34, 43, 45, 45, 45, 45],
+    "iodine": [90, 90, 120, 150, 150, 150, 150, 150],
+    "chloride": [1500, 1900, 2300, 2300, 2300, 2300, 2000, 1800],
+    "biotin": [8, 12, 20, 25, 30, 30, 30, 30],
+    "pantothenic_acid": [2, 3, 4, 5, 5, 5, 5, 5],
+    "choline": ([200, 250, 375, 550, 550, 550, 550, 550], [200, 250, 375, 400, 425, 425, 425, 425]),
+}
+
+UPPER_LIMITS = {
+    "iron": [40, 40, 40, 45, 45, 45, 45, 45],
+    "calcium": [2500, 2500, 3000, 3000, 2500, 2500, 2000, 2000],
+    "vitamin_c": [400, 650, 1200, 1800, 2000, 2000, 2000, 2000],
+    "vitamin_a": [600, 900, 1700, 2800, 3000, 3000, 3000, 3000],
+    "vitamin_e": [200, 300, 600, 800, 1000, 1000, 1000, 1000],
+    "folate": [300, 400, 600, 800, 1000, 1000, 1000, 1000],
+    "niacin": [10, 15, 20, 30, 35, 35, 35, 35],
+    "vitamin_b6": [30, 40, 60, 80, 100, 100, 100, 100],
+    "phosphorus": [3000, 3000, 4000, 4000, 4000, 4000, 4000, 3000],
+    "selenium": [90, 150, 280, 400, 400, 400, 400, 400],
+    "copper": [1, 3, 5, 8, 10, 10, 10, 10],
+    "manganese": [2, 3, 6, 9, 11, 11, 11, 11],
+    "molybdenum": [300, 600, 1100, 1700, 2000, 2000, 2000, 2000],
+    "iodine": [200, 300, 600, 900, 1100, 1100, 1100, 1100],
+    "chloride": [2300, 2900, 3400, 3600, 3600, 3600, 3600, 3600],
+    "choline": [1000, 1000, 2000, 3000, 3500, 3500, 3500, 3500],
+}
+
+# mg per kg of body weight per day
+AMINO_ACIDS_PER_KG = {
+    "histidine": [15, 12, 12, 11, 10, 10, 10, 10],
+    "isoleucine": [27, 23, 22, 21, 20, 20, 20, 20],
+    "leucine": [54, 44, 44, 42, 39, 39, 39, 39],
+    "lysine": [45, 35, 35, 33, 30, 30, 30, 30],
+    "methionine": [15.4, 12.6, 11.9, 11.2, 10.4, 10.4, 10.4, 10.4],
+    "cysteine": [6.6, 5.4, 5.1, 4.8, 4.1, 4.1, 4.1, 4.1],
+    "threonine": [23, 18, 18, 17, 15, 15, 15, 15],
+    "tryptophan": [6.4, 4.8, 4.8, 4.5, 4, 4, 4, 4],
+    "valine": [36, 29, 29, 28, 26, 26, 26, 26],
+}
+
+# DRI reference body weights in kg, used when a person's weight is not given
+REFERENCE_WEIGHT_KG = ([12, 20, 36, 61, 70, 70, 70, 70], [12, 20, 37, 54, 57, 57, 57, 57])
+
+
+class IntakeError(ValueError):
+    """Invalid gap analysis request"""
+
+
+def _by_group(table):
+    """(sexes * age bands, micronutrients) matrix from a {nutrient: values} table, NaN where unset"""
+    matrix = np.full((len(SEXES) * len(AGE_BANDS), len(MICRONUTRIENTS)), np.nan)
+    for column, name in enumerate(MICRONUTRIENTS):
+        values = table.get(name)
+        if values is None:
+            continue
+        male, female = values if isinstance(values, tuple) else (values, values)
+        matrix[:len(AGE_BANDS), column] = male
+        matrix[len(AGE_BANDS):, column] = female
+    return matrix
+
+
+if NUMPY_AVAILABLE:
+    RECOMMENDED_BY_GROUP = _by_group(RECOMMENDED)
+    UPPER_LIMITS_BY_GROUP = _by_group(UPPER_LIMITS)
+    PER_KG_BY_GROUP = _by_group(AMINO_ACIDS_PER_KG)
+    REFERENCE_WEIGHTS = np.array(REFERENCE_WEIGHT_KG[0] + REFERENCE_WEIGHT_KG[1], dtype=float)
+    # Micronutrients with a reference in every group, in MICRONUTRIENTS order
+    HAS_REFERENCE = ~np.isnan(RECOMMENDED_BY_GROUP).all(axis=0) | ~np.isnan(PER_KG_BY_GROUP).all(axis=0)
+REFERENCED = [name for name in MICRONUTRIENTS if name in RECOMMENDED or name in AMINO_ACIDS_PER_KG]
+NO_REFERENCE = [name for name in MICRONUTRIENTS if name not in REFERENCED]
+_FIRST_MICRO = len(MACRONUTRIENTS)
+
+
+def group_index(age, sex):
+    """Row of the reference tables for an age in years and a sex"""
+    sex_name = SEX_ALIASES.get(str(sex).strip().lower()) if sex is not None else None
+    if sex_name is None:
+        raise IntakeError(f"sex must be 'male' or 'female', got {sex!r}")
+    if not isinstance(age, (int, float)) or isinstance(age, bool) or not math.isfinite(age) or age < 1:
+        raise IntakeError(f"age must be a number of years, at least 1, got {age!r}")
+    band = next(i for i, (_, last) in enumerate(AGE_BANDS) if last is None or age < last + 1)
+    return SEXES.index(sex_name) * len(AGE_BANDS) + band
+
+
+def group_name(index):
+    first, last = AGE_BANDS[index % len(AGE_BANDS)]
+    return f"{SEXES[index // len(AGE_BANDS)]} {first}-{last}" if last else f"{SEXES[index // len(AGE_BANDS)]} {first}+"
+
+
+def reference_intakes(groups, weights_kg=None):
+    """(recommended, upper limit) matrices, people x referenced micronutrients, NaN where no UL"""
+    groups = np.asarray(groups, dtype=np.intp)
+    weights = REFERENCE_WEIGHTS[groups] if weights_kg is None else np.asarray(weights_kg, dtype=float)
+    recommended = RECOMMENDED_BY_GROUP[groups]
+    recommended = np.where(np.isnan(recommended), PER_KG_BY_GROUP[groups] * weights[:, None], recommended)
+    return recommended[:, HAS_REFERENCE], UPPER_LIMITS_BY_GROUP[groups][:, HAS_REFERENCE]
+
+
+def gap_arrays(intakes, groups, weights_kg=None):
+    """%DV, deficits and excesses for a people x micronutrients (MICRONUTRIENTS order) daily intake matrix
+
+    Returns three people x REFERENCED matrices: intake as a percentage of
+    the recommended intake, the amount short of it (0 when met) and the
+    amount above the UL (0 when under it or without a UL).
+    """
+    intakes = np.asarray(intakes, dtype=float)[:, HAS_REFERENCE]
+    recommended, upper = reference_intakes(groups, weights_kg)
+    percent = intakes / recommended * 100
+    deficit = np.maximum(recommended - intakes, 0)
+    excess = np.nan_to_num(np.maximum(intakes - upper, 0), nan=0.0)
+    return percent, deficit, excess
+
+
+def _intake_vector(person, index):
+    if isinstance(person.get('nutrition'), dict):
+        try:
+            return flatten_nutrition(person['nutrition'])[_FIRST_MICRO:]
+        except NutritionError as e:
+            raise IntakeError(f"Person {index}: invalid nutrition: {e}")
+    vector = person.get('vector')
+    if isinstance(vector, list) and len(vector) in (len(NUTRIENT_FIELDS), len(MICRONUTRIENTS)):
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in vector):
+            raise IntakeError(f"Person {index}: vector must contain only numbers")
+        # Ranges are checked all at once when the matrix is built
+        return vector[-len(MICRONUTRIENTS):]
+    raise IntakeError(f"Person {index} needs a nutrition object or a vector of "
+                      f"{len(NUTRIENT_FIELDS)} (all nutrients) or {len(MICRONUTRIENTS)} (micronutrients) values")
+
+
+def parse_people(people):
+    """(intakes per day, group indices, weights in kg) arrays for a list of people"""
+    if not isinstance(people, list) or not people:
+        raise IntakeError("people must be a non-empty list")
+    if len(people) > MAX_PEOPLE:
+        raise IntakeError(f"At most {MAX_PEOPLE} people per request")
+    intakes, groups, weights, days = [], [], [], []
+    for index, person in enumerate(people):
+        if not isinstance(person, dict):
+            raise IntakeError(f"Person {index} must be an object")
+        group = group_index(person.get('age'), person.get('sex'))
+        weight = person.get('weight_kg')
+        if weight is not None and (not isinstance(weight, (int, float)) or isinstance(weight, bool)
+                                   or not math.isfinite(weight) or weight <= 0):
+            raise IntakeError(f"Person {index}: weight_kg must be a positive number")
+        period_days = person.get('days', 1)
+        if (not isinstance(period_days, (int, float)) or isinstance(period_days, bool)
+                or not math.isfinite(period_days) or period_days <= 0):
+            raise IntakeError(f"Person {index}: days must be a positive number")
+        intakes.append(_intake_vector(person, index))
+        groups.append(group)
+        weights.append(weight or REFERENCE_WEIGHTS[group])
+        days.append(period_days)
+    try:
+        with np.errstate(over='ignore'):
+            intakes = np.array(intakes, dtype=float) / np.asarray(days, dtype=float)[:, None]
+    except OverflowError:
+        raise IntakeError("Intakes must be non-negative numbers")
+    if not np.isfinite(intakes).all() or (intakes < 0).any():
+        raise IntakeError("Intakes must be non-negative numbers")
+    return intakes, np.asarray(groups, dtype=np.intp), np.asarray(weights, dtype=float)
+
+
+_REFERENCED_NAMES = np.array(REFERENCED) if NUMPY_AVAILABLE else None
+
+
+def _nonzero_by_row(matrix):
+    """{nutrient: value} of the non-zero entries of each row, from one pass over the matrix"""
+    rows = [{} for _ in range(len(matrix))]
+    people, columns = np.nonzero(matrix)
+    for person, name, value in zip(people.tolist(), _REFERENCED_NAMES[columns].tolist(), matrix[people, columns].tolist()):
+        rows[person][name] = value
+    return rows
+
+
+def intake_gaps(people, digits=1):
+    """Per-person %DV, deficits and excesses plus a cohort summary for an /nutrition/gaps request"""
+    intakes, groups, weights = parse_people(people)
+    percent, deficit, excess = gap_arrays(intakes, groups, weights)
+
+    percent_rows = np.round(percent, digits).tolist()
+    deficits = _nonzero_by_row(np.round(deficit, digits + 1))
+    excesses = _nonzero_by_row(np.round(excess, digits + 1))
+    results = [{
+        "user_id": person.get('user_id'),
+        "group": group_name(group),
+        "percent_dv": dict(zip(REFERENCED, row)),
+        "deficits": short,
+        "excesses": over,
+    } for person, group, row, short, over in zip(people, groups.tolist(), percent_rows, deficits, excesses)]
+
+    cohort = {
+        "people": len(people),
+        "below_reference": dict(zip(REFERENCED, (deficit > 0).sum(axis=0).tolist())),
+        "above_upper_limit": dict(zip(REFERENCED, (excess > 0).sum(axis=0).tolist())),
+        "median_percent_dv": dict(zip(REFERENCED, np.round(np.median(percent, axis=0), digits).tolist())),
+    }
+    return {
+        "results": results,
+        "cohort": cohort,
+        "units": {name: NUTRIENT_UNITS[name] for name in REFERENCED},
+        "no_reference": NO_REFERENCE,
+    }
@@ -0,0 +1,400 @@
+"""
+Asynchronous analysis jobs on a persistent SQLite queue
+
+POST /jobs/analyze_food stores the image and returns a job id at once; a
+small pool of worker threads claims queued jobs oldest first, runs the
+analysis and records the result, and clients poll GET /jobs/{id} or give a
+callback_url that receives the finished job as a JSON POST. Jobs survive a
+restart: anything still marked running is requeued on startup, as are
+callbacks that were never delivered.
+
+Results are de-duplicated by the sha256 of the decoded image. A retried
+upload of a photo whose result is still cached finishes immediately, and
+jobs queued behind a running job with the same digest are completed from
+its result instead of calling the recognizer again.
+
+Callback hosts must resolve to public addresses only, checked when the job
+is submitted and again before every delivery attempt (DNS can change in
+between), and redirects are not followed. Private, loopback, link-local and
+reserved addresses are refused unless JOB_CALLBACK_ALLOW lists them.
+"""
+
+import hashlib
+import ipaddress
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from urllib.parse import urlsplit
+
+from allten.core.pipeline import AnalysisError, decode_image
+from allten.sqlite_db import ThreadConnections
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 24 * 3600))
+JOB_CALLBACK_TIMEOUT = float(os.environ.get('JOB_CALLBACK_TIMEOUT', 10))
+JOB_CALLBACK_ATTEMPTS = int(os.environ.get('JOB_CALLBACK_ATTEMPTS', 3))
+# Comma-separated hosts or networks callbacks may reach even though they are not public
+JOB_CALLBACK_ALLOW = os.environ.get('JOB_CALLBACK_ALLOW', '')
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class JobError(ValueError):
+    """Invalid job submission"""
+
+
+def parse_allowlist(text):
+    """(networks, host names) from comma-separated entries such as 10.0.0.0/8 or hooks.internal"""
+    networks, hosts = [], set()
+    for entry in str(text or '').split(','):
+        entry = entry.strip().lower()
+        if not entry:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            hosts.add(entry)
+    return networks, frozenset(hosts)
+
+
+def check_callback_url(url, allow=((), frozenset())):
+    """Raise JobError unless url is http(s) and its host only resolves to public or allowed addresses"""
+    parts = urlsplit(str(url))
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise JobError("callback_url must be an http or https URL")
+    networks, hosts = allow
+    host = parts.hostname.lower()
+    if host in hosts:
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (OSError, ValueError, UnicodeError):
+        raise JobError(f"callback_url host {host!r} cannot be resolved")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if (ip.is_global and not ip.is_multicast) or any(ip in network for network in networks):
+            continue
+        raise JobError(f"callback_url host {host!r} resolves to a non-public address ({ip})")
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        # A redirect could point anywhere, including the addresses check_callback_url refuses
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirects)
+
+
+class JobQueue:
+    """SQLite-backed job store with its own worker and callback threads"""
+
+    def __init__(self, path, analyze, workers=JOB_WORKERS, cache_result=None, name='jobs',
+                 callback_allow=JOB_CALLBACK_ALLOW):
+        # analyze(image_data) -> result dict; cache_result(result) -> whether a
+        # later job with the same image may reuse it (default: always)
+        self.path = path
+        self.analyze = analyze
+        self.cache_result = cache_result or (lambda result: True)
+        self.name = name
+        self.callback_allow = parse_allowlist(callback_allow)
+        self._connections = ThreadConnections(path)
+        self._wakeup = threading.Condition()
+        self._callbacks = queue.SimpleQueue()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0, "retried": 0,
+            "callbacks_delivered": 0, "callbacks_failed": 0, "runs": 0, "run_ms_total": 0.0
+        }
+
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                status TEXT NOT NULL,
+                image TEXT,
+                callback_url TEXT,
+                callback_status TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_digest ON jobs (digest);
+            CREATE TABLE IF NOT EXISTS job_results (
+                digest TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        with self._write() as conn:
+            # Interrupted by a restart: run again
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ? WHERE status = ?", (QUEUED, RUNNING)).rowcount
+            pending = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND callback_url IS NOT NULL "
+                "AND callback_status IS NULL", (DONE, FAILED)).fetchall()
+        if requeued:
+            print(f"♻️ Requeued {requeued} interrupted analysis jobs")
+        for row in pending:
+            self._callbacks.put(row['id'])
+
+        self._workers = [threading.Thread(target=self._run, name=f'{name}-worker-{i}', daemon=True)
+                         for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+        threading.Thread(target=self._deliver_callbacks, name=f'{name}-callbacks', daemon=True).start()
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _write(self):
+        return self._connections.transaction()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def submit(self, image_data, callback_url=None):
+        """Queue an analysis and return the job; raises AnalysisError or JobError for a bad request"""
+        digest = hashlib.sha256(decode_image(image_data)).hexdigest()
+        if callback_url is not None:
+            check_callback_url(callback_url, self.callback_allow)
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._write() as conn:
+            cached = conn.execute(
+                "SELECT 1 FROM job_results WHERE digest = ? AND created_at >= ?",
+                (digest, now - JOB_RESULT_TTL)).fetchone()
+            if cached:
+                conn.execute(
+                    "INSERT INTO jobs (id, digest, status, callback_url, created_at, started_at, finished_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", (job_id, digest, DONE, callback_url, now, now, now))
+            else:
+                conn.execute(
+                    "INSERT INTO jobs (id, digest, status, image, callback_url, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (job_id, digest, QUEUED, image_data, callback_url, now))
+
+        self._count("submitted")
+        if cached:
+            self._count("deduplicated")
+            if callback_url:
+                self._callbacks.put(job_id)
+        else:
+            with self._wakeup:
+                self._wakeup.notify()
+        return self.get(job_id)
+
+    def result(self, digest):
+        """Cached result for an image digest, or None"""
+        row = self._connection().execute(
+            "SELECT result FROM job_results WHERE digest = ? AND created_at >= ?",
+            (digest, time.time() - JOB_RESULT_TTL)).fetchone()
+        return json.loads(row['result']) if row else None
+
+    def invalidate_results(self, predicate):
+        """Stop reusing stored results matching predicate(result) for new jobs; returns how many"""
+        cutoff = time.time() - JOB_RESULT_TTL
+        rows = self._connection().execute(
+            "SELECT digest, result FROM job_results WHERE created_at >= ?", (cutoff,)).fetchall()
+        stale = [(row['digest'],) for row in rows if predicate(json.loads(row['result']))]
+        if stale:
+            with self._write() as conn:
+                # Same as an uncacheable result: existing jobs still return it
+                conn.executemany("UPDATE job_results SET created_at = 0 WHERE digest = ?", stale)
+        return len(stale)
+
+    def get(self, job_id):
+        """The job as returned by GET /jobs/{id}, or None"""
+        row = self._connection().execute(
+            "SELECT jobs.*, job_results.result FROM jobs "
+            "LEFT JOIN job_results ON jobs.status = ? AND job_results.digest = jobs.digest "
+            "WHERE jobs.id = ?", (DONE, job_id)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "job_id": row['id'],
+            "status": row['status'],
+            "image_sha256": row['digest'],
+            "created_at": row['created_at'],
+            "started_at": row['started_at'],
+            "finished_at": row['finished_at'],
+            "attempts": row['attempts'],
+        }
+        if row['status'] == DONE:
+            job["result"] = json.loads(row['result']) if row['result'] else None
+        if row['status'] == FAILED:
+            job["error"] = row['error']
+        if row['callback_url']:
+            job["callback"] = {"url": row['callback_url'], "status": row['callback_status'] or "pending"}
+        return job
+
+    def _claim(self):
+        """Mark the oldest runnable job running; jobs sharing a running job's digest wait for its result"""
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT id, digest, image FROM jobs WHERE status = ? AND digest NOT IN "
+                "(SELECT digest FROM jobs WHERE status = ?) ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING)).fetchone()
+            if row is None:
+                return None
+            cached = conn.execute(
+                "SELECT 1 FROM job_results WHERE digest = ? AND created_at >= ?",
+                (row['digest'], time.time() - JOB_RESULT_TTL)).fetchone()
+            if cached:
+                # Completed by an earlier job with the same image while this one was queued
+                callbacks = self._finish(conn, row['digest'], DONE)
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, time.time(), row['id']))
+        if not cached:
+            return row['id'], row['digest'], row['image']
+        self._queue_callbacks(callbacks)
+        return self._claim()
+
+    def _finish(self, conn, digest, status, error=None):
+        """Close every queued or running job for digest; returns the ids whose callbacks are due
+
+        Queue them with _queue_callbacks once the transaction has committed:
+        the callback thread reads the job on its own connection.
+        """
+        now = time.time()
+        rows = conn.execute(
+            "SELECT id, status, callback_url FROM jobs WHERE digest = ? AND status IN (?, ?)",
+            (digest, QUEUED, RUNNING)).fetchall()
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, image = NULL, finished_at = ?, "
+            "started_at = COALESCE(started_at, ?) WHERE digest = ? AND status IN (?, ?)",
+            (status, error, now, now, digest, QUEUED, RUNNING))
+        followers = sum(1 for row in rows if row['status'] == QUEUED)
+        if followers:
+            self._count("deduplicated", followers)
+        self._count("completed" if status == DONE else "failed", len(rows))
+        return [row['id'] for row in rows if row['callback_url']]
+
+    def _queue_callbacks(self, job_ids):
+        for job_id in job_ids:
+            self._callbacks.put(job_id)
+
+    def _run(self):
+        while True:
+            claimed = self._claim()
+            if claimed is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+            job_id, digest, image_data = claimed
+            start = time.perf_counter()
+            try:
+                result = self.analyze(image_data)
+            except AnalysisError as e:
+                with self._write() as conn:
+                    callbacks = self._finish(conn, digest, FAILED, e.message)
+                self._queue_callbacks(callbacks)
+                continue
+            except Exception as e:
+                print(f"❌ Analysis job {job_id} failed: {e}")
+                self._retry_or_fail(job_id, digest, str(e))
+                continue
+            finally:
+                self._count("runs")
+                self._count("run_ms_total", (time.perf_counter() - start) * 1000)
+
+            with self._write() as conn:
+                conn.execute(
+                    "INSERT INTO job_results (digest, result, created_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (digest) DO UPDATE SET result = excluded.result, created_at = excluded.created_at",
+                    (digest, json.dumps(result), time.time()))
+                callbacks = self._finish(conn, digest, DONE)
+                if not self.cache_result(result):
+                    # Delivered to this digest's jobs, but later uploads are analysed again
+                    conn.execute("UPDATE job_results SET created_at = 0 WHERE digest = ?", (digest,))
+            self._queue_callbacks(callbacks)
+            self._prune()
+
+    def _retry_or_fail(self, job_id, digest, error):
+        callbacks = []
+        with self._write() as conn:
+            attempts = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()['attempts']
+            if attempts < JOB_MAX_ATTEMPTS:
+                conn.execute("UPDATE jobs SET status = ?, error = ? WHERE id = ?", (QUEUED, error, job_id))
+                self._count("retried")
+            else:
+                callbacks = self._finish(conn, digest, FAILED, error)
+        self._queue_callbacks(callbacks)
+
+    def _prune(self):
+        """Drop results and finished jobs older than JOB_RESULT_TTL"""
+        cutoff = time.time() - JOB_RESULT_TTL
+        with self._write() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ? "
+                "AND (callback_url IS NULL OR callback_status IS NOT NULL)", (DONE, FAILED, cutoff))
+            conn.execute(
+                "DELETE FROM job_results WHERE created_at < ? AND digest NOT IN "
+                "(SELECT digest FROM jobs WHERE status = ?)", (cutoff, DONE))
+
+    def _deliver_callbacks(self):
+        while True:
+            job_id = self._callbacks.get()
+            job = self.get(job_id)
+            if job is None or 'callback' not in job:
+                continue
+            status = self._post(job['callback']['url'], job)
+            self._connection().execute("UPDATE jobs SET callback_status = ? WHERE id = ?", (status, job_id))
+            self._count("callbacks_delivered" if status == 'delivered' else "callbacks_failed")
+
+    def _post(self, url, job):
+        """POST the finished job to its callback URL with retries; 'delivered' or the last error"""
+        body = json.dumps(job).encode('utf-8')
+        error = None
+        for attempt in range(JOB_CALLBACK_ATTEMPTS):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+            try:
+                check_callback_url(url, self.callback_allow)
+            except JobError as e:
+                error = str(e)
+                break
+            request = urllib.request.Request(url, data=body, method='POST',
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                with _callback_opener.open(request, timeout=JOB_CALLBACK_TIMEOUT) as response:
+                    response.read()
+                return 'delivered'
+            except urllib.error.HTTPError as e:
+                error = f"HTTP {e.code}"
+                if e.code < 500:
+                    break
+            except (OSError, ValueError) as e:
+                error = str(e)
+        print(f"⚠️ Callback for job {job['job_id']} failed: {error}")
+        return f"failed: {error}"
+
+    def stats(self):
+        counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+        for row in self._connection().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row['status']] = row['n']
+        with self._stats_lock:
+            stats = dict(self._stats)
+        run_ms_total = stats.pop("run_ms_total")
+        stats["mean_run_ms"] = round(run_ms_total / stats["runs"], 2) if stats["runs"] else None
+        stats["workers"] = len(self._workers)
+        stats["jobs"] = counts
+        return stats
+
+
+def default_jobs_path():
+    return os.environ.get('JOBS_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jobs.db'))
@@ -0,0 +1,217 @@
+"""
+HTTP/1.1 persistent connections for the http.server based apps
+
+Handlers keep writing responses the usual way (send_response, send_header,
+end_headers, wfile.write). KeepAliveHandlerMixin buffers each response and
+sends the headers only once the body is complete, so every response,
+including errors and 404s, carries an exact Content-Length and the
+connection can be reused; streamed responses are sent with chunked
+encoding through send_chunked instead. Request bodies (with a
+Content-Length or chunked) that a handler did not read are drained so the
+next, possibly pipelined, request starts at the right byte.
+"""
+
+import io
+import os
+import threading
+from http import HTTPStatus
+
+from allten.ingest import ChunkedReader
+
+IDLE_TIMEOUT = float(os.environ.get('HTTP_IDLE_TIMEOUT', 15))
+MAX_REQUESTS_PER_CONNECTION = int(os.environ.get('HTTP_MAX_REQUESTS_PER_CONNECTION', 100))
+# Unread request bodies up to this size are drained; larger ones close the connection instead
+MAX_DRAIN_BYTES = 64 * 1024
+
+_stats_lock = threading.Lock()
+_stats = {"connections": 0, "requests": 0, "idle_timeouts": 0, "max_requests_reached": 0}
+
+
+def connection_stats():
+    """Counters for /metrics: connections, requests and how often connections are reused"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["requests_per_connection"] = round(stats["requests"] / stats["connections"], 2) if stats["connections"] else 0
+    return stats
+
+
+def count_connection_event(name):
+    """Add one to a connection counter (other transports report into the same /metrics block)"""
+    with _stats_lock:
+        _stats[name] += 1
+
+
+class _RequestBody:
+    """Request stream limited to the declared Content-Length"""
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.rfile.readline(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def drain(self, limit):
+        """Discard what the handler left unread; False if that is too much or the client went away"""
+        if self.remaining > limit:
+            return False
+        while self.remaining:
+            if not self.read(min(self.remaining, 65536)):
+                return False
+        return True
+
+
+class KeepAliveHandlerMixin:
+    """Mix in before BaseHTTPRequestHandler to serve HTTP/1.1 keep-alive connections"""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = IDLE_TIMEOUT  # socket timeout, so idle connections are closed
+    disable_nagle_algorithm = True  # TCP_NODELAY: small responses go out without waiting
+    max_requests = MAX_REQUESTS_PER_CONNECTION
+
+    def setup(self):
+        super().setup()
+        self.requests_on_connection = 0
+        count_connection_event("connections")
+
+    def handle_one_request(self):
+        socket_rfile, socket_wfile = self.rfile, self.wfile
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except (TimeoutError, ConnectionError):
+            # Idle keep-alive connection timed out or was dropped by the client
+            count_connection_event("idle_timeouts")
+            self.close_connection = True
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+
+        self.requests_on_connection += 1
+        count_connection_event("requests")
+        self._socket_wfile = socket_wfile
+        self._sent_length = False
+        self._sent_connection = False
+        self.wfile = io.BytesIO()
+        try:
+            self._dispatch()
+            if self.rfile is not socket_rfile and not self.rfile.drain(MAX_DRAIN_BYTES):
+                self.close_connection = True
+        except (TimeoutError, ConnectionError) as e:
+            self.log_error("Request timed out: %r", e)
+            self.close_connection = True
+            return
+        finally:
+            self.rfile = socket_rfile
+            body, self.wfile = self.wfile.getvalue(), socket_wfile
+        self._send_buffered(body)
+
+    def _dispatch(self):
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(HTTPStatus.REQUEST_URI_TOO_LONG)
+            return
+        if not self.parse_request():
+            return
+
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.rfile = ChunkedReader(self.rfile)
+        else:
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.send_error(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+                return
+            self.rfile = _RequestBody(self.rfile, length)
+
+        method = getattr(self, 'do_' + self.command, None)
+        if method is None:
+            self.send_error(HTTPStatus.NOT_IMPLEMENTED, "Unsupported method (%r)" % self.command)
+            return
+        method()
+
+    def send_header(self, keyword, value):
+        name = keyword.lower()
+        if name == 'content-length':
+            self._sent_length = True
+        elif name == 'connection':
+            self._sent_connection = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        # Held back until the body is complete; _send_buffered writes headers and body together
+        pass
+
+    def handle_expect_100(self):
+        self._socket_wfile.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        self._socket_wfile.flush()
+        return True
+
+    def _send_buffered(self, body):
+        headers = getattr(self, '_headers_buffer', None)
+        if not headers:
+            if body:
+                self.wfile.write(body)
+            self.wfile.flush()
+            return
+
+        if not self._sent_length:
+            super().send_header('Content-Length', str(len(body)))
+        self._send_connection_headers()
+
+        headers.append(b"\r\n")
+        self.wfile.write(b"".join(headers) + body)
+        self._headers_buffer = []
+        self.wfile.flush()
+
+    def _send_connection_headers(self):
+        if self.requests_on_connection >= self.max_requests and not self.close_connection:
+            count_connection_event("max_requests_reached")
+            self.close_connection = True
+        if not self._sent_connection:
+            if self.close_connection:
+                super().send_header('Connection', 'close')
+            else:
+                super().send_header('Connection', 'keep-alive')
+                remaining = self.max_requests - self.requests_on_connection
+                super().send_header('Keep-Alive', f'timeout={int(self.timeout)}, max={remaining}')
+
+    def send_chunked(self, chunks):
+        """Send the headers now and then each chunk as it is produced (chunked encoding)
+
+        Call after send_response/send_header instead of writing a body. For
+        HTTP/1.0 clients the chunks are buffered into one ordinary response.
+        """
+        if self.request_version != 'HTTP/1.1':
+            for chunk in chunks:
+                self.wfile.write(chunk)
+            return
+        super().send_header('Transfer-Encoding', 'chunked')
+        self._sent_length = True
+        self._send_connection_headers()
+        self._headers_buffer.append(b"\r\n")
+        wfile = self._socket_wfile
+        wfile.write(b"".join(self._headers_buffer))
+        self._headers_buffer = []
+        wfile.flush()
+        for chunk in chunks:
+            if chunk:
+                wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                wfile.flush()
+        wfile.write(b"0\r\n\r\n")
+        wfile.flush()
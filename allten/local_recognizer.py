@@ -0,0 +1,171 @@
+"""
+On-box CPU food classifier
+
+Runs a small (ideally int8-quantized) ONNX image classifier with ONNX Runtime,
+pinned to the CPU execution provider. The model is loaded once per process.
+Its classes are listed one per line in a labels file next to the model and
+must be FOOD_DATABASE keys, so predictions feed straight into the nutrition
+lookup without any mapping step.
+"""
+
+import io
+import os
+import threading
+import time
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'food_classifier.onnx')
+DEFAULT_INPUT_SIZE = 224
+
+# ImageNet normalisation used by the usual MobileNet/EfficientNet exports
+IMAGE_MEAN = (0.485, 0.456, 0.406)
+IMAGE_STD = (0.229, 0.224, 0.225)
+
+
+def default_labels_path(model_path):
+    return os.path.splitext(model_path)[0] + '.labels.txt'
+
+
+class LocalFoodClassifier:
+    """ONNX Runtime image classifier restricted to the CPU"""
+
+    def __init__(self, model_path, labels_path=None, num_threads=0, known_foods=None):
+        start = time.perf_counter()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads  # 0 lets ONNX Runtime use all physical cores
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        shape = model_input.shape  # NCHW, symbolic dims come back as strings
+        self.input_size = shape[2] if isinstance(shape[2], int) else DEFAULT_INPUT_SIZE
+        self.supports_batching = not isinstance(shape[0], int) or shape[0] != 1
+
+        with open(labels_path or default_labels_path(model_path)) as labels_file:
+            self.classes = [line.strip() for line in labels_file if line.strip()]
+        if known_foods is not None:
+            unknown = [name for name in self.classes if name not in known_foods]
+            if unknown:
+                raise ValueError(f"Model classes are not FOOD_DATABASE keys: {unknown}")
+
+        self._mean = np.array(IMAGE_MEAN, dtype=np.float32).reshape(3, 1, 1)
+        self._std = np.array(IMAGE_STD, dtype=np.float32).reshape(3, 1, 1)
+
+        self._stats_lock = threading.Lock()
+        self.images = 0
+        self.batches = 0
+        self.inference_seconds_total = 0.0
+        self.model_path = model_path
+        self.load_seconds = time.perf_counter() - start
+
+        # Run one inference so the first real request does not pay for lazy allocations
+        self._run(np.zeros((1, 3, self.input_size, self.input_size), dtype=np.float32))
+
+    def preprocess(self, image_bytes):
+        """Decode and normalise one image to a (3, size, size) float32 array"""
+        image = Image.open(io.BytesIO(image_bytes))
+        image.draft('RGB', (self.input_size, self.input_size))
+        image = image.convert('RGB').resize((self.input_size, self.input_size), Image.BILINEAR)
+        pixels = np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return (pixels - self._mean) / self._std
+
+    def _run(self, batch):
+        logits = self.session.run(None, {self.input_name: batch})[0]
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict_batch(self, images_bytes, top_k=3):
+        """Top-k (food, score) predictions for each image, in input order"""
+        start = time.perf_counter()
+        batch = np.stack([self.preprocess(image_bytes) for image_bytes in images_bytes])
+        if self.supports_batching:
+            probabilities = self._run(batch)
+        else:
+            probabilities = np.concatenate([self._run(batch[i:i + 1]) for i in range(len(batch))])
+
+        results = []
+        for row in probabilities:
+            best = np.argsort(row)[::-1][:top_k]
+            results.append([(self.classes[i], float(row[i])) for i in best])
+
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.images += len(images_bytes)
+            self.batches += 1
+            self.inference_seconds_total += elapsed
+        return results
+
+    def predict(self, image_bytes, top_k=3):
+        return self.predict_batch([image_bytes], top_k=top_k)[0]
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "model_path": self.model_path,
+                "classes": len(self.classes),
+                "input_size": self.input_size,
+                "load_ms": round(self.load_seconds * 1000, 2),
+                "images": self.images,
+                "batches": self.batches,
+                "avg_ms_per_image": round(self.inference_seconds_total / self.images * 1000, 3) if self.images else 0.0,
+            }
+
+
+_classifier = None
+_load_attempted = False
+_load_lock = threading.Lock()
+
+
+def load_local_classifier(known_foods=None):
+    """Process-wide classifier, loaded on first call; None when no model or runtime is available"""
+    global _classifier, _load_attempted
+
+    with _load_lock:
+        if _load_attempted:
+            return _classifier
+        _load_attempted = True
+
+        if not (NUMPY_AVAILABLE and ONNXRUNTIME_AVAILABLE and PIL_AVAILABLE):
+            print("⚠️ Local food model disabled (needs numpy, onnxruntime and Pillow)")
+            return None
+
+        model_path = os.environ.get('LOCAL_MODEL_PATH', DEFAULT_MODEL_PATH)
+        if not os.path.exists(model_path):
+            print(f"⚠️ No local food model found at {model_path}")
+            return None
+
+        try:
+            _classifier = LocalFoodClassifier(
+                model_path,
+                labels_path=os.environ.get('LOCAL_MODEL_LABELS'),
+                num_threads=int(os.environ.get('LOCAL_MODEL_THREADS', 0)),
+                known_foods=set(known_foods) if known_foods is not None else None
+            )
+            print(f"✅ Local food model loaded in {_classifier.load_seconds * 1000:.0f} ms ({len(_classifier.classes)} classes)")
+        except Exception as e:
+            print(f"❌ Failed to load local food model: {e}")
+            _classifier = None
+
+    return _classifier
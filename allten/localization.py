@@ -0,0 +1,169 @@
+"""
+Object localization fan-out for plates with several foods
+
+With VISION_MODE=objects, one Vision annotate call asks for object
+localization and labels together. Each localized item is cropped out of
+the photo and the crops are labelled in batches (by the local model
+through its micro-batcher, or by one Vision batch request per
+OBJECT_BATCH_SIZE crops) on a small shared pool, so a busy plate costs a
+few parallel round trips rather than one per item. Whatever has not come
+back by the deadline keeps the name object localization gave it.
+
+Each item's bounding box area, as a share of the frame, replaces the
+random portion guess: a box covering OBJECT_REFERENCE_AREA of the photo is
+one serving, and portions scale linearly from there within
+[MIN_PORTION, MAX_PORTION].
+"""
+
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+OBJECT_MAX_ITEMS = int(os.environ.get('OBJECT_MAX_ITEMS', 6))
+OBJECT_MIN_SCORE = float(os.environ.get('OBJECT_MIN_SCORE', 0.5))
+OBJECT_CONCURRENCY = int(os.environ.get('OBJECT_CONCURRENCY', 4))
+OBJECT_BATCH_SIZE = int(os.environ.get('OBJECT_BATCH_SIZE', 4))
+OBJECT_DEADLINE_MS = float(os.environ.get('OBJECT_DEADLINE_MS', 1500))
+OBJECT_REFERENCE_AREA = float(os.environ.get('OBJECT_REFERENCE_AREA', 0.25))
+MIN_PORTION = 0.5
+MAX_PORTION = 2.0
+# Crops keep a little context around the box and are sent at this size at most
+CROP_PADDING = 0.05
+CROP_MAX_SIDE = 512
+
+# name: object localization's name, lower case; box: normalized (x0, y0, x1, y1)
+Region = namedtuple('Region', 'name score box area')
+
+
+def localized_regions(objects, min_score=OBJECT_MIN_SCORE, max_items=OBJECT_MAX_ITEMS):
+    """The largest confident Regions from Vision localized_object_annotations, plates and trays left out"""
+    regions = []
+    for obj in objects:
+        if obj.score < min_score:
+            continue
+        xs = [vertex.x for vertex in obj.bounding_poly.normalized_vertices]
+        ys = [vertex.y for vertex in obj.bounding_poly.normalized_vertices]
+        if not xs:
+            continue
+        box = (max(0.0, min(xs)), max(0.0, min(ys)), min(1.0, max(xs)), min(1.0, max(ys)))
+        area = (box[2] - box[0]) * (box[3] - box[1])
+        if area > 0:
+            regions.append(Region(obj.name.lower(), obj.score, box, area))
+    regions = drop_containers(regions)
+    regions.sort(key=lambda region: region.area, reverse=True)
+    return regions[:max_items]
+
+
+def drop_containers(regions):
+    """Regions without the centres of two or more other regions inside them (a plate around its food)"""
+    centres = [((r.box[0] + r.box[2]) / 2, (r.box[1] + r.box[3]) / 2) for r in regions]
+    kept = []
+    for i, region in enumerate(regions):
+        x0, y0, x1, y1 = region.box
+        inside = sum(x0 <= x <= x1 and y0 <= y <= y1 for j, (x, y) in enumerate(centres) if j != i)
+        if inside < 2:
+            kept.append(region)
+    return kept
+
+
+def area_portion(area, reference=OBJECT_REFERENCE_AREA):
+    """Servings for an item whose box covers area (0-1) of the photo"""
+    return round(min(MAX_PORTION, max(MIN_PORTION, area / reference)), 3)
+
+
+def crop_regions(image_bytes, regions):
+    """JPEG bytes for each region's padded box; None for all of them without Pillow or a readable image"""
+    if not PIL_AVAILABLE:
+        return [None] * len(regions)
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image = image.convert('RGB')
+    except Exception:
+        return [None] * len(regions)
+    width, height = image.size
+    crops = []
+    for region in regions:
+        x0, y0, x1, y1 = region.box
+        box = (int(max(0.0, x0 - CROP_PADDING) * width), int(max(0.0, y0 - CROP_PADDING) * height),
+               int(min(1.0, x1 + CROP_PADDING) * width), int(min(1.0, y1 + CROP_PADDING) * height))
+        if box[2] <= box[0] or box[3] <= box[1]:
+            crops.append(None)
+            continue
+        crop = image.crop(box)
+        crop.thumbnail((CROP_MAX_SIDE, CROP_MAX_SIDE))
+        out = io.BytesIO()
+        crop.save(out, format='JPEG', quality=90)
+        crops.append(out.getvalue())
+    return crops
+
+
+class ObjectFanout:
+    """Labels crops in parallel batches on a shared, capped pool, giving up at a deadline"""
+
+    def __init__(self, label_batch, batch_size=OBJECT_BATCH_SIZE, concurrency=OBJECT_CONCURRENCY,
+                 deadline_ms=OBJECT_DEADLINE_MS, name='object-fanout'):
+        # label_batch(list of crop bytes) -> list of label lists, one per crop
+        self.label_batch = label_batch
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.deadline = max(0.0, deadline_ms) / 1000.0
+        # Every request shares these workers, so a burst of busy plates
+        # queues here instead of multiplying calls to the recognizer
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._stats = {"fanouts": 0, "crops": 0, "batches": 0, "timed_out": 0, "failed": 0, "seconds": 0.0}
+
+    def resolve(self, crops):
+        """Label lists for each crop, None where the crop is missing, failed or missed the deadline"""
+        start = time.perf_counter()
+        results = [None] * len(crops)
+        indices = [i for i, crop in enumerate(crops) if crop is not None]
+        chunks = [indices[i:i + self.batch_size] for i in range(0, len(indices), self.batch_size)]
+        futures = {self._pool.submit(self.label_batch, [crops[i] for i in chunk]): chunk for chunk in chunks}
+        done, pending = wait(futures, timeout=self.deadline)
+
+        failed = timed_out = 0
+        for future in pending:
+            future.cancel()
+            timed_out += len(futures[future])
+        for future in done:
+            try:
+                labels = future.result()
+            except Exception:
+                failed += len(futures[future])
+                continue
+            for i, crop_labels in zip(futures[future], labels):
+                results[i] = list(crop_labels)
+
+        with self._lock:
+            self._stats["fanouts"] += 1
+            self._stats["crops"] += len(indices)
+            self._stats["batches"] += len(chunks)
+            self._stats["timed_out"] += timed_out
+            self._stats["failed"] += failed
+            self._stats["seconds"] += time.perf_counter() - start
+        return results
+
+    def stats(self):
+        with self._lock:
+            fanouts = self._stats["fanouts"]
+            return {
+                "fanouts": fanouts,
+                "crops": self._stats["crops"],
+                "batches": self._stats["batches"],
+                "timed_out": self._stats["timed_out"],
+                "failed": self._stats["failed"],
+                "mean_ms": round(self._stats["seconds"] * 1000 / fanouts, 3) if fanouts else 0.0,
+                "concurrency": self.concurrency,
+                "batch_size": self.batch_size,
+                "deadline_ms": self.deadline * 1000,
+            }
@@ -0,0 +1,241 @@
+"""
+Meal log with incremental daily and weekly nutrient rollups
+
+Meals are stored in SQLite (WAL mode, so dashboard reads never block
+writers). Every insert or delete adjusts a per-user rollup row for the
+meal's day and ISO week in the same transaction, so a summary is a single
+primary-key lookup no matter how long the user's history is.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from allten.core.encoding import nutrition_json
+from allten.nutrients import NUTRIENT_FIELDS, NutritionError, flatten_nutrition, unflatten_nutrition
+from allten.sqlite_db import ThreadConnections
+
+PERIODS = ('day', 'week')
+
+_COLUMNS = ", ".join(NUTRIENT_FIELDS)
+_PLACEHOLDERS = ", ".join("?" for _ in NUTRIENT_FIELDS)
+_COLUMN_DEFS = ", ".join(f"{name} REAL NOT NULL DEFAULT 0" for name in NUTRIENT_FIELDS)
+
+
+class MealLogError(ValueError):
+    """Invalid meal or summary request"""
+
+
+def period_keys(dt):
+    """Rollup keys for a timestamp: ('2024-05-06', '2024-W19')"""
+    iso_year, iso_week, _ = dt.isocalendar()
+    return dt.date().isoformat(), f"{iso_year}-W{iso_week:02d}"
+
+
+def parse_logged_at(value):
+    """Meal time from an epoch number or ISO-8601 string; the local date of an offset-aware string is kept"""
+    if value is None:
+        return datetime.now(timezone.utc)
+    if isinstance(value, bool):
+        raise MealLogError(f"Invalid logged_at: {value!r}")
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise MealLogError(f"logged_at out of range: {value!r}")
+    if not isinstance(value, str):
+        raise MealLogError(f"Invalid logged_at: {value!r}")
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise MealLogError(f"Invalid logged_at: {value!r}")
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class MealLog:
+    """SQLite-backed meal store; safe to share between request threads"""
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = ThreadConnections(path)
+        self._connection().executescript(f"""
+            CREATE TABLE IF NOT EXISTS meals (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                logged_at REAL NOT NULL,
+                day TEXT NOT NULL,
+                week TEXT NOT NULL,
+                detected_foods TEXT NOT NULL,
+                {_COLUMN_DEFS}
+            );
+            CREATE INDEX IF NOT EXISTS meals_user_time ON meals (user_id, logged_at);
+            CREATE TABLE IF NOT EXISTS rollups (
+                user_id TEXT NOT NULL,
+                period TEXT NOT NULL,
+                period_key TEXT NOT NULL,
+                meal_count INTEGER NOT NULL,
+                {_COLUMN_DEFS},
+                PRIMARY KEY (user_id, period, period_key)
+            ) WITHOUT ROWID;
+        """)
+
+    def _connection(self):
+        return self._connections.get()
+
+    def _write(self):
+        return self._connections.transaction()
+
+    def _prepare(self, user_id, meal):
+        if not user_id or not isinstance(user_id, str):
+            raise MealLogError("user_id is required")
+        if not isinstance(meal, dict):
+            raise MealLogError("Each meal must be an object")
+        nutrition = meal.get('nutrition')
+        if not isinstance(nutrition, dict):
+            raise MealLogError("Each meal needs a nutrition object")
+        detected_foods = meal.get('detected_foods', [])
+        if not isinstance(detected_foods, list) or not all(isinstance(food, str) for food in detected_foods):
+            raise MealLogError("detected_foods must be a list of names")
+        dt = parse_logged_at(meal.get('logged_at'))
+        day, week = period_keys(dt)
+        try:
+            values = flatten_nutrition(nutrition)
+        except NutritionError as e:
+            raise MealLogError(f"Invalid nutrition: {e}")
+        row = (user_id, dt.timestamp(), day, week, json.dumps(detected_foods), *values)
+        return row, day, week, values
+
+    def add_meal(self, user_id, meal):
+        """Log one meal and return its id"""
+        return self.add_meals(user_id, [meal])[0]
+
+    def add_meals(self, user_id, meals):
+        """Bulk insert: one transaction, rollup deltas pre-aggregated per period"""
+        if not isinstance(meals, list):
+            raise MealLogError("meals must be a list")
+        prepared = [self._prepare(user_id, meal) for meal in meals]
+
+        deltas = {}
+        for _, day, week, values in prepared:
+            for key in (('day', day), ('week', week)):
+                count, totals = deltas.get(key, (0, [0.0] * len(NUTRIENT_FIELDS)))
+                deltas[key] = (count + 1, [a + b for a, b in zip(totals, values)])
+
+        with self._write() as conn:
+            ids = []
+            for row, _, _, _ in prepared:
+                cursor = conn.execute(
+                    f"INSERT INTO meals (user_id, logged_at, day, week, detected_foods, {_COLUMNS}) "
+                    f"VALUES (?, ?, ?, ?, ?, {_PLACEHOLDERS})", row)
+                ids.append(cursor.lastrowid)
+            self._apply_deltas(conn, user_id, deltas, sign=1)
+        return ids
+
+    def delete_meal(self, user_id, meal_id):
+        """Remove a meal and subtract it from its rollups; False if it does not exist"""
+        with self._write() as conn:
+            row = conn.execute(
+                f"SELECT day, week, {_COLUMNS} FROM meals WHERE id = ? AND user_id = ?",
+                (meal_id, user_id)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
+            values = [row[name] for name in NUTRIENT_FIELDS]
+            deltas = {('day', row['day']): (1, values), ('week', row['week']): (1, values)}
+            self._apply_deltas(conn, user_id, deltas, sign=-1)
+        return True
+
+    def _apply_deltas(self, conn, user_id, deltas, sign):
+        updates = ", ".join(f"{name} = {name} + excluded.{name}" for name in NUTRIENT_FIELDS)
+        conn.executemany(
+            f"INSERT INTO rollups (user_id, period, period_key, meal_count, {_COLUMNS}) "
+            f"VALUES (?, ?, ?, ?, {_PLACEHOLDERS}) "
+            f"ON CONFLICT (user_id, period, period_key) DO UPDATE SET "
+            f"meal_count = meal_count + excluded.meal_count, {updates}",
+            [(user_id, period, period_key, sign * count, *(sign * value for value in totals))
+             for (period, period_key), (count, totals) in deltas.items()])
+        if sign < 0:
+            conn.execute("DELETE FROM rollups WHERE user_id = ? AND meal_count <= 0", (user_id,))
+
+    def summary(self, user_id, period='day', date=None):
+        """Totals for the day or ISO week containing date (default: today, UTC)"""
+        if period not in PERIODS:
+            raise MealLogError("period must be 'day' or 'week'")
+        dt = parse_logged_at(date) if date else datetime.now(timezone.utc)
+        day, week = period_keys(dt)
+        period_key = day if period == 'day' else week
+
+        row = self._connection().execute(
+            f"SELECT meal_count, {_COLUMNS} FROM rollups WHERE user_id = ? AND period = ? AND period_key = ?",
+            (user_id, period, period_key)).fetchone()
+
+        values = [row[name] for name in NUTRIENT_FIELDS] if row else [0.0] * len(NUTRIENT_FIELDS)
+        return {
+            "user_id": user_id,
+            "period": period,
+            "period_key": period_key,
+            "meal_count": row['meal_count'] if row else 0,
+            "nutrition": unflatten_nutrition(values, digits=2),
+        }
+
+    def list_meals(self, user_id, limit=50, encoded=False):
+        """Most recent meals first; encoded=True formats nutrition with nutrition_json for a response body"""
+        nutrition = (lambda values: nutrition_json(values, digits=2)) if encoded else (
+            lambda values: unflatten_nutrition(values, digits=2))
+        rows = self._connection().execute(
+            f"SELECT id, logged_at, detected_foods, {_COLUMNS} FROM meals "
+            f"WHERE user_id = ? ORDER BY logged_at DESC LIMIT ?", (user_id, limit)).fetchall()
+        return [{
+            "id": row['id'],
+            "logged_at": datetime.fromtimestamp(row['logged_at'], timezone.utc).isoformat(),
+            "detected_foods": json.loads(row['detected_foods']),
+            "nutrition": nutrition([row[name] for name in NUTRIENT_FIELDS]),
+        } for row in rows]
+
+    def meals_by_id(self, meal_ids, encoded=False):
+        """{id: meal} for the given ids that exist, shaped like list_meals entries"""
+        nutrition = (lambda values: nutrition_json(values, digits=2)) if encoded else (
+            lambda values: unflatten_nutrition(values, digits=2))
+        meal_ids = [int(meal_id) for meal_id in meal_ids]
+        if not meal_ids:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT id, logged_at, detected_foods, {_COLUMNS} FROM meals "
+            f"WHERE id IN ({', '.join('?' for _ in meal_ids)})", meal_ids).fetchall()
+        return {row['id']: {
+            "id": row['id'],
+            "logged_at": datetime.fromtimestamp(row['logged_at'], timezone.utc).isoformat(),
+            "detected_foods": json.loads(row['detected_foods']),
+            "nutrition": nutrition([row[name] for name in NUTRIENT_FIELDS]),
+        } for row in rows}
+
+    def meal_vector(self, user_id, meal_id):
+        """NUTRIENT_FIELDS values of one of the user's meals, or None"""
+        row = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM meals WHERE id = ? AND user_id = ?", (meal_id, user_id)).fetchone()
+        return [row[name] for name in NUTRIENT_FIELDS] if row else None
+
+    def iter_vectors(self, user_id=None, after_id=0, limit=None, chunk_size=50000):
+        """Chunks of (id, *NUTRIENT_FIELDS values) rows: every meal after after_id, or a user's most recent"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            if user_id is not None:
+                cursor = conn.execute(
+                    f"SELECT id, {_COLUMNS} FROM meals WHERE user_id = ? ORDER BY logged_at DESC LIMIT ?",
+                    (user_id, limit if limit is not None else -1))
+            else:
+                cursor = conn.execute(
+                    f"SELECT id, {_COLUMNS} FROM meals WHERE id > ? ORDER BY id LIMIT ?",
+                    (after_id, limit if limit is not None else -1))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+
+def default_meal_log_path():
+    return os.environ.get('MEAL_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'meals.db'))
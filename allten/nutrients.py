@@ -0,0 +1,96 @@
+"""
+Canonical nutrient schema shared by every response builder
+
+A nutrition block is the nested dict returned by /analyze_food:
+the macro fields at the top level plus a "micronutrients" dict.
+Storage and vector math use the flat NUTRIENT_FIELDS order instead.
+"""
+
+MACRONUTRIENTS = [
+    "calories", "protein", "carbs", "fat", "fiber", "sugar", "sodium",
+]
+
+MICRONUTRIENTS = [
+    "iron", "calcium", "vitamin_c", "potassium", "vitamin_a", "vitamin_e",
+    "vitamin_k", "folate", "niacin", "riboflavin", "thiamin", "vitamin_b6",
+    "phosphorus", "selenium", "copper", "manganese", "chromium", "molybdenum",
+    "iodine", "chloride", "biotin", "pantothenic_acid", "choline", "betaine",
+    "taurine", "creatine", "carnitine", "inositol", "paba", "lipoic_acid",
+    "coq10", "glutathione", "melatonin", "serotonin", "dopamine",
+    "norepinephrine", "epinephrine", "histamine", "gaba", "glycine", "proline",
+    "serine", "threonine", "tryptophan", "tyrosine", "valine", "alanine",
+    "arginine", "asparagine", "aspartic_acid", "cysteine", "glutamine",
+    "glutamic_acid", "isoleucine", "leucine", "lysine", "methionine",
+    "phenylalanine", "histidine",
+]
+
+NUTRIENT_FIELDS = MACRONUTRIENTS + MICRONUTRIENTS
+FIELD_INDEX = {name: i for i, name in enumerate(NUTRIENT_FIELDS)}
+
+# Far beyond any food; keeps rollups and vector sums finite
+MAX_NUTRIENT_AMOUNT = 1e9
+
+
+class NutritionError(ValueError):
+    """Nutrition block that is not an object of non-negative numbers"""
+
+
+def nutrient_amount(value, name):
+    """A client-supplied nutrient value as a float (None is 0); raises NutritionError"""
+    if value is None:
+        return 0.0
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise NutritionError(f"{name} must be a number")
+    # Also false for NaN and infinity
+    if not 0 <= value <= MAX_NUTRIENT_AMOUNT:
+        raise NutritionError(f"{name} must be between 0 and {MAX_NUTRIENT_AMOUNT:g}")
+    return float(value)
+
+
+def flatten_nutrition(nutrition):
+    """Nested nutrition block -> list of floats in NUTRIENT_FIELDS order (missing fields are 0)"""
+    if not isinstance(nutrition, dict):
+        raise NutritionError("nutrition must be an object")
+    micronutrients = nutrition.get("micronutrients") or {}
+    if not isinstance(micronutrients, dict):
+        raise NutritionError("micronutrients must be an object")
+    values = [nutrient_amount(nutrition.get(name), name) for name in MACRONUTRIENTS]
+    values.extend(nutrient_amount(micronutrients.get(name), name) for name in MICRONUTRIENTS)
+    return values
+
+
+def unflatten_nutrition(values, digits=None):
+    """List of floats in NUTRIENT_FIELDS order -> nested nutrition block"""
+    if digits is not None:
+        values = [round(value, digits) for value in values]
+    macro_count = len(MACRONUTRIENTS)
+    nutrition = dict(zip(MACRONUTRIENTS, values[:macro_count]))
+    nutrition["micronutrients"] = dict(zip(MICRONUTRIENTS, values[macro_count:]))
+    return nutrition
+
+
+# Units every nutrient is reported in (per serving in responses, per 100 g in the catalogue)
+NUTRIENT_UNITS = {
+    "calories": "kcal", "protein": "g", "carbs": "g", "fat": "g", "fiber": "g", "sugar": "g", "sodium": "mg",
+    "iron": "mg", "calcium": "mg", "vitamin_c": "mg", "potassium": "mg", "vitamin_a": "ug", "vitamin_e": "mg",
+    "vitamin_k": "ug", "folate": "ug", "niacin": "mg", "riboflavin": "mg", "thiamin": "mg", "vitamin_b6": "mg",
+    "phosphorus": "mg", "selenium": "ug", "copper": "mg", "manganese": "mg", "chromium": "ug", "molybdenum": "ug",
+    "iodine": "ug", "chloride": "mg", "biotin": "ug", "pantothenic_acid": "mg", "choline": "mg", "betaine": "mg",
+}
+# Everything else (conditionally essential nutrients, neurotransmitters and amino acids) is in mg
+for _name in MICRONUTRIENTS:
+    NUTRIENT_UNITS.setdefault(_name, "mg")
+
+_MASS_IN_GRAMS = {"g": 1.0, "mg": 1e-3, "ug": 1e-6, "mcg": 1e-6, "µg": 1e-6}
+_ENERGY_IN_KCAL = {"kcal": 1.0, "kj": 1 / 4.184}
+
+
+def unit_factor(from_unit, to_unit):
+    """Multiplier converting a value from one unit to another, or None if they are not comparable"""
+    from_unit, to_unit = from_unit.strip().lower(), to_unit.strip().lower()
+    if from_unit == to_unit:
+        return 1.0
+    for table in (_MASS_IN_GRAMS, _ENERGY_IN_KCAL):
+        if from_unit in table and to_unit in table:
+            return table[from_unit] / table[to_unit]
+    return None
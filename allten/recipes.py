@@ -0,0 +1,198 @@
+"""
+Recipe nutrition from ingredient quantities
+
+Every known food has a per-gram density vector in NUTRIENT_FIELDS order.
+A batch of recipes is a sparse quantity matrix (recipes x foods, in grams)
+kept in CSR form: one flat list of ingredient lines plus the offset where
+each recipe starts. Totals are its product with the density matrix: the
+density rows of the referenced foods are gathered once, scaled by grams and
+summed per recipe with np.add.reduceat, so the cost depends on the number
+of ingredient lines and not on the size of the catalogue.
+"""
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from allten.core.encoding import nutrition_json
+from allten.nutrients import NUTRIENT_FIELDS, FIELD_INDEX, flatten_nutrition, unflatten_nutrition
+
+MAX_RECIPES = 1000
+MAX_INGREDIENTS = 200
+MAX_SERVINGS = 10000
+# Per ingredient line, after unit conversion (a tonne); keeps totals finite
+MAX_GRAMS = 1e6
+
+# Grams per unit; volumes assume the density of water
+UNIT_GRAMS = {
+    'g': 1.0, 'gram': 1.0, 'grams': 1.0,
+    'kg': 1000.0, 'mg': 0.001,
+    'oz': 28.3495, 'lb': 453.592,
+    'ml': 1.0, 'l': 1000.0,
+    'cup': 240.0, 'cups': 240.0,
+    'tbsp': 15.0, 'tsp': 5.0,
+}
+# Units measured in servings of the ingredient itself
+SERVING_UNITS = {'serving', 'servings', 'piece', 'pieces', 'each', 'whole'}
+
+
+class RecipeError(ValueError):
+    """Invalid recipe or unknown ingredient"""
+
+
+def _number(value):
+    # Comparisons are false for NaN, so a NaN never passes the range checks below
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class RecipeCalculator:
+    """Totals and per-serving nutrition for recipes over the built-in tables and the catalogue"""
+
+    def __init__(self, food_database, vision_food_ranges, serving_grams, catalog=None):
+        self.catalog = catalog
+        self.builtin_ids = []
+        self.builtin_serving = []
+        densities = []
+
+        for food_id, nutrition in food_database.items():
+            grams = serving_grams[food_id]
+            densities.append([value / grams for value in flatten_nutrition(nutrition)])
+            self.builtin_ids.append(food_id)
+            self.builtin_serving.append(grams)
+        for food_id, ranges in vision_food_ranges.items():
+            if food_id in food_database:
+                continue
+            # Only macro ranges are known for these; use the middle of each range
+            grams = serving_grams[food_id]
+            vector = [0.0] * len(NUTRIENT_FIELDS)
+            for name, (low, high) in ranges.items():
+                vector[FIELD_INDEX[name]] = (low + high) / 2 / grams
+            densities.append(vector)
+            self.builtin_ids.append(food_id)
+            self.builtin_serving.append(grams)
+
+        self.builtin_row = {food_id: row for row, food_id in enumerate(self.builtin_ids)}
+        self.builtin_densities = np.array(densities) if NUMPY_AVAILABLE else densities
+
+    def _resolve(self, food_id):
+        """(table, row, serving grams) for a food id, or None"""
+        row = self.builtin_row.get(food_id)
+        if row is not None:
+            return 'builtin', row, self.builtin_serving[row]
+        if self.catalog is not None:
+            row = self.catalog.row_of.get(food_id)
+            if row is not None:
+                return 'catalog', row, self.catalog.serving_grams[row]
+        return None
+
+    def _parse(self, recipe, index):
+        if not isinstance(recipe, dict) or not isinstance(recipe.get('ingredients'), list):
+            raise RecipeError(f"Recipe {index} needs an ingredients list")
+        ingredients = recipe['ingredients']
+        if not ingredients:
+            raise RecipeError(f"Recipe {index} has no ingredients")
+        if len(ingredients) > MAX_INGREDIENTS:
+            raise RecipeError(f"Recipe {index} has more than {MAX_INGREDIENTS} ingredients")
+        servings = recipe.get('servings', 1)
+        if not _number(servings) or not 0 < servings <= MAX_SERVINGS:
+            raise RecipeError(f"Recipe {index}: servings must be a positive number")
+
+        lines = []
+        for item in ingredients:
+            if not isinstance(item, dict):
+                raise RecipeError(f"Recipe {index}: each ingredient must be an object")
+            food_id = item.get('id')
+            if not isinstance(food_id, str):
+                raise RecipeError(f"Recipe {index}: each ingredient needs a string id")
+            resolved = self._resolve(food_id)
+            if resolved is None:
+                raise RecipeError(f"Unknown ingredient id: {food_id!r}")
+            table, row, serving = resolved
+            quantity = item.get('quantity', 1)
+            if not _number(quantity) or not 0 <= quantity <= MAX_GRAMS:
+                raise RecipeError(f"Ingredient {food_id!r}: quantity must be a non-negative number")
+            unit = str(item.get('unit', 'g')).strip().lower()
+            if unit in SERVING_UNITS:
+                grams = quantity * serving
+            elif unit in UNIT_GRAMS:
+                grams = quantity * UNIT_GRAMS[unit]
+            else:
+                raise RecipeError(f"Ingredient {food_id!r}: unknown unit {unit!r}")
+            if grams > MAX_GRAMS:
+                raise RecipeError(f"Ingredient {food_id!r}: more than {MAX_GRAMS:g} g")
+            lines.append((food_id, table, row, grams))
+        return recipe.get('name'), servings, lines
+
+    def compute(self, recipes, digits=2, encoded=False):
+        """Nutrition for a list of recipes ({"ingredients": [{"id", "quantity", "unit"}], "servings"})
+
+        With encoded=True the nutrition blocks come from nutrition_json, for
+        a response body encoded with dumps().
+        """
+        if not isinstance(recipes, list) or not recipes:
+            raise RecipeError("recipes must be a non-empty list")
+        if len(recipes) > MAX_RECIPES:
+            raise RecipeError(f"At most {MAX_RECIPES} recipes per request")
+        parsed = [self._parse(recipe, index) for index, recipe in enumerate(recipes)]
+
+        # CSR layout of the quantity matrix
+        lines = [line for _, _, recipe_lines in parsed for line in recipe_lines]
+        starts = []
+        offset = 0
+        for _, _, recipe_lines in parsed:
+            starts.append(offset)
+            offset += len(recipe_lines)
+
+        totals = self._product(lines, starts)
+        servings = [recipe_servings for _, recipe_servings, _ in parsed]
+        if NUMPY_AVAILABLE:
+            per_serving = np.round(totals / np.array(servings, dtype=float)[:, None], digits).tolist()
+            totals = np.round(totals, digits).tolist()
+        else:
+            per_serving = [[round(value / count, digits) for value in total] for total, count in zip(totals, servings)]
+            totals = [[round(value, digits) for value in total] for total in totals]
+
+        nutrition = nutrition_json if encoded else unflatten_nutrition
+        results = []
+        for (name, count, recipe_lines), total, serving in zip(parsed, totals, per_serving):
+            results.append({
+                "name": name,
+                "servings": count,
+                "total_grams": round(sum(line[3] for line in recipe_lines), 1),
+                "ingredients": [{"id": food_id, "grams": round(grams, 1)} for food_id, _, _, grams in recipe_lines],
+                "total": nutrition(total),
+                "per_serving": nutrition(serving),
+            })
+        return results
+
+    def _product(self, lines, starts):
+        """Quantity matrix x density matrix: one row of totals per recipe"""
+        if not NUMPY_AVAILABLE:
+            totals = []
+            ends = starts[1:] + [len(lines)]
+            for start, end in zip(starts, ends):
+                total = [0.0] * len(NUTRIENT_FIELDS)
+                for _, table, row, grams in lines[start:end]:
+                    for i, density in enumerate(self._density(table, row)):
+                        total[i] += density * grams
+                totals.append(total)
+            return totals
+
+        grams = np.array([line[3] for line in lines])
+        from_catalog = np.array([line[1] == 'catalog' for line in lines])
+        rows = np.array([line[2] for line in lines])
+
+        densities = np.empty((len(lines), len(NUTRIENT_FIELDS)))
+        densities[~from_catalog] = self.builtin_densities[rows[~from_catalog]]
+        if from_catalog.any():
+            # Catalogue columns are per 100 g and stored one nutrient per column
+            densities[from_catalog] = self.catalog.columns[:, rows[from_catalog]].T / 100.0
+        return np.add.reduceat(densities * grams[:, None], starts, axis=0)
+
+    def _density(self, table, row):
+        if table == 'builtin':
+            return self.builtin_densities[row]
+        return [value / 100.0 for value in self.catalog.vector(self.catalog.ids[row])]
+
@@ -0,0 +1,203 @@
+"""
+Structured request and event logging off the request path
+
+Handlers no longer print: they hand a small dict to RequestLogger, which
+decides whether to keep it (per-route sampling, or only slow and failed
+requests) and puts it on a SimpleQueue. A background thread takes whatever
+has accumulated, encodes it as JSON lines and writes it with one call, so
+a request never waits on stdout and lines from concurrent requests never
+interleave. If the writer falls behind by more than max_pending records,
+new ones are dropped and counted instead of growing memory.
+
+Configured from the environment:
+
+    REQUEST_LOG              stdout (default), stderr, off, or a file path
+    REQUEST_LOG_SAMPLE_RATE  fraction of requests/events kept (default 1)
+    REQUEST_LOG_ROUTE_RATES  per-route overrides, e.g. "/health=0,/meals/{meal_id:int}=0.1"
+    REQUEST_LOG_SLOW_MS      only keep requests at least this slow (5xx are always kept)
+"""
+
+import atexit
+import itertools
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+def parse_rates(spec):
+    """{'/health': 0.0, ...} from "route=rate,route=rate" """
+    rates = {}
+    for item in (spec or '').split(','):
+        route, sep, rate = item.strip().rpartition('=')
+        if not sep or not route:
+            continue
+        try:
+            rates[route] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            print(f"⚠️ Ignoring request log sample rate {item!r}")
+    return rates
+
+
+class RequestLogger:
+    """Sampled JSON-lines log written by a background thread"""
+
+    def __init__(self, destination='stdout', sample_rate=1.0, route_rates=None, slow_ms=None,
+                 batch_size=512, max_pending=10000):
+        self.destination = destination
+        self.enabled = destination != 'off'
+        self.sample_rate = sample_rate
+        self.route_rates = dict(route_rates or {})
+        self.slow_ms = slow_ms
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+
+        self._queue = queue.SimpleQueue()
+        # itertools.count is advanced atomically, so producers never take a lock
+        self._dropped = itertools.count()
+        self._sampled_out = itertools.count()
+        self._written = 0
+        self._batches = 0
+        self._write_seconds = 0.0
+        self._writer = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        slow_ms = os.environ.get('REQUEST_LOG_SLOW_MS')
+        return cls(
+            destination=os.environ.get('REQUEST_LOG', 'stdout'),
+            sample_rate=float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 1.0)),
+            route_rates=parse_rates(os.environ.get('REQUEST_LOG_ROUTE_RATES')),
+            slow_ms=float(slow_ms) if slow_ms else None
+        )
+
+    def _keep(self, key):
+        rate = self.route_rates.get(key, self.sample_rate)
+        if rate >= 1.0 or (rate > 0.0 and random.random() < rate):
+            return True
+        next(self._sampled_out)
+        return False
+
+    def request(self, request, status, seconds, route=None, lane=None, error=None):
+        """Record one handled request (called by Router.dispatch)"""
+        if not self.enabled:
+            return
+        ms = seconds * 1000
+        if status < 500:
+            if self.slow_ms is not None and ms < self.slow_ms:
+                next(self._sampled_out)
+                return
+            if not self._keep(route or request.path):
+                return
+        record = {
+            "ts": time.time(),
+            "type": "request",
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": status,
+            "ms": round(ms, 2),
+            "lane": lane,
+            "client": request.client,
+        }
+        if error is not None:
+            record["error"] = error
+        self._put(record)
+
+    def event(self, name, level='info', **fields):
+        """Record something that happened while serving a request; errors are never sampled out"""
+        if not self.enabled:
+            return
+        if level != 'error' and (self.slow_ms is not None or not self._keep(name)):
+            # In slow-request mode only the slow requests themselves and errors are kept
+            if self.slow_ms is not None:
+                next(self._sampled_out)
+            return
+        self._put({"ts": time.time(), "type": "event", "event": name, "level": level, **fields})
+
+    def _put(self, record):
+        if self._queue.qsize() >= self.max_pending:
+            next(self._dropped)
+            return
+        if self._writer is None:
+            self._start()
+        self._queue.put(record)
+
+    def _start(self):
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _open(self):
+        if self.destination == 'stdout':
+            return sys.stdout, False
+        if self.destination == 'stderr':
+            return sys.stderr, False
+        return open(self.destination, 'a', encoding='utf-8', buffering=1 << 16), True
+
+    def _run(self):
+        stream, owned = self._open()
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = None in batch
+                if stop:
+                    del batch[batch.index(None):]
+                if batch:
+                    start = time.perf_counter()
+                    stream.write(''.join(json.dumps(record, default=str) + '\n' for record in batch))
+                    stream.flush()
+                    self._write_seconds += time.perf_counter() - start
+                    self._written += len(batch)
+                    self._batches += 1
+                if stop:
+                    return
+        finally:
+            if owned:
+                stream.close()
+
+    def close(self, timeout=2.0):
+        """Write out everything queued so far and stop the writer"""
+        writer = self._writer
+        if writer is not None and writer.is_alive():
+            self._queue.put(None)
+            writer.join(timeout)
+
+    def stats(self):
+        written, batches = self._written, self._batches
+        return {
+            "destination": self.destination,
+            "sample_rate": self.sample_rate,
+            "route_rates": self.route_rates,
+            "slow_ms": self.slow_ms,
+            "written": written,
+            "dropped": _peek(self._dropped),
+            "sampled_out": _peek(self._sampled_out),
+            "pending": self._queue.qsize(),
+            "batches": batches,
+            "mean_batch_size": round(written / batches, 1) if batches else 0.0,
+            "mean_write_ms": round(self._write_seconds / batches * 1000, 3) if batches else 0.0,
+        }
+
+
+def _peek(counter):
+    # Current value of an itertools.count without advancing it
+    return int(repr(counter)[6:-1])
+
+
+# Process-wide logger shared by the apps and the analysis core
+REQUEST_LOG = RequestLogger.from_env()
+
+
+def log_event(name, level='info', **fields):
+    REQUEST_LOG.event(name, level, **fields)
@@ -0,0 +1,140 @@
+"""
+Analysis results by image digest, for clients that ask before uploading
+
+Every analysed image is remembered by the sha256 of its decoded bytes (and
+its perceptual hash when Pillow is available). POST /analyze_food/by_digest
+sends just those hashes: a hit returns the earlier result without the
+upload, a miss tells the client to send the image. Re-synced galleries
+mostly contain photos the server has already seen, so most of their upload
+bytes and body parsing are skipped.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from allten.image_hash import BKTree
+
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+_PHASH = re.compile(r'^[0-9a-f]{16}$')
+
+
+def image_digest(image_bytes):
+    """The strong content hash clients send: sha256 of the decoded image bytes, hex"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def parse_digest(value):
+    """Lower-case sha256 hex, or None if value is not one"""
+    value = str(value or '').strip().lower()
+    return value if _SHA256.match(value) else None
+
+
+def parse_phash(value):
+    """64-bit perceptual hash from 16 hex digits, or None"""
+    value = str(value or '').strip().lower()
+    return int(value, 16) if _PHASH.match(value) else None
+
+
+class DigestResultCache:
+    """Thread-safe LRU of analysis results keyed by image sha256, with a near-duplicate index"""
+
+    def __init__(self, max_entries=10000, ttl=24 * 3600, max_distance=6, backing=None):
+        # backing(digest) -> result or None is asked on a miss (e.g. results persisted by the job queue)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.backing = backing
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> (result, stored_at, size, phash), least recent first
+        self._tree = BKTree()  # phash -> digest
+        self._stats = {"stored": 0, "lookups": 0, "sha256_hits": 0, "phash_hits": 0, "misses": 0,
+                       "invalidated": 0, "upload_bytes_avoided": 0}
+
+    def store(self, digest, result, size=0, phash=None):
+        with self._lock:
+            self._entries[digest] = (result, time.time(), size, phash)
+            self._entries.move_to_end(digest)
+            if phash is not None:
+                self._tree.add(phash, digest)
+            self._stats["stored"] += 1
+            if len(self._entries) > self.max_entries:
+                self._evict()
+
+    def lookup(self, digest, phash=None):
+        """(result, how) for an exact digest or a near-duplicate phash, or (None, None)
+
+        how is {"matched_by": "sha256"} or {"matched_by": "phash", "phash_distance": d}.
+        """
+        if self.backing is not None:
+            with self._lock:
+                known = self._get(digest) is not None
+            if not known:
+                result = self.backing(digest)
+                if result is not None:
+                    self.store(digest, result)
+        with self._lock:
+            self._stats["lookups"] += 1
+            found = self._get(digest)
+            how = {"matched_by": "sha256"}
+            if found is None and phash is not None:
+                # Expired entries stay in the tree until the next rebuild; look past them
+                nearest = self._tree.find_nearest(phash, self.max_distance, accept=self._is_live)
+                if nearest is not None:
+                    found = self._get(nearest[2])
+                    how = {"matched_by": "phash", "phash_distance": nearest[0]}
+            if found is None:
+                self._stats["misses"] += 1
+                return None, None
+            result, size = found
+            self._stats["sha256_hits" if how["matched_by"] == "sha256" else "phash_hits"] += 1
+            # The upload would have been base64 in JSON
+            self._stats["upload_bytes_avoided"] += (size + 2) // 3 * 4
+            return result, how
+
+    def _get(self, digest):
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        result, stored_at, size, _ = entry
+        if time.time() - stored_at > self.ttl:
+            return None
+        self._entries.move_to_end(digest)
+        return result, size
+
+    def _is_live(self, digest):
+        entry = self._entries.get(digest)
+        return entry is not None and time.time() - entry[1] <= self.ttl
+
+    def invalidate(self, predicate):
+        """Drop every entry whose result matches predicate(result); returns how many were dropped"""
+        with self._lock:
+            stale = [digest for digest, (result, _, _, _) in self._entries.items() if predicate(result)]
+            for digest in stale:
+                del self._entries[digest]
+            if stale:
+                self._rebuild_tree()
+            self._stats["invalidated"] += len(stale)
+        return len(stale)
+
+    def _evict(self):
+        # BK-trees do not support deletion, so drop the least recent quarter and rebuild
+        for _ in range(max(1, self.max_entries // 4)):
+            self._entries.popitem(last=False)
+        self._rebuild_tree()
+
+    def _rebuild_tree(self):
+        self._tree = BKTree()
+        for digest, (_, _, _, phash) in self._entries.items():
+            if phash is not None:
+                self._tree.add(phash, digest)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        hits = stats["sha256_hits"] + stats["phash_hits"]
+        stats["hit_rate"] = round(hits / stats["lookups"], 4) if stats["lookups"] else 0.0
+        return stats
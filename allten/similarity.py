@@ -0,0 +1,241 @@
+"""
+Nutrient-vector similarity: "meals like this" and food swaps
+
+Foods and meals are compared by their NUTRIENT_FIELDS vectors. Each
+nutrient is standardized (minus its mean, divided by its standard deviation
+over the indexed set) so sodium in mg does not drown out copper, and each
+vector is scaled to unit length; similarity is the dot product, i.e. the
+cosine similarity of the nutrient profiles. Weights multiply the query's
+nutrients, so a nutrient counts more (2), less (0.5) or not at all (0)
+without rebuilding anything.
+
+Up to EXACT_MAX_VECTORS vectors are searched exactly with one
+matrix-vector product. Larger sets get an inverted file (IVF) index:
+spherical k-means splits the vectors into about sqrt(n) clusters stored
+contiguously, and a query only scores the vectors of the nprobe clusters
+whose centroids score highest.
+
+Meals are only ever compared within one user's history: similar_meals()
+scans that user's most recent meals exactly.
+"""
+
+import math
+import os
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from allten.nutrients import (
+    FIELD_INDEX, MACRONUTRIENTS, MICRONUTRIENTS, NUTRIENT_FIELDS, NutritionError, flatten_nutrition
+)
+
+EXACT_MAX_VECTORS = int(os.environ.get('SIMILARITY_EXACT_MAX', 50000))
+SIMILARITY_NPROBE = int(os.environ.get('SIMILARITY_NPROBE', 16))
+MAX_K = 100
+# k-means trains on this many vectors per cluster, at most
+KMEANS_SAMPLE_PER_LIST = 32
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK = 65536
+# Meals compared within one user's history (most recent first)
+MAX_USER_MEALS = 10000
+WEIGHT_GROUPS = {'macronutrients': MACRONUTRIENTS, 'micronutrients': MICRONUTRIENTS}
+
+
+class SimilarityError(ValueError):
+    """Invalid similarity request"""
+
+
+def parse_weights(weights):
+    """Weight vector from {"protein": 2, ...} or "protein:2,sodium:0"; None for equal weights
+
+    "macronutrients" and "micronutrients" set a whole group, and single
+    nutrients override their group.
+    """
+    if weights is None or weights == '' or weights == {}:
+        return None
+    if isinstance(weights, str):
+        pairs = {}
+        for part in weights.split(','):
+            name, sep, value = part.partition(':')
+            if not sep:
+                raise SimilarityError(f"Weight {part!r} must look like nutrient:weight")
+            try:
+                pairs[name.strip()] = float(value)
+            except ValueError:
+                raise SimilarityError(f"Weight for {name.strip()!r} must be a number")
+        weights = pairs
+    if not isinstance(weights, dict):
+        raise SimilarityError("weights must be an object of nutrient: weight")
+
+    vector = np.ones(len(NUTRIENT_FIELDS), dtype=np.float32)
+    groups = [name for name in weights if name in WEIGHT_GROUPS]
+    for name in groups + [name for name in weights if name not in WEIGHT_GROUPS]:
+        value = weights[name]
+        if (not isinstance(value, (int, float)) or isinstance(value, bool)
+                or not math.isfinite(value) or value < 0):
+            raise SimilarityError(f"Weight for {name!r} must be a non-negative number")
+        if name in WEIGHT_GROUPS:
+            vector[[FIELD_INDEX[field] for field in WEIGHT_GROUPS[name]]] = value
+        elif name in FIELD_INDEX:
+            vector[FIELD_INDEX[name]] = value
+        else:
+            raise SimilarityError(f"Unknown nutrient in weights: {name!r}")
+    if not vector.any():
+        raise SimilarityError("At least one weight must be above 0")
+    return vector
+
+
+def nutrient_stats(vectors):
+    """(mean, standard deviation) per nutrient; constant nutrients get a deviation of 1"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not len(vectors):
+        return np.zeros(len(NUTRIENT_FIELDS), dtype=np.float32), np.ones(len(NUTRIENT_FIELDS), dtype=np.float32)
+    mean = vectors.mean(axis=0, dtype=np.float64)
+    std = vectors.std(axis=0, dtype=np.float64)
+    std[std < 1e-9] = 1.0
+    return mean.astype(np.float32), std.astype(np.float32)
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def _assign(data, centroids):
+    """Index of the highest scoring centroid for every row"""
+    assign = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), ASSIGN_CHUNK):
+        assign[start:start + ASSIGN_CHUNK] = np.argmax(data[start:start + ASSIGN_CHUNK] @ centroids.T, axis=1)
+    return assign
+
+
+def _kmeans(data, nlist, rng):
+    """Unit-length centroids of spherical k-means over a sample of data"""
+    sample = data[np.sort(rng.choice(len(data), min(len(data), nlist * KMEANS_SAMPLE_PER_LIST), replace=False))]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=nlist)
+        used = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[used])[:-1]))
+        centroids[used] = np.add.reduceat(sample[order], starts, axis=0)
+        # Empty clusters restart from random sample vectors
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        _unit_rows(centroids)
+    return centroids
+
+
+class VectorIndex:
+    """Top-k cosine search over standardized nutrient vectors, exact or IVF"""
+
+    def __init__(self, vectors, keys, stats=None, exact_max=EXACT_MAX_VECTORS, nlist=None, seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.mean, self.std = stats if stats is not None else nutrient_stats(vectors)
+        data = _unit_rows((vectors - self.mean) / self.std)
+        keys = list(keys)
+
+        self.centroids = self.offsets = None
+        if len(data) > exact_max:
+            nlist = nlist or max(1, int(math.sqrt(len(data))))
+            self.centroids = _kmeans(data, nlist, np.random.default_rng(seed))
+            assign = _assign(data, self.centroids)
+            order = np.argsort(assign, kind='stable')
+            data = data[order]
+            keys = [keys[i] for i in order]
+            self.offsets = np.searchsorted(assign[order], np.arange(nlist + 1))
+        self.data = data
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def method(self):
+        return 'exact' if self.centroids is None else 'ivf'
+
+    def query(self, vector, weights=None):
+        """Standardized, weighted unit query for a raw NUTRIENT_FIELDS vector"""
+        query = (np.asarray(vector, dtype=np.float32) - self.mean) / self.std
+        if weights is not None:
+            query = query * weights
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def search(self, vector, k=10, weights=None, exclude=(), exact=False, nprobe=None):
+        """[(key, similarity)] best first; exact=True scans everything even with an IVF index"""
+        return self.search_query(self.query(vector, weights), k, exclude, exact, nprobe)
+
+    def search_query(self, query, k=10, exclude=(), exact=False, nprobe=None):
+        if not len(self.keys):
+            return []
+        if self.centroids is None or exact:
+            scores = self.data @ query
+            positions = None
+        else:
+            nprobe = min(len(self.centroids), nprobe or SIMILARITY_NPROBE)
+            lists = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+            ranges = [(self.offsets[c], self.offsets[c + 1]) for c in lists if self.offsets[c + 1] > self.offsets[c]]
+            if not ranges:
+                return []
+            scores = np.concatenate([self.data[start:end] @ query for start, end in ranges])
+            positions = np.concatenate([np.arange(start, end) for start, end in ranges])
+
+        wanted = min(len(scores), k + len(exclude))
+        top = np.argpartition(scores, -wanted)[-wanted:]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        results = []
+        for i in top:
+            key = self.keys[i if positions is None else positions[i]]
+            if key not in exclude:
+                results.append((key, float(scores[i])))
+        return results[:k]
+
+
+def food_vector_index(recipes, catalog=None, **kwargs):
+    """VectorIndex over the built-in foods and the catalogue, per 100 g, keyed by food id"""
+    parts = [np.asarray(recipes.builtin_densities, dtype=np.float32).reshape(-1, len(NUTRIENT_FIELDS)) * 100]
+    keys = list(recipes.builtin_ids)
+    if catalog is not None and len(catalog):
+        parts.append(np.asarray(catalog.columns, dtype=np.float32).T)
+        keys += catalog.ids
+    return VectorIndex(np.concatenate(parts), keys, **kwargs)
+
+
+def nutrition_vector(nutrition):
+    """NUTRIENT_FIELDS vector of a posted nutrition block"""
+    try:
+        return flatten_nutrition(nutrition)
+    except NutritionError as e:
+        raise SimilarityError(f"Invalid nutrition: {e}")
+
+
+def food_vector(recipes, catalog, food_id):
+    """Per-100 g vector of a built-in or catalogue food, or None"""
+    row = recipes.builtin_row.get(food_id)
+    if row is not None:
+        return [value * 100 for value in recipes.builtin_densities[row]]
+    return catalog.vector(food_id) if catalog is not None else None
+
+
+def _stack(chunks):
+    ids, vectors = [], []
+    for rows in chunks:
+        block = np.asarray(rows, dtype=np.float64)
+        ids.append(block[:, 0].astype(np.int64))
+        vectors.append(block[:, 1:].astype(np.float32))
+    if not ids:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, len(NUTRIENT_FIELDS)), dtype=np.float32)
+    return np.concatenate(ids), np.concatenate(vectors)
+
+
+def nearest_meals(meal_log, user_id, vector, k=10, weights=None, exclude=()):
+    """[(meal_id, similarity)] best first among one user's most recent meals"""
+    ids, vectors = _stack(meal_log.iter_vectors(user_id=user_id, limit=MAX_USER_MEALS))
+    return VectorIndex(vectors, ids.tolist(), exact_max=len(ids)).search(vector, k, weights, exclude)
@@ -0,0 +1,48 @@
+"""
+Per-thread SQLite connections and write transactions
+
+sqlite3 connections cannot be shared between threads, so each store keeps
+one connection per thread, in autocommit mode with WAL journaling so reads
+never block the writer. Writes go through Transaction, which takes the
+write lock up front (BEGIN IMMEDIATE) instead of failing on upgrade.
+"""
+
+import sqlite3
+import threading
+
+
+class ThreadConnections:
+    """One lazily opened connection to path per thread, with rows as sqlite3.Row"""
+
+    def __init__(self, path, timeout=10):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        return Transaction(self.get())
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a thread's connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
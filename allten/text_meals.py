@@ -0,0 +1,209 @@
+"""
+Nutrition from typed meal descriptions
+
+"2 eggs, toast with butter and an apple" is split into items on commas,
+"and", "with" and the like; each item's leading (or trailing) quantity and
+unit are parsed, and the rest is resolved to foods through the food search
+index's names and aliases: the whole phrase, then the phrase without a
+plural ending, then the longest known names inside it ("scrambled eggs on
+toast" is eggs and toast), then a fuzzy match for typos. Totals come from
+RecipeCalculator, with every description of a batch computed in one
+matrix product. Nothing touches an image or the network, and phrase
+resolution is memoized per set of tables.
+"""
+
+import functools
+import re
+
+from allten.core.encoding import nutrition_json
+from allten.food_search import normalize
+from allten.nutrients import NUTRIENT_FIELDS, unflatten_nutrition
+
+MAX_TEXT_LENGTH = 2000
+MAX_TEXTS = 1000
+# Longest run of words tried as one food name inside a phrase
+MAX_NAME_WORDS = 4
+FUZZY_MIN_SIMILARITY = 0.5
+TEXT_METHOD = "All Ten Text Parser"
+
+# Spoken quantities
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'dozen': 12, 'couple': 2,
+    'half': 0.5, 'quarter': 0.25,
+}
+FRACTIONS = {'½': 0.5, '¼': 0.25, '¾': 0.75, '⅓': 1 / 3, '⅔': 2 / 3}
+
+# Units people type -> RecipeCalculator units; countable containers are servings of the food
+UNITS = {
+    'g': 'g', 'gr': 'g', 'gram': 'g', 'grams': 'g', 'kg': 'kg', 'kilo': 'kg', 'kilos': 'kg', 'mg': 'mg',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz', 'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'ml': 'ml', 'l': 'l', 'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'cup': 'cup', 'cups': 'cup', 'glass': 'cup', 'glasses': 'cup', 'mug': 'cup', 'mugs': 'cup',
+    'tbsp': 'tbsp', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tsp': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'serving': 'serving', 'servings': 'serving', 'portion': 'serving', 'portions': 'serving',
+    'piece': 'serving', 'pieces': 'serving', 'slice': 'serving', 'slices': 'serving',
+    'bowl': 'serving', 'bowls': 'serving', 'plate': 'serving', 'plates': 'serving',
+    'handful': 'serving', 'handfuls': 'serving',
+}
+# Words that never name a food, dropped before fuzzy matching and from unmatched text
+FILLER = {'a', 'an', 'the', 'of', 'some', 'my', 'bit', 'little', 'on', 'in', 'for', 'x'}
+
+_UNIT = '|'.join(sorted(map(re.escape, UNITS), key=len, reverse=True))
+# Mixed numbers and fractions first, or "1/2" would be read as 1 followed by "/2"
+_NUMBER = r'\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|[½¼¾⅓⅔]'
+_WORD = '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True))
+_SPLIT = re.compile(r'\s*(?:[,;\n+&]|\band\b|\bwith\b|\bplus\b|\bthen\b)\s*')
+_LEADING = re.compile(
+    rf'^(?:(?:a|an)\s+(?=(?:dozen|couple|half|quarter)\b))?(?:(?P<number>{_NUMBER})|(?P<word>{_WORD})\b)\s*(?:x\s*)?(?:(?:a|an)\s+)?'
+    rf'(?:(?P<unit>{_UNIT})\b\.?\s*)?(?:of\s+)?')
+_TRAILING = re.compile(rf'\s+(?:x\s*(?P<count>\d+)|(?P<number>{_NUMBER})\s*(?P<unit>{_UNIT})\b\.?)$')
+
+
+class TextMealError(ValueError):
+    """Invalid /analyze_text request"""
+
+
+def parse_number(text):
+    """Float for "2", "1.5", "1/2", "1 1/2", "½" or a number word"""
+    if text in FRACTIONS:
+        return FRACTIONS[text]
+    if text in NUMBER_WORDS:
+        return float(NUMBER_WORDS[text])
+    whole, _, fraction = text.rpartition(' ')
+    if '/' in fraction:
+        numerator, denominator = fraction.split('/')
+        value = int(numerator) / int(denominator) if int(denominator) else 0.0
+        return value + (float(whole) if whole else 0.0)
+    return float(text)
+
+
+def parse_quantity(item):
+    """(quantity, unit, rest of the text) for one item; no quantity means one serving"""
+    match = _LEADING.match(item)
+    if match and (match.group('number') or match.group('word')):
+        quantity = parse_number(match.group('number') or match.group('word'))
+        unit = UNITS[match.group('unit')] if match.group('unit') else 'serving'
+        if match.group('word') in ('a', 'an') and match.end() == len(item):
+            # "a" alone is not a quantity of nothing
+            return 1.0, 'serving', item
+        return quantity, unit, item[match.end():]
+    match = _TRAILING.search(item)
+    if match:
+        if match.group('count'):
+            return float(match.group('count')), 'serving', item[:match.start()]
+        return parse_number(match.group('number')), UNITS[match.group('unit')], item[:match.start()]
+    return 1.0, 'serving', item
+
+
+def _singular(word):
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('oes') or word.endswith('ches') or word.endswith('shes'):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+class TextMealAnalyzer:
+    """Meal descriptions -> foods, quantities and nutrition totals over one set of food tables"""
+
+    def __init__(self, search, recipes, cache_size=8192):
+        self.search = search
+        self.recipes = recipes
+        self._foods = functools.lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _lookup(self, words):
+        name = ' '.join(words)
+        found = self.search.lookup(name)
+        if found is None and words:
+            found = self.search.lookup(' '.join(words[:-1] + [_singular(words[-1])]))
+        return found
+
+    def _resolve(self, phrase):
+        """[(food_id, name, match)] named in a phrase, in order"""
+        words = normalize(phrase).split()
+        if not words:
+            return ()
+        found = self._lookup(words)
+        if found is not None:
+            return ((found[0], found[1], 'exact'),)
+
+        # Longest known names, left to right, skipping words that are not foods
+        foods = []
+        position = 0
+        while position < len(words):
+            for size in range(min(MAX_NAME_WORDS, len(words) - position), 0, -1):
+                found = self._lookup(words[position:position + size])
+                if found is not None and not (size == 1 and words[position] in FILLER):
+                    foods.append((found[0], found[1], 'exact'))
+                    position += size
+                    break
+            else:
+                position += 1
+        if foods:
+            return tuple(foods)
+
+        query = ' '.join(word for word in words if word not in FILLER)
+        results = self.search.search(query, limit=1, min_similarity=FUZZY_MIN_SIMILARITY) if query else []
+        if results:
+            return ((results[0]['id'], results[0]['name'], results[0]['match']),)
+        return ()
+
+    def parse(self, text):
+        """(items, unmatched) for one description; items carry id, name, quantity, unit, match and text"""
+        items, unmatched = [], []
+        for part in _SPLIT.split(text.lower()):
+            part = part.strip(' .!?:-')
+            if not part:
+                continue
+            quantity, unit, phrase = parse_quantity(part)
+            foods = self._foods(phrase.strip())
+            if not foods:
+                unmatched.append(part)
+                continue
+            for i, (food_id, name, match) in enumerate(foods):
+                # Extra foods in the same phrase ("eggs on toast") get one serving each
+                items.append({"text": part, "id": food_id, "name": name, "match": match,
+                              "quantity": quantity if i == 0 else 1.0, "unit": unit if i == 0 else 'serving'})
+        return items, unmatched
+
+    def analyze(self, texts, digits=2, encoded=False):
+        """Results for a list of descriptions, totals computed as one batch"""
+        if not isinstance(texts, list) or not texts:
+            raise TextMealError("texts must be a non-empty list")
+        if len(texts) > MAX_TEXTS:
+            raise TextMealError(f"At most {MAX_TEXTS} descriptions per request")
+        parsed = []
+        for index, text in enumerate(texts):
+            if not isinstance(text, str) or not text.strip():
+                raise TextMealError(f"Description {index} must be a non-empty string")
+            if len(text) > MAX_TEXT_LENGTH:
+                raise TextMealError(f"Description {index} is longer than {MAX_TEXT_LENGTH} characters")
+            parsed.append(self.parse(text))
+
+        recipes = [{"ingredients": [{"id": item["id"], "quantity": item["quantity"], "unit": item["unit"]}
+                                    for item in items]} for items, _ in parsed if items]
+        computed = iter(self.recipes.compute(recipes, digits=digits, encoded=encoded) if recipes else [])
+        nothing = (nutrition_json if encoded else unflatten_nutrition)([0.0] * len(NUTRIENT_FIELDS))
+
+        results = []
+        for text, (items, unmatched) in zip(texts, parsed):
+            if items:
+                totals = next(computed)
+                for item, line in zip(items, totals["ingredients"]):
+                    item["grams"] = line["grams"]
+                nutrition, total_grams = totals["total"], totals["total_grams"]
+            else:
+                nutrition, total_grams = nothing, 0.0
+            results.append({
+                "text": text,
+                "items": items,
+                "unmatched": unmatched,
+                "detected_foods": list(dict.fromkeys(item["name"] for item in items)),
+                "total_grams": total_grams,
+                "nutrition": nutrition,
+                "analysis_method": TEXT_METHOD,
+            })
+        return results
@@ -0,0 +1,103 @@
+"""
+Background loading of slow dependencies
+
+A BackgroundLoader runs a load function (import a client library, open
+connections) in a daemon thread so the server can bind its socket and
+answer health checks first. Request handlers ask for the value without
+blocking, or wait a bounded time for it, and fall back when it is not
+ready. Per-phase timings and time-to-ready are kept for /debug and /ready.
+"""
+
+import io
+import threading
+import time
+from contextlib import contextmanager
+
+PENDING, LOADING, READY, FAILED = 'pending', 'loading', 'ready', 'failed'
+
+
+class BackgroundLoader:
+    """Load a value once, in the background or inline, and report how long it took"""
+
+    def __init__(self, name, load_fn, started_at=None):
+        self.name = name
+        self.load_fn = load_fn
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.state = PENDING
+        self.value = None
+        self.error = None
+        self.phases = {}
+        self.time_to_ready_ms = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Begin loading in a daemon thread (no-op if already started)"""
+        with self._lock:
+            if self.state != PENDING:
+                return self
+            self.state = LOADING
+        threading.Thread(target=self._run, name=f'{self.name}-loader', daemon=True).start()
+        return self
+
+    def load(self):
+        """Load inline in the calling thread"""
+        with self._lock:
+            if self.state != PENDING:
+                return self.wait()
+            self.state = LOADING
+        self._run()
+        return self.value
+
+    def _run(self):
+        try:
+            self.value = self.load_fn(self)
+            self.state = READY
+        except Exception as e:
+            self.error = str(e)
+            self.state = FAILED
+            print(f"❌ {self.name} failed to load: {e}")
+        self.time_to_ready_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+        self._ready.set()
+        if self.state == READY:
+            print(f"✅ {self.name} ready {self.time_to_ready_ms:.0f} ms after start")
+
+    @contextmanager
+    def phase(self, name):
+        """Time one step of the load function"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def get(self):
+        """The loaded value, or None while loading or after a failure"""
+        return self.value if self.state == READY else None
+
+    def wait(self, timeout=None):
+        """Wait up to timeout seconds for loading to finish; the value or None"""
+        if self.state != PENDING:
+            self._ready.wait(timeout)
+        return self.get()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "phases_ms": dict(self.phases),
+            "time_to_ready_ms": self.time_to_ready_ms,
+            "error": self.error,
+        }
+
+
+def synthetic_food_image(size=64):
+    """A small JPEG with a plate-like gradient for warm-up requests, or None without Pillow"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    image = Image.new('RGB', (size, size))
+    image.putdata([(200 - x, 120 + y, (x * y) % 256) for y in range(size) for x in range(size)])
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
@@ -1,621 +1,855 @@
 import json
 import os
 import base64
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse
 import time
-import random
-import hashlib
-import traceback
+import functools
+import hmac
 
-# Try to import Google Cloud Vision, but don't crash if it fails
-try:
-    from google.cloud import vision
-    from google.oauth2 import service_account
-    GOOGLE_VISION_AVAILABLE = True
+# Cold start timings in /debug are measured from here
+PROCESS_STARTED = time.perf_counter()
+
+from allten.adapters import serve
+from allten.admission import AdmissionController
+from allten.barcodes import PYZBAR_AVAILABLE, decode_barcodes, normalize_gtin
+from allten.batching import MicroBatcher
+from allten.catalog import current_generation
+from allten.core import FAST_LANE, AnalysisError, AnalysisPipeline, Router, decode_image, json_response
+from allten.core.encoding import ENCODER as JSON_ENCODER_NAME, nutrition_json
+from allten.core.estimates import (
+    FALLBACK_METHOD, estimate_nutrition, fallback_nutrition, first_food_label, food_portions, is_food_related,
+    match_vision_labels
+)
+from allten.core.streaming import analysis_events, event_stream, stream_format
+from allten.food_tables import LiveFoodTables
+from allten.image_hash import PerceptualLabelCache, PersistentLabelStore, compute_phash, PIL_AVAILABLE
+from allten.ingest import ingest_stats
+from allten.jobs import JobError, JobQueue, default_jobs_path
+from allten.intakes import IntakeError, intake_gaps
+from allten.keepalive import connection_stats
+from allten.local_recognizer import load_local_classifier
+from allten.localization import OBJECT_MAX_ITEMS, ObjectFanout, area_portion, crop_regions, localized_regions
+from allten.meal_log import MealLog, MealLogError, default_meal_log_path
+from allten.recipes import RecipeError
+from allten.request_log import REQUEST_LOG, log_event
+from allten.result_cache import DigestResultCache, image_digest, parse_digest, parse_phash
+from allten.similarity import MAX_K, SimilarityError, food_vector, nearest_meals, nutrition_vector, parse_weights
+from allten.text_meals import TextMealError
+from allten.warmup import FAILED, LOADING, READY, BackgroundLoader, synthetic_food_image
+
+# Google Cloud Vision is imported and connected after the socket is bound, so
+# /health answers immediately on a cold start (VISION_STARTUP=blocking restores the old order)
+VISION_STARTUP = os.environ.get('VISION_STARTUP', 'background')
+# How long /analyze_food waits for a Vision client that is still loading before using the fallback
+VISION_WARMUP_WAIT = float(os.environ.get('VISION_WARMUP_WAIT', 5))
+
+def _create_vision_client(loader):
+    """Import the Vision stack, create a client from the configured credentials and open its channel"""
+    with loader.phase('import'):
+        from google.cloud import vision
+        from google.oauth2 import service_account
     print("✅ Google Cloud Vision imports successful")
-except ImportError as e:
-    print(f"⚠️ Google Cloud Vision import failed: {e}")
-    GOOGLE_VISION_AVAILABLE = False
-
-class GoogleVisionNutritionAPI(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.vision_client = None
-        try:
-            if GOOGLE_VISION_AVAILABLE:
-                # Try to get credentials from environment variable first
-                credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
-                if credentials_json:
-                    try:
-                        # Parse the JSON string from environment
-                        credentials_info = json.loads(credentials_json)
-                        credentials = service_account.Credentials.from_service_account_info(credentials_info)
-                        self.vision_client = vision.ImageAnnotatorClient(credentials=credentials)
-                        print("✅ Google Cloud Vision client initialized with environment credentials")
-                    except json.JSONDecodeError as e:
-                        print(f"❌ Failed to parse credentials JSON: {e}")
-                        print(f"Credentials content preview: {credentials_json[:100]}...")
-                    except Exception as e:
-                        print(f"❌ Failed to create credentials from JSON: {e}")
-                else:
-                    print("⚠️ No GOOGLE_APPLICATION_CREDENTIALS_JSON environment variable found")
-                    # Fallback to file if environment variable not set
-                    credentials_path = os.path.join(os.path.dirname(__file__), 'google-credentials.json')
-                    if os.path.exists(credentials_path):
-                        try:
-                            credentials = service_account.Credentials.from_service_account_file(credentials_path)
-                            self.vision_client = vision.ImageAnnotatorClient(credentials=credentials)
-                            print("✅ Google Cloud Vision client initialized with service account file")
-                        except Exception as e:
-                            print(f"❌ Failed to load credentials from file: {e}")
-                    else:
-                        print("⚠️ No credentials file found, trying default credentials")
-                        try:
-                            self.vision_client = vision.ImageAnnotatorClient()
-                            print("✅ Google Cloud Vision client initialized with default credentials")
-                        except Exception as e:
-                            print(f"❌ Failed to initialize with default credentials: {e}")
-            else:
-                print("⚠️ Google Cloud Vision not available")
-        except Exception as e:
-            print(f"❌ Failed to initialize Google Cloud Vision: {e}")
-            print(f"Full traceback: {traceback.format_exc()}")
-            self.vision_client = None
-        
-        super().__init__(*args, **kwargs)
-    
-    def do_GET(self):
-        path = urlparse(self.path).path
-        
-        if path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = {
-                "status": "healthy", 
-                "message": "All Ten API running on Render!",
-                "vision_api": "enabled" if self.vision_client else "disabled"
-            }
-            self.wfile.write(json.dumps(response).encode())
-            
-        elif path == '/debug':
-            # Debug endpoint to see what's happening
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            # Check environment variables
-            env_var = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
-            env_var_length = len(env_var) if env_var else 0
-            env_var_preview = env_var[:100] + "..." if env_var and len(env_var) > 100 else env_var
-            
-            debug_info = {
-                "vision_client_exists": self.vision_client is not None,
-                "google_vision_available": GOOGLE_VISION_AVAILABLE,
-                "env_var_exists": env_var is not None,
-                "env_var_length": env_var_length,
-                "env_var_preview": env_var_preview,
-                "env_var_starts_with_brace": env_var.startswith('{') if env_var else False,
-                "env_var_ends_with_brace": env_var.endswith('}') if env_var else False
-            }
-            
-            self.wfile.write(json.dumps(debug_info, indent=2).encode())
-            
-        elif path == '/vision_labels':
-            # Debug endpoint to see all Vision API labels for an image
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            response = {
-                "message": "Send a POST request to this endpoint with image data to see all Vision API labels",
-                "usage": "POST /vision_labels with JSON: {'image': 'base64_image_data'}"
-            }
-            self.wfile.write(json.dumps(response).encode())
-            
-        elif path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = {
-                "message": "All Ten Nutrition API with Google Vision",
-                "status": "live",
-                "vision_api": "enabled" if self.vision_client else "disabled",
-                "endpoints": ["/health", "/analyze_food", "/vision_labels", "/debug"]
-            }
-            self.wfile.write(json.dumps(response).encode())
-            
-        else:
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(b'{"error": "Not found"}')
-    
-    def do_POST(self):
-        path = urlparse(self.path).path
-        
-        if path == '/analyze_food':
+
+    vision_client = None
+    with loader.phase('client'):
+        # Try to get credentials from environment variable first
+        credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
+        if credentials_json:
             try:
-                # Read request data
-                content_length = int(self.headers.get('Content-Length', 0))
-                if content_length > 0:
-                    post_data = self.rfile.read(content_length)
-                    try:
-                        data = json.loads(post_data.decode('utf-8'))
-                        image_data = data.get('image', '')
-                    except:
-                        image_data = None
-                else:
-                    image_data = None
-                
-                # Analyze the image with Google Vision API
-                nutrition = self._analyze_food_with_vision(image_data)
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(nutrition).encode())
-                
+                # Parse the JSON string from environment
+                credentials_info = json.loads(credentials_json)
+                credentials = service_account.Credentials.from_service_account_info(credentials_info)
+                vision_client = vision.ImageAnnotatorClient(credentials=credentials)
+                print("✅ Google Cloud Vision client initialized with environment credentials")
+            except json.JSONDecodeError as e:
+                print(f"❌ Failed to parse credentials JSON: {e}")
+                print(f"Credentials content preview: {credentials_json[:100]}...")
             except Exception as e:
-                print(f"❌ Error in analyze_food: {e}")
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
-                
-        elif path == '/vision_labels':
+                print(f"❌ Failed to create credentials from JSON: {e}")
+        else:
+            print("⚠️ No GOOGLE_APPLICATION_CREDENTIALS_JSON environment variable found")
+            # Fallback to file if environment variable not set
+            credentials_path = os.path.join(os.path.dirname(__file__), 'google-credentials.json')
+            if os.path.exists(credentials_path):
+                try:
+                    credentials = service_account.Credentials.from_service_account_file(credentials_path)
+                    vision_client = vision.ImageAnnotatorClient(credentials=credentials)
+                    print("✅ Google Cloud Vision client initialized with service account file")
+                except Exception as e:
+                    print(f"❌ Failed to load credentials from file: {e}")
+            else:
+                print("⚠️ No credentials file found, trying default credentials")
+                try:
+                    vision_client = vision.ImageAnnotatorClient()
+                    print("✅ Google Cloud Vision client initialized with default credentials")
+                except Exception as e:
+                    print(f"❌ Failed to initialize with default credentials: {e}")
+
+    if vision_client is not None:
+        # Connect now so the first real request does not pay for the TCP/TLS handshake
+        with loader.phase('channel'):
             try:
-                # Read request data
-                content_length = int(self.headers.get('Content-Length', 0))
-                if content_length > 0:
-                    post_data = self.rfile.read(content_length)
-                    try:
-                        data = json.loads(post_data.decode('utf-8'))
-                        image_data = data.get('image', '')
-                    except:
-                        image_data = None
-                else:
-                    image_data = None
-                
-                # Get all Vision API labels for debugging
-                labels_info = self._get_vision_labels(image_data)
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(labels_info).encode())
-                
+                import grpc
+                grpc.channel_ready_future(vision_client.transport.grpc_channel).result(timeout=10)
             except Exception as e:
-                print(f"❌ Error in vision_labels: {e}")
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
-        else:
-            self.send_response(404)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(b'{"error": "Not found"}')
+                print(f"⚠️ Vision channel warm-up failed: {e}")
+    return vision_client
+
+VISION_LOADER = BackgroundLoader('Google Cloud Vision', _create_vision_client, started_at=PROCESS_STARTED)
+STARTUP = {"listening_ms": None}
+
+if not PIL_AVAILABLE:
+    print("⚠️ Pillow not installed, near-duplicate image cache disabled")
+
+# Near-duplicate photo cache shared by all requests in this process
+# (persisted to PHASH_DB_PATH when set, so a restart can replay the hottest entries)
+PHASH_DB_PATH = os.environ.get('PHASH_DB_PATH')
+PHASH_CACHE = PerceptualLabelCache(
+    max_distance=int(os.environ.get('PHASH_MAX_DISTANCE', 6)),
+    max_entries=int(os.environ.get('PHASH_CACHE_SIZE', 10000)),
+    persistent=PersistentLabelStore(PHASH_DB_PATH) if PHASH_DB_PATH else None
+)
+PHASH_REPLAY_SECONDS = int(os.environ.get('PHASH_REPLAY_SECONDS', 3600))
+
+def _invalidate_results(old, new, changes):
+    """Drop cached analyses computed from foods a table reload changed"""
+    foods = changes['vision_food_ranges']
+    if not foods:
+        return None
+    if list(old.vision_food_ranges) != list(new.vision_food_ranges):
+        # Foods were added or removed, so any photo's labels may match differently now
+        stale = lambda result: True
+    else:
+        stale = lambda result: not foods.isdisjoint(result.get('detected_foods') or ())
+    # Jobs first: the result cache refills itself from them on a miss
+    jobs = JOBS.invalidate_results(stale) if JOBS else 0
+    return {"result_cache": RESULT_CACHE.invalidate(stale), "job_results": jobs}
+
+# Food tables, compiled nutrient catalogue (import-nutrients.py), name search
+# and recipe calculator, rebuilt and swapped in when FOOD_TABLES_DIR or the
+# catalogue changes; handlers read TABLES.current once per request
+TABLES = LiveFoodTables(poll_seconds=float(os.environ.get('FOOD_TABLES_POLL_SECONDS', 2)),
+                        on_swap=_invalidate_results)
+if TABLES.current.catalog:
+    print(f"✅ Loaded nutrient catalogue {TABLES.current.catalog.manifest['generation']} "
+          f"with {len(TABLES.current.catalog)} foods")
+# POST /admin/reload_tables is only served when this is set
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Optional on-box CPU model used as a fast path before calling Vision;
+# its classes must be keys of the food table loaded at startup
+LOCAL_CLASSIFIER = load_local_classifier(TABLES.current.food_database.keys())
+LOCAL_MODEL_MIN_CONFIDENCE = float(os.environ.get('LOCAL_MODEL_MIN_CONFIDENCE', 0.8))
+
+# Concurrent requests share one batched forward pass
+LOCAL_BATCHER = MicroBatcher(
+    functools.partial(LOCAL_CLASSIFIER.predict_batch, top_k=1),
+    max_batch_size=int(os.environ.get('LOCAL_BATCH_MAX_SIZE', 8)),
+    max_wait_ms=float(os.environ.get('LOCAL_BATCH_MAX_WAIT_MS', 3)),
+    name='local-model-batcher'
+) if LOCAL_CLASSIFIER is not None else None
+
+# Meal log with running daily/weekly rollups
+try:
+    MEAL_LOG = MealLog(default_meal_log_path())
+except Exception as e:
+    print(f"❌ Failed to open meal log: {e}")
+    MEAL_LOG = None
+
+def _wait_for_vision():
+    """Give a Vision client that is still warming up a bounded time to become ready"""
+    if VISION_LOADER.state != READY:
+        VISION_LOADER.start()
+        VISION_LOADER.wait(VISION_WARMUP_WAIT)
+    return VISION_LOADER.get()
+
+def _vision_status():
+    if VISION_LOADER.get():
+        return "enabled"
+    return "loading" if VISION_LOADER.state == LOADING else "disabled"
+
+def _local_food_labels(image_bytes):
+    """Food labels from the local model, or None if it is not confident enough"""
+    try:
+        food, score = LOCAL_BATCHER(image_bytes)[0]
+    except Exception as e:
+        log_event('local_model_error', 'error', error=str(e))
+        return None
     
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-
-    def _get_vision_labels(self, image_data):
-        """Get all Vision API labels for debugging"""
-        if not self.vision_client:
-            return {"error": "Vision API not available", "labels": []}
-        
-        try:
-            # Decode base64 image
-            if not image_data:
-                return {"error": "No image data provided", "labels": []}
-            
-            # Remove data URL prefix if present
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            
-            # Decode base64
-            image_bytes = base64.b64decode(image_data)
-            
-            # Create Vision API image object
-            image = vision.Image(content=image_bytes)
-            
-            # Perform label detection
-            response = self.vision_client.label_detection(image=image)
-            labels = response.label_annotations
-            
-            # Extract all labels with scores
-            all_labels = []
-            for label in labels:
-                all_labels.append({
-                    "description": label.description,
-                    "score": label.score,
-                    "mid": label.mid
-                })
-            
-            # Sort by score (highest first)
-            all_labels.sort(key=lambda x: x['score'], reverse=True)
-            
+    # Confident on-box predictions skip Vision entirely, so only a doubtful
+    # one waits for a Vision client that is still warming up; without Vision
+    # the local model is the best answer we have
+    if score < LOCAL_MODEL_MIN_CONFIDENCE and _wait_for_vision():
+        return None
+    # Class names are FOOD_DATABASE keys such as 'chicken_breast'
+    food_labels = [food.replace('_', ' ')]
+    log_event('local_model_labels', labels=food_labels, score=round(float(score), 4))
+    return food_labels
+
+def _vision_food_labels(image_bytes):
+    """Vision labels above 0.5, reusing those of an earlier near-duplicate photo; None without Vision"""
+    vision_client = _wait_for_vision()
+    if not vision_client:
+        return None
+    
+    phash = compute_phash(image_bytes)
+    food_labels = PHASH_CACHE.lookup(phash) if phash is not None else None
+    if food_labels is not None:
+        log_event('phash_cache_hit', labels=food_labels)
+        return food_labels
+    
+    if OBJECT_FANOUT is not None:
+        food_labels = _vision_object_labels(vision_client, image_bytes)
+    else:
+        from google.cloud import vision
+        response = vision_client.label_detection(image=vision.Image(content=image_bytes))
+        food_labels = [label.description.lower() for label in response.label_annotations if label.score > 0.5]
+        log_event('vision_labels', labels=food_labels)
+    
+    if phash is not None:
+        PHASH_CACHE.store(phash, food_labels)
+    return food_labels
+
+def _vision_object_labels(vision_client, image_bytes):
+    """(label, servings) for each food Vision localizes, or the whole-photo labels if it finds none"""
+    from google.cloud import vision
+    response = vision_client.annotate_image({
+        "image": {"content": image_bytes},
+        # Room for plates and cutlery, which are dropped, on top of the items kept
+        "features": [{"type_": vision.Feature.Type.OBJECT_LOCALIZATION, "max_results": 2 * OBJECT_MAX_ITEMS},
+                     {"type_": vision.Feature.Type.LABEL_DETECTION}]
+    })
+    labels = [label.description.lower() for label in response.label_annotations if label.score > 0.5]
+    regions = localized_regions(response.localized_object_annotations)
+    crop_labels = OBJECT_FANOUT.resolve(crop_regions(image_bytes, regions)) if regions else []
+
+    food_ranges = TABLES.current.vision_food_ranges
+    items = []
+    for region, candidates in zip(regions, crop_labels):
+        # Crops that failed or missed the deadline keep the localized object's name
+        label = first_food_label((candidates or []) + [region.name], food_ranges)
+        if label is not None:
+            items.append((label, area_portion(region.area)))
+    log_event('vision_objects', labels=labels, regions=[region.name for region in regions], items=items)
+    return items or labels
+
+def _local_crop_labels(crops):
+    # Submitted together, so the micro-batcher runs them as one forward pass
+    futures = [LOCAL_BATCHER.submit(crop) for crop in crops]
+    labels = []
+    for future in futures:
+        food, score = future.result()[0]
+        labels.append([food.replace('_', ' ')] if score >= LOCAL_MODEL_MIN_CONFIDENCE else [])
+    return labels
+
+def _vision_crop_labels(crops):
+    from google.cloud import vision
+    response = VISION_LOADER.get().batch_annotate_images(requests=[
+        {"image": {"content": crop}, "features": [{"type_": vision.Feature.Type.LABEL_DETECTION}]}
+        for crop in crops
+    ])
+    return [[label.description.lower() for label in annotated.label_annotations if label.score > 0.5]
+            for annotated in response.responses]
+
+# VISION_MODE=objects asks Vision for object boxes and labels in one call, then
+# labels each cropped item in parallel and sizes its portion from its box
+VISION_MODE = os.environ.get('VISION_MODE', 'labels')
+OBJECT_FANOUT = ObjectFanout(
+    _local_crop_labels if LOCAL_BATCHER is not None else _vision_crop_labels
+) if VISION_MODE == 'objects' else None
+if OBJECT_FANOUT is not None and not PIL_AVAILABLE:
+    print("⚠️ Pillow not installed, localized items are named without cropping")
+
+# Packaged foods: a barcode in the photo is looked up in the catalogue's
+# barcode index before any recognizer runs
+BARCODE_SCAN = os.environ.get('BARCODE_SCAN', '1') == '1'
+BARCODE_METHOD = "Barcode + All Ten Catalogue"
+if BARCODE_SCAN and not PYZBAR_AVAILABLE:
+    print("⚠️ pyzbar not installed, barcodes in photos are not decoded")
+
+def _product_result(catalog, row):
+    """Exact nutrition per label serving for a catalogue product, shaped like an /analyze_food result"""
+    food_id = catalog.ids[row]
+    grams = catalog.serving_grams[row]
+    return {
+        "nutrition": catalog.nutrition(food_id, grams),
+        "detected_foods": [catalog.names[row]],
+        "confidence": 1.0,
+        "analysis_method": BARCODE_METHOD,
+        "product": {
+            "id": food_id,
+            "name": catalog.names[row],
+            "source": catalog.sources[row],
+            "upc": catalog.upcs[row],
+            "serving_grams": grams,
+            "per_100g": catalog.nutrition(food_id)
+        }
+    }
+
+def _barcode_result(image_bytes):
+    catalog = TABLES.current.catalog
+    if catalog is None or catalog.upc_index is None:
+        return None
+    for code in decode_barcodes(image_bytes):
+        row = catalog.row_for_upc(code)
+        if row is not None:
+            log_event('barcode_hit', barcode=code)
+            return _product_result(catalog, row)
+    return None
+
+# Results by image sha256 / perceptual hash for POST /analyze_food/by_digest
+# (after a restart, results persisted by the job queue are still found)
+RESULT_CACHE = DigestResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', 24 * 3600)),
+    max_distance=PHASH_CACHE.max_distance,
+    backing=lambda digest: JOBS.result(digest) if JOBS else None
+)
+# by_digest bodies carry two hashes, never an image
+BY_DIGEST_MAX_BYTES = 4096
+
+def _remember_result(image_bytes, result):
+    RESULT_CACHE.store(image_digest(image_bytes), result, len(image_bytes), compute_phash(image_bytes))
+
+def _estimate(foods, image_bytes, analysis_method, portions=None):
+    food_ranges = TABLES.current.vision_food_ranges
+    return estimate_nutrition(foods, image_bytes, food_ranges, analysis_method,
+                              food_portions(portions, food_ranges) if portions else None)
+
+# decode -> local model, then near-duplicate cache / Vision -> match labels -> estimate nutrition
+PIPELINE = AnalysisPipeline(
+    ([(_local_food_labels, "All Ten On-Device Model + All Ten AI")] if LOCAL_CLASSIFIER is not None else [])
+    + [(_vision_food_labels, "Google Cloud Vision API + All Ten AI")],
+    match=lambda labels: match_vision_labels(labels, TABLES.current.vision_food_ranges),
+    compute=_estimate,
+    fallback=fallback_nutrition,
+    on_result=_remember_result,
+    shortcuts=[_barcode_result] if BARCODE_SCAN and PYZBAR_AVAILABLE else []
+)
+
+# Caps concurrent Vision-backed analyses and sheds load once the queue is full
+ANALYSIS_ADMISSION = AdmissionController('analysis')
+
+# Background analyses for POST /jobs/analyze_food; fallback estimates are not
+# reused for later uploads of the same photo, Vision may be up by then
+try:
+    JOBS = JobQueue(
+        default_jobs_path(),
+        lambda image_data: PIPELINE.analyze({"image": image_data}),
+        cache_result=lambda result: result.get('analysis_method') != FALLBACK_METHOD
+    )
+except Exception as e:
+    print(f"❌ Failed to open job queue: {e}")
+    JOBS = None
+# Job submissions are cheap, but still rate limited per client
+JOB_ADMISSION = AdmissionController('jobs')
+
+router = Router(cors_headers='Content-Type, X-User-Id, X-API-Key', access_log=REQUEST_LOG)
+
+def _int_param(request, name, default):
+    try:
+        return max(1, int(request.arg(name)))
+    except (TypeError, ValueError):
+        return default
+
+def _user_id(request, data=None):
+    """Caller's user id from the query string, JSON body or X-User-Id header"""
+    if request.arg('user_id'):
+        return request.arg('user_id')
+    if isinstance(data, dict) and data.get('user_id'):
+        return str(data['user_id'])
+    return request.headers.get('X-User-Id')
+
+@router.route('/health', lane=FAST_LANE)
+def health(request):
+    return {
+        "status": "healthy", 
+        "message": "All Ten API running on Render!",
+        "vision_api": _vision_status()
+    }
+
+@router.route('/ready', lane=FAST_LANE)
+def ready(request):
+    # Unlike /health, only passes once this instance can serve real traffic at full speed
+    checks = readiness_checks()
+    is_ready = all(checks.values())
+    return {
+        "ready": is_ready,
+        "checks": checks,
+        "warmup": WARMUP_LOADER.stats(),
+        "vision": VISION_LOADER.stats()
+    }, 200 if is_ready else 503
+
+@router.route('/debug', lane=FAST_LANE)
+def debug(request):
+    # Check environment variables
+    env_var = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
+    env_var_length = len(env_var) if env_var else 0
+    env_var_preview = env_var[:100] + "..." if env_var and len(env_var) > 100 else env_var
+    
+    catalog = TABLES.current.catalog
+    debug_info = {
+        "vision_client_exists": VISION_LOADER.get() is not None,
+        "google_vision_available": VISION_LOADER.state == READY,
+        "env_var_exists": env_var is not None,
+        "env_var_length": env_var_length,
+        "env_var_preview": env_var_preview,
+        "env_var_starts_with_brace": env_var.startswith('{') if env_var else False,
+        "env_var_ends_with_brace": env_var.endswith('}') if env_var else False,
+        "startup": {
+            "mode": VISION_STARTUP,
+            "listening_ms": STARTUP["listening_ms"],
+            "vision": VISION_LOADER.stats()
+        },
+        "phash_cache": PHASH_CACHE.stats(),
+        "local_model": LOCAL_CLASSIFIER.stats() if LOCAL_CLASSIFIER else None,
+        "json_encoder": JSON_ENCODER_NAME,
+        "catalog": {
+            "generation": catalog.manifest['generation'],
+            "foods": len(catalog),
+            "barcodes": catalog.manifest.get('barcodes', 0)
+        } if catalog else None,
+        "barcode_scan": BARCODE_SCAN and PYZBAR_AVAILABLE,
+        "vision_mode": VISION_MODE,
+        "object_fanout": OBJECT_FANOUT.stats() if OBJECT_FANOUT else None,
+        "food_tables": TABLES.stats()
+    }
+    return json_response(debug_info, indent=2)
+
+@router.route('/metrics', lane=FAST_LANE)
+def metrics(request):
+    return {
+        "phash_cache": PHASH_CACHE.stats(),
+        "local_model": LOCAL_CLASSIFIER.stats() if LOCAL_CLASSIFIER else None,
+        "local_batcher": LOCAL_BATCHER.stats() if LOCAL_BATCHER else None,
+        "pipeline": PIPELINE.stats(),
+        "admission": ANALYSIS_ADMISSION.stats(),
+        "result_cache": RESULT_CACHE.stats(),
+        "jobs": JOBS.stats() if JOBS else None,
+        "job_admission": JOB_ADMISSION.stats(),
+        "lanes": router.lane_stats(),
+        "connections": connection_stats(),
+        "request_log": REQUEST_LOG.stats(),
+        "ingest": ingest_stats()
+    }
+
+@router.route('/', lane=FAST_LANE)
+def root(request):
+    return {
+        "message": "All Ten Nutrition API with Google Vision",
+        "status": "live",
+        "vision_api": _vision_status(),
+        "endpoints": ["/health", "/ready", "/analyze_food", "/analyze_food/by_digest", "/analyze_food/stream", "/analyze_text", "/jobs/analyze_food", "/jobs/{id}", "/vision_labels", "/debug", "/metrics", "/foods", "/foods/similar", "/foods/upc/{code}", "/meals", "/meals/similar", "/summary", "/nutrition/compute", "/nutrition/gaps"]
+    }
+
+@router.route('/analyze_food', methods=['POST'])
+@ANALYSIS_ADMISSION.guard
+def analyze_food(request):
+    # The declared size is checked before the body is read
+    data = request.json()
+    return PIPELINE.analyze({"image": data.get('image', '')} if data else None)
+
+@router.route('/analyze_food/by_digest', methods=['POST'], lane=FAST_LANE)
+def analyze_food_by_digest(request):
+    # Ask before uploading: {"sha256": hex digest of the decoded image bytes, "phash": optional 16 hex digits}
+    data = request.json(max_bytes=BY_DIGEST_MAX_BYTES)
+    digest = parse_digest(data.get('sha256')) if data else None
+    if digest is None:
+        return {"error": "sha256 of the image bytes (64 hex digits) is required"}, 400
+    result, how = RESULT_CACHE.lookup(digest, parse_phash(data.get('phash')))
+    if result is None:
+        return {"error": "No cached result, upload the image", "upload": "/analyze_food", "sha256": digest}, 404
+    return {**result, "cache": {**how, "sha256": digest}}
+
+@router.route('/analyze_food/stream', methods=['POST'])
+@ANALYSIS_ADMISSION.guard
+def analyze_food_stream(request):
+    # Same analysis as /analyze_food, sent as SSE (default) or NDJSON events as each stage finishes
+    data = request.json()
+    stages = PIPELINE.stages({"image": data.get('image', '')} if data else None)
+    return event_stream(analysis_events(stages), stream_format(request))
+
+@router.route('/analyze_text', methods=['POST'])
+def analyze_text(request):
+    # {"text": "2 eggs, toast with butter and an apple"}, or {"texts": [...]} for a batch
+    data = request.json()
+    if not isinstance(data, dict) or ('text' not in data and 'texts' not in data):
+        return {"error": "text or texts is required"}, 400
+    analyzer = TABLES.current.text
+    try:
+        start = time.perf_counter()
+        if 'texts' in data:
+            results = analyzer.analyze(data['texts'], encoded=True)
             return {
-                "total_labels": len(all_labels),
-                "labels": all_labels,
-                "food_related_labels": [l for l in all_labels if self._is_food_related(l['description'])],
-                "analysis_method": "Google Cloud Vision API - Debug Mode"
+                "results": results,
+                "compute_ms": round((time.perf_counter() - start) * 1000, 3)
             }
-            
-        except Exception as e:
-            print(f"❌ Vision API error in _get_vision_labels: {e}")
-            return {"error": str(e), "labels": []}
-
-    def _is_food_related(self, label):
-        """Check if a label is food-related"""
-        food_keywords = [
-            'food', 'meal', 'dish', 'cuisine', 'cooking', 'recipe', 'ingredient',
-            'meat', 'beef', 'chicken', 'pork', 'lamb', 'fish', 'seafood',
-            'vegetable', 'fruit', 'grain', 'rice', 'pasta', 'bread', 'cereal',
-            'dairy', 'milk', 'cheese', 'yogurt', 'butter', 'cream',
-            'nut', 'seed', 'bean', 'legume', 'soup', 'salad', 'sandwich',
-            'pizza', 'burger', 'steak', 'chop', 'cutlet', 'fillet',
-            'potato', 'tomato', 'onion', 'carrot', 'broccoli', 'spinach',
-            'apple', 'banana', 'orange', 'grape', 'berry', 'lemon',
-            'pasta', 'noodle', 'spaghetti', 'macaroni', 'lasagna',
-            'sauce', 'gravy', 'marinade', 'seasoning', 'spice', 'herb'
-        ]
-        
-        label_lower = label.lower()
-        return any(keyword in label_lower for keyword in food_keywords)
+        return analyzer.analyze([data['text']], encoded=True)[0]
+    except (TextMealError, RecipeError) as e:
+        return {"error": str(e)}, 400
 
-    def _analyze_food_with_vision(self, image_data):
-        """Analyze food image using Google Cloud Vision API"""
-        
-        if not self.vision_client:
-            return self._fallback_analysis(image_data)
-        
-        try:
-            # Decode base64 image
-            if not image_data:
-                return self._fallback_analysis(image_data)
-            
-            # Remove data URL prefix if present
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            
-            # Decode base64
-            image_bytes = base64.b64decode(image_data)
-            
-            # Create Vision API image object
-            image = vision.Image(content=image_bytes)
-            
-            # Perform label detection
-            response = self.vision_client.label_detection(image=image)
-            labels = response.label_annotations
-            
-            # Extract food-related labels with lower threshold
-            food_labels = [label.description.lower() for label in labels if label.score > 0.5]
-            
-            print(f"🔍 Vision API detected labels: {food_labels}")
-            
-            # Analyze nutrition based on detected foods
-            nutrition = self._calculate_nutrition_from_labels(food_labels, image_bytes)
-            
-            return nutrition
-            
-        except Exception as e:
-            print(f"❌ Vision API error: {e}")
-            return self._fallback_analysis(image_data)
+@router.route('/jobs/analyze_food', methods=['POST'])
+@JOB_ADMISSION.guard
+def submit_analysis_job(request):
+    # Returns at once; poll GET /jobs/{id} or pass callback_url to receive the result
+    data = request.json()
+    if not JOBS:
+        return {"error": "Job queue not available"}, 503
+    if not isinstance(data, dict):
+        return {"error": "Invalid JSON body"}, 400
+    try:
+        job = JOBS.submit(data.get('image'), data.get('callback_url'))
+    except JobError as e:
+        return {"error": str(e)}, 400
+    job["poll"] = f"/jobs/{job['job_id']}"
+    return job, 202
+
+@router.route('/jobs/{job_id}')
+def get_job(request):
+    if not JOBS:
+        return {"error": "Job queue not available"}, 503
+    job = JOBS.get(request.params['job_id'])
+    if job is None:
+        return {"error": "Job not found"}, 404
+    return job
+
+@router.route('/vision_labels', lane=FAST_LANE)
+def vision_labels_usage(request):
+    # Debug endpoint to see all Vision API labels for an image
+    return {
+        "message": "Send a POST request to this endpoint with image data to see all Vision API labels",
+        "usage": "POST /vision_labels with JSON: {'image': 'base64_image_data'}"
+    }
+
+@router.route('/vision_labels', methods=['POST'])
+@ANALYSIS_ADMISSION.guard
+def vision_labels(request):
+    """Get all Vision API labels for debugging"""
+    data = request.json()
+    vision_client = _wait_for_vision()
+    if not vision_client:
+        return {"error": "Vision API not available", "labels": []}
     
-    def _calculate_nutrition_from_labels(self, food_labels, image_bytes):
-        """Calculate nutrition based on detected food labels"""
-        
-        # Create deterministic seed from image
-        image_hash = hashlib.md5(image_bytes).hexdigest()
-        seed_value = int(image_hash[:8], 16) % 1000000
-        random.seed(seed_value)
-        
-        # Expanded food database with more items and synonyms
-        food_database = {
-            # Meats
-            'chicken': {'calories': (150, 250), 'protein': (25, 35), 'carbs': (0, 5), 'fat': (3, 8)},
-            'beef': {'calories': (200, 300), 'protein': (25, 35), 'carbs': (0, 2), 'fat': (10, 20)},
-            'steak': {'calories': (250, 350), 'protein': (30, 40), 'carbs': (0, 2), 'fat': (15, 25)},
-            'lamb': {'calories': (200, 300), 'protein': (25, 35), 'carbs': (0, 2), 'fat': (12, 22)},
-            'lambchop': {'calories': (220, 320), 'protein': (28, 38), 'carbs': (0, 2), 'fat': (14, 24)},
-            'pork': {'calories': (180, 280), 'protein': (22, 32), 'carbs': (0, 2), 'fat': (8, 18)},
-            'fish': {'calories': (120, 200), 'protein': (20, 30), 'carbs': (0, 2), 'fat': (3, 10)},
-            'salmon': {'calories': (150, 250), 'protein': (22, 32), 'carbs': (0, 2), 'fat': (8, 15)},
-            'tuna': {'calories': (120, 180), 'protein': (25, 35), 'carbs': (0, 2), 'fat': (1, 5)},
-            
-            # Grains and Starches
-            'rice': {'calories': (100, 150), 'protein': (2, 4), 'carbs': (20, 30), 'fat': (0, 1)},
-            'pasta': {'calories': (150, 200), 'protein': (5, 8), 'carbs': (30, 40), 'fat': (1, 2)},
-            'bread': {'calories': (80, 120), 'protein': (3, 5), 'carbs': (15, 25), 'fat': (1, 3)},
-            'potato': {'calories': (80, 120), 'protein': (2, 4), 'carbs': (18, 25), 'fat': (0, 1)},
-            'mashed': {'calories': (120, 180), 'protein': (3, 6), 'carbs': (25, 35), 'fat': (2, 8)},
-            'fries': {'calories': (200, 300), 'protein': (3, 6), 'carbs': (30, 45), 'fat': (8, 15)},
-            
-            # Vegetables
-            'vegetable': {'calories': (30, 80), 'protein': (2, 5), 'carbs': (5, 15), 'fat': (0, 2)},
-            'broccoli': {'calories': (25, 50), 'protein': (3, 6), 'carbs': (5, 10), 'fat': (0, 1)},
-            'carrot': {'calories': (25, 50), 'protein': (1, 2), 'carbs': (6, 12), 'fat': (0, 1)},
-            'spinach': {'calories': (15, 30), 'protein': (2, 4), 'carbs': (2, 6), 'fat': (0, 1)},
-            'lettuce': {'calories': (10, 25), 'protein': (1, 2), 'carbs': (2, 5), 'fat': (0, 1)},
-            'tomato': {'calories': (15, 30), 'protein': (1, 2), 'carbs': (3, 7), 'fat': (0, 1)},
-            'onion': {'calories': (20, 40), 'protein': (1, 2), 'carbs': (5, 10), 'fat': (0, 1)},
-            'pepper': {'calories': (20, 40), 'protein': (1, 2), 'carbs': (4, 8), 'fat': (0, 1)},
-            
-            # Fruits
-            'fruit': {'calories': (50, 100), 'protein': (0, 2), 'carbs': (10, 25), 'fat': (0, 1)},
-            'apple': {'calories': (60, 80), 'protein': (0, 1), 'carbs': (15, 20), 'fat': (0, 1)},
-            'banana': {'calories': (80, 120), 'protein': (1, 2), 'carbs': (20, 30), 'fat': (0, 1)},
-            'orange': {'calories': (50, 70), 'protein': (1, 2), 'carbs': (12, 18), 'fat': (0, 1)},
-            
-            # Dairy
-            'cheese': {'calories': (100, 150), 'protein': (6, 10), 'carbs': (1, 3), 'fat': (8, 15)},
-            'milk': {'calories': (80, 120), 'protein': (8, 10), 'carbs': (10, 15), 'fat': (3, 8)},
-            'yogurt': {'calories': (60, 120), 'protein': (6, 12), 'carbs': (8, 20), 'fat': (0, 8)},
-            'butter': {'calories': (200, 300), 'protein': (0, 1), 'carbs': (0, 1), 'fat': (20, 30)},
-            
-            # Other
-            'salad': {'calories': (50, 150), 'protein': (3, 8), 'carbs': (8, 15), 'fat': (0, 5)},
-            'soup': {'calories': (80, 200), 'protein': (5, 15), 'carbs': (10, 25), 'fat': (2, 8)},
-            'sandwich': {'calories': (200, 400), 'protein': (10, 20), 'carbs': (25, 45), 'fat': (5, 15)},
-            'pizza': {'calories': (250, 400), 'protein': (12, 20), 'carbs': (30, 50), 'fat': (8, 18)},
-            'burger': {'calories': (300, 500), 'protein': (15, 25), 'carbs': (30, 50), 'fat': (10, 25)},
-            'eggs': {'calories': (70, 90), 'protein': (6, 8), 'carbs': (0, 1), 'fat': (5, 7)},
-        }
-        
-        # Match detected labels to food database with flexible matching
-        detected_foods = []
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        
-        for label in food_labels:
-            label_matched = False
-            for food, nutrition in food_database.items():
-                # More flexible matching - check if food name is in label or label is in food name
-                if (food in label or 
-                    label in food or 
-                    any(word in label for word in food.split()) or
-                    any(word in food for word in label.split())):
-                    
-                    if food not in detected_foods:  # Avoid duplicates
-                        detected_foods.append(food)
-                        # Calculate portion size based on image characteristics
-                        portion_multiplier = random.uniform(0.8, 1.5)
-                        
-                        total_calories += nutrition['calories'][1] * portion_multiplier
-                        total_protein += nutrition['protein'][1] * portion_multiplier
-                        total_carbs += nutrition['carbs'][1] * portion_multiplier
-                        total_fat += nutrition['fat'][1] * portion_multiplier
-                        label_matched = True
-                        break
-            
-            # If no specific match, check for general categories
-            if not label_matched:
-                if any(word in label for word in ['meat', 'protein', 'animal']):
-                    if 'mixed meat' not in detected_foods:
-                        detected_foods.append('mixed meat')
-                        total_calories += random.uniform(200, 300)
-                        total_protein += random.uniform(25, 35)
-                        total_carbs += random.uniform(0, 5)
-                        total_fat += random.uniform(10, 20)
-                elif any(word in label for word in ['grain', 'starch', 'carb']):
-                    if 'mixed grain' not in detected_foods:
-                        detected_foods.append('mixed grain')
-                        total_calories += random.uniform(150, 250)
-                        total_protein += random.uniform(3, 8)
-                        total_carbs += random.uniform(25, 40)
-                        total_fat += random.uniform(1, 5)
-        
-        # If no specific foods detected, use general estimation
-        if not detected_foods:
-            detected_foods = ['mixed meal']
-            total_calories = random.randint(300, 600)
-            total_protein = random.uniform(20, 40)
-            total_carbs = random.uniform(30, 60)
-            total_fat = random.uniform(10, 25)
-        
-        # Generate micronutrients based on detected foods
-        base_multiplier = total_calories / 400
-        
-        nutrition_data = {
-            "nutrition": {
-                "calories": round(total_calories),
-                "protein": round(total_protein, 1),
-                "carbs": round(total_carbs, 1),
-                "fat": round(total_fat, 1),
-                "fiber": round(random.uniform(3, 8) * base_multiplier, 1),
-                "sugar": round(random.uniform(5, 15) * base_multiplier, 1),
-                "sodium": round(random.uniform(200, 800) * base_multiplier),
-                "micronutrients": {
-                    "iron": round(random.uniform(1, 5) * base_multiplier, 1),
-                    "calcium": round(random.uniform(50, 200) * base_multiplier, 1),
-                    "vitamin_c": round(random.uniform(10, 50) * base_multiplier, 1),
-                    "potassium": round(random.uniform(200, 600) * base_multiplier, 1),
-                    "vitamin_a": round(random.uniform(100, 800) * base_multiplier, 1),
-                    "vitamin_e": round(random.uniform(1, 5) * base_multiplier, 1),
-                    "vitamin_k": round(random.uniform(5, 25) * base_multiplier, 1),
-                    "folate": round(random.uniform(20, 80) * base_multiplier, 1),
-                    "niacin": round(random.uniform(3, 12) * base_multiplier, 1),
-                    "riboflavin": round(random.uniform(0.2, 0.8) * base_multiplier, 2),
-                    "thiamin": round(random.uniform(0.1, 0.5) * base_multiplier, 2),
-                    "vitamin_b6": round(random.uniform(0.3, 1.2) * base_multiplier, 2),
-                    "phosphorus": round(random.uniform(80, 180) * base_multiplier, 1),
-                    "selenium": round(random.uniform(5, 25) * base_multiplier, 1),
-                    "copper": round(random.uniform(0.1, 0.5) * base_multiplier, 2),
-                    "manganese": round(random.uniform(0.2, 0.8) * base_multiplier, 2),
-                    "chromium": round(random.uniform(2, 8) * base_multiplier, 1),
-                    "molybdenum": round(random.uniform(5, 15) * base_multiplier, 1),
-                    "iodine": round(random.uniform(5, 25) * base_multiplier, 1),
-                    "chloride": round(random.uniform(100, 400) * base_multiplier, 1),
-                    "biotin": round(random.uniform(2, 8) * base_multiplier, 1),
-                    "pantothenic_acid": round(random.uniform(1, 4) * base_multiplier, 1),
-                    "choline": round(random.uniform(20, 80) * base_multiplier, 1),
-                    "betaine": round(random.uniform(5, 20) * base_multiplier, 1),
-                    "taurine": round(random.uniform(10, 40) * base_multiplier, 1),
-                    "creatine": round(random.uniform(1, 5) * base_multiplier, 1),
-                    "carnitine": round(random.uniform(5, 25) * base_multiplier, 1),
-                    "inositol": round(random.uniform(10, 40) * base_multiplier, 1),
-                    "paba": round(random.uniform(0.5, 2) * base_multiplier, 1),
-                    "lipoic_acid": round(random.uniform(0.2, 1) * base_multiplier, 2),
-                    "coq10": round(random.uniform(0.5, 2) * base_multiplier, 1),
-                    "glutathione": round(random.uniform(5, 20) * base_multiplier, 1),
-                    "melatonin": round(random.uniform(0.05, 0.2) * base_multiplier, 2),
-                    "serotonin": round(random.uniform(0.02, 0.1) * base_multiplier, 2),
-                    "dopamine": round(random.uniform(0.01, 0.05) * base_multiplier, 2),
-                    "norepinephrine": round(random.uniform(0.005, 0.02) * base_multiplier, 3),
-                    "epinephrine": round(random.uniform(0.002, 0.01) * base_multiplier, 3),
-                    "histamine": round(random.uniform(0.05, 0.2) * base_multiplier, 2),
-                    "gaba": round(random.uniform(0.2, 1) * base_multiplier, 2),
-                    "glycine": round(random.uniform(50, 150) * base_multiplier, 1),
-                    "proline": round(random.uniform(40, 120) * base_multiplier, 1),
-                    "serine": round(random.uniform(30, 90) * base_multiplier, 1),
-                    "threonine": round(random.uniform(25, 75) * base_multiplier, 1),
-                    "tryptophan": round(random.uniform(10, 30) * base_multiplier, 1),
-                    "tyrosine": round(random.uniform(20, 60) * base_multiplier, 1),
-                    "valine": round(random.uniform(35, 105) * base_multiplier, 1),
-                    "alanine": round(random.uniform(45, 135) * base_multiplier, 1),
-                    "arginine": round(random.uniform(40, 120) * base_multiplier, 1),
-                    "asparagine": round(random.uniform(30, 90) * base_multiplier, 1),
-                    "aspartic_acid": round(random.uniform(35, 105) * base_multiplier, 1),
-                    "cysteine": round(random.uniform(15, 45) * base_multiplier, 1),
-                    "glutamine": round(random.uniform(50, 150) * base_multiplier, 1),
-                    "glutamic_acid": round(random.uniform(60, 180) * base_multiplier, 1),
-                    "isoleucine": round(random.uniform(30, 90) * base_multiplier, 1),
-                    "leucine": round(random.uniform(40, 120) * base_multiplier, 1),
-                    "lysine": round(random.uniform(35, 105) * base_multiplier, 1),
-                    "methionine": round(random.uniform(12, 38) * base_multiplier, 1),
-                    "phenylalanine": round(random.uniform(25, 75) * base_multiplier, 1),
-                    "histidine": round(random.uniform(15, 45) * base_multiplier, 1)
-                }
-            },
-            "detected_foods": detected_foods,
-            "confidence": 0.85 if detected_foods != ['mixed meal'] else 0.6,
-            "analysis_method": "Google Cloud Vision API + All Ten AI"
-        }
-        
-        return nutrition_data
+    try:
+        image_bytes = decode_image(data.get('image', '') if data else None)
+    except AnalysisError as e:
+        return {"error": e.message, "labels": []}
     
-    def _fallback_analysis(self, image_data):
-        """Fallback analysis when Vision API is not available"""
-        print("⚠️ Using fallback analysis (Vision API not available)")
-        
-        # Use the old simulated analysis as fallback
-        if image_data:
-            image_hash = hashlib.md5(image_data.encode() if isinstance(image_data, str) else str(image_data).encode()).hexdigest()
-            seed_value = int(image_hash[:8], 16) % 1000000
-        else:
-            seed_value = int(time.time() * 1000) % 1000000
+    try:
+        from google.cloud import vision
+        response = vision_client.label_detection(image=vision.Image(content=image_bytes))
         
-        random.seed(seed_value)
-        
-        # Simple fallback meal types
-        meal_types = [
-            {"name": "Mixed Meal", "calories": (300, 500), "protein": (20, 35), "carbs": (25, 45), "fat": (10, 25)},
-            {"name": "Light Meal", "calories": (200, 350), "protein": (15, 25), "carbs": (20, 35), "fat": (5, 15)},
-            {"name": "Hearty Meal", "calories": (500, 700), "protein": (30, 45), "carbs": (40, 60), "fat": (20, 35)},
-        ]
-        
-        meal = random.choice(meal_types)
-        calories = random.randint(meal["calories"][0], meal["calories"][1])
-        protein = round(random.uniform(meal["protein"][0], meal["protein"][1]), 1)
-        carbs = round(random.uniform(meal["carbs"][0], meal["carbs"][1]), 1)
-        fat = round(random.uniform(meal["fat"][0], meal["fat"][1]), 1)
+        # Extract all labels with scores, highest first
+        all_labels = [{
+            "description": label.description,
+            "score": label.score,
+            "mid": label.mid
+        } for label in response.label_annotations]
+        all_labels.sort(key=lambda x: x['score'], reverse=True)
         
         return {
-            "nutrition": {
-                "calories": calories,
-                "protein": protein,
-                "carbs": carbs,
-                "fat": fat,
-                "fiber": round(random.uniform(3, 8), 1),
-                "sugar": round(random.uniform(5, 15), 1),
-                "sodium": random.randint(200, 800),
-                "micronutrients": {
-                    "iron": round(random.uniform(1, 5), 1),
-                    "calcium": round(random.uniform(50, 200), 1),
-                    "vitamin_c": round(random.uniform(10, 50), 1),
-                    "potassium": round(random.uniform(200, 600), 1),
-                    "vitamin_a": round(random.uniform(100, 800), 1),
-                    "vitamin_e": round(random.uniform(1, 5), 1),
-                    "vitamin_k": round(random.uniform(5, 25), 1),
-                    "folate": round(random.uniform(20, 80), 1),
-                    "niacin": round(random.uniform(3, 12), 1),
-                    "riboflavin": round(random.uniform(0.2, 0.8), 2),
-                    "thiamin": round(random.uniform(0.1, 0.5), 2),
-                    "vitamin_b6": round(random.uniform(0.3, 1.2), 2),
-                    "phosphorus": round(random.uniform(80, 180), 1),
-                    "selenium": round(random.uniform(5, 25), 1),
-                    "copper": round(random.uniform(0.1, 0.5), 2),
-                    "manganese": round(random.uniform(0.2, 0.8), 2),
-                    "chromium": round(random.uniform(2, 8), 1),
-                    "molybdenum": round(random.uniform(5, 15), 1),
-                    "iodine": round(random.uniform(5, 25), 1),
-                    "chloride": round(random.uniform(100, 400), 1),
-                    "biotin": round(random.uniform(2, 8), 1),
-                    "pantothenic_acid": round(random.uniform(1, 4), 1),
-                    "choline": round(random.uniform(20, 80), 1),
-                    "betaine": round(random.uniform(5, 20), 1),
-                    "taurine": round(random.uniform(10, 40), 1),
-                    "creatine": round(random.uniform(1, 5), 1),
-                    "carnitine": round(random.uniform(5, 25), 1),
-                    "inositol": round(random.uniform(10, 40), 1),
-                    "paba": round(random.uniform(0.5, 2), 1),
-                    "lipoic_acid": round(random.uniform(0.2, 1), 2),
-                    "coq10": round(random.uniform(0.5, 2), 1),
-                    "glutathione": round(random.uniform(5, 20), 1),
-                    "melatonin": round(random.uniform(0.05, 0.2), 2),
-                    "serotonin": round(random.uniform(0.02, 0.1), 2),
-                    "dopamine": round(random.uniform(0.01, 0.05), 2),
-                    "norepinephrine": round(random.uniform(0.005, 0.02), 3),
-                    "epinephrine": round(random.uniform(0.002, 0.01), 3),
-                    "histamine": round(random.uniform(0.05, 0.2), 2),
-                    "gaba": round(random.uniform(0.2, 1), 2),
-                    "glycine": round(random.uniform(50, 150), 1),
-                    "proline": round(random.uniform(40, 120), 1),
-                    "serine": round(random.uniform(30, 90), 1),
-                    "threonine": round(random.uniform(25, 75), 1),
-                    "tryptophan": round(random.uniform(10, 30), 1),
-                    "tyrosine": round(random.uniform(20, 60), 1),
-                    "valine": round(random.uniform(35, 105), 1),
-                    "alanine": round(random.uniform(45, 135), 1),
-                    "arginine": round(random.uniform(40, 120), 1),
-                    "asparagine": round(random.uniform(30, 90), 1),
-                    "aspartic_acid": round(random.uniform(35, 105), 1),
-                    "cysteine": round(random.uniform(15, 45), 1),
-                    "glutamine": round(random.uniform(50, 150), 1),
-                    "glutamic_acid": round(random.uniform(60, 180), 1),
-                    "isoleucine": round(random.uniform(30, 90), 1),
-                    "leucine": round(random.uniform(40, 120), 1),
-                    "lysine": round(random.uniform(35, 105), 1),
-                    "methionine": round(random.uniform(12, 38), 1),
-                    "phenylalanine": round(random.uniform(25, 75), 1),
-                    "histidine": round(random.uniform(15, 45), 1)
-                }
-            },
-            "detected_foods": [meal["name"]],
-            "confidence": 0.6,
-            "analysis_method": "All Ten AI - Fallback Analysis"
+            "total_labels": len(all_labels),
+            "labels": all_labels,
+            "food_related_labels": [l for l in all_labels if is_food_related(l['description'])],
+            "analysis_method": "Google Cloud Vision API - Debug Mode"
         }
+    except Exception as e:
+        log_event('vision_error', 'error', route='/vision_labels', error=str(e))
+        return {"error": str(e), "labels": []}
+
+@router.route('/foods')
+def foods(request):
+    search = request.arg('q', '')
+    if not search.strip():
+        return {"error": "Query parameter q is required"}, 400
+    limit = _int_param(request, 'limit', 10)
+    return {"query": search, "results": TABLES.current.search.search(search, limit=limit)}
+
+@router.route('/foods/upc/{code}', lane=FAST_LANE)
+def food_by_upc(request):
+    # Packaged food by barcode (UPC-A, UPC-E, EAN-8, EAN-13 or GTIN-14), no image needed
+    code = request.params['code']
+    if normalize_gtin(code) is None:
+        return {"error": "Barcode must have 8, 12, 13 or 14 digits"}, 400
+    catalog = TABLES.current.catalog
+    if catalog is None or catalog.upc_index is None:
+        return {"error": "Barcode index not available"}, 503
+    row = catalog.row_for_upc(code)
+    if row is None:
+        return {"error": "Unknown barcode", "upc": code}, 404
+    return _product_result(catalog, row)
+
+def _similarity_options(request, data):
+    """(k, weights, exact, nprobe) from the JSON body or the query string"""
+    data = data if isinstance(data, dict) else {}
+    option = lambda name: data[name] if name in data else request.arg(name)
+    try:
+        k = int(option('k') or 10)
+        nprobe = int(option('nprobe')) if option('nprobe') else None
+    except (TypeError, ValueError):
+        raise SimilarityError("k and nprobe must be integers")
+    if not 1 <= k <= MAX_K:
+        raise SimilarityError(f"k must be between 1 and {MAX_K}")
+    exact = str(option('exact')).lower() in ('1', 'true')
+    return k, parse_weights(option('weights')), exact, nprobe
+
+def _food_summary(tables, food_id, similarity):
+    catalog = tables.catalog
+    row = tables.recipes.builtin_row.get(food_id)
+    if row is not None:
+        name = food_id.replace('_', ' ')
+        source = 'food_database' if food_id in tables.food_database else 'vision_food_ranges'
+    else:
+        row = catalog.row_of[food_id]
+        name, source = catalog.names[row], catalog.sources[row]
+    return {
+        "id": food_id,
+        "name": name,
+        "source": source,
+        "similarity": round(similarity, 4),
+        "per_100g": nutrition_json(food_vector(tables.recipes, catalog, food_id), digits=2)
+    }
+
+@router.route('/foods/similar', methods=['GET', 'POST'])
+def similar_foods(request):
+    # Swap suggestions: foods whose nutrient profile per 100 g is closest to a
+    # food (?id=) or to a posted nutrition block ({"nutrition": {...}})
+    data = request.json() if request.method == 'POST' else None
+    if request.method == 'POST' and not isinstance(data, dict):
+        return {"error": "Invalid JSON body"}, 400
+    tables = TABLES.current
+    try:
+        k, weights, exact, nprobe = _similarity_options(request, data)
+        food_id = (data or {}).get('id') or request.arg('id')
+        if food_id:
+            vector = food_vector(tables.recipes, tables.catalog, food_id)
+            if vector is None:
+                return {"error": f"Unknown food id: {food_id}"}, 404
+        elif isinstance((data or {}).get('nutrition'), dict):
+            vector = nutrition_vector(data['nutrition'])
+        else:
+            return {"error": "id or nutrition is required"}, 400
+        index = tables.similar_foods()
+        start = time.perf_counter()
+        matches = index.search(vector, k, weights, exclude={food_id} if food_id else (), exact=exact, nprobe=nprobe)
+    except SimilarityError as e:
+        return {"error": str(e)}, 400
+    return {
+        "id": food_id,
+        "results": [_food_summary(tables, match, similarity) for match, similarity in matches],
+        "method": 'exact' if exact else index.method,
+        "search_ms": round((time.perf_counter() - start) * 1000, 3)
+    }
+
+@router.route('/meals/similar', methods=['GET', 'POST'])
+def similar_meals(request):
+    # The caller's own meals whose nutrient profile is closest to one of their
+    # logged meals (?meal_id=) or a posted nutrition block
+    data = request.json() if request.method == 'POST' else None
+    if request.method == 'POST' and not isinstance(data, dict):
+        return {"error": "Invalid JSON body"}, 400
+    user_id = _user_id(request, data)
+    if not MEAL_LOG:
+        return {"error": "Meal log not available"}, 503
+    if not user_id:
+        return {"error": "user_id is required"}, 400
+    meal_id = (data or {}).get('meal_id') or request.arg('meal_id')
+    try:
+        k, weights, _, _ = _similarity_options(request, data)
+        if meal_id:
+            try:
+                meal_id = int(meal_id)
+            except (TypeError, ValueError):
+                return {"error": "meal_id must be an integer"}, 400
+            vector = MEAL_LOG.meal_vector(user_id, meal_id)
+            if vector is None:
+                return {"error": "Meal not found"}, 404
+        elif isinstance((data or {}).get('nutrition'), dict):
+            vector = nutrition_vector(data['nutrition'])
+        else:
+            return {"error": "meal_id or nutrition is required"}, 400
+        start = time.perf_counter()
+        matches = nearest_meals(MEAL_LOG, user_id, vector, k, weights, exclude={meal_id} if meal_id else ())
+    except SimilarityError as e:
+        return {"error": str(e)}, 400
+    meals = MEAL_LOG.meals_by_id([match for match, _ in matches], encoded=True)
+    return {
+        "meal_id": meal_id,
+        "results": [dict(meals[match], similarity=round(similarity, 4))
+                    for match, similarity in matches if match in meals],
+        "search_ms": round((time.perf_counter() - start) * 1000, 3)
+    }
+
+@router.route('/meals')
+def list_meals(request):
+    user_id = _user_id(request)
+    if not MEAL_LOG:
+        return {"error": "Meal log not available"}, 503
+    if not user_id:
+        return {"error": "user_id is required"}, 400
+    limit = min(_int_param(request, 'limit', 50), 500)
+    return {"meals": MEAL_LOG.list_meals(user_id, limit, encoded=True)}
+
+@router.route('/meals', methods=['POST'])
+def log_meals(request):
+    # Log one meal ({"nutrition": ...}) or bulk import ({"meals": [...]})
+    data = request.json()
+    user_id = _user_id(request, data)
+    if not MEAL_LOG:
+        return {"error": "Meal log not available"}, 503
+    if not isinstance(data, dict):
+        return {"error": "Invalid JSON body"}, 400
+    try:
+        if 'meals' in data:
+            return {"meal_ids": MEAL_LOG.add_meals(user_id, data['meals'])}, 201
+        return {"meal_id": MEAL_LOG.add_meal(user_id, data)}, 201
+    except MealLogError as e:
+        return {"error": str(e)}, 400
+
+@router.route('/meals/{meal_id:int}', methods=['DELETE'])
+def delete_meal(request):
+    user_id = _user_id(request)
+    if not MEAL_LOG:
+        return {"error": "Meal log not available"}, 503
+    if not user_id:
+        return {"error": "user_id is required"}, 400
+    if MEAL_LOG.delete_meal(user_id, request.params['meal_id']):
+        return {"deleted": True}
+    return {"error": "Meal not found"}, 404
+
+@router.route('/summary')
+def summary(request):
+    user_id = _user_id(request)
+    if not MEAL_LOG:
+        return {"error": "Meal log not available"}, 503
+    if not user_id:
+        return {"error": "user_id is required"}, 400
+    try:
+        return MEAL_LOG.summary(user_id, period=request.arg('period', 'day'), date=request.arg('date'))
+    except MealLogError as e:
+        return {"error": str(e)}, 400
+
+@router.route('/nutrition/compute', methods=['POST'])
+def nutrition_compute(request):
+    # One recipe ({"ingredients": [...]}) or a batch ({"recipes": [...]})
+    data = request.json()
+    if not isinstance(data, dict):
+        return {"error": "Invalid JSON body"}, 400
+    try:
+        start = time.perf_counter()
+        recipes = TABLES.current.recipes
+        if 'recipes' in data:
+            results = recipes.compute(data['recipes'], encoded=True)
+            return {
+                "recipes": results,
+                "compute_ms": round((time.perf_counter() - start) * 1000, 3)
+            }
+        return recipes.compute([data], encoded=True)[0]
+    except RecipeError as e:
+        return {"error": str(e)}, 400
+
+# People in a /nutrition/gaps request that may be filled in from the meal log
+GAPS_MAX_LOGGED = 1000
+
+def _needs_logged_totals(person):
+    return (isinstance(person, dict) and 'nutrition' not in person and 'vector' not in person
+            and bool(person.get('user_id')))
+
+def _with_logged_totals(person):
+    """A person without intakes gets their meal log totals for period/date (a week counts as 7 days)"""
+    if not _needs_logged_totals(person):
+        return person
+    period = person.get('period', 'day')
+    summary = MEAL_LOG.summary(str(person['user_id']), period=period, date=person.get('date'))
+    return {**person, "nutrition": summary['nutrition'], "days": person.get('days', 7 if period == 'week' else 1)}
+
+@router.route('/nutrition/gaps', methods=['POST'])
+def nutrition_gaps(request):
+    # {"people": [{"user_id", "age", "sex", "nutrition" or "vector", "days", "weight_kg"}]};
+    # people with only a user_id are scored on their logged totals
+    data = request.json()
+    if not isinstance(data, dict):
+        return {"error": "Invalid JSON body"}, 400
+    people = data.get('people')
+    digits = data.get('digits', 1)
+    if not isinstance(digits, int) or isinstance(digits, bool) or not 0 <= digits <= 6:
+        return {"error": "digits must be an integer from 0 to 6"}, 400
+    try:
+        if isinstance(people, list) and MEAL_LOG:
+            logged = sum(1 for person in people if _needs_logged_totals(person))
+            if logged > GAPS_MAX_LOGGED:
+                return {"error": f"At most {GAPS_MAX_LOGGED} people can be read from the meal log per request"}, 400
+            people = [_with_logged_totals(person) for person in people]
+        start = time.perf_counter()
+        result = intake_gaps(people, digits=digits)
+    except (IntakeError, MealLogError) as e:
+        return {"error": str(e)}, 400
+    result["compute_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+@router.route('/admin/reload_tables', methods=['POST'])
+def reload_tables(request):
+    # Rebuild the food tables now instead of waiting for the watcher to notice a change
+    token = request.headers.get('X-Admin-Token') or ''
+    if not ADMIN_TOKEN:
+        return {"error": "Admin endpoints are disabled, set ADMIN_TOKEN"}, 404
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return {"error": "Invalid X-Admin-Token"}, 403
+    if not TABLES.reload():
+        return {"status": "reloading", "food_tables": TABLES.stats()}, 202
+    stats = TABLES.stats()
+    if stats["last_error"]:
+        return {"status": "failed", "food_tables": stats}, 422
+    return {"status": "reloaded", "food_tables": stats}
+
+READY_REQUIRE_VISION = os.environ.get('READY_REQUIRE_VISION', '0') == '1'
+
+def _warm_up(loader):
+    """Replay hot cache keys, wait for Vision, then run a synthetic analysis end to end"""
+    with loader.phase('cache_replay'):
+        replayed = PHASH_CACHE.replay(PHASH_REPLAY_SECONDS)
+        if replayed:
+            print(f"♻️ Replayed {replayed} near-duplicate cache entries")
+    with loader.phase('vision'):
+        VISION_LOADER.wait()
+    with loader.phase('analysis'):
+        # Same decode, matching and serialization steps as /analyze_food, without a Vision call
+        payload = 'data:image/jpeg;base64,' + base64.b64encode(synthetic_food_image() or b'').decode()
+        image_bytes = decode_image(payload)
+        compute_phash(image_bytes)
+        if LOCAL_BATCHER is not None:
+            LOCAL_BATCHER(image_bytes)
+        foods = PIPELINE.match(['grilled chicken', 'rice', 'broccoli'])
+        json_response(PIPELINE.compute(foods, image_bytes, "warm-up"))
+    with loader.phase('tables'):
+        TABLES.current.search.search('chiken brest')
+        TABLES.current.recipes.compute([{"ingredients": [{"id": "rice", "quantity": 100}]}])
+        TABLES.current.text.analyze(["2 eggs, toast with butter and an apple"])
+        TABLES.current.similar_foods().search(TABLES.current.recipes.builtin_densities[0], k=5)
+    return replayed
+
+WARMUP_LOADER = BackgroundLoader('Warm-up', _warm_up, started_at=PROCESS_STARTED)
+
+def readiness_checks():
+    """Everything /ready waits for"""
+    vision_done = VISION_LOADER.state in (READY, FAILED)
+    return {
+        "recognizer": vision_done and (VISION_LOADER.get() is not None or not READY_REQUIRE_VISION),
+        "nutrition_tables": TABLES.current.catalog is not None or current_generation(TABLES.catalog_dir) is None,
+        "caches": 'cache_replay' in WARMUP_LOADER.phases,
+        "warmup": WARMUP_LOADER.state == READY,
+    }
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
     print(f"🚀 Starting All Ten API with Google Vision on port {port}")
-    server = HTTPServer(('0.0.0.0', port), GoogleVisionNutritionAPI)
-    server.serve_forever()
+    if VISION_STARTUP == 'blocking':
+        VISION_LOADER.load()
+    
+    def on_listening():
+        STARTUP["listening_ms"] = round((time.perf_counter() - PROCESS_STARTED) * 1000, 1)
+        print(f"📡 Listening {STARTUP['listening_ms']:.0f} ms after start")
+        VISION_LOADER.start()
+        WARMUP_LOADER.start()
+        TABLES.start()
+    
+    serve(router, '0.0.0.0', port, on_listening)
@@ -1,376 +1,48 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import base64
+from flask import Flask
 import numpy as np
 from PIL import Image
 import io
-import json
 import os
+import functools
+
+from allten.adapters.flask_app import register_router
+from allten.admission import AdmissionController
+from allten.batching import MicroBatcher
+from allten.core import FAST_LANE, AnalysisPipeline, Router
+from allten.core.estimates import database_totals
+from allten.food_data import FOOD_DATABASE, SERVING_GRAMS, VISION_FOOD_RANGES
+from allten.ingest import MAX_BODY_BYTES
+from allten.local_recognizer import load_local_classifier
+from allten.recipes import RecipeCalculator, RecipeError
 
 app = Flask(__name__)
-CORS(app)
+router = Router(cors_headers='Content-Type, X-API-Key')
+# Werkzeug answers 413 for larger bodies before they are read
+app.config['MAX_CONTENT_LENGTH'] = MAX_BODY_BYTES
 
-# Simple food recognition (you can replace with ML model)
-FOOD_DATABASE = {
-    "apple": {
-        "calories": 95,
-        "protein": 0.5,
-        "carbs": 25,
-        "fat": 0.3,
-        "fiber": 4.4,
-        "sugar": 19,
-        "sodium": 2,
-        "micronutrients": {
-            "vitamin_c": 8.4,
-            "iron": 0.2,
-            "calcium": 11,
-            "potassium": 195,
-            "vitamin_a": 98,
-            "vitamin_e": 0.3,
-            "vitamin_k": 2.2,
-            "folate": 3,
-            "niacin": 0.1,
-            "riboflavin": 0.1,
-            "thiamin": 0.1,
-            "vitamin_b6": 0.1,
-            "phosphorus": 20,
-            "selenium": 0,
-            "copper": 0.1,
-            "manganese": 0.1,
-            "chromium": 0,
-            "molybdenum": 0,
-            "iodine": 0,
-            "chloride": 0,
-            "biotin": 0,
-            "pantothenic_acid": 0.1,
-            "choline": 6,
-            "betaine": 0,
-            "taurine": 0,
-            "creatine": 0,
-            "carnitine": 0,
-            "inositol": 0,
-            "paba": 0,
-            "lipoic_acid": 0,
-            "coq10": 0,
-            "glutathione": 0,
-            "melatonin": 0,
-            "serotonin": 0,
-            "dopamine": 0,
-            "norepinephrine": 0,
-            "epinephrine": 0,
-            "histamine": 0,
-            "gaba": 0,
-            "glycine": 0,
-            "proline": 0,
-            "serine": 0,
-            "threonine": 0,
-            "tryptophan": 0,
-            "tyrosine": 0,
-            "valine": 0,
-            "alanine": 0,
-            "arginine": 0,
-            "asparagine": 0,
-            "aspartic_acid": 0,
-            "cysteine": 0,
-            "glutamine": 0,
-            "glutamic_acid": 0,
-            "isoleucine": 0,
-            "leucine": 0,
-            "lysine": 0,
-            "methionine": 0,
-            "phenylalanine": 0,
-            "histidine": 0,
-        }
-    },
-    "banana": {
-        "calories": 105,
-        "protein": 1.3,
-        "carbs": 27,
-        "fat": 0.4,
-        "fiber": 3.1,
-        "sugar": 14,
-        "sodium": 1,
-        "micronutrients": {
-            "vitamin_c": 10.3,
-            "iron": 0.3,
-            "calcium": 6,
-            "potassium": 422,
-            "vitamin_a": 76,
-            "vitamin_e": 0.1,
-            "vitamin_k": 0.6,
-            "folate": 24,
-            "niacin": 0.8,
-            "riboflavin": 0.1,
-            "thiamin": 0.1,
-            "vitamin_b6": 0.4,
-            "phosphorus": 26,
-            "selenium": 1,
-            "copper": 0.1,
-            "manganese": 0.3,
-            "chromium": 0,
-            "molybdenum": 0,
-            "iodine": 0,
-            "chloride": 0,
-            "biotin": 0,
-            "pantothenic_acid": 0.4,
-            "choline": 12,
-            "betaine": 0,
-            "taurine": 0,
-            "creatine": 0,
-            "carnitine": 0,
-            "inositol": 0,
-            "paba": 0,
-            "lipoic_acid": 0,
-            "coq10": 0,
-            "glutathione": 0,
-            "melatonin": 0,
-            "serotonin": 0,
-            "dopamine": 0,
-            "norepinephrine": 0,
-            "epinephrine": 0,
-            "histamine": 0,
-            "gaba": 0,
-            "glycine": 0,
-            "proline": 0,
-            "serine": 0,
-            "threonine": 0,
-            "tryptophan": 0,
-            "tyrosine": 0,
-            "valine": 0,
-            "alanine": 0,
-            "arginine": 0,
-            "asparagine": 0,
-            "aspartic_acid": 0,
-            "cysteine": 0,
-            "glutamine": 0,
-            "glutamic_acid": 0,
-            "isoleucine": 0,
-            "leucine": 0,
-            "lysine": 0,
-            "methionine": 0,
-            "phenylalanine": 0,
-            "histidine": 0,
-        }
-    },
-    "chicken_breast": {
-        "calories": 165,
-        "protein": 31,
-        "carbs": 0,
-        "fat": 3.6,
-        "fiber": 0,
-        "sugar": 0,
-        "sodium": 74,
-        "micronutrients": {
-            "vitamin_c": 0,
-            "iron": 1.0,
-            "calcium": 15,
-            "potassium": 256,
-            "vitamin_a": 6,
-            "vitamin_e": 0.2,
-            "vitamin_k": 0,
-            "folate": 4,
-            "niacin": 13.7,
-            "riboflavin": 0.1,
-            "thiamin": 0.1,
-            "vitamin_b6": 0.6,
-            "phosphorus": 228,
-            "selenium": 22,
-            "copper": 0.1,
-            "manganese": 0,
-            "chromium": 0,
-            "molybdenum": 0,
-            "iodine": 7,
-            "chloride": 0,
-            "biotin": 0,
-            "pantothenic_acid": 0.9,
-            "choline": 73,
-            "betaine": 0,
-            "taurine": 0,
-            "creatine": 0,
-            "carnitine": 0,
-            "inositol": 0,
-            "paba": 0,
-            "lipoic_acid": 0,
-            "coq10": 0,
-            "glutathione": 0,
-            "melatonin": 0,
-            "serotonin": 0,
-            "dopamine": 0,
-            "norepinephrine": 0,
-            "epinephrine": 0,
-            "histamine": 0,
-            "gaba": 0,
-            "glycine": 0,
-            "proline": 0,
-            "serine": 0,
-            "threonine": 0,
-            "tryptophan": 0,
-            "tyrosine": 0,
-            "valine": 0,
-            "alanine": 0,
-            "arginine": 0,
-            "asparagine": 0,
-            "aspartic_acid": 0,
-            "cysteine": 0,
-            "glutamine": 0,
-            "glutamic_acid": 0,
-            "isoleucine": 0,
-            "leucine": 0,
-            "lysine": 0,
-            "methionine": 0,
-            "phenylalanine": 0,
-            "histidine": 0,
-        }
-    },
-    "rice": {
-        "calories": 130,
-        "protein": 2.7,
-        "carbs": 28,
-        "fat": 0.3,
-        "fiber": 0.4,
-        "sugar": 0.1,
-        "sodium": 0,
-        "micronutrients": {
-            "vitamin_c": 0,
-            "iron": 0.2,
-            "calcium": 10,
-            "potassium": 35,
-            "vitamin_a": 0,
-            "vitamin_e": 0.1,
-            "vitamin_k": 0,
-            "folate": 8,
-            "niacin": 1.6,
-            "riboflavin": 0.1,
-            "thiamin": 0.1,
-            "vitamin_b6": 0.1,
-            "phosphorus": 43,
-            "selenium": 15,
-            "copper": 0.1,
-            "manganese": 0.5,
-            "chromium": 0,
-            "molybdenum": 0,
-            "iodine": 0,
-            "chloride": 0,
-            "biotin": 0,
-            "pantothenic_acid": 0.4,
-            "choline": 9,
-            "betaine": 0,
-            "taurine": 0,
-            "creatine": 0,
-            "carnitine": 0,
-            "inositol": 0,
-            "paba": 0,
-            "lipoic_acid": 0,
-            "coq10": 0,
-            "glutathione": 0,
-            "melatonin": 0,
-            "serotonin": 0,
-            "dopamine": 0,
-            "norepinephrine": 0,
-            "epinephrine": 0,
-            "histamine": 0,
-            "gaba": 0,
-            "glycine": 0,
-            "proline": 0,
-            "serine": 0,
-            "threonine": 0,
-            "tryptophan": 0,
-            "tyrosine": 0,
-            "valine": 0,
-            "alanine": 0,
-            "arginine": 0,
-            "asparagine": 0,
-            "aspartic_acid": 0,
-            "cysteine": 0,
-            "glutamine": 0,
-            "glutamic_acid": 0,
-            "isoleucine": 0,
-            "leucine": 0,
-            "lysine": 0,
-            "methionine": 0,
-            "phenylalanine": 0,
-            "histidine": 0,
-        }
-    },
-    "broccoli": {
-        "calories": 55,
-        "protein": 3.7,
-        "carbs": 11,
-        "fat": 0.6,
-        "fiber": 5.2,
-        "sugar": 1.5,
-        "sodium": 33,
-        "micronutrients": {
-            "vitamin_c": 89.2,
-            "iron": 0.7,
-            "calcium": 47,
-            "potassium": 316,
-            "vitamin_a": 623,
-            "vitamin_e": 0.8,
-            "vitamin_k": 101.6,
-            "folate": 63,
-            "niacin": 0.6,
-            "riboflavin": 0.1,
-            "thiamin": 0.1,
-            "vitamin_b6": 0.2,
-            "phosphorus": 66,
-            "selenium": 2.5,
-            "copper": 0.1,
-            "manganese": 0.2,
-            "chromium": 0,
-            "molybdenum": 0,
-            "iodine": 0,
-            "chloride": 0,
-            "biotin": 0,
-            "pantothenic_acid": 0.6,
-            "choline": 18,
-            "betaine": 0,
-            "taurine": 0,
-            "creatine": 0,
-            "carnitine": 0,
-            "inositol": 0,
-            "paba": 0,
-            "lipoic_acid": 0,
-            "coq10": 0,
-            "glutathione": 0,
-            "melatonin": 0,
-            "serotonin": 0,
-            "dopamine": 0,
-            "norepinephrine": 0,
-            "epinephrine": 0,
-            "histamine": 0,
-            "gaba": 0,
-            "glycine": 0,
-            "proline": 0,
-            "serine": 0,
-            "threonine": 0,
-            "tryptophan": 0,
-            "tyrosine": 0,
-            "valine": 0,
-            "alanine": 0,
-            "arginine": 0,
-            "asparagine": 0,
-            "aspartic_acid": 0,
-            "cysteine": 0,
-            "glutamine": 0,
-            "glutamic_acid": 0,
-            "isoleucine": 0,
-            "leucine": 0,
-            "lysine": 0,
-            "methionine": 0,
-            "phenylalanine": 0,
-            "histidine": 0,
-        }
-    }
-}
+# On-box CPU classifier whose classes are FOOD_DATABASE keys (None if no model is deployed)
+LOCAL_CLASSIFIER = load_local_classifier(FOOD_DATABASE.keys())
+
+# Concurrent requests share one batched forward pass
+LOCAL_BATCHER = MicroBatcher(
+    functools.partial(LOCAL_CLASSIFIER.predict_batch, top_k=1),
+    max_batch_size=int(os.environ.get('LOCAL_BATCH_MAX_SIZE', 8)),
+    max_wait_ms=float(os.environ.get('LOCAL_BATCH_MAX_WAIT_MS', 3)),
+    name='local-model-batcher'
+) if LOCAL_CLASSIFIER is not None else None
+
+# Recipe totals over per-gram densities of the built-in food tables
+RECIPES = RecipeCalculator(FOOD_DATABASE, VISION_FOOD_RANGES, SERVING_GRAMS)
 
-def simple_food_recognition(image_data):
+def simple_food_recognition(image_bytes):
     """
-    Simple food recognition based on image characteristics
-    In a real implementation, you'd use a trained ML model
+    Recognize foods with the local model, falling back to
+    simple color heuristics when no model is available
     """
-    # Convert base64 to image
-    image_bytes = base64.b64decode(image_data)
+    if LOCAL_BATCHER is not None:
+        predictions = LOCAL_BATCHER(image_bytes)
+        return [food for food, score in predictions]
+    
     image = Image.open(io.BytesIO(image_bytes))
     
     # Convert to numpy array for analysis
@@ -393,129 +65,61 @@ def simple_food_recognition(image_data):
     else:
         return ["banana"]  # Default
 
-@app.route('/analyze_food', methods=['POST'])
-def analyze_food():
+# Recognized names are FOOD_DATABASE keys; totals are summed over the detected foods
+PIPELINE = AnalysisPipeline(
+    [(simple_food_recognition, None)],
+    match=list,
+    compute=lambda foods, image_bytes, analysis_method: database_totals(foods, FOOD_DATABASE)
+)
+
+# Caps concurrent analyses and sheds load once the queue is full
+ANALYSIS_ADMISSION = AdmissionController('analysis')
+
+@router.route('/analyze_food', methods=['POST'])
+@ANALYSIS_ADMISSION.guard
+def analyze_food(request):
+    return PIPELINE.analyze(request.json())
+
+@router.route('/nutrition/compute', methods=['POST'])
+def nutrition_compute(request):
+    data = request.json()
+    if not isinstance(data, dict):
+        return {'error': 'Invalid JSON body'}, 400
     try:
-        data = request.get_json()
-        image_data = data.get('image')
-        
-        if not image_data:
-            return jsonify({'error': 'No image data provided'}), 400
-        
-        # Recognize foods in the image
-        detected_foods = simple_food_recognition(image_data)
-        
-        # Calculate nutrition totals
-        total_nutrition = {
-            "calories": 0,
-            "protein": 0,
-            "carbs": 0,
-            "fat": 0,
-            "fiber": 0,
-            "sugar": 0,
-            "sodium": 0,
-            "micronutrients": {
-                "vitamin_c": 0,
-                "iron": 0,
-                "calcium": 0,
-                "potassium": 0,
-                "vitamin_a": 0,
-                "vitamin_e": 0,
-                "vitamin_k": 0,
-                "folate": 0,
-                "niacin": 0,
-                "riboflavin": 0,
-                "thiamin": 0,
-                "vitamin_b6": 0,
-                "phosphorus": 0,
-                "selenium": 0,
-                "copper": 0,
-                "manganese": 0,
-                "chromium": 0,
-                "molybdenum": 0,
-                "iodine": 0,
-                "chloride": 0,
-                "biotin": 0,
-                "pantothenic_acid": 0,
-                "choline": 0,
-                "betaine": 0,
-                "taurine": 0,
-                "creatine": 0,
-                "carnitine": 0,
-                "inositol": 0,
-                "paba": 0,
-                "lipoic_acid": 0,
-                "coq10": 0,
-                "glutathione": 0,
-                "melatonin": 0,
-                "serotonin": 0,
-                "dopamine": 0,
-                "norepinephrine": 0,
-                "epinephrine": 0,
-                "histamine": 0,
-                "gaba": 0,
-                "glycine": 0,
-                "proline": 0,
-                "serine": 0,
-                "threonine": 0,
-                "tryptophan": 0,
-                "tyrosine": 0,
-                "valine": 0,
-                "alanine": 0,
-                "arginine": 0,
-                "asparagine": 0,
-                "aspartic_acid": 0,
-                "cysteine": 0,
-                "glutamine": 0,
-                "glutamic_acid": 0,
-                "isoleucine": 0,
-                "leucine": 0,
-                "lysine": 0,
-                "methionine": 0,
-                "phenylalanine": 0,
-                "histidine": 0,
-            }
-        }
-        
-        # Sum nutrition from all detected foods
-        for food in detected_foods:
-            if food in FOOD_DATABASE:
-                food_data = FOOD_DATABASE[food]
-                total_nutrition["calories"] += food_data["calories"]
-                total_nutrition["protein"] += food_data["protein"]
-                total_nutrition["carbs"] += food_data["carbs"]
-                total_nutrition["fat"] += food_data["fat"]
-                total_nutrition["fiber"] += food_data["fiber"]
-                total_nutrition["sugar"] += food_data["sugar"]
-                total_nutrition["sodium"] += food_data["sodium"]
-                
-                # Add micronutrients
-                for nutrient, value in food_data["micronutrients"].items():
-                    total_nutrition["micronutrients"][nutrient] += value
-        
-        return jsonify({
-            "success": True,
-            "detected_foods": detected_foods,
-            "nutrition": total_nutrition
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        if 'recipes' in data:
+            return {'recipes': RECIPES.compute(data['recipes'], encoded=True)}
+        return RECIPES.compute([data], encoded=True)[0]
+    except RecipeError as e:
+        return {'error': str(e)}, 400
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    return jsonify({'status': 'healthy', 'message': 'All Ten Nutrition API is running!'})
+@router.route('/health', lane=FAST_LANE)
+def health_check(request):
+    return {'status': 'healthy', 'message': 'All Ten Nutrition API is running!'}
 
-@app.route('/', methods=['GET'])
-def root():
-    return jsonify({
+@router.route('/metrics', lane=FAST_LANE)
+def metrics(request):
+    return {
+        'local_model': LOCAL_CLASSIFIER.stats() if LOCAL_CLASSIFIER else None,
+        'local_batcher': LOCAL_BATCHER.stats() if LOCAL_BATCHER else None,
+        'pipeline': PIPELINE.stats(),
+        'admission': ANALYSIS_ADMISSION.stats(),
+        'lanes': router.lane_stats()
+    }
+
+@router.route('/', lane=FAST_LANE)
+def root(request):
+    return {
         'message': 'All Ten Nutrition API',
         'endpoints': {
             'health': '/health',
-            'analyze_food': '/analyze_food'
+            'analyze_food': '/analyze_food',
+            'nutrition_compute': '/nutrition/compute',
+            'metrics': '/metrics'
         }
-    })
+    }
+
+register_router(app, router)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(debug=False, host='0.0.0.0', port=port) 
\ No newline at end of file
+    app.run(debug=False, host='0.0.0.0', port=port)
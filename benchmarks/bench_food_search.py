@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark the food search index against a large synthetic catalogue
+
+Reports index build time, per-query latency for prefix, exact and
+misspelled queries, and how often a misspelled name still finds its food.
+
+    python benchmarks/bench_food_search.py --foods 300000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allten.food_data import FOOD_ALIASES, FOOD_DATABASE, VISION_FOOD_RANGES
+from allten.food_search import FoodSearchIndex, builtin_food_entries
+
+STYLES = ['raw', 'boiled', 'baked', 'fried', 'grilled', 'roasted', 'steamed', 'canned', 'frozen', 'dried',
+          'smoked', 'braised', 'poached', 'pickled', 'sauteed']
+BASES = ['chicken', 'beef', 'pork', 'salmon', 'tuna', 'rice', 'pasta', 'bread', 'potato', 'broccoli', 'carrot',
+         'spinach', 'tomato', 'onion', 'apple', 'banana', 'orange', 'cheese', 'milk', 'yogurt', 'lentils',
+         'chickpeas', 'oats', 'quinoa', 'turkey', 'shrimp', 'tofu', 'almonds', 'walnuts', 'mushroom']
+QUALIFIERS = ['breast', 'thigh', 'fillet', 'whole', 'sliced', 'diced', 'organic', 'low fat', 'skinless',
+              'with salt', 'without salt', 'unsweetened', 'in oil', 'in water', 'enriched', 'wholegrain']
+BRANDS = [f"brand{i}" for i in range(700)]
+
+
+def synthetic_catalogue(count, seed=0):
+    rng = random.Random(seed)
+    entries = builtin_food_entries(FOOD_DATABASE, VISION_FOOD_RANGES, FOOD_ALIASES)
+    seen = {name for _, name, _, _ in entries}
+    while len(entries) < count:
+        name = f"{rng.choice(BASES)} {rng.choice(QUALIFIERS)} {rng.choice(STYLES)} {rng.choice(BRANDS)}"
+        if name not in seen:
+            seen.add(name)
+            entries.append((f"syn{len(entries)}", name, [], 'synthetic'))
+    return entries
+
+
+def misspell(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def time_queries(index, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1e6, samples[int(len(samples) * 0.99) - 1] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--foods', type=int, default=300000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    entries = synthetic_catalogue(args.foods)
+    start = time.perf_counter()
+    index = FoodSearchIndex(entries)
+    print(f"built index over {len(entries)} foods in {time.perf_counter() - start:.2f} s")
+
+    rng = random.Random(1)
+    names = [name for _, name, _, _ in entries]
+    workloads = {
+        "prefix (2-6 chars)": [rng.choice(BASES)[:rng.randint(2, 6)] for _ in range(args.queries)],
+        "word prefix": [rng.choice(QUALIFIERS)[:5] for _ in range(args.queries)],
+        "exact name": [rng.choice(names) for _ in range(args.queries)],
+        "typo": [misspell(rng.choice(BASES), rng) for _ in range(args.queries)],
+        "typo, long name": [misspell(rng.choice(names), rng) for _ in range(args.queries)],
+    }
+    for name, queries in workloads.items():
+        p50, p99 = time_queries(index, queries)
+        print(f"{name:<20} p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+
+    originals = [rng.choice(names) for _ in range(args.queries)]
+    found = sum(any(result['name'] == original for result in index.search(misspell(original, rng)))
+                for original in originals)
+    print(f"typo recall (long names, top {index.top_k}): {found / len(originals):.1%}")
+
+
+if __name__ == '__main__':
+    main()
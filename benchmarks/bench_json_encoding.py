@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON encoding of response payloads
+
+Encodes the full /analyze_food nutrition_data payload and a batch of
+/nutrition/compute recipe results with every installed backend: the old
+json.dumps(...).encode(), allten.core.encoding.dumps, and for the recipe
+batch the nutrient-vector template that formats each nutrition block
+straight from its vector instead of building the nested dict.
+nutrition_json() only uses the template with the stdlib backend, where
+it measures faster; orjson and ujson are faster with the dict.
+
+    python benchmarks/bench_json_encoding.py --recipes 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allten.core import encoding
+from allten.core.estimates import estimate_nutrition
+from allten.food_data import VISION_FOOD_RANGES
+from allten.nutrients import NUTRIENT_FIELDS, unflatten_nutrition
+
+
+def per_call_us(fn, min_seconds=0.5):
+    """Mean microseconds per call of fn, repeated for at least min_seconds"""
+    fn()
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=1000)
+    args = parser.parse_args()
+
+    nutrition_data = estimate_nutrition(['chicken', 'rice', 'broccoli'], b'benchmark image',
+                                        VISION_FOOD_RANGES, "Google Cloud Vision API + All Ten AI")
+    rng = random.Random(0)
+    vectors = [[round(rng.uniform(0, 500), 2) for _ in NUTRIENT_FIELDS] for _ in range(args.recipes)]
+
+    def recipe_batch(nutrition):
+        return {"recipes": [{
+            "name": f"recipe {i}", "servings": 2, "total_grams": 450.0,
+            "ingredients": [{"id": "rice", "grams": 200.0}, {"id": "chicken_breast", "grams": 150.0}],
+            "total": nutrition(vector), "per_serving": nutrition([value / 2 for value in vector]),
+        } for i, vector in enumerate(vectors)]}
+
+    backends = [name for name in ('orjson', 'ujson', 'stdlib') if encoding._BACKENDS[name][0]]
+    print(f"Encoders installed: {', '.join(backends)} (default: {encoding.ENCODER})\n")
+    size = len(json.dumps(nutrition_data).encode())
+    print(f"nutrition_data ({size} bytes)")
+    base = per_call_us(lambda: json.dumps(nutrition_data).encode())
+    print(f"  {'json.dumps().encode()':<36} {base:9.2f} us")
+    for name in backends:
+        _, encode = encoding.select_encoder(name)
+        us = per_call_us(lambda: encoding._splice(encode(nutrition_data, None, encoding._default([])), []))
+        print(f"  {name + ' dumps':<36} {us:9.2f} us   {base / us:5.2f}x")
+
+    print(f"\n{args.recipes} recipes, vectors -> response body")
+    base = per_call_us(lambda: json.dumps(recipe_batch(unflatten_nutrition)).encode())
+    print(f"  {'dicts + json.dumps().encode()':<36} {base / 1000:9.2f} ms")
+    for name in backends:
+        _, encode = encoding.select_encoder(name)
+
+        def encode_with(payload, encode=encode):
+            fragments = []
+            return encoding._splice(encode(payload, None, encoding._default(fragments)), fragments)
+
+        for label, nutrition in (("dicts", unflatten_nutrition), ("template", encoding._nutrition_fragment)):
+            us = per_call_us(lambda: encode_with(recipe_batch(nutrition)))
+            print(f"  {label + ' + ' + name:<36} {us / 1000:9.2f} ms   {base / us:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark the on-box CPU food classifier
+
+Reports model load time and per-image latency for single images and
+batches, next to the color heuristic it replaces. Point LOCAL_MODEL_PATH
+at the ONNX model to measure.
+
+    python benchmarks/bench_local_recognizer.py --images 200 --batch 8
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from allten import local_recognizer
+
+
+def make_images(count, size=(640, 480)):
+    """Random-ish JPEGs at a typical phone upload resolution"""
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        base = rng.integers(0, 255, size=(size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+        image = Image.fromarray(base).resize(size, Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def color_heuristic(image_bytes):
+    img_array = np.array(Image.open(io.BytesIO(image_bytes)))
+    return np.mean(img_array, axis=(0, 1))
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(f"{name:<28} p50 {statistics.median(samples) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=8)
+    args = parser.parse_args()
+
+    images = make_images(args.images)
+
+    samples = []
+    for image_bytes in images:
+        start = time.perf_counter()
+        color_heuristic(image_bytes)
+        samples.append(time.perf_counter() - start)
+    report("color heuristic", samples)
+
+    classifier = local_recognizer.load_local_classifier()
+    if classifier is None:
+        print("Local model unavailable, set LOCAL_MODEL_PATH to benchmark it")
+        return
+
+    print(f"model load                   {classifier.load_seconds * 1000:8.1f} ms")
+
+    samples = []
+    for image_bytes in images:
+        start = time.perf_counter()
+        classifier.predict(image_bytes)
+        samples.append(time.perf_counter() - start)
+    report("local model, batch 1", samples)
+
+    samples = []
+    for i in range(0, len(images) - args.batch + 1, args.batch):
+        start = time.perf_counter()
+        classifier.predict_batch(images[i:i + args.batch])
+        samples.append((time.perf_counter() - start) / args.batch)
+    report(f"local model, batch {args.batch} (per image)", samples)
+
+
+if __name__ == '__main__':
+    main()
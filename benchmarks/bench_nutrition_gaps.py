@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark micronutrient gap analysis for whole cohorts
+
+Generates random people (age, sex, weight) with daily intake vectors and
+reports people per second for the broadcast array computation alone, for
+a full /nutrition/gaps request body (parsing, arrays and the per-person
+response), and for a per-person, per-nutrient dict loop like the one the
+clients run.
+
+    python benchmarks/bench_nutrition_gaps.py --people 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allten.core.encoding import dumps
+from allten.intakes import (
+    AMINO_ACIDS_PER_KG, MAX_PEOPLE, RECOMMENDED, REFERENCE_WEIGHT_KG, REFERENCED, SEXES, UPPER_LIMITS, AGE_BANDS,
+    gap_arrays, group_index, intake_gaps
+)
+from allten.nutrients import MICRONUTRIENTS, NUTRIENT_FIELDS
+
+
+def cohort(count, seed=0):
+    rng = np.random.default_rng(seed)
+    ages = rng.integers(1, 90, count)
+    sexes = rng.choice(SEXES, count)
+    weights = rng.uniform(40, 110, count).round(1)
+    # Intakes around the adult references, from a tenth to three times as much
+    scale = np.array([np.mean(RECOMMENDED[name][0] if isinstance(RECOMMENDED[name], tuple) else RECOMMENDED[name])
+                      if name in RECOMMENDED else np.mean(AMINO_ACIDS_PER_KG.get(name, [10])) * 70
+                      for name in MICRONUTRIENTS])
+    intakes = scale * rng.lognormal(0, 0.6, (count, len(MICRONUTRIENTS)))
+    return ages, sexes, weights, intakes
+
+
+def loop_gaps(people):
+    """One person and one nutrient at a time, as the clients do"""
+    results = []
+    for person in people:
+        sex = 0 if person['sex'] == 'male' else 1
+        band = next(i for i, (_, last) in enumerate(AGE_BANDS) if last is None or person['age'] < last + 1)
+        weight = person.get('weight_kg') or REFERENCE_WEIGHT_KG[sex][band]
+        intake = dict(zip(MICRONUTRIENTS, person['vector']))
+        percent, deficits, excesses = {}, {}, {}
+        for name in REFERENCED:
+            if name in RECOMMENDED:
+                values = RECOMMENDED[name]
+                reference = (values[sex] if isinstance(values, tuple) else values)[band]
+            else:
+                reference = AMINO_ACIDS_PER_KG[name][band] * weight
+            percent[name] = round(intake[name] / reference * 100, 1)
+            if intake[name] < reference:
+                deficits[name] = round(reference - intake[name], 2)
+            if name in UPPER_LIMITS and intake[name] > UPPER_LIMITS[name][band]:
+                excesses[name] = round(intake[name] - UPPER_LIMITS[name][band], 2)
+        results.append({"percent_dv": percent, "deficits": deficits, "excesses": excesses})
+    return results
+
+
+def rate(fn, count, repeat=3):
+    best = min(timed(fn) for _ in range(repeat))
+    return count / best
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--people', type=int, default=100000)
+    args = parser.parse_args()
+
+    ages, sexes, weights, intakes = cohort(args.people)
+    groups = np.array([group_index(int(age), sex) for age, sex in zip(ages, sexes)])
+    request_size = min(args.people, MAX_PEOPLE)
+    people = [{"user_id": str(i), "age": int(ages[i]), "sex": str(sexes[i]), "weight_kg": float(weights[i]),
+               "vector": intakes[i].tolist()} for i in range(request_size)]
+    print(f"{args.people} people x {len(MICRONUTRIENTS)} micronutrients "
+          f"({len(REFERENCED)} with a reference intake), vectors of {len(NUTRIENT_FIELDS)} or {len(MICRONUTRIENTS)}\n")
+
+    print(f"{'computation':<44} {'people/s':>12}")
+    print(f"{'gap_arrays (%DV, deficits, excesses)':<44} {rate(lambda: gap_arrays(intakes, groups, weights), args.people):12.0f}")
+    print(f"{'intake_gaps, ' + str(request_size) + ' people per request':<44} "
+          f"{rate(lambda: intake_gaps(people), request_size):12.0f}")
+    print(f"{'intake_gaps + JSON encoding':<44} {rate(lambda: dumps(intake_gaps(people)), request_size):12.0f}")
+    print(f"{'per-person, per-nutrient loop':<44} {rate(lambda: loop_gaps(people), request_size):12.0f}")
+
+    percent, _, _ = gap_arrays(intakes[:request_size], groups[:request_size], weights[:request_size])
+    looped = loop_gaps(people[:100])
+    mismatches = sum(abs(looped[i]["percent_dv"][name] - round(percent[i, j], 1)) > 0.1
+                     for i in range(100) for j, name in enumerate(REFERENCED))
+    print(f"\n%DV differences against the loop (first 100 people): {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
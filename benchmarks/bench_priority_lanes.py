@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Check that /health latency stays flat while the analysis pool is saturated
+
+Serves a router whose /analyze_food blocks for --analysis-ms (standing in
+for a Vision call) on each stdlib transport, measures /health latency on
+an idle server, then again while enough clients hammer /analyze_food to
+keep every analysis worker busy. Exits non-zero if saturated p99 exceeds
+idle p99 by more than --max-increase-ms on any transport. --no-lanes puts
+/health on the default lane to show what happens without the fast lane.
+
+    python benchmarks/bench_priority_lanes.py --analysis-clients 64
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from allten.core import DEFAULT_LANE, FAST_LANE, Router
+
+TRANSPORTS = ['threading', 'asyncio']
+
+
+def serve(transport, port, analysis_ms, lanes):
+    from allten.adapters import serve as serve_router
+    router = Router()
+
+    @router.route('/health', lane=FAST_LANE if lanes else DEFAULT_LANE)
+    def health(request):
+        return {"status": "healthy"}
+
+    @router.route('/analyze_food', methods=['POST'])
+    def analyze_food(request):
+        request.json()
+        time.sleep(analysis_ms / 1000)
+        return {"detected_foods": ["mixed meal"]}
+
+    serve_router(router, '127.0.0.1', port, transport=transport)
+
+
+def health_latencies(port, count, interval):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        conn.request('GET', '/health')
+        conn.getresponse().read()
+        samples.append(time.perf_counter() - start)
+        time.sleep(interval)
+    conn.close()
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.99) - 1] * 1000
+
+
+def saturate(port, clients, stop):
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while not stop.is_set():
+            try:
+                conn.request('POST', '/analyze_food', body=b'{"image": ""}',
+                             headers={'Content-Type': 'application/json'})
+                conn.getresponse().read()
+            except (OSError, http.client.HTTPException):
+                # Connection closed after its request limit, or the server is stopping
+                conn.close()
+        conn.close()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_until_up(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            health_latencies(port, 1, 0)
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transports', default=','.join(TRANSPORTS))
+    parser.add_argument('--analysis-clients', type=int, default=64)
+    parser.add_argument('--analysis-ms', type=float, default=500)
+    parser.add_argument('--probes', type=int, default=200)
+    parser.add_argument('--max-increase-ms', type=float, default=50)
+    parser.add_argument('--no-lanes', action='store_true')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--serve', choices=TRANSPORTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.analysis_ms, not args.no_lanes)
+        return
+
+    failed = False
+    for transport in args.transports.split(','):
+        command = [sys.executable, os.path.abspath(__file__), '--serve', transport, '--port', str(args.port),
+                   '--analysis-ms', str(args.analysis_ms)] + (['--no-lanes'] if args.no_lanes else [])
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        stop = threading.Event()
+        try:
+            if not wait_until_up(args.port):
+                print(f"{transport:<10} did not start")
+                failed = True
+                continue
+            idle_p50, idle_p99 = health_latencies(args.port, args.probes, 0.005)
+            saturate(args.port, args.analysis_clients, stop)
+            time.sleep(1)
+            busy_p50, busy_p99 = health_latencies(args.port, args.probes, 0.005)
+            ok = busy_p99 - idle_p99 <= args.max_increase_ms
+            failed |= not ok
+            print(f"{transport:<10} /health idle p50 {idle_p50:6.2f} ms p99 {idle_p99:6.2f} ms   "
+                  f"saturated p50 {busy_p50:7.2f} ms p99 {busy_p99:7.2f} ms   {'ok' if ok else 'FAIL'}")
+        finally:
+            stop.set()
+            server.terminate()
+            server.wait()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-request cost of logging
+
+Compares what a request thread pays to log one request: the old
+synchronous print of an f-string, and RequestLogger with every request
+kept, with 10% sampling and in slow-request-only mode. Several threads
+log at once between simulated handler work, as they would under load,
+and the output goes through a pipe to a reader that takes its time (like
+a container's stdout), so a blocking write shows up in the numbers.
+
+    python benchmarks/bench_request_log.py --threads 8 --records 5000
+    python benchmarks/bench_request_log.py --reader-delay-ms 40   # stdout that cannot keep up
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allten.core import Request
+from allten.request_log import RequestLogger
+
+
+def slow_reader(fd, delay):
+    # Drains the pipe in 64 KiB reads with a pause between them
+    while True:
+        data = os.read(fd, 65536)
+        if not data:
+            return
+        time.sleep(delay)
+
+
+def run_threads(threads, records, log_one, handler_seconds):
+    """Mean and p99 per-call microseconds across all threads"""
+    per_thread = []
+    samples = []
+
+    def worker():
+        request = Request('POST', '/analyze_food', client='203.0.113.7')
+        local = []
+        start = time.perf_counter()
+        for i in range(records):
+            call = time.perf_counter()
+            log_one(request, i)
+            local.append(time.perf_counter() - call)
+            if handler_seconds:
+                time.sleep(handler_seconds)  # the rest of the request
+        per_thread.append(time.perf_counter() - start)
+        samples.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    wall = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - wall
+    samples.sort()
+    return (statistics.mean(samples) * 1e6, samples[int(len(samples) * 0.99)] * 1e6,
+            threads * records / wall)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--reader-delay-ms', type=float, default=0.2)
+    parser.add_argument('--handler-us', type=float, default=100,
+                        help="time each simulated request spends outside logging (0 logs back to back)")
+    args = parser.parse_args()
+
+    read_fd, write_fd = os.pipe()
+    reader = threading.Thread(target=slow_reader, args=(read_fd, args.reader_delay_ms / 1000), daemon=True)
+    reader.start()
+    # Line-buffered like stdout on a terminal or under most process managers
+    out = os.fdopen(write_fd, 'w', buffering=1)
+
+    def print_line(request, i):
+        print(f"🔍 [{time.strftime('%Y-%m-%d %H:%M:%S')}] \"{request.method} {request.path} HTTP/1.1\" 200 "
+              f"- {request.client} labels: ['grilled chicken', 'rice']", file=out)
+
+    modes = [("print (synchronous)", None, print_line)]
+    for name, kwargs in [("RequestLogger, all", {}),
+                         ("RequestLogger, 10% sampled", {"sample_rate": 0.1}),
+                         ("RequestLogger, slow only", {"slow_ms": 500})]:
+        logger = RequestLogger(destination='stdout', **kwargs)
+        modes.append((name, logger, lambda request, i, logger=logger: logger.request(
+            request, 200, 0.012, route='/analyze_food', lane='default')))
+
+    real_stdout = sys.stdout
+    print(f"{args.threads} threads x {args.records} requests of {args.handler_us:g} us, pipe reader pausing "
+          f"{args.reader_delay_ms} ms per 64 KiB\n")
+    print(f"{'mode':<28} {'mean us':>9} {'p99 us':>9} {'req/s':>11} {'written':>9} {'dropped':>8}")
+    for name, logger, log_one in modes:
+        sys.stdout = out  # RequestLogger writes to sys.stdout from its own thread
+        try:
+            mean_us, p99_us, rate = run_threads(args.threads, args.records, log_one, args.handler_us / 1e6)
+            if logger is not None:
+                logger.close(timeout=30)
+        finally:
+            sys.stdout = real_stdout
+        stats = logger.stats() if logger else {"written": args.threads * args.records, "dropped": 0}
+        print(f"{name:<28} {mean_us:9.2f} {p99_us:9.2f} {rate:11.0f} {stats['written']:9d} {stats['dropped']:8d}")
+    out.close()
+
+
+if __name__ == '__main__':
+    main()
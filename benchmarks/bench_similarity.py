@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark nutrient-vector similarity search over a million vectors
+
+Generates clustered synthetic nutrient vectors (food-like profiles with
+noise), builds the IVF index and reports build time, then per-query
+latency and recall@k against exact brute force for several nprobe values,
+with equal and with custom nutrient weights.
+
+    python benchmarks/bench_similarity.py --vectors 1000000 --queries 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allten.nutrients import NUTRIENT_FIELDS
+from allten.similarity import VectorIndex, parse_weights
+
+
+def synthetic_vectors(count, profiles=2000, seed=0):
+    """Nutrient vectors scattered around random food profiles, heavy-tailed like real ones"""
+    rng = np.random.default_rng(seed)
+    centres = rng.lognormal(0, 1.5, (profiles, len(NUTRIENT_FIELDS))).astype(np.float32)
+    centres *= rng.random((profiles, len(NUTRIENT_FIELDS))) < 0.7  # many foods lack some nutrients
+    vectors = centres[rng.integers(0, profiles, count)]
+    vectors *= rng.lognormal(0, 0.35, vectors.shape).astype(np.float32)
+    return vectors
+
+
+def timed(search, queries):
+    samples, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.mean(samples) * 1000, samples[int(len(samples) * 0.99)] * 1000, results
+
+
+def recall(results, truth):
+    return statistics.mean(len({key for key, _ in got} & {key for key, _ in want}) / len(want)
+                           for got, want in zip(results, truth))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vectors', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.vectors)
+    start = time.perf_counter()
+    index = VectorIndex(vectors, range(args.vectors), exact_max=0)
+    print(f"{args.vectors} vectors: IVF index with {len(index.centroids)} lists built in "
+          f"{time.perf_counter() - start:.2f} s, {index.data.nbytes / 2 ** 20:.0f} MiB\n")
+
+    rng = np.random.default_rng(1)
+    # Queries are perturbed copies of indexed vectors, like a meal that resembles others
+    sources = vectors[rng.integers(0, args.vectors, args.queries)]
+    queries = sources * rng.lognormal(0, 0.2, sources.shape).astype(np.float32)
+
+    for label, weights in (("equal weights", None),
+                           ("protein:3,fiber:2,sodium:0", parse_weights("protein:3,fiber:2,sodium:0"))):
+        print(f"{label}\n{'search':<18} {'mean ms':>9} {'p99 ms':>9} {'recall@' + str(args.k):>10}")
+        exact_ms, exact_p99, truth = timed(lambda q: index.search(q, args.k, weights, exact=True), queries)
+        print(f"{'exact':<18} {exact_ms:9.2f} {exact_p99:9.2f} {1.0:10.3f}")
+        for nprobe in (4, 8, 16, 32, 64):
+            mean_ms, p99_ms, results = timed(lambda q: index.search(q, args.k, weights, nprobe=nprobe), queries)
+            print(f"{'ivf nprobe=' + str(nprobe):<18} {mean_ms:9.2f} {p99_ms:9.2f} {recall(results, truth):10.3f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
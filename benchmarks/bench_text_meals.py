@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark /analyze_text parsing and totals on one core
+
+Generates random meal descriptions from the built-in foods and reports
+descriptions per second analyzed one at a time and in batches, with the
+phrase cache cold (a new analyzer) and warm (the same descriptions again).
+
+    python benchmarks/bench_text_meals.py --texts 20000 --batch 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allten.food_data import FOOD_ALIASES, FOOD_DATABASE, SERVING_GRAMS, VISION_FOOD_RANGES
+from allten.food_search import FoodSearchIndex, builtin_food_entries
+from allten.recipes import RecipeCalculator
+from allten.text_meals import TextMealAnalyzer
+
+QUANTITIES = ['', '2 ', 'a ', 'one ', '1/2 cup of ', '150g ', 'a bowl of ', '3 slices of ', 'half a ', '2 tbsp ']
+JOINERS = [', ', ' and ', ' with ', ', then ']
+PREFIXES = ['', 'scrambled ', 'fresh ', 'grilled ', 'some ']
+
+
+def descriptions(count, seed=0):
+    rng = random.Random(seed)
+    names = [food.replace('_', ' ') for food in FOOD_DATABASE]
+    names += [alias for aliases in FOOD_ALIASES.values() for alias in aliases]
+    texts = []
+    for _ in range(count):
+        parts = [rng.choice(QUANTITIES) + rng.choice(PREFIXES) + rng.choice(names)
+                 for _ in range(rng.randint(1, 4))]
+        text = parts[0]
+        for part in parts[1:]:
+            text += rng.choice(JOINERS) + part
+        texts.append(text)
+    return texts
+
+
+def rate(analyzer, texts, batch):
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch):
+        analyzer.analyze(texts[i:i + batch], encoded=True)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--texts', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    search = FoodSearchIndex(builtin_food_entries(FOOD_DATABASE, VISION_FOOD_RANGES, FOOD_ALIASES))
+    recipes = RecipeCalculator(FOOD_DATABASE, VISION_FOOD_RANGES, SERVING_GRAMS)
+    texts = descriptions(args.texts)
+    print(f"{len(texts)} descriptions, e.g. {texts[0]!r}\n")
+
+    print(f"{'mode':<24} {'cold /s':>10} {'warm /s':>10}")
+    for name, batch in (("one per call", 1), (f"batches of {args.batch}", args.batch)):
+        analyzer = TextMealAnalyzer(search, recipes)
+        cold = rate(analyzer, texts, batch)
+        warm = rate(analyzer, texts, batch)
+        print(f"{name:<24} {cold:10.0f} {warm:10.0f}")
+
+    results = TextMealAnalyzer(search, recipes).analyze(texts[:1000])
+    matched = sum(not result["unmatched"] for result in results)
+    print(f"\nfully matched: {matched}/{len(results)} descriptions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark the analysis core behind each transport
+
+Serves one Router (GET /health and POST /analyze_food through the Vision
+label matching and nutrition estimate, with fixed labels in place of a
+Vision call) from Flask, http.server and asyncio in turn, each in its own
+process, and drives it with keep-alive clients. Reports requests per second
+and p50/p99 latency per transport and endpoint.
+
+    python benchmarks/bench_transports.py --clients 16 --requests 500
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from allten.core import AnalysisPipeline, Router
+from allten.core.estimates import estimate_nutrition, fallback_nutrition, match_vision_labels
+from allten.food_data import VISION_FOOD_RANGES
+from allten.warmup import synthetic_food_image
+
+TRANSPORTS = ['flask', 'threading', 'asyncio']
+LABELS = ['grilled chicken', 'rice', 'broccoli']
+
+
+def build_router():
+    router = Router()
+    pipeline = AnalysisPipeline(
+        [(lambda image_bytes: LABELS, "benchmark")],
+        match=lambda labels: match_vision_labels(labels, VISION_FOOD_RANGES),
+        compute=lambda foods, image_bytes, method: estimate_nutrition(foods, image_bytes, VISION_FOOD_RANGES, method),
+        fallback=fallback_nutrition
+    )
+
+    @router.route('/health')
+    def health(request):
+        return {"status": "healthy"}
+
+    @router.route('/analyze_food', methods=['POST'])
+    def analyze_food(request):
+        return pipeline.analyze(request.json())
+
+    return router
+
+
+def serve(transport, port):
+    router = build_router()
+    if transport == 'flask':
+        from flask import Flask
+        from werkzeug.serving import run_simple
+        from allten.adapters.flask_app import register_router
+        app = register_router(Flask(__name__), router)
+        run_simple('127.0.0.1', port, app, threaded=True)
+    else:
+        from allten.adapters import serve as serve_router
+        serve_router(router, '127.0.0.1', port, transport=transport)
+
+
+def wait_until_up(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/health')
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def run_clients(port, method, path, body, clients, requests):
+    """Latencies (seconds) of clients x requests calls, each client on one keep-alive connection"""
+    samples = []
+    lock = threading.Lock()
+    headers = {'Content-Type': 'application/json'} if body else {}
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"{method} {path} answered {response.status}")
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transports', default=','.join(TRANSPORTS))
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500, help="requests per client")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--serve', choices=TRANSPORTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    image = base64.b64encode(synthetic_food_image(256) or b'').decode()
+    workloads = {
+        "GET /health": ('GET', '/health', None),
+        "POST /analyze_food": ('POST', '/analyze_food', json.dumps({"image": image}).encode()),
+    }
+    for transport in args.transports.split(','):
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', transport,
+                                   '--port', str(args.port)],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_until_up(args.port):
+                print(f"{transport:<10} did not start (is it installed?)")
+                continue
+            for name, (method, path, body) in workloads.items():
+                run_clients(args.port, method, path, body, args.clients, 20)  # warm up
+                samples, elapsed = run_clients(args.port, method, path, body, args.clients, args.requests)
+                samples.sort()
+                print(f"{transport:<10} {name:<20} {len(samples) / elapsed:8.0f} req/s   "
+                      f"p50 {statistics.median(samples) * 1000:6.2f} ms   "
+                      f"p99 {samples[int(len(samples) * 0.99) - 1] * 1000:6.2f} ms")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
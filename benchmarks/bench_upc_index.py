@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark the on-disk barcode index with millions of products
+
+Writes an index for random GTINs, then reports build time, file size,
+open time and per-lookup latency for known and unknown codes, next to a
+plain dict of the same codes (which would have to be rebuilt in memory
+on every start).
+
+    python benchmarks/bench_upc_index.py --products 3000000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from allten.barcodes import UpcIndex, write_upc_index
+
+
+def per_lookup_us(lookup, codes):
+    samples = []
+    for code in codes:
+        start = time.perf_counter()
+        lookup(code)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.mean(samples) * 1e6, samples[int(len(samples) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=2000000)
+    parser.add_argument('--lookups', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # 12 and 13 digit codes, as UPC-A and EAN-13 products have
+    codes = rng.integers(10 ** 10, 10 ** 13, args.products, dtype=np.int64).astype(np.uint64)
+    known = [int(code) for code in codes[rng.integers(0, args.products, args.lookups)]]
+    unknown = [int(code) for code in rng.integers(10 ** 13, 10 ** 14, args.lookups, dtype=np.int64)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'upc.idx')
+        start = time.perf_counter()
+        stored = write_upc_index(path, codes, np.arange(args.products))
+        build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        index = UpcIndex(path)
+        open_ms = (time.perf_counter() - start) * 1000
+        print(f"{stored} products: built in {build_s:.2f} s, {os.path.getsize(path) / 2 ** 20:.0f} MiB "
+              f"({index.capacity} slots), opened in {open_ms:.2f} ms\n")
+
+        start = time.perf_counter()
+        table = dict(zip(codes.tolist(), range(args.products)))
+        dict_s = time.perf_counter() - start
+
+        print(f"{'lookup':<24} {'mean us':>9} {'p99 us':>9}")
+        for name, sample in (("index, known code", known), ("index, unknown code", unknown)):
+            mean_us, p99_us = per_lookup_us(index.row, sample)
+            print(f"{name:<24} {mean_us:9.2f} {p99_us:9.2f}")
+        mean_us, p99_us = per_lookup_us(table.get, known)
+        print(f"{'dict, known code':<24} {mean_us:9.2f} {p99_us:9.2f}   (built in {dict_s:.2f} s at every start)")
+
+        misses = sum(index.row(code) is None for code in unknown)
+        wrong = sum(index.row(code) != table[code] for code in known[:10000])
+        print(f"\nunknown codes not found: {misses}/{len(unknown)}, wrong rows for known codes: {wrong}")
+
+
+if __name__ == '__main__':
+    main()
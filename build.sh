@@ -4,4 +4,4 @@ pip install --upgrade pip
 pip install -r requirements.txt
 
 echo "Starting the application..."
-gunicorn app:app --bind 0.0.0.0:$PORT --workers 1 
\ No newline at end of file
+gunicorn app:app --bind 0.0.0.0:$PORT --workers 1 --threads 8 
\ No newline at end of file
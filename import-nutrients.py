@@ -0,0 +1,39 @@
+"""
+Compile USDA-style nutrient datasets into the catalogue the servers load
+
+    python import-nutrients.py data/FoodData_Central_csv/ data/branded.jsonl
+    python import-nutrients.py --catalog-dir /var/lib/allten/catalog --workers 4 data/foundation.json
+
+Sources are FoodData Central CSV directories, FoodData Central JSON files or
+JSON Lines files. Re-running with unchanged sources is a no-op; only changed
+sources are parsed again.
+"""
+
+import argparse
+import sys
+import time
+
+from allten.catalog import default_catalog_dir
+from allten.importer import InvalidSourceError, import_sources
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sources', nargs='+', help="CSV directories, .json or .jsonl files")
+    parser.add_argument('--catalog-dir', default=default_catalog_dir())
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="re-import sources even if unchanged")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        import_sources(args.sources, args.catalog_dir, workers=args.workers, force=args.force)
+    except (InvalidSourceError, OSError) as e:
+        print(f"❌ Import failed: {e}")
+        return 1
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import pytest
+
+from allten.admission import AdmissionController, Rejected, client_key
+from allten.core.routing import Request
+
+KEYS = frozenset({'team-a'})
+
+
+def request(client='10.0.0.5', **headers):
+    return Request('POST', '/analyze_food', headers=headers, client=client)
+
+
+def test_only_configured_api_keys_get_their_own_bucket():
+    assert client_key(request(**{'X-API-Key': 'team-a'}), KEYS) == 'key:team-a'
+    assert client_key(request(**{'X-API-Key': 'made-up'}), KEYS) == 'ip:10.0.0.5'
+    assert client_key(request(**{'X-API-Key': 'made-up', 'X-Forwarded-For': '1.2.3.4, 5.6.7.8'}), KEYS) == 'ip:5.6.7.8'
+    assert client_key(request(**{'X-API-Key': 'team-a'}), frozenset()) == 'ip:10.0.0.5'
+
+
+def test_random_keys_do_not_escape_the_rate_limit():
+    admission = AdmissionController('test', rate=0.001, burst=2)
+    for attempt in range(2):
+        admission.acquire(client_key(request(**{'X-API-Key': f'random-{attempt}'}), KEYS))
+        admission.release(0.01)
+    with pytest.raises(Rejected) as error:
+        admission.acquire(client_key(request(**{'X-API-Key': 'random-2'}), KEYS))
+    assert error.value.status == 429
+    assert admission.stats()["tracked_clients"] == 1
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from allten.barcodes import (
+    UpcIndex, decode_barcodes, expand_upce, format_gtin, gtin_candidates, normalize_gtin, write_upc_index
+)
+from allten.catalog import CatalogError, load_catalog, write_catalog
+from allten.nutrients import NUTRIENT_FIELDS
+
+
+@pytest.mark.parametrize("code", ['036000291452', '0036000291452', '00036000291452', '0 36000-29145 2'])
+def test_upc_ean_and_gtin_forms_are_one_number(code):
+    assert normalize_gtin(code) == 36000291452
+    assert format_gtin(normalize_gtin(code)) == '00036000291452'
+
+
+@pytest.mark.parametrize("code", [None, '', '12345', '0360002914521234', '03600029145X', '00000000', 'abc'])
+def test_invalid_codes(code):
+    assert normalize_gtin(code) is None
+
+
+def test_upce_expansion():
+    assert expand_upce('01234565') == '012345000065'
+    assert expand_upce('04252614') == '042100005264'
+    assert expand_upce('21234565') is None  # number system must be 0 or 1
+    assert expand_upce('0123456') is None
+    # An 8-digit code is tried as EAN-8 first, then as UPC-E
+    assert gtin_candidates('01234565') == [1234565, 12345000065]
+    assert gtin_candidates('96385074') == [96385074]
+
+
+def test_index_lookup(tmp_path):
+    path = str(tmp_path / 'upc.idx')
+    codes = np.arange(1, 1001, dtype=np.uint64) * 1000003
+    # A repeated code keeps its last row
+    assert write_upc_index(path, list(codes) + [codes[0]], list(range(1000)) + [5000]) == 1000
+
+    index = UpcIndex(path)
+    assert len(index) == 1000 and index.capacity == 2048
+    assert index.row(int(codes[0])) == 5000
+    assert all(index.row(int(code)) == row for row, code in enumerate(codes[1:], start=1))
+    assert index.row(7) is None
+
+
+def test_index_rejects_other_files(tmp_path):
+    path = tmp_path / 'upc.idx'
+    path.write_bytes(b'not an index at all')
+    with pytest.raises(ValueError):
+        UpcIndex(str(path))
+
+
+def test_catalog_finds_products_by_any_barcode_form(tmp_path):
+    directory = str(tmp_path / 'catalog')
+    columns = np.zeros((len(NUTRIENT_FIELDS), 3), dtype=np.float32)
+    write_catalog(directory, ['fdc:1', 'fdc:2', 'fdc:3'], ['Cola', 'Crackers', 'Apple'], ['fdc'] * 3, [355, 30, 182],
+                  columns, {}, upcs=['036000291452', '012345000065', None])
+
+    catalog = load_catalog(directory)
+    assert catalog.manifest['barcodes'] == 2
+    assert catalog.row_for_upc('0036000291452') == 0
+    assert catalog.row_for_upc('00036000291452') == 0
+    assert catalog.row_for_upc('01234565') == 1  # UPC-E on the pack, UPC-A in the catalogue
+    assert catalog.row_for_upc('5000000000000') is None
+    assert catalog.row_for_upc('not a code') is None
+
+
+def test_unreadable_barcode_index(tmp_path):
+    directory = str(tmp_path / 'catalog')
+    generation = write_catalog(directory, ['fdc:1'], ['Cola'], ['fdc'], [355],
+                               np.zeros((len(NUTRIENT_FIELDS), 1), dtype=np.float32), {}, upcs=['036000291452'])
+    (tmp_path / 'catalog' / generation / 'upc.idx').write_bytes(b'garbage')
+    with pytest.raises(CatalogError):
+        load_catalog(directory)
+
+
+def test_decoding_something_that_is_not_an_image():
+    assert decode_barcodes(b'not an image') == []
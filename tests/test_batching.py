@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from allten.batching import MicroBatcher
+
+
+def gated(batch_fn):
+    gate = threading.Event()
+    calls = []
+
+    def run(items):
+        gate.wait(5)
+        calls.append(list(items))
+        return batch_fn(items)
+    return run, gate, calls
+
+
+def test_concurrent_items_share_a_batch():
+    run, gate, calls = gated(lambda items: [item * 2 for item in items])
+    batcher = MicroBatcher(run, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(5)]
+    gate.set()
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8]
+    assert sum(len(call) for call in calls) == 5
+    assert len(calls) < 5
+
+
+def test_bad_item_only_fails_its_own_caller():
+    def predict(items):
+        if 'corrupt' in items:
+            raise ValueError("cannot decode image")
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(predict, max_batch_size=3, max_wait_ms=500)
+    futures = [batcher.submit(item) for item in ('rice', 'corrupt', 'egg')]
+    assert futures[0].result(timeout=5) == 'RICE'
+    assert futures[2].result(timeout=5) == 'EGG'
+    with pytest.raises(ValueError, match="cannot decode"):
+        futures[1].result(timeout=5)
+    assert batcher.stats()["split_batches"] == 1
+
+
+def test_short_result_list_fails_the_missing_items():
+    batcher = MicroBatcher(lambda items: items[:1], max_batch_size=3, max_wait_ms=500)
+    futures = [batcher.submit(item) for item in 'abc']
+    assert futures[0].result(timeout=5) == 'a'
+    for future in futures[1:]:
+        with pytest.raises(RuntimeError, match="1 results for"):
+            future.result(timeout=5)
+
+
+def test_single_item_error_is_raised_to_caller():
+    def fail(items):
+        raise KeyError('model')
+
+    batcher = MicroBatcher(fail, max_wait_ms=0)
+    with pytest.raises(KeyError):
+        batcher('x', timeout=5)
+    assert batcher.stats()["split_batches"] == 0
+
+
+def test_generator_failing_partway_does_not_stop_the_worker():
+    def predict(items):
+        for item in items:
+            if item == 'corrupt':
+                raise ValueError("cannot decode image")
+            yield item.upper()
+
+    batcher = MicroBatcher(predict, max_batch_size=3, max_wait_ms=500)
+    futures = [batcher.submit(item) for item in ('rice', 'corrupt', 'egg')]
+    assert futures[0].result(timeout=5) == 'RICE'
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == 'EGG'
+    assert batcher('toast', timeout=5) == 'TOAST'
+
+
+def test_cancelled_items_are_skipped():
+    run, gate, calls = gated(lambda items: [item * 2 for item in items])
+    batcher = MicroBatcher(run, max_batch_size=1, max_wait_ms=0)
+    first = batcher.submit(1)
+    cancelled = batcher.submit(2)
+    assert cancelled.cancel()
+    gate.set()
+    assert first.result(timeout=5) == 2
+    assert batcher(3, timeout=5) == 6
+    assert [2] not in calls
@@ -0,0 +1,42 @@
+import json
+
+import numpy as np
+import pytest
+
+from allten.core import encoding
+from allten.core.encoding import RawJSON, _BACKENDS, dumps
+from allten.nutrients import NUTRIENT_FIELDS
+
+
+@pytest.fixture(params=sorted(_BACKENDS))
+def backend(request, monkeypatch):
+    available, encode = _BACKENDS[request.param]
+    if not available:
+        pytest.skip(f"{request.param} is not installed")
+    monkeypatch.setattr(encoding, 'ENCODER', request.param)
+    monkeypatch.setattr(encoding, '_encode', encode)
+    return request.param
+
+
+def test_backends_agree(backend):
+    payload = {"name": "Crème brûlée", "grams": 125.5, "foods": ["egg", "cream"], "count": 3, "missing": None,
+               "vector": np.array([1.5, 2.0], dtype=np.float32), "raw": RawJSON(b'{"a":1}')}
+    assert json.loads(dumps(payload)) == {**payload, "vector": [1.5, 2.0], "raw": {"a": 1}}
+    assert json.loads(dumps(payload, indent=2)) == json.loads(dumps(payload))
+
+
+def test_non_finite_floats_are_null(backend):
+    payload = {"calories": float('nan'), "values": [1.0, float('inf'), -float('inf')], "nested": {"fat": float('nan')},
+               "array": np.array([np.nan, 2.0]), "raw": RawJSON(b'[1]'), "ok": 2.5}
+    expected = {"calories": None, "values": [1.0, None, None], "nested": {"fat": None},
+                "array": [None, 2.0], "raw": [1], "ok": 2.5}
+    assert json.loads(dumps(payload)) == expected
+    assert json.loads(dumps(payload, indent=2)) == expected
+
+
+def test_nutrition_blocks_with_non_finite_values(backend):
+    values = [1.0] * len(NUTRIENT_FIELDS)
+    values[0] = float('nan')
+    block = json.loads(dumps({"nutrition": encoding.nutrition_json(values)}))["nutrition"]
+    assert block["calories"] is None and block["protein"] == 1.0
+    assert block["micronutrients"]["iron"] == 1.0
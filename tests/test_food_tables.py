@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from allten.food_data import FOOD_DATABASE
+from allten.food_tables import LiveFoodTables, TablesError, merge_tables, validate_tables
+
+
+@pytest.fixture
+def tables_dir(tmp_path):
+    directory = tmp_path / 'food_tables'
+    directory.mkdir()
+    return directory
+
+
+def live(tables_dir, tmp_path, on_swap=None):
+    return LiveFoodTables(str(tables_dir), str(tmp_path / 'catalog'), poll_seconds=0, on_swap=on_swap)
+
+
+def test_overrides_merge_onto_builtin_entries():
+    tables = merge_tables([
+        ('a.json', {"food_database": {"apple": {"calories": 80, "micronutrients": {"iron": 1.5}}},
+                    "aliases": {"apple": ["pomme"]}}),
+        ('b.json', {"food_database": {"banana": None}}),
+    ])
+    apple = tables['food_database']['apple']
+    assert apple['calories'] == 80 and apple['protein'] == FOOD_DATABASE['apple']['protein']
+    assert apple['micronutrients']['iron'] == 1.5
+    assert apple['micronutrients']['calcium'] == FOOD_DATABASE['apple']['micronutrients']['calcium']
+    assert 'banana' not in tables['food_database']
+    assert tables['aliases']['apple'] == ['pomme']
+    validate_tables(tables)
+
+
+@pytest.mark.parametrize("override", [
+    {"food_database": {"apple": {"calories": "lots"}}},
+    {"food_database": {"apple": {"calories": -1}}},
+    {"food_database": {"apple": {"calories": True}}},
+    {"food_database": {"apple": {"vitamin_z": 1}}},
+    {"food_database": {"kiwi": {"calories": 42}}},  # no serving_grams
+    {"vision_food_ranges": {"rice": {"calories": [200, 100]}}},
+    {"serving_grams": {"apple": 0}},
+    {"aliases": {"apple": "pomme"}},
+])
+def test_inconsistent_tables_are_rejected(override):
+    with pytest.raises(TablesError):
+        validate_tables(merge_tables([('bad.json', override)]))
+
+
+def test_unknown_table_is_rejected():
+    with pytest.raises(TablesError):
+        merge_tables([('bad.json', {"recipes": {}})])
+
+
+def test_reload_swaps_in_new_tables(tables_dir, tmp_path):
+    swaps = []
+    tables = live(tables_dir, tmp_path, on_swap=lambda old, new, changes: swaps.append(changes) or {"dropped": 0})
+    before = tables.current
+    assert before.food_database['apple']['calories'] == 95
+
+    (tables_dir / 'apple.json').write_text(json.dumps({
+        "food_database": {"apple": {"calories": 52}}, "aliases": {"apple": ["pink lady"]}}))
+    assert tables.reload_now()
+    after = tables.current
+    assert after is not before and after.generation == before.generation + 1
+    assert after.food_database['apple']['calories'] == 52
+    assert before.food_database['apple']['calories'] == 95  # old snapshot is untouched
+    assert swaps[-1]['food_database'] == {'apple'} and swaps[-1]['aliases'] == {'apple'}
+    assert after.search.search('pink lady')[0]['id'] == 'apple'
+    assert tables.stats()['last_invalidated'] == {"dropped": 0}
+
+
+def test_failed_reload_keeps_live_tables(tables_dir, tmp_path):
+    tables = live(tables_dir, tmp_path)
+    before = tables.current
+    (tables_dir / 'broken.json').write_text('{"food_database": ')
+    assert not tables.reload_now()
+    assert tables.current is before
+    stats = tables.stats()
+    assert stats['failures'] == 1 and 'broken.json' in stats['last_error']
+
+
+def test_broken_override_at_startup_uses_builtin_tables(tables_dir, tmp_path):
+    (tables_dir / 'bad.json').write_text(json.dumps({"serving_grams": {"apple": -5}}))
+    tables = live(tables_dir, tmp_path)
+    assert tables.current.serving_grams['apple'] == 182
+    assert 'serving_grams.apple' in tables.stats()['last_error']
+
+
+def test_watcher_thread_reload(tables_dir, tmp_path):
+    tables = live(tables_dir, tmp_path)
+    tables.start()
+    (tables_dir / 'rice.json').write_text(json.dumps({"serving_grams": {"rice": 200}}))
+    assert tables.reload(timeout=10)
+    assert tables.current.serving_grams['rice'] == 200
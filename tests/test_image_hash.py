@@ -0,0 +1,84 @@
+import io
+import random
+
+import pytest
+
+from allten.image_hash import (
+    BKTree, PerceptualLabelCache, PersistentLabelStore, compute_phash, hamming
+)
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def photo(seed=0, quality=90, size=(160, 120)):
+    rng = random.Random(seed)
+    image = Image.new('RGB', size)
+    image.putdata([(x * 255 // size[0], y * 255 // size[1], rng.randrange(256) // 8)
+                   for y in range(size[1]) for x in range(size[0])])
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+
+def test_reencoded_photo_hashes_close():
+    original = compute_phash(photo(quality=95))
+    reencoded = compute_phash(photo(quality=40))
+    assert hamming(original, reencoded) <= 6
+
+
+def test_compute_phash_rejects_undecodable_bytes():
+    assert compute_phash(b'not an image') is None
+    assert compute_phash(b'') is None
+
+
+def test_bk_tree_finds_nearest_within_distance():
+    rng = random.Random(1)
+    tree = BKTree()
+    keys = [rng.getrandbits(64) for _ in range(500)]
+    for i, key in enumerate(keys):
+        tree.add(key, i)
+    assert tree.size == 500
+
+    query = keys[42] ^ 0b101  # two bits away
+    distance, key, value = tree.find_nearest(query, 6)
+    assert (distance, key, value) == (2, keys[42], 42)
+    brute = min(hamming(query, k) for k in keys)
+    assert distance == brute
+
+
+def test_bk_tree_miss_and_empty():
+    tree = BKTree()
+    assert tree.find_nearest(0, 6) is None
+    tree.add(0, 'zero')
+    assert tree.find_nearest((1 << 64) - 1, 6) is None
+    tree.add(0, 'replaced')
+    assert tree.size == 1
+    assert tree.find_nearest(0, 0) == (0, 0, 'replaced')
+
+
+def test_label_cache_hits_and_evicts():
+    cache = PerceptualLabelCache(max_distance=4, max_entries=8)
+    cache.store(0b1111, ['apple'])
+    assert cache.lookup(0b1110) == ['apple']
+    assert cache.lookup(1 << 60) is None
+
+    for i in range(1, 12):
+        cache.store(i << 40, [f'food {i}'])
+    stats = cache.stats()
+    assert stats['entries'] <= 8
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_distance_histogram'][1] == 1
+
+
+def test_persistent_store_replays_hottest(tmp_path):
+    path = str(tmp_path / 'phash.db')
+    cache = PerceptualLabelCache(persistent=PersistentLabelStore(path))
+    high_bit = 1 << 63  # stored signed in SQLite, must come back unsigned
+    cache.store(high_bit, ['banana'])
+    cache.store(7, ['rice'])
+    cache.lookup(high_bit)
+
+    restarted = PerceptualLabelCache(persistent=PersistentLabelStore(path))
+    assert restarted.replay() == 2
+    assert restarted.lookup(high_bit) == ['banana']
+    assert PersistentLabelStore(path).hottest(0, 1) == [(high_bit, ['banana'])]
@@ -0,0 +1,115 @@
+import io
+import json
+
+import pytest
+
+from allten.catalog import load_catalog
+from allten.importer import (
+    InvalidSourceError, byte_ranges, import_sources, iter_json_array_items, normalize_fdc_food
+)
+from allten.nutrients import FIELD_INDEX
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def fdc_csv(directory, food_nutrient_header='"id","fdc_id","nutrient_id","amount"'):
+    directory.mkdir()
+    write(directory / 'food.csv', '"fdc_id","data_type","description"\n"1","foundation","Apple, raw"\n'
+                                  '"2","foundation","Rice, cooked"\n')
+    write(directory / 'nutrient.csv', '"id","name","unit_name"\n"1008","Energy","KCAL"\n"1003","Protein","G"\n'
+                                      '"1087","Calcium","MG"\n"1089","Iron","UG"\n"2047","Energy (Atwater)","KCAL"\n')
+    rows = [(1, 1008, 52), (1, 2047, 60), (1, 1003, 0.3), (1, 1089, 120), (2, 1003, 2.7), (2, 1087, 10), (3, 1003, 9)]
+    write(directory / 'food_nutrient.csv',
+          food_nutrient_header + '\n' + ''.join(f'"{i}","{fdc}","{nid}","{amount}"\n'
+                                                for i, (fdc, nid, amount) in enumerate(rows)))
+    write(directory / 'food_portion.csv', '"id","fdc_id","gram_weight"\n"1","1","182"\n')
+    return str(directory)
+
+
+def food(fdc_id, protein, upc=None):
+    return {"fdcId": fdc_id, "description": f"Food {fdc_id}", "gtinUpc": upc, "servingSize": 30, "servingSizeUnit": "g",
+            "foodNutrients": [{"nutrient": {"id": 1003, "unitName": "g"}, "amount": protein}]}
+
+
+def test_csv_directory_import(tmp_path):
+    source = fdc_csv(tmp_path / 'fdc')
+    catalog_dir = str(tmp_path / 'catalog')
+    assert import_sources([source], catalog_dir, workers=1, log=lambda message: None)
+
+    catalog = load_catalog(catalog_dir)
+    assert catalog.ids == ['fdc:1', 'fdc:2']
+    apple = catalog.vector('fdc:1')
+    assert apple[FIELD_INDEX['calories']] == 52  # 1008 is preferred over 2047
+    assert apple[FIELD_INDEX['iron']] == pytest.approx(0.12)  # ug -> mg
+    assert catalog.serving_grams == [182.0, 100.0]
+
+    # Unchanged sources are not imported again
+    assert import_sources([source], catalog_dir, workers=1, log=lambda message: None) is None
+
+
+def test_json_and_jsonl_import(tmp_path):
+    array_path = write(tmp_path / 'foundation.json', json.dumps({"FoundationFoods": [food(10, 5), food(11, 6)]}))
+    lines_path = write(tmp_path / 'branded.jsonl', '\n'.join(json.dumps(food(20 + i, i, f'0001{i}')) for i in range(3)))
+    catalog_dir = str(tmp_path / 'catalog')
+    import_sources([array_path, lines_path], catalog_dir, workers=1, log=lambda message: None)
+
+    catalog = load_catalog(catalog_dir)
+    assert len(catalog) == 5
+    assert catalog.vector('fdc:11')[FIELD_INDEX['protein']] == 6
+    assert catalog.upcs[catalog.row_of['fdc:22']] == '00012'
+    assert catalog.serving_grams[catalog.row_of['fdc:20']] == 30
+
+
+def test_json_array_items_stream_in_small_blocks():
+    text = json.dumps({"SurveyFoods": [{"n": i, "s": "x]" * i} for i in range(50)]})
+    items = list(iter_json_array_items(io.StringIO(text), block_bytes=7))
+    assert [item["n"] for item in items] == list(range(50))
+    with pytest.raises(InvalidSourceError):
+        list(iter_json_array_items(io.StringIO('[{"a": 1}, {"b": '), block_bytes=4))
+
+
+def test_byte_ranges_end_on_line_boundaries(tmp_path):
+    path = write(tmp_path / 'lines.txt', ''.join(f"line {i}\n" for i in range(100)))
+    ranges = byte_ranges(path, chunk_bytes=50)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(open(path, 'rb').read())
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert all(data[end - 1:end] == b'\n' for _, end in ranges)
+
+
+def test_normalize_prefers_primary_nutrient():
+    normalized = normalize_fdc_food({"fdcId": 1, "foodNutrients": [
+        {"nutrient": {"id": 2047, "unitName": "kcal"}, "amount": 70},
+        {"nutrient": {"id": 1008, "unitName": "kcal"}, "amount": 65},
+        {"nutrient": {"id": 1089, "unitName": "kJ"}, "amount": 1},  # iron in kJ is not comparable
+    ]})
+    assert normalized[0] == 'fdc:1'
+    assert normalized[3][FIELD_INDEX['calories']] == 65
+    assert normalized[3][FIELD_INDEX['iron']] == 0
+
+
+@pytest.mark.parametrize("name, content", [
+    ('broken.jsonl', '{"fdcId": 1}\n{"fdcId": \n'),
+    ('no_id.jsonl', '{"description": "no fdcId"}\n'),
+    ('broken.json', '{"FoundationFoods": [{"fdcId": 1}, {"fdcId"'),
+    ('strings.json', '["not a food"]'),
+    ('data.xml', '<foods/>'),
+])
+def test_malformed_files_raise_invalid_source(tmp_path, name, content):
+    path = write(tmp_path / name, content)
+    with pytest.raises(InvalidSourceError):
+        import_sources([path], str(tmp_path / 'catalog'), workers=1, log=lambda message: None)
+
+
+def test_missing_csv_column_raises_invalid_source(tmp_path):
+    source = fdc_csv(tmp_path / 'fdc')
+    write(tmp_path / 'fdc' / 'food.csv', '"id","description"\n"1","Apple"\n')
+    with pytest.raises(InvalidSourceError, match="fdc_id"):
+        import_sources([source], str(tmp_path / 'catalog'), workers=1, log=lambda message: None)
+
+    other = fdc_csv(tmp_path / 'fdc2', food_nutrient_header='"id","fdc_id","nutrient","amount"')
+    with pytest.raises(InvalidSourceError, match="nutrient_id"):
+        import_sources([other], str(tmp_path / 'catalog'), workers=1, log=lambda message: None)
@@ -0,0 +1,89 @@
+import asyncio
+import io
+
+import pytest
+
+from allten.adapters.asyncio_server import MAX_HEADER_BYTES, _BadRequest, _read_chunked
+from allten.core.routing import Request
+from allten.ingest import ChunkedReader, IngestError, read_body
+
+
+def chunked(*parts):
+    return io.BytesIO(b''.join(b'%x\r\n%s\r\n' % (len(part), part) for part in parts) + b'0\r\n\r\n')
+
+
+def test_content_length_body():
+    body = b'{"image": "abc"}' * 10000
+    assert read_body({'Content-Length': str(len(body))}, io.BytesIO(body + b'next request')) == body
+
+
+def test_missing_length_is_an_empty_body():
+    assert read_body({}, io.BytesIO(b'ignored')) == b''
+
+
+def test_content_type_is_not_checked():
+    request = Request('POST', '/analyze_food', headers={
+        'Content-Type': 'application/x-www-form-urlencoded', 'Content-Length': '13'}, rfile=io.BytesIO(b'{"image": ""}'))
+    assert request.json() == {"image": ""}
+
+
+def test_chunked_body():
+    headers = {'Transfer-Encoding': 'chunked'}
+    assert read_body(headers, chunked(b'{"a":', b' 1}')) == b'{"a": 1}'
+
+
+@pytest.mark.parametrize("headers, body, status", [
+    ({'Content-Length': '100'}, b'x' * 100, 413),
+    ({'Content-Length': 'ten'}, b'', 400),
+    ({'Content-Length': '-1'}, b'', 400),
+    ({'Content-Length': '20'}, b'short', 400),
+])
+def test_rejected_bodies(headers, body, status):
+    with pytest.raises(IngestError) as error:
+        read_body(headers, io.BytesIO(body), max_bytes=50)
+    assert error.value.status == status
+
+
+def test_chunked_body_over_the_limit():
+    with pytest.raises(IngestError) as error:
+        read_body({'Transfer-Encoding': 'chunked'}, chunked(b'x' * 40, b'x' * 40), max_bytes=50)
+    assert error.value.status == 413
+
+
+def test_malformed_chunks():
+    with pytest.raises(IngestError):
+        ChunkedReader(io.BytesIO(b'zz\r\nabc\r\n')).read()
+    with pytest.raises(IngestError):
+        ChunkedReader(io.BytesIO(b'10\r\nabc')).read()
+    assert not ChunkedReader(io.BytesIO(b'5\r\nab')).drain(100)
+
+
+def test_invalid_json_is_none():
+    request = Request('POST', '/meals', headers={'Content-Length': '5'}, rfile=io.BytesIO(b'{oops'))
+    assert request.json() is None
+
+
+def read_chunked_async(data, limit=1000):
+    async def read():
+        reader = asyncio.StreamReader(limit=MAX_HEADER_BYTES)
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await _read_chunked(reader, limit)
+    return asyncio.run(read())
+
+
+def test_asyncio_chunked_body():
+    assert read_chunked_async(chunked(b'{"a":', b' 1}').read()) == b'{"a": 1}'
+
+
+@pytest.mark.parametrize("data, status", [
+    (b'f' * (MAX_HEADER_BYTES + 10) + b'\r\nabc', 400),
+    (b'f' * 2000 + b'\r\n', 400),
+    (b'zz\r\nabc\r\n', 400),
+    (b'3\r\nabc\r\n0\r\nX-Trailer: ' + b'x' * (MAX_HEADER_BYTES + 10) + b'\r\n\r\n', 400),
+    (b'800\r\n' + b'x' * 2048 + b'\r\n0\r\n\r\n', 413),
+], ids=['size-over-stream-limit', 'size-line-too-long', 'size-not-hex', 'trailer-over-stream-limit', 'too-large'])
+def test_asyncio_malformed_chunks_are_bad_requests(data, status):
+    with pytest.raises(_BadRequest) as error:
+        read_chunked_async(data)
+    assert error.value.status == status
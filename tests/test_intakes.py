@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from allten.intakes import (
+    MAX_PEOPLE, NO_REFERENCE, REFERENCED, IntakeError, gap_arrays, group_index, group_name, intake_gaps, parse_people
+)
+from allten.nutrients import MICRONUTRIENTS, NUTRIENT_FIELDS
+
+
+def micros(**values):
+    return [values.get(name, 0) for name in MICRONUTRIENTS]
+
+
+@pytest.mark.parametrize("age, sex, name", [
+    (1, 'male', 'male 1-3'), (8.5, 'F', 'female 4-8'), (30, 'woman', 'female 19-30'), (90, 'm', 'male 71+'),
+])
+def test_groups(age, sex, name):
+    assert group_name(group_index(age, sex)) == name
+
+
+def test_percent_deficit_and_excess():
+    # A 30 year old woman: iron RDA 18 mg, UL 45 mg; calcium RDA 1000 mg
+    result = intake_gaps([{"user_id": "u1", "age": 30, "sex": "female",
+                           "nutrition": {"calories": 2000, "micronutrients": {"iron": 9, "calcium": 3000}}}])
+    person = result["results"][0]
+    assert person["group"] == 'female 19-30'
+    assert person["percent_dv"]["iron"] == 50.0 and person["deficits"]["iron"] == 9.0
+    assert person["excesses"]["calcium"] == 500.0 and "calcium" not in person["deficits"]
+    assert result["cohort"]["below_reference"]["iron"] == 1
+    assert set(result["no_reference"]) == set(NO_REFERENCE) and result["units"]["iron"] == 'mg'
+
+
+def test_vectors_days_and_body_weight():
+    full = [0] * (len(NUTRIENT_FIELDS) - len(MICRONUTRIENTS)) + micros(iron=16, lysine=4200)
+    intakes, groups, weights = parse_people([
+        {"age": 40, "sex": "male", "vector": full, "days": 2, "weight_kg": 70},
+        {"age": 40, "sex": "male", "vector": micros(iron=8, lysine=2100)},
+    ])
+    assert np.array_equal(intakes[0], intakes[1])
+    percent, _, _ = gap_arrays(intakes, groups, weights)
+    # Lysine is 30 mg per kg: 2100 mg is exactly the requirement at 70 kg
+    assert percent[0, REFERENCED.index('lysine')] == pytest.approx(100.0)
+    assert percent[0, REFERENCED.index('iron')] == pytest.approx(100.0)
+
+
+@pytest.mark.parametrize("people", [
+    None, [], [{}] * (MAX_PEOPLE + 1), ["person"],
+    [{"age": 0, "sex": "male", "vector": micros()}],
+    [{"age": 30, "sex": "other", "vector": micros()}],
+    [{"age": 30, "sex": "male"}],
+    [{"age": 30, "sex": "male", "vector": [1, 2, 3]}],
+    [{"age": 30, "sex": "male", "vector": micros(), "days": 0}],
+    [{"age": 30, "sex": "male", "vector": micros(), "days": float('inf')}],
+    [{"age": 30, "sex": "male", "vector": micros(), "weight_kg": -70}],
+    [{"age": 30, "sex": "male", "vector": micros(iron="8")}],
+    [{"age": 30, "sex": "male", "vector": micros(iron=True)}],
+    [{"age": 30, "sex": "male", "vector": micros(iron=float('nan'))}],
+    [{"age": 30, "sex": "male", "vector": micros(iron=-1)}],
+    [{"age": 30, "sex": "male", "vector": micros(iron=10 ** 400)}],
+    [{"age": 30, "sex": "male", "nutrition": {"micronutrients": {"iron": "lots"}}}],
+    [{"age": 30, "sex": "male", "nutrition": {"micronutrients": {"iron": float('nan')}}}],
+    [{"age": 30, "sex": "male", "nutrition": {"micronutrients": [8]}}],
+])
+def test_invalid_people(people):
+    with pytest.raises(IntakeError):
+        intake_gaps(people)
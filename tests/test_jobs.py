@@ -0,0 +1,166 @@
+import base64
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from allten.core.pipeline import AnalysisError
+from allten.jobs import DONE, FAILED, JobError, JobQueue, check_callback_url, parse_allowlist
+
+IMAGE = base64.b64encode(b'plate photo').decode()
+# The test callback server listens on loopback, which callbacks may only reach when allowed
+LOOPBACK = '127.0.0.1'
+OTHER_IMAGE = base64.b64encode(b'another plate').decode()
+
+
+@pytest.fixture
+def callbacks():
+    received = queue.Queue()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.put(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    received.url = f"http://127.0.0.1:{server.server_address[1]}/done"
+    yield received
+    server.shutdown()
+
+
+def wait_for(jobs, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get(job_id)
+        if job['status'] in (DONE, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {job['status']}")
+
+
+def test_job_runs_and_result_is_reused(tmp_path):
+    calls = []
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), lambda image: calls.append(image) or {"detected_foods": ["rice"]})
+    first = jobs.submit(IMAGE)
+    assert first['status'] in ('queued', 'running', DONE)
+    assert wait_for(jobs, first['job_id'])['result'] == {"detected_foods": ["rice"]}
+
+    # Same image again: finished at once from the stored result
+    again = jobs.submit('data:image/jpeg;base64,' + IMAGE)
+    assert again['status'] == DONE and again['result'] == {"detected_foods": ["rice"]}
+    assert len(calls) == 1
+    assert jobs.stats()["deduplicated"] == 1
+
+
+def test_callback_body_has_final_status_and_result(tmp_path, callbacks):
+    def slow_cache_check(result):
+        # Runs inside the transaction that finishes the job, so a callback
+        # queued before COMMIT would read the job while it is still running
+        time.sleep(0.2)
+        return True
+
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), lambda image: {"detected_foods": ["egg"]},
+                    cache_result=slow_cache_check, callback_allow=LOOPBACK)
+    job = jobs.submit(IMAGE, callback_url=callbacks.url)
+    body = callbacks.get(timeout=5)
+    assert body['job_id'] == job['job_id']
+    assert body['status'] == DONE
+    assert body['result'] == {"detected_foods": ["egg"]}
+
+    deadline = time.time() + 5
+    while jobs.get(job['job_id'])['callback']['status'] != 'delivered' and time.time() < deadline:
+        time.sleep(0.01)
+    assert jobs.get(job['job_id'])['callback']['status'] == 'delivered'
+
+
+def test_failed_analysis_calls_back_with_error(tmp_path, callbacks):
+    def reject(image):
+        raise AnalysisError(400, "Not a food photo")
+
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), reject, callback_allow=LOOPBACK)
+    job = jobs.submit(OTHER_IMAGE, callback_url=callbacks.url)
+    body = callbacks.get(timeout=5)
+    assert (body['job_id'], body['status'], body['error']) == (job['job_id'], FAILED, "Not a food photo")
+
+
+def test_unexpected_errors_are_retried(tmp_path):
+    attempts = []
+
+    def flaky(image):
+        attempts.append(image)
+        if len(attempts) < 2:
+            raise RuntimeError("Vision timed out")
+        return {"detected_foods": ["toast"]}
+
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), flaky, workers=1)
+    job = wait_for(jobs, jobs.submit(IMAGE)['job_id'])
+    assert job['status'] == DONE and job['attempts'] == 2
+    assert jobs.stats()["retried"] == 1
+
+
+def test_interrupted_jobs_resume_after_restart(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    blocked = threading.Event()
+    first = JobQueue(path, lambda image: blocked.wait(30) and {}, workers=1)
+    job_id = first.submit(IMAGE)['job_id']
+    deadline = time.time() + 5
+    while first.get(job_id)['status'] != 'running' and time.time() < deadline:
+        time.sleep(0.01)
+
+    # A new process over the same database: the running job is queued again and finishes there
+    second = JobQueue(path, lambda image: {"detected_foods": ["soup"]}, workers=1)
+    assert wait_for(second, job_id)['result'] == {"detected_foods": ["soup"]}
+    blocked.set()
+
+
+@pytest.mark.parametrize("image, callback_url, error", [
+    (None, None, AnalysisError),
+    ('%%% not base64', None, AnalysisError),
+    (IMAGE, 'ftp://example.com/hook', JobError),
+    (IMAGE, 'not a url', JobError),
+    (IMAGE, 'http://127.0.0.1:8080/hook', JobError),
+    (IMAGE, 'http://localhost/hook', JobError),
+    (IMAGE, 'http://169.254.169.254/latest/meta-data/', JobError),
+    (IMAGE, 'https://10.1.2.3/hook', JobError),
+    (IMAGE, 'http://[::1]/hook', JobError),
+    (IMAGE, 'http://0.0.0.0/hook', JobError),
+])
+def test_invalid_submissions(tmp_path, image, callback_url, error):
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), lambda image: {})
+    with pytest.raises(error):
+        jobs.submit(image, callback_url=callback_url)
+    assert jobs.get('missing') is None
+
+
+def test_callback_allowlist():
+    allow = parse_allowlist('10.0.0.0/8, Hooks.Internal, 127.0.0.1')
+    check_callback_url('http://10.20.30.40/hook', allow)
+    check_callback_url('http://127.0.0.1:9000/hook', allow)
+    check_callback_url('https://hooks.internal/done', allow)
+    check_callback_url('http://93.184.215.14/hook')  # a literal public address needs no lookup
+    with pytest.raises(JobError):
+        check_callback_url('http://192.168.1.1/hook', allow)
+
+
+def test_callback_host_is_checked_again_before_delivery(tmp_path, callbacks):
+    release = threading.Event()
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), lambda image: release.wait(30) and {"detected_foods": ["egg"]},
+                    callback_allow=LOOPBACK)
+    job_id = jobs.submit(IMAGE, callback_url=callbacks.url)['job_id']
+    # The host stops being acceptable between submission and delivery
+    jobs.callback_allow = parse_allowlist('')
+    release.set()
+
+    deadline = time.time() + 5
+    while jobs.get(job_id)['callback']['status'] == 'pending' and time.time() < deadline:
+        time.sleep(0.01)
+    assert jobs.get(job_id)['callback']['status'].startswith('failed: callback_url host')
+    assert callbacks.empty()
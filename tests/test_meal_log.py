@@ -0,0 +1,91 @@
+import pytest
+
+from allten.meal_log import MealLog, MealLogError, parse_logged_at
+from allten.nutrients import NUTRIENT_FIELDS, NutritionError, flatten_nutrition, unflatten_nutrition
+
+
+@pytest.fixture
+def meal_log(tmp_path):
+    return MealLog(str(tmp_path / 'meals.db'))
+
+
+def meal(calories, logged_at='2024-05-06T12:00:00Z', **micronutrients):
+    return {"nutrition": {"calories": calories, "protein": 10, "micronutrients": micronutrients},
+            "detected_foods": ["rice"], "logged_at": logged_at}
+
+
+def test_flatten_round_trip():
+    nutrition = {"calories": 250, "sodium": 1.5, "micronutrients": {"iron": 2, "histidine": 0.25}}
+    values = flatten_nutrition(nutrition)
+    assert len(values) == len(NUTRIENT_FIELDS)
+    again = unflatten_nutrition(values)
+    assert again["calories"] == 250.0 and again["fat"] == 0.0
+    assert again["micronutrients"]["histidine"] == 0.25
+
+
+@pytest.mark.parametrize("nutrition", [
+    {"calories": "abc"}, {"calories": [1]}, {"calories": True}, {"calories": float('nan')},
+    {"calories": float('inf')}, {"calories": -5}, {"calories": 10 ** 400},
+    {"micronutrients": {"iron": "2"}}, {"micronutrients": [1, 2]}, [1, 2],
+])
+def test_flatten_rejects_bad_values(nutrition):
+    with pytest.raises(NutritionError):
+        flatten_nutrition(nutrition)
+
+
+def test_rollups_follow_inserts_and_deletes(meal_log):
+    first, second = meal_log.add_meals('u1', [meal(300, iron=2), meal(200, iron=1)])
+    meal_log.add_meal('u1', meal(100, logged_at='2024-05-07T08:00:00Z'))
+    meal_log.add_meal('u2', meal(999))
+
+    day = meal_log.summary('u1', 'day', '2024-05-06')
+    assert day["meal_count"] == 2
+    assert day["nutrition"]["calories"] == 500
+    assert day["nutrition"]["micronutrients"]["iron"] == 3
+    week = meal_log.summary('u1', 'week', '2024-05-06')
+    assert (week["period_key"], week["meal_count"], week["nutrition"]["calories"]) == ('2024-W19', 3, 600)
+
+    assert meal_log.delete_meal('u1', first)
+    assert not meal_log.delete_meal('u2', second)  # someone else's meal
+    assert meal_log.summary('u1', 'day', '2024-05-06')["nutrition"]["calories"] == 200
+    assert [m["id"] for m in meal_log.list_meals('u1')] == [3, second]
+
+
+def test_offset_keeps_local_date(meal_log):
+    meal_log.add_meal('u1', meal(100, logged_at='2024-05-06T23:30:00-05:00'))
+    assert meal_log.summary('u1', 'day', '2024-05-06')["meal_count"] == 1
+
+
+@pytest.mark.parametrize("bad", [
+    meal("abc"), meal([1]), meal(float('nan')), meal(-1), meal(100, logged_at=1e20),
+    meal(100, logged_at=True), meal(100, logged_at='yesterday'), meal(100, logged_at=float('nan')),
+    meal(100, logged_at=[2024]), {"nutrition": 5}, "not a meal",
+    {"nutrition": {}, "detected_foods": "rice"},
+])
+def test_invalid_meals_raise_meal_log_error(meal_log, bad):
+    with pytest.raises(MealLogError):
+        meal_log.add_meals('u1', [meal(1), bad])
+    # Nothing from the failed batch was stored
+    assert meal_log.list_meals('u1') == []
+
+
+def test_summary_rejects_bad_period(meal_log):
+    with pytest.raises(MealLogError):
+        meal_log.summary('u1', 'month')
+    with pytest.raises(MealLogError):
+        meal_log.add_meal('', meal(1))
+
+
+def test_parse_logged_at_epoch_and_iso():
+    assert parse_logged_at(0).year == 1970
+    assert parse_logged_at('2024-05-06T12:00:00Z').tzinfo is not None
+    assert parse_logged_at('2024-05-06').isoformat().startswith('2024-05-06T00:00:00')
+
+
+def test_vectors_and_lookup_by_id(meal_log):
+    ids = meal_log.add_meals('u1', [meal(100), meal(200)])
+    assert meal_log.meal_vector('u1', ids[1])[0] == 200
+    assert meal_log.meal_vector('u2', ids[1]) is None
+    rows = [row for chunk in meal_log.iter_vectors(after_id=ids[0], chunk_size=1) for row in chunk]
+    assert [row[0] for row in rows] == [ids[1]]
+    assert set(meal_log.meals_by_id(ids)) == set(ids)
@@ -0,0 +1,148 @@
+import asyncio
+import http.client
+import socket
+import threading
+import time
+
+import pytest
+
+from allten.adapters.asyncio_server import serve as serve_asyncio
+from allten.adapters.http_server import make_server
+from allten.core import DEFAULT_LANE, FAST_LANE, Router
+
+ANALYSIS_WORKERS = 4
+ANALYSIS_CLIENTS = 2 * ANALYSIS_WORKERS
+# Fast-lane answers must stay well under this while every analysis worker is busy
+MAX_HEALTH_MS = 250
+
+
+def lanes_router(health_lane=FAST_LANE):
+    router = Router()
+    router.release = threading.Event()
+    router.busy = threading.Semaphore(0)
+
+    @router.route('/health', lane=health_lane)
+    def health(request):
+        return {"status": "healthy"}
+
+    @router.route('/analyze_food', methods=['POST'])
+    def analyze_food(request):
+        # Stands in for a Vision call that takes until the test is done
+        request.json()
+        router.busy.release()
+        router.release.wait(30)
+        return {"detected_foods": ["mixed meal"]}
+    return router
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_asyncio(router):
+    port = free_port()
+    listening = threading.Event()
+    loop = asyncio.new_event_loop()
+    server = loop.create_task(serve_asyncio(router, '127.0.0.1', port, listening.set, workers=ANALYSIS_WORKERS))
+
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(server)
+        except asyncio.CancelledError:
+            pass
+        # Close the connections still open before the loop goes away
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert listening.wait(5)
+
+    def stop():
+        loop.call_soon_threadsafe(server.cancel)
+        thread.join(5)
+    return port, stop
+
+
+def start_threading(router):
+    server = make_server(router, '127.0.0.1', 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1], server.shutdown
+
+
+@pytest.fixture(params=['asyncio', 'threading'])
+def transport(request):
+    return {'asyncio': start_asyncio, 'threading': start_threading}[request.param]
+
+
+def saturate(port, clients):
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        try:
+            conn.request('POST', '/analyze_food', body=b'{"image": ""}')
+            conn.getresponse().read()
+        except OSError:
+            pass
+        finally:
+            conn.close()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def health_ms(port, timeout=5):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        start = time.perf_counter()
+        conn.request('GET', '/health')
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 200
+        return (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+
+
+def test_health_stays_fast_while_analysis_pool_is_saturated(transport):
+    router = lanes_router()
+    port, stop = transport(router)
+    clients = []
+    try:
+        idle = [health_ms(port) for _ in range(20)]
+        clients = saturate(port, ANALYSIS_CLIENTS)
+        for _ in range(ANALYSIS_WORKERS):
+            assert router.busy.acquire(timeout=5), "analysis workers never became busy"
+
+        busy = [health_ms(port) for _ in range(50)]
+        assert max(busy) < MAX_HEALTH_MS, f"/health took {max(busy):.1f} ms (idle max {max(idle):.1f} ms)"
+        assert router.lane_stats()[FAST_LANE]["requests"] == 70
+    finally:
+        router.release.set()
+        for client in clients:
+            client.join(5)
+        stop()
+
+
+def test_health_on_the_default_lane_queues_behind_analyses():
+    # The same check without the fast lane, to show it measures something
+    router = lanes_router(health_lane=DEFAULT_LANE)
+    port, stop = start_asyncio(router)
+    clients = []
+    try:
+        clients = saturate(port, ANALYSIS_CLIENTS)
+        for _ in range(ANALYSIS_WORKERS):
+            assert router.busy.acquire(timeout=5)
+        with pytest.raises(OSError):
+            health_ms(port, timeout=MAX_HEALTH_MS / 1000)
+    finally:
+        router.release.set()
+        for client in clients:
+            client.join(5)
+        stop()
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from allten.catalog import Catalog
+from allten.nutrients import FIELD_INDEX, NUTRIENT_FIELDS
+from allten import recipes as recipes_module
+from allten.recipes import RecipeCalculator, RecipeError
+
+FOOD_DATABASE = {
+    "rice": {"calories": 200, "protein": 4, "micronutrients": {"iron": 2}},
+    "egg": {"calories": 70, "protein": 6, "micronutrients": {}},
+}
+VISION_FOOD_RANGES = {"toast": {"calories": (60, 100), "protein": (2, 4), "carbs": (10, 20), "fat": (1, 3)}}
+SERVING_GRAMS = {"rice": 200, "egg": 50, "toast": 30}
+
+
+@pytest.fixture
+def calculator():
+    columns = np.zeros((len(NUTRIENT_FIELDS), 1), dtype=np.float32)
+    columns[FIELD_INDEX['calories'], 0] = 400  # per 100 g
+    catalog = Catalog(['fdc:1'], ['Oats'], ['test'], [40.0], columns)
+    return RecipeCalculator(FOOD_DATABASE, VISION_FOOD_RANGES, SERVING_GRAMS, catalog)
+
+
+def test_totals_and_per_serving(calculator):
+    result = calculator.compute([{
+        "name": "breakfast", "servings": 2,
+        "ingredients": [{"id": "rice", "quantity": 100}, {"id": "egg", "quantity": 2, "unit": "each"},
+                        {"id": "toast", "quantity": 1, "unit": "serving"}, {"id": "fdc:1", "quantity": 0.05, "unit": "kg"}],
+    }])[0]
+    assert result["total_grams"] == 100 + 100 + 30 + 50
+    assert result["total"]["calories"] == 100 + 140 + 80 + 200
+    assert result["per_serving"]["calories"] == 260
+    assert result["total"]["micronutrients"]["iron"] == 1
+
+
+def test_batch_matches_one_at_a_time(calculator):
+    batch = [{"ingredients": [{"id": "rice", "quantity": grams}]} for grams in (10, 50, 400)]
+    together = calculator.compute(batch)
+    assert together == [calculator.compute([recipe])[0] for recipe in batch]
+
+
+def test_pure_python_fallback_matches_numpy(calculator, monkeypatch):
+    recipe = {"ingredients": [{"id": "rice", "quantity": 150}, {"id": "fdc:1", "quantity": 30}]}
+    expected = calculator.compute([recipe])
+    monkeypatch.setattr(recipes_module, 'NUMPY_AVAILABLE', False)
+    calculator.builtin_densities = calculator.builtin_densities.tolist()
+    assert calculator.compute([recipe]) == expected
+
+
+@pytest.mark.parametrize("recipe", [
+    {"ingredients": []},
+    {"ingredients": "rice"},
+    {"ingredients": [{"id": "rice"}], "servings": 0},
+    {"ingredients": [{"id": "rice"}], "servings": True},
+    {"ingredients": [{"id": "rice"}], "servings": float('nan')},
+    {"ingredients": [{"id": "pizza"}]},
+    {"ingredients": [{"id": ["x"]}]},
+    {"ingredients": [{"id": {"a": 1}}]},
+    {"ingredients": [{"id": "rice", "quantity": -1}]},
+    {"ingredients": [{"id": "rice", "quantity": "2"}]},
+    {"ingredients": [{"id": "rice", "quantity": True}]},
+    {"ingredients": [{"id": "rice", "quantity": float('nan')}]},
+    {"ingredients": [{"id": "rice", "quantity": float('inf')}]},
+    {"ingredients": [{"id": "rice", "quantity": 1e308}]},
+    {"ingredients": [{"id": "rice", "quantity": 2000, "unit": "kg"}]},
+    {"ingredients": [{"id": "rice", "quantity": 1, "unit": "bucket"}]},
+    {"ingredients": ["rice"]},
+])
+def test_invalid_recipes_raise_recipe_error(calculator, recipe):
+    with pytest.raises(RecipeError):
+        calculator.compute([recipe])
+
+
+def test_request_limits(calculator):
+    with pytest.raises(RecipeError):
+        calculator.compute([])
+    with pytest.raises(RecipeError):
+        calculator.compute([{"ingredients": [{"id": "rice"}]}] * (recipes_module.MAX_RECIPES + 1))
@@ -0,0 +1,47 @@
+import time
+
+from allten.result_cache import DigestResultCache, image_digest, parse_digest, parse_phash
+
+SALAD = image_digest(b'salad photo')
+SALAD_AGAIN = image_digest(b'salad photo, re-encoded')
+OLD_SALAD = image_digest(b'salad photo from last week')
+
+
+def test_exact_and_near_duplicate_hits():
+    cache = DigestResultCache(max_distance=6)
+    cache.store(SALAD, {"detected_foods": ["salad"]}, size=300, phash=0b1111)
+    assert cache.lookup(SALAD) == ({"detected_foods": ["salad"]}, {"matched_by": "sha256"})
+    result, how = cache.lookup(SALAD_AGAIN, phash=0b1100)
+    assert result == {"detected_foods": ["salad"]}
+    assert how == {"matched_by": "phash", "phash_distance": 2}
+    assert cache.lookup(SALAD_AGAIN, phash=(1 << 64) - 1) == (None, None)
+    assert cache.stats()["upload_bytes_avoided"] == 800
+
+
+def test_expired_nearest_match_does_not_hide_a_live_one(monkeypatch):
+    cache = DigestResultCache(ttl=60, max_distance=6)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now - 120)
+    cache.store(OLD_SALAD, {"detected_foods": ["old salad"]}, phash=0b1)
+    monkeypatch.setattr(time, 'time', lambda: now)
+    cache.store(SALAD, {"detected_foods": ["salad"]}, phash=0b111)
+
+    # The expired entry is the closer one (distance 0), the live one is 2 away
+    result, how = cache.lookup(SALAD_AGAIN, phash=0b1)
+    assert result == {"detected_foods": ["salad"]}
+    assert how == {"matched_by": "phash", "phash_distance": 2}
+    assert cache.lookup(OLD_SALAD) == (None, None)
+
+
+def test_backing_store_fills_misses():
+    cache = DigestResultCache(backing=lambda digest: {"detected_foods": ["soup"]} if digest == SALAD else None)
+    assert cache.lookup(SALAD)[0] == {"detected_foods": ["soup"]}
+    assert cache.lookup(OLD_SALAD) == (None, None)
+    assert cache.invalidate(lambda result: "soup" in result["detected_foods"]) == 1
+
+
+def test_parsing_client_hashes():
+    assert parse_digest(SALAD.upper()) == SALAD
+    assert parse_digest('abc') is None and parse_digest(None) is None
+    assert parse_phash('00000000000000ff') == 255
+    assert parse_phash('xyz') is None
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from allten.food_data import FOOD_DATABASE, SERVING_GRAMS, VISION_FOOD_RANGES
+from allten.meal_log import MealLog
+from allten.nutrients import FIELD_INDEX, NUTRIENT_FIELDS
+from allten.recipes import RecipeCalculator
+from allten.similarity import (
+    SimilarityError, VectorIndex, food_vector, food_vector_index, nearest_meals, nutrition_vector, parse_weights
+)
+
+
+def test_weights_from_query_string_and_json():
+    weights = parse_weights('protein:3, micronutrients:0')
+    assert weights[FIELD_INDEX['protein']] == 3 and weights[FIELD_INDEX['calories']] == 1
+    assert weights[FIELD_INDEX['iron']] == 0
+    # A single nutrient overrides its group whatever the order
+    weights = parse_weights({"iron": 2, "micronutrients": 0})
+    assert weights[FIELD_INDEX['iron']] == 2 and weights[FIELD_INDEX['calcium']] == 0
+    assert parse_weights(None) is None and parse_weights('') is None
+
+
+@pytest.mark.parametrize("weights", [
+    'protein', 'protein:lots', {"protein": -1}, {"protein": True}, {"protein": float('nan')},
+    {"vitamin_z": 1}, [1, 2], {"macronutrients": 0, "micronutrients": 0},
+])
+def test_invalid_weights(weights):
+    with pytest.raises(SimilarityError):
+        parse_weights(weights)
+
+
+@pytest.mark.parametrize("nutrition", [{"calories": "lots"}, {"calories": float('nan')}, {"micronutrients": [1]}])
+def test_invalid_posted_nutrition(nutrition):
+    with pytest.raises(SimilarityError):
+        nutrition_vector(nutrition)
+
+
+def test_exact_search_ranks_the_closest_profile_first():
+    vectors = np.zeros((3, len(NUTRIENT_FIELDS)), dtype=np.float32)
+    vectors[:, FIELD_INDEX['protein']] = [30, 1, 28]
+    vectors[:, FIELD_INDEX['carbs']] = [1, 40, 3]
+    index = VectorIndex(vectors, ['chicken', 'rice', 'tuna'])
+    assert index.method == 'exact'
+    results = index.search(vectors[0], k=2, exclude={'chicken'})
+    assert [key for key, _ in results] == ['tuna', 'rice']
+    assert results[0][1] > results[1][1]
+    assert VectorIndex(np.zeros((0, len(NUTRIENT_FIELDS))), []).search(vectors[0]) == []
+
+
+def test_ivf_search_finds_what_exact_search_finds():
+    rng = np.random.default_rng(1)
+    centers = rng.random((20, len(NUTRIENT_FIELDS)), dtype=np.float32) * 100
+    vectors = np.repeat(centers, 50, axis=0) + rng.random((1000, len(NUTRIENT_FIELDS)), dtype=np.float32)
+    index = VectorIndex(vectors, list(range(1000)), exact_max=100)
+    assert index.method == 'ivf' and len(index) == 1000
+
+    recall = []
+    for query in vectors[::50]:
+        exact = {key for key, _ in index.search(query, k=10, exact=True)}
+        approximate = {key for key, _ in index.search(query, k=10, nprobe=8)}
+        recall.append(len(exact & approximate) / 10)
+    assert np.mean(recall) >= 0.9
+
+
+def test_food_index_covers_builtin_foods():
+    recipes = RecipeCalculator(FOOD_DATABASE, VISION_FOOD_RANGES, SERVING_GRAMS)
+    index = food_vector_index(recipes)
+    results = index.search(food_vector(recipes, None, 'apple'), k=3)
+    assert results[0] == ('apple', pytest.approx(1.0, abs=1e-4))
+    assert food_vector(recipes, None, 'no such food') is None
+
+
+def test_meals_are_only_compared_within_one_user(tmp_path):
+    meal_log = MealLog(str(tmp_path / 'meals.db'))
+    meal = lambda calories, protein: {"nutrition": {"calories": calories, "protein": protein},
+                                      "detected_foods": ["rice"], "logged_at": '2024-05-06T12:00:00Z'}
+    salad, steak, pasta = meal_log.add_meals('u1', [meal(150, 5), meal(600, 60), meal(700, 20)])
+    other_steak, = meal_log.add_meals('u2', [meal(610, 61)])
+
+    query = meal_log.meal_vector('u1', steak)
+    results = nearest_meals(meal_log, 'u1', query, k=10, exclude={steak})
+    assert {meal_id for meal_id, _ in results} == {salad, pasta}
+    assert [meal_id for meal_id, _ in nearest_meals(meal_log, 'u2', query)] == [other_steak]
+    assert nearest_meals(meal_log, 'nobody', query) == []
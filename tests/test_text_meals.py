@@ -0,0 +1,65 @@
+import pytest
+
+from allten.food_data import FOOD_ALIASES, FOOD_DATABASE, SERVING_GRAMS, VISION_FOOD_RANGES
+from allten.food_search import FoodSearchIndex, builtin_food_entries
+from allten.recipes import RecipeCalculator
+from allten.text_meals import MAX_TEXT_LENGTH, MAX_TEXTS, TextMealAnalyzer, TextMealError, parse_number, parse_quantity
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    search = FoodSearchIndex(builtin_food_entries(FOOD_DATABASE, VISION_FOOD_RANGES, FOOD_ALIASES))
+    return TextMealAnalyzer(search, RecipeCalculator(FOOD_DATABASE, VISION_FOOD_RANGES, SERVING_GRAMS))
+
+
+@pytest.mark.parametrize("text, value", [
+    ('2', 2.0), ('1.5', 1.5), ('1/2', 0.5), ('1 1/2', 1.5), ('½', 0.5), ('dozen', 12.0), ('1/0', 0.0),
+])
+def test_parse_number(text, value):
+    assert parse_number(text) == value
+
+
+@pytest.mark.parametrize("item, expected", [
+    ('1/2 cup rice', (0.5, 'cup', 'rice')),
+    ('1 1/2 cups of rice', (1.5, 'cup', 'rice')),
+    ('½ cup rice', (0.5, 'cup', 'rice')),
+    ('3/4 tbsp butter', (0.75, 'tbsp', 'butter')),
+    ('2 eggs', (2.0, 'serving', 'eggs')),
+    ('150g chicken', (150.0, 'g', 'chicken')),
+    ('two slices of bread', (2.0, 'serving', 'bread')),
+    ('half an apple', (0.5, 'serving', 'apple')),
+    ('an apple', (1.0, 'serving', 'apple')),
+    ('a', (1.0, 'serving', 'a')),
+    ('rice 150g', (150.0, 'g', 'rice')),
+    ('rice 1/2 cup', (0.5, 'cup', 'rice')),
+    ('milk 1 1/2 cups', (1.5, 'cup', 'milk')),
+    ('toast x 2', (2.0, 'serving', 'toast')),
+    ('banana', (1.0, 'serving', 'banana')),
+])
+def test_parse_quantity(item, expected):
+    assert parse_quantity(item) == expected
+
+
+def test_description_is_split_into_foods(analyzer):
+    result = analyzer.analyze(['1/2 cup rice and 2 eggs'])[0]
+    assert [(item['id'], item['quantity'], item['unit']) for item in result['items']] == [
+        ('rice', 0.5, 'cup'), ('eggs', 2.0, 'serving')]
+    assert result['unmatched'] == []
+    assert result['total_grams'] == sum(item['grams'] for item in result['items'])
+    assert result['nutrition']['calories'] > 0
+
+
+def test_names_inside_a_phrase_and_typos(analyzer):
+    eggs_on_toast, typo, nothing = analyzer.analyze(['scrambled eggs on toast', 'bananna', 'xyzzy plugh'])
+    assert eggs_on_toast['detected_foods'] == ['eggs', 'bread']
+    assert typo['items'][0]['id'] == 'banana' and typo['items'][0]['match'] == 'fuzzy'
+    assert nothing['items'] == [] and nothing['unmatched'] == ['xyzzy plugh']
+    assert nothing['total_grams'] == 0.0 and nothing['nutrition']['calories'] == 0
+
+
+@pytest.mark.parametrize("texts", [
+    None, 'rice', [], [''], ['rice', 3], ['x' * (MAX_TEXT_LENGTH + 1)], ['rice'] * (MAX_TEXTS + 1),
+])
+def test_invalid_requests(analyzer, texts):
+    with pytest.raises(TextMealError):
+        analyzer.analyze(texts)